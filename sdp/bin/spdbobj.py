@@ -23,13 +23,28 @@ def create_tables(conn):
             - when pipeline status is 'running', 'transition' contain transition currently running
         - 'jobrun' table
             - 'runlog' column contains detailed infos about the job execution
+        - 'event' table
+            - 'delivery_id' column contains the event identifier set by the transfer module
+              (used to ignore events received twice, e.g. when a batch is sent again after a timeout)
     """
     conn.execute("create table if not exists ppprun (ppprun_id INTEGER PRIMARY KEY, variable TEXT, dataset_pattern TEXT, project TEXT, model TEXT, state TEXT, transition TEXT, status TEXT, pipeline TEXT, error_msg TEXT, priority INT, crea_date TEXT, last_mod_date TEXT)")
-    conn.execute("create table if not exists event (event_id INTEGER PRIMARY KEY, name TEXT, status TEXT, project TEXT, model TEXT, dataset_pattern TEXT, variable TEXT, filename_pattern TEXT, crea_date TEXT, priority INT)")
+    conn.execute("create table if not exists event (event_id INTEGER PRIMARY KEY, name TEXT, status TEXT, project TEXT, model TEXT, dataset_pattern TEXT, variable TEXT, filename_pattern TEXT, crea_date TEXT, priority INT, delivery_id TEXT)")
     conn.execute("create table if not exists jobrun (jobrun_id INTEGER PRIMARY KEY, ppprun_id INT, transition TEXT, start_date TEXT, end_date TEXT, duration INT, status TEXT, error_msg TEXT, runlog TEXT)")
 
+    # upgrade database created with a previous version
+    if not column_exists(conn,'event','delivery_id'):
+        conn.execute("alter table event add column delivery_id TEXT")
+
     conn.commit()
 
+def column_exists(conn,table,column):
+    c = conn.cursor()
+    c.execute("pragma table_info(%s)"%table)
+    columns=[rs[1] for rs in c.fetchall()]
+    c.close()
+
+    return column in columns
+
 def create_indexes(conn):
     conn.execute("create unique index if not exists idx_ppprun_1 on ppprun (dataset_pattern,variable,pipeline)")
     conn.execute("create        index if not exists idx_ppprun_2 on ppprun (status,transition)")
@@ -37,4 +52,5 @@ def create_indexes(conn):
     conn.execute("create        index if not exists idx_event_1 on event (name)")
     conn.execute("create        index if not exists idx_event_2 on event (status)")
     conn.execute("create        index if not exists idx_event_3 on event (crea_date)")
+    conn.execute("create unique index if not exists idx_event_4 on event (delivery_id)")
     conn.commit()
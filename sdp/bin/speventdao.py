@@ -20,17 +20,29 @@ from sptypes import Event
 from spexception import SPException
 
 def add_events(events):
-    keys_to_insert=['name', 'status', 'project', 'model', 'dataset_pattern', 'variable', 'filename_pattern', 'crea_date', 'priority']
+    """Insert events in one transaction.
+
+    Returns
+        number of inserted events
+
+    Note
+        Events already received (same 'delivery_id') are ignored.
+    """
+    keys_to_insert=['name', 'status', 'project', 'model', 'dataset_pattern', 'variable', 'filename_pattern', 'crea_date', 'priority', 'delivery_id']
 
     conn=spdb.connect()
 
     try:
-        for event in events:
-            spsqlutils.insert(event,keys_to_insert,conn)
+        before=conn.total_changes
+        conn.executemany("insert or ignore into event (%s) values (%s)"%(', '.join(keys_to_insert),', '.join(['?']*len(keys_to_insert))),
+                         [[e.__dict__.get(k) for k in keys_to_insert] for e in events]) # 'delivery_id' is missing when events come from a previous version of the transfer module
+        count=conn.total_changes-before
         conn.commit()
     finally:
         spdb.disconnect(conn)
 
+    return count
+
 def get_events(limit=None,**search_constraints):
     """
     Note
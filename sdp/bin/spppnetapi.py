@@ -60,9 +60,10 @@ def event(events):
         event=Event(**e)
         li.append(event)
 
-    speventdao.add_events(li)
+    count=speventdao.add_events(li)
 
-    response={"error_code":0}
+    # the whole batch is acknowledged (events already received are counted as duplicates)
+    response={"error_code":0,"received":len(li),"duplicates":len(li)-count}
     return response
 
 class PostProcessingNetAPI():
@@ -29,6 +29,7 @@ class AuthRequestHandler(PostProcessingNetAPI,pyjsonrpc.HttpRequestHandler):
 
     DEFAULT_AUTH_ERROR_MESSAGE = """<head> <title>%(code)s - %(message)s</title> </head> <body> <h1>Authorization Required</h1> this server could not verify that you are authorized to access the document requested.  Either you supplied the wrong credentials (e.g., bad password), or your browser doesn't understand how to supply the credentials required.  </body> """
     DO_AUTH = True # False means no authentication
+    protocol_version = 'HTTP/1.1' # keep connection open between requests (the transfer module sends events on a persistent connection)
 
     def parse_request(self):
         if not BaseHTTPServer.BaseHTTPRequestHandler.parse_request(self):
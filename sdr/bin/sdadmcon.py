@@ -64,7 +64,25 @@ class AdminConsole(BaseConsole):
             pass
 
     def do_priority(self,arg):
-        pass
+        import sdmodify
+
+        li=arg.split()
+        if len(li)!=2:
+            print "Incorrect argument"
+            return
+
+        (file_,priority)=li
+        try:
+            priority=int(priority)
+        except ValueError:
+            print "Incorrect priority (%s)"%priority
+            return
+
+        nbr=sdmodify.change_priority(priority,None if file_=='all' else file_)
+        if nbr>0:
+            print "%i file(s) modified."%nbr
+        else:
+            print "No file modified (only waiting files can be modified)."
 
     #def do_si(self,line):
     #    """si SELECTION
@@ -132,7 +150,7 @@ class AdminConsole(BaseConsole):
     def help_benchmark(self):
         print sdi18n.m0006('benchmark','Bench ESGF indexes')
     def help_priority(self):
-        print sdi18n.m0006('priority','Set transfers priority')
+        print sdi18n.m0006('priority [ all | file ] priority','Set waiting transfers priority',example=sdi18n.m0029)
     def help_sample(self):
         print sdi18n.m0006('sample sample_type [ project ]','Print samples',example=sdi18n.m0013)
     def help_retry(self):
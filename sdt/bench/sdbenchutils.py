@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains benchmark helpers.
+
+Notes
+    - Benchmarks run against a scratch database (the user database is never modified).
+    - use_scratch_folder() must be called BEFORE 'sdapp' and 'sddb' modules are imported
+      (database connection is opened when 'sddb' module is imported).
+"""
+
+import os
+import time
+import sqlite3
+from tabulate import tabulate
+import sdconfig
+import sdconst
+
+class CountingCursor():
+    """Cursor proxy which counts executed statements."""
+
+    def __init__(self,cursor,counter):
+        self._cursor=cursor
+        self._counter=counter
+
+    def execute(self,*args,**kwargs):
+        self._counter['statements']+=1
+        return self._cursor.execute(*args,**kwargs)
+
+    def executemany(self,*args,**kwargs):
+        self._counter['statements']+=1
+        return self._cursor.executemany(*args,**kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self,name):
+        return getattr(self._cursor,name)
+
+class CountingConnection():
+    """Connection proxy which counts executed statements.
+
+    Note
+        this proxy must be installed before the DAO modules are imported, as
+        they bind 'sddb.conn' as default argument at import time.
+    """
+
+    def __init__(self,conn):
+        self._conn=conn
+        self._counter={'statements':0}
+
+    def cursor(self,*args,**kwargs):
+        return CountingCursor(self._conn.cursor(*args,**kwargs),self._counter)
+
+    def execute(self,*args,**kwargs):
+        self._counter['statements']+=1
+        return self._conn.execute(*args,**kwargs)
+
+    def executemany(self,*args,**kwargs):
+        self._counter['statements']+=1
+        return self._conn.executemany(*args,**kwargs)
+
+    def get_statement_count(self):
+        return self._counter['statements']
+
+    def __getattr__(self,name):
+        return getattr(self._conn,name)
+
+def use_scratch_folder(folder):
+    """Redirect database and pid files to 'folder'."""
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    db_file="%s/sdt.db"%folder
+    for f in (db_file,"%s/caches.db"%folder):
+        if os.path.isfile(f):
+            os.remove(f)
+
+    if os.path.isfile(sdconfig.db_file):
+        copy_param_table(sdconfig.db_file,db_file)
+
+    sdconfig.default_db_folder=folder # 'caches.db' location
+    sdconfig.db_folder=folder
+    sdconfig.db_file=db_file
+    sdconfig.daemon_pid_file="%s/daemon.pid"%folder
+    sdconfig.ihm_pid_file="%s/ihm.pid"%folder
+
+def copy_param_table(src_db_file,dest_db_file):
+    """Copy 'param' table from the user database (so the scratch database doesn't need to retrieve parameters from ESGF)."""
+    conn=sqlite3.connect(dest_db_file)
+    conn.execute("attach database ? as src",(src_db_file,))
+    conn.execute("create table param as select * from src.param")
+    conn.commit()
+    conn.execute("detach database src")
+    conn.close()
+
+def install_counting_connection():
+    """Wrap 'sddb.conn' to count executed statements.
+
+    Returns
+        CountingConnection object
+    """
+    import sddb # do not move at the top (see use_scratch_folder() note)
+
+    sddb.conn=CountingConnection(sddb.conn)
+
+    return sddb.conn
+
+def populate_waiting_files(conn,count,datanode_count,dataset_size=10):
+    """Insert 'count' waiting files spread over 'datanode_count' data nodes.
+
+    Note
+        files are grouped by 'dataset_size' in datasets, so 'dataset complete'
+        events are triggered during the benchmark.
+    """
+    now=time.strftime("%Y-%m-%d %H:%M:%S")
+    c=conn.cursor()
+
+    dataset_id=None
+    for i in range(count):
+        if i%dataset_size==0:
+            path='CMIP5/output1/BENCH/IPSL-CM5A-LR/historical/mon/atmos/Amon/r%ii1p1/v20110101'%i
+            c.execute("insert into dataset (dataset_functional_id,status,crea_date,path,path_without_version,version,local_path,latest,model,project,timestamp) values (?,?,?,?,?,?,?,?,?,?,?)",
+                      (path.replace('/','.'),sdconst.DATASET_STATUS_EMPTY,now,path,os.path.dirname(path),'v20110101',path,0,'IPSL-CM5A-LR','CMIP5',now))
+            dataset_id=c.lastrowid
+
+        data_node='esgf-node%i.example.org'%(i%datanode_count)
+        filename='tas_Amon_%i.nc'%i
+        local_path='%s/tas/%s'%(path,filename)
+        c.execute("insert into file (url,file_functional_id,filename,local_path,data_node,size,crea_date,status,priority,model,project,variable,dataset_id,insertion_group_id,timestamp) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                  ('http://%s/thredds/fileServer/%s'%(data_node,local_path),local_path.replace('/','.'),filename,local_path,data_node,1,now,sdconst.TRANSFER_STATUS_WAITING,sdconst.DEFAULT_PRIORITY,'IPSL-CM5A-LR','CMIP5','tas',dataset_id,1,now))
+
+    conn.commit()
+    c.close()
+
+def generate_file_dicts(count,datanode_count,dataset_size=10,priority=sdconst.DEFAULT_PRIORITY):
+    """Generate synthetic files as they come out of the search-API file pipeline (i.e. 'sdenqueue' input)."""
+    files=[]
+
+    for i in range(count):
+        dataset_idx=i/dataset_size
+        data_node='esgf-node%i.example.org'%(i%datanode_count)
+        dataset_path='CMIP6/CMIP/BENCH/IPSL-CM6A-LR/historical/r%ii1p1f1/Amon/tas/gr/v20180803'%dataset_idx
+        filename='tas_Amon_IPSL-CM6A-LR_historical_r%ii1p1f1_gr_%i.nc'%(dataset_idx,i)
+        dataset_functional_id=dataset_path.replace('/','.')
+
+        f={}
+        f['url']='http://%s/thredds/fileServer/%s/%s'%(data_node,dataset_path,filename)
+        f['file_functional_id']='%s.%s'%(dataset_functional_id,filename)
+        f['filename']=filename
+        f['local_path']='%s/%s'%(dataset_path,filename)
+        f['data_node']=data_node
+        f['checksum']='%032x'%i
+        f['checksum_type']=sdconst.CHECKSUM_TYPE_MD5
+        f['tracking_id']='hdl:21.14100/%032x'%i
+        f['size']=1000000
+        f['priority']=priority
+        f['variable']='tas'
+        f['project']='CMIP6'
+        f['model']='IPSL-CM6A-LR'
+        f['timestamp']='2018-08-03T00:00:00Z'
+        f['status']=sdconst.TRANSFER_STATUS_NEW
+        f['insertion_group_id']=1
+        f['dataset_functional_id']=dataset_functional_id
+        f['dataset_local_path']=dataset_path
+        f['dataset_path']=dataset_path
+        f['dataset_path_without_version']=os.path.dirname(dataset_path)
+        f['dataset_version']='v20180803'
+        f['dataset_template']=None
+        f['dataset_timestamp']='2018-08-03T00:00:00Z'
+        files.append(f)
+
+    return files
+
+def get_remaining_count(db_file):
+    """Returns the number of files not in 'done' nor 'error' status (uses a dedicated connection)."""
+    conn=sqlite3.connect(db_file,120)
+    c=conn.cursor()
+    c.execute("select count(1) from file where status not in (?,?)",(sdconst.TRANSFER_STATUS_DONE,sdconst.TRANSFER_STATUS_ERROR))
+    count=c.fetchone()[0]
+    c.close()
+    conn.close()
+
+    return count
+
+def print_report(title,rows):
+    print title
+    print "="*len(title)
+    print ""
+    print tabulate(rows,tablefmt="plain")
+    print ""
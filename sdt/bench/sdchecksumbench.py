@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare checksum computation modes (hash-on-write vs re-read).
+
+Notes
+    - Files are downloaded with the native client from a local HTTPS stand-in
+      data node (see 'sddatanodestub' module), which runs in a separate
+      process (so it doesn't compete with the client for the GIL).
+    - In 're-read' mode, the checksum is computed from the local file once the
+      transfer is complete (as done with wget). In 'hash-on-write' mode, it is
+      computed while the file is written.
+    - Re-read files are likely to still be in the page cache here, so the
+      're-read' figures are a best case (on a parallel filesystem, files
+      bigger than the cache are read again from disk).
+
+Example
+    sdchecksumbench.py --files 8 --size 200000000 --parallel 4
+"""
+
+import os
+import sys
+import time
+import socket
+import subprocess
+import shutil
+import argparse
+import threading
+import Queue
+import sdconfig
+import sdconst
+import sdbenchutils
+import sddatanodestub
+
+def worker(mode,checksum_type,queue,results):
+    import sdget_native # imported in the main thread by run()
+    import sdutils
+
+    while True:
+        try:
+            (url,local_path)=queue.get(False)
+        except Queue.Empty:
+            break
+
+        if mode=='hash-on-write':
+            (status,error_msg,local_checksum)=sdget_native.download_file(url,local_path,checksum_type=checksum_type)
+            verification_time=0
+        else:
+            (status,error_msg,local_checksum)=sdget_native.download_file(url,local_path)
+            start=time.time()
+            local_checksum=sdutils.compute_checksum(local_path,checksum_type)
+            verification_time=time.time()-start
+
+        assert status==0,error_msg
+
+        results[local_path]=(local_checksum,verification_time)
+
+def run_mode(mode,checksum_type,port,args):
+    dest_folder='%s/data'%args.folder
+    if os.path.isdir(dest_folder):
+        shutil.rmtree(dest_folder)
+
+    queue=Queue.Queue()
+    for i in range(args.files):
+        name='file%i.nc'%i
+        queue.put((sddatanodestub.get_url(port,name,args.size),'%s/%s'%(dest_folder,name)))
+
+    results={}
+
+    start=time.time()
+
+    threads=[]
+    for i in range(args.parallel):
+        th=threading.Thread(target=worker,args=(mode,checksum_type,queue,results))
+        th.start()
+        threads.append(th)
+    for th in threads:
+        th.join()
+
+    wall_time=time.time()-start
+
+    checksums=dict((local_path,local_checksum) for (local_path,(local_checksum,verification_time)) in results.iteritems())
+    verification_time=sum(verification_time for (local_checksum,verification_time) in results.values())/len(results)
+
+    return (checksums,[checksum_type,mode,'%.2f'%wall_time,'%.0f'%(args.files*args.size/wall_time/1e6),'%.2f'%verification_time])
+
+def start_stub(args):
+    """Start the stub in a child process.
+
+    Returns
+        (process,port) tuple
+    """
+
+    # pick a free port
+    sock=socket.socket()
+    sock.bind(('127.0.0.1',0))
+    port=sock.getsockname()[1]
+    sock.close()
+
+    process=subprocess.Popen([sys.executable,os.path.join(os.path.dirname(os.path.abspath(__file__)),'sddatanodestub.py'),'--port',str(port),'--folder','%s/.esg'%args.folder],stdout=open(os.devnull,'w'))
+
+    # wait until the stub is ready
+    for i in range(100):
+        try:
+            socket.create_connection(('127.0.0.1',port)).close()
+            break
+        except socket.error:
+            time.sleep(0.1)
+
+    return (process,port)
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdget_native
+
+    # the stub certificate is used as ESGF credential
+    sdconfig.esgf_x509_proxy=sddatanodestub.create_credential('%s/.esg'%args.folder)
+
+    (process,port)=start_stub(args)
+
+    rows=[]
+    for checksum_type in (sdconst.CHECKSUM_TYPE_MD5,sdconst.CHECKSUM_TYPE_SHA256):
+        checksums={}
+        for mode in ('re-read','hash-on-write'):
+            (checksums[mode],row)=run_mode(mode,checksum_type,port,args)
+            rows.append(row)
+
+        assert checksums['re-read']==checksums['hash-on-write']
+
+    sdget_native.reset()
+    process.terminate()
+    process.wait()
+
+    print "Files: %i, file size: %i, parallel: %i"%(args.files,args.size,args.parallel)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Checksum type','Mode','Wall time (s)','MB per second (download + checksum)','Verification time per file (s)'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=8)
+    parser.add_argument('--size',type=int,default=200000000,help='File size (bytes)')
+    parser.add_argument('--parallel',type=int,default=4)
+    parser.add_argument('--folder',default='%s/checksumbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare completion checks based on file counts queries and on completion counters.
+
+Notes
+    - One large dataset is created, with files spread over several variables.
+    - Files are then set to 'done' one by one. After each status change, the
+      dataset status and the variable completion are computed, as in
+      'sdevent.file_complete_event'.
+    - 'count queries' mode replays the previous implementation (file counts
+      computed from the 'file' table). 'counters' mode uses the completion
+      counters (see 'sdcompletion' module).
+    - 'count queries' mode is only measured on 'samples' status changes
+      (spread over the whole run), as it is quadratic.
+    - Last, the counters are checked against the 'file' table, then some
+      drift is injected to make sure it is reported.
+
+Example
+    sdcompletionbench.py --files 20000 --variables 20
+"""
+
+import time
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+
+def count_queries_status(d,variable):
+    """Previous implementation (dataset status and variable completion)."""
+    import sdfilequery
+    import sdvariablequery
+
+    total_files_count=sdfilequery.count_dataset_files(d,None)
+    total_done_files_count=sdfilequery.count_dataset_files(d,sdconst.TRANSFER_STATUS_DONE)
+
+    if total_done_files_count==0:
+        status=sdconst.DATASET_STATUS_EMPTY
+    elif total_files_count==total_done_files_count:
+        status=sdconst.DATASET_STATUS_COMPLETE
+    else:
+        status=sdconst.DATASET_STATUS_EMPTY
+
+        vars_files_count=sdvariablequery.get_variables_files_count(d)
+        vars_files_count_by_status=sdvariablequery.get_variables_files_count_by_status(d.dataset_id)
+        for k in vars_files_count_by_status.keys():
+            if vars_files_count[k]==vars_files_count_by_status[k][sdconst.TRANSFER_STATUS_DONE]:
+                status=sdconst.DATASET_STATUS_IN_PROGRESS
+                break
+
+    di=sdvariablequery.get_variables_files_count_by_status(d.dataset_id,variable)
+    variable_complete=(sum(di[variable].values())==di[variable][sdconst.TRANSFER_STATUS_DONE])
+
+    return (status,variable_complete)
+
+def counters_status(d,variable):
+    import sdvariable
+    import sddatasetflag
+
+    return (sddatasetflag.compute_dataset_status(d),sdvariable.is_variable_complete(d.dataset_id,variable))
+
+def populate(conn,args):
+    """Returns insert duration."""
+    start=time.time()
+    sdbenchutils.populate_waiting_files(conn,args.files,1,dataset_size=args.files)
+    conn.execute("update file set variable='var'||(file_id%?)",(args.variables,))
+    conn.commit()
+
+    return time.time()-start
+
+def measure_trigger_overhead(conn,args):
+    """Returns (insert duration with triggers,insert duration without triggers)."""
+    import sddbobj
+
+    conn.execute("delete from file")
+    conn.execute("delete from dataset")
+    conn.commit()
+    with_triggers=populate(conn,args)
+
+    for i in (1,2,3):
+        conn.execute("drop trigger trg_file_counter_%i"%i)
+    conn.execute("delete from file")
+    conn.execute("delete from dataset")
+    conn.commit()
+    without_triggers=populate(conn,args)
+
+    sddbobj.create_triggers(conn)
+    sddbobj.rebuild_counters(conn)
+    conn.commit()
+
+    return (with_triggers,without_triggers)
+
+def run_status_changes(conn,args):
+    import sdfiledao
+    import sddatasetdao
+
+    transfers=sdfiledao.get_files(status=sdconst.TRANSFER_STATUS_WAITING)
+    d=sddatasetdao.get_dataset(dataset_id=transfers[0].dataset_id)
+
+    sample_step=max(1,len(transfers)/args.samples)
+
+    durations={'update':0,'count queries':0,'counters':0}
+    samples=0
+    mismatches=0
+    complete_variables=0
+
+    for i,tr in enumerate(transfers):
+        tr.status=sdconst.TRANSFER_STATUS_DONE
+
+        start=time.time()
+        sdfiledao.update_file(tr,commit=True)
+        durations['update']+=time.time()-start
+
+        start=time.time()
+        result=counters_status(d,tr.variable)
+        durations['counters']+=time.time()-start
+
+        if result[1]:
+            complete_variables+=1
+
+        if i%sample_step==0:
+            start=time.time()
+            expected=count_queries_status(d,tr.variable)
+            durations['count queries']+=time.time()-start
+
+            samples+=1
+            if expected!=result:
+                mismatches+=1
+
+    rows=[]
+    rows.append(['count queries',samples,'%.3f'%(durations['count queries']/samples*1000),'%.1f'%(durations['count queries']/samples*len(transfers))])
+    rows.append(['counters',len(transfers),'%.3f'%(durations['counters']/len(transfers)*1000),'%.1f'%durations['counters']])
+
+    final_status=counters_status(d,tr.variable)[0]
+
+    return (rows,durations['update']/len(transfers)*1000,mismatches,complete_variables,final_status)
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sddb
+    import sdcompletion
+
+    (with_triggers,without_triggers)=measure_trigger_overhead(sddb.conn,args)
+
+    (rows,update_duration,mismatches,complete_variables,final_status)=run_status_changes(sddb.conn,args)
+
+    start=time.time()
+    drifts=sdcompletion.check()
+    check_duration=time.time()-start
+
+    sddb.conn.execute("update dataset_counter set done=done-1")
+    sddb.conn.execute("update variable_counter set error=error+1 where variable='var0'")
+    sddb.conn.commit()
+    injected_drifts=sdcompletion.check()
+    sdcompletion.rebuild()
+    drifts_after_rebuild=sdcompletion.check()
+
+    print "Files: %i, variables: %i"%(args.files,args.variables)
+    print "Bulk insert: %.2fs with counters triggers, %.2fs without"%(with_triggers,without_triggers)
+    print "File status update (including counters): %.3f ms"%update_duration
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Completion check','Measured','Per status change (ms)','Estimated total (s)'])
+    print ""
+    print "Mismatches with count queries: %i, variable complete events: %i, final dataset status: %s"%(mismatches,complete_variables,final_status)
+    print "Consistency check: %i drift(s) (%.3fs), %i drift(s) after injection, %i drift(s) after rebuild"%(len(drifts),check_duration,len(injected_drifts),len(drifts_after_rebuild))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=20000,help='Number of files in the dataset')
+    parser.add_argument('--variables',type=int,default=20)
+    parser.add_argument('--samples',type=int,default=200,help='Number of status changes measured in count queries mode')
+    parser.add_argument('--folder',default='%s/completionbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
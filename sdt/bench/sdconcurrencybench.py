@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare static and adaptive per-data-node concurrency with simulated data nodes.
+
+Notes
+    - Time is simulated (no transfer is done): each data node is modelled by
+      the number of parallel streams it can serve before saturating. Above
+      this number, its aggregate throughput degrades and transfers fail
+      with timeouts.
+    - Ended transfers are given to 'sdconcurrency' module, as done by the
+      scheduler.
+    - The 'adaptive (restart)' run starts with the windows learned (and
+      persisted) during the 'adaptive' run.
+
+Example
+    sdconcurrencybench.py --duration 3600 --max_parallel_download 40
+"""
+
+import random
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+
+class SimulatedDataNode():
+    def __init__(self,name,saturation,stream_rate):
+        self.name=name
+        self.saturation=saturation   # number of streams above which the data node is overloaded
+        self.stream_rate=stream_rate # bytes per second per stream (below saturation)
+
+    def get_throughput(self,n):
+        """Returns aggregate throughput with n parallel streams."""
+        if n<=self.saturation:
+            return n*self.stream_rate
+        else:
+            return self.saturation*self.stream_rate*max(0.5,1-0.05*(n-self.saturation)) # overloaded data node thrashes
+
+    def get_error_probability(self,n,dt):
+        """Returns the probability for a running transfer to fail during 'dt' seconds."""
+        if n<=self.saturation:
+            return 0
+        else:
+            return min(1,0.02*(n-self.saturation)*dt)
+
+class SimulatedTransfer():
+    def __init__(self,data_node,size,start):
+        self.data_node=data_node
+        self.size=size
+        self.start=start
+        self.remaining=size
+
+def simulate(mode,data_nodes,args):
+    from sdtypes import File
+    import sdconcurrency
+
+    random.seed(args.seed)
+
+    initial_windows=dict((dn.name,sdconcurrency.get_window(dn.name)) for dn in data_nodes)
+
+    running=dict((dn.name,[]) for dn in data_nodes)
+    stats=dict((dn.name,{'bytes':0,'errors':0}) for dn in data_nodes)
+
+    now=0.0
+    while now<args.duration:
+
+        # start transfers (data nodes are served in turn, as in sdtransferqueue)
+        started=True
+        while started and sum(len(li) for li in running.values())<args.max_parallel_download:
+            started=False
+            for dn in data_nodes:
+                limit=args.max_parallel_download_per_datanode if mode=='static' else sdconcurrency.get_window(dn.name)
+                if len(running[dn.name])<limit and sum(len(li) for li in running.values())<args.max_parallel_download:
+                    running[dn.name].append(SimulatedTransfer(dn.name,args.file_size,now))
+                    started=True
+
+        now+=args.step
+
+        # progress
+        for dn in data_nodes:
+            transfers=running[dn.name]
+            n=len(transfers)
+            if n==0:
+                continue
+
+            share=dn.get_throughput(n)/n*args.step
+            error_probability=dn.get_error_probability(n,args.step)
+
+            for t in list(transfers):
+                if random.random()<error_probability:
+                    status,sdget_status=sdconst.TRANSFER_STATUS_ERROR,25 # read timeout
+                    stats[dn.name]['errors']+=1
+                else:
+                    t.remaining-=share
+                    if t.remaining>0:
+                        continue
+                    status,sdget_status=sdconst.TRANSFER_STATUS_DONE,0
+                    stats[dn.name]['bytes']+=t.size
+
+                transfers.remove(t)
+
+                duration=now-t.start
+                tr=File(data_node=dn.name,size=t.size,duration=duration,rate=t.size/duration,status=status,sdget_status=sdget_status)
+
+                if mode!='static':
+                    sdconcurrency.transfer_done(tr,now)
+
+    rows=[]
+    for dn in data_nodes:
+        window=args.max_parallel_download_per_datanode if mode=='static' else sdconcurrency.get_window(dn.name)
+        initial_window=args.max_parallel_download_per_datanode if mode=='static' else initial_windows[dn.name]
+        rows.append([mode,dn.name,dn.saturation,initial_window,window,'%.1f'%(stats[dn.name]['bytes']/args.duration/1e6),stats[dn.name]['errors']])
+
+    total=sum(s['bytes'] for s in stats.values())/args.duration/1e6
+    errors=sum(s['errors'] for s in stats.values())
+    rows.append([mode,'total','','','','%.1f'%total,errors])
+
+    return rows
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdconcurrency
+
+    sdconcurrency.max_window=args.max_parallel_download
+    sdconcurrency.initial_window=args.max_parallel_download_per_datanode
+
+    data_nodes=[SimulatedDataNode('weak.example.org',2,10e6),
+                SimulatedDataNode('medium.example.org',6,10e6),
+                SimulatedDataNode('strong.example.org',20,10e6)]
+
+    rows=[]
+    rows.extend(simulate('static',data_nodes,args))
+    rows.extend(simulate('adaptive',data_nodes,args))
+
+    # restart (learned windows are reloaded from disk)
+    sdconcurrency.flush()
+    sdconcurrency=reload(sdconcurrency)
+    sdconcurrency.max_window=args.max_parallel_download
+    sdconcurrency.initial_window=args.max_parallel_download_per_datanode
+
+    rows.extend(simulate('adaptive (restart)',data_nodes,args))
+
+    print "Simulated duration: %is, file size: %i, max_parallel_download: %i, max_parallel_download_per_datanode: %i"%(args.duration,args.file_size,args.max_parallel_download,args.max_parallel_download_per_datanode)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Mode','Data node','Saturation (streams)','Initial window','Final window','MB per second','Errors'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duration',type=int,default=3600,help='Simulated duration (seconds)')
+    parser.add_argument('--step',type=float,default=1,help='Simulation step (seconds)')
+    parser.add_argument('--file_size',type=int,default=200000000)
+    parser.add_argument('--max_parallel_download',type=int,default=40)
+    parser.add_argument('--max_parallel_download_per_datanode',type=int,default=8)
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--folder',default='%s/concurrencybench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains a local stand-in for an ESGF data node (used by benchmarks).
+
+Notes
+    - Files are synthetic: '/thredds/fileServer/<size>/<name>' returns <size>
+      bytes, which only depend on <name> (see get_content()).
+    - HTTPS with optional X509 client certificate. The certificate is a
+      self-signed one, created by create_credential() (it is also used as
+      client credential, so the server trusts it).
+    - ORP authentication is emulated: a request without session cookie is
+      redirected to the ORP, which checks the client certificate, sets the
+      cookie and redirects back to the file.
+    - HTTP/1.1 keep-alive is supported. Accepted connections, requests, ORP
+      redirects and sent bytes are counted.
+    - Range requests are supported (single 'bytes=N-' or 'bytes=N-M' range,
+      with 'If-Range'), unless 'accept_ranges' is false.
+    - Connection drops can be simulated ('drop_rate' is the probability for a
+      response to be cut at a random position).
+    - Per-response bandwidth can be capped ('rate_limit'), to emulate a single
+      TCP stream over a high latency link.
+
+Example
+    sddatanodestub.py --port 8443
+    wget --no-check-certificate --certificate=/tmp/sthome/tmp/datanodestub/credentials.pem https://localhost:8443/thredds/fileServer/1000/foo.nc
+"""
+
+import os
+import re
+import ssl
+import time
+import random
+import urllib
+import hashlib
+import urlparse
+import argparse
+import threading
+import subprocess
+import BaseHTTPServer
+import SocketServer
+import Cookie
+import sdconfig
+
+class DataNodeStubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version='HTTP/1.1' # keep-alive
+
+    def setup(self):
+        self.request.do_handshake() # see DataNodeStubServer.get_request()
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.incr('connections')
+
+    def do_GET(self):
+        self.server.incr('requests')
+
+        u=urlparse.urlparse(self.path)
+
+        if u.path==orp_path:
+            self.do_orp(u)
+        elif u.path.startswith(file_path_prefix):
+            self.do_file(u)
+        else:
+            self.send_empty_response(404)
+
+    def do_orp(self,u):
+        self.server.incr('orp_redirects')
+
+        if self.connection.getpeercert() is None:
+            self.send_empty_response(403)
+            return
+
+        redirect=urlparse.parse_qs(u.query)['redirect'][0]
+
+        self.send_response(302)
+        self.send_header('Set-Cookie','%s=%s; Path=/'%(cookie_name,cookie_value))
+        self.send_header('Location',redirect)
+        self.send_header('Content-Length','0')
+        self.end_headers()
+
+    def do_file(self,u):
+        if self.server.orp and not self.has_session_cookie():
+            self.send_response(302)
+            self.send_header('Location','%s?%s'%(orp_path,urllib.urlencode({'redirect':self.get_full_url()})))
+            self.send_header('Content-Length','0')
+            self.end_headers()
+            return
+
+        if self.server.latency>0:
+            time.sleep(self.server.latency)
+
+        (size,name)=u.path[len(file_path_prefix):].split('/',1)
+        size=int(size)
+        etag='"%s"'%hashlib.md5(name).hexdigest()
+
+        byte_range=self.get_range(etag)
+
+        if byte_range is None:
+            (start,end)=(0,size)
+            self.send_response(200)
+        else:
+            (start,end)=byte_range
+            end=size if end is None else min(end+1,size)
+
+            if start>=end:
+                self.send_empty_response(416)
+                return
+
+            self.send_response(206)
+            self.send_header('Content-Range','bytes %d-%d/%d'%(start,end-1,size))
+        if self.server.accept_ranges:
+            self.send_header('Accept-Ranges','bytes')
+        self.send_header('ETag',etag)
+        self.send_header('Content-Type','application/x-netcdf')
+        self.send_header('Content-Length',str(end-start))
+        self.end_headers()
+
+        if random.random()<self.server.drop_rate:
+            end=random.randint(start,end-1)
+            self.close_connection=1
+
+        self.write_content(name,start,end)
+
+    def get_range(self,etag):
+        """Returns requested (first,last) byte positions (last is None if open-ended), or None if the whole file is to be sent."""
+        if not self.server.accept_ranges:
+            return None
+
+        m=re.match(r'^bytes=(\d+)-(\d*)$',self.headers.get('Range',''))
+        if m is None:
+            return None
+
+        if_range=self.headers.get('If-Range')
+        if if_range is not None and if_range!=etag:
+            return None # file has changed
+
+        return (int(m.group(1)),int(m.group(2)) if m.group(2)!='' else None)
+
+    def write_content(self,name,start,end):
+        block=get_block(name)
+        offset=start
+        begin=time.time()
+        while offset<end:
+            i=offset%len(block)
+            data=block[i:min(len(block),i+end-offset)]
+            self.wfile.write(data)
+            offset+=len(data)
+
+            if self.server.rate_limit>0:
+                delay=begin+(offset-start)/float(self.server.rate_limit)-time.time()
+                if delay>0:
+                    time.sleep(delay)
+        self.server.incr('bytes_sent',end-start)
+
+    def has_session_cookie(self):
+        cookie=Cookie.SimpleCookie(self.headers.get('Cookie',''))
+        return cookie_name in cookie and cookie[cookie_name].value==cookie_value
+
+    def get_full_url(self):
+        return 'https://%s%s'%(self.headers.get('Host'),self.path)
+
+    def send_empty_response(self,code):
+        self.send_response(code)
+        self.send_header('Content-Length','0')
+        self.end_headers()
+
+    def log_message(self,format,*args):
+        pass
+
+class DataNodeStubServer(SocketServer.ThreadingMixIn,BaseHTTPServer.HTTPServer):
+    daemon_threads=True
+
+    def __init__(self,port,credential,orp=True,latency=0,accept_ranges=True,drop_rate=0,rate_limit=0):
+        BaseHTTPServer.HTTPServer.__init__(self,('127.0.0.1',port),DataNodeStubHandler)
+        self.orp=orp                     # if true, ORP authentication is required
+        self.latency=latency             # seconds added to each file request
+        self.accept_ranges=accept_ranges # if true, range requests are supported
+        self.drop_rate=drop_rate         # probability for a file response to be cut
+        self.rate_limit=rate_limit       # max bytes per second per response (0 means no limit)
+        self.counters={'connections':0,'requests':0,'orp_redirects':0,'bytes_sent':0}
+        self.lock=threading.Lock()
+
+        self.context=ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        self.context.load_cert_chain(credential)
+        self.context.load_verify_locations(credential)
+        self.context.verify_mode=ssl.CERT_OPTIONAL
+
+    def get_request(self):
+        (sock,addr)=self.socket.accept()
+
+        # handshake is done in the handler thread (not to block the accept loop)
+        sock=self.context.wrap_socket(sock,server_side=True,do_handshake_on_connect=False)
+
+        return (sock,addr)
+
+    def handle_error(self,request,client_address):
+        pass # clients may close the connection without TLS shutdown (e.g. wget)
+
+    def incr(self,name,value=1):
+        with self.lock:
+            self.counters[name]+=value
+
+    def reset_counters(self):
+        with self.lock:
+            for name in self.counters:
+                self.counters[name]=0
+
+    def get_url(self,name,size):
+        return get_url(self.server_address[1],name,size)
+
+def start(credential,port=0,orp=True,latency=0,accept_ranges=True,drop_rate=0,rate_limit=0):
+    """Start the stub in a background thread (port=0 means any free port).
+
+    Returns
+        DataNodeStubServer object (use get_url() to build file url)
+    """
+    server=DataNodeStubServer(port,credential,orp,latency,accept_ranges,drop_rate,rate_limit)
+
+    th=threading.Thread(target=server.serve_forever)
+    th.setDaemon(True)
+    th.start()
+
+    return server
+
+def get_url(port,name,size):
+    return 'https://localhost:%i%s%i/%s'%(port,file_path_prefix,size,name)
+
+def create_credential(folder):
+    """Create a self-signed certificate (with its private key in the same file, as in 'credentials.pem').
+
+    Returns
+        credential file path
+    """
+    path='%s/credentials.pem'%folder
+
+    if not os.path.isfile(path):
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        subprocess.check_call(['openssl','req','-x509','-newkey','rsa:2048','-nodes','-days','30',
+                               '-subj','/CN=localhost','-keyout',path+'.key','-out',path+'.crt'],stderr=open(os.devnull,'w'))
+        with open(path,'w') as fh:
+            fh.write(open(path+'.crt').read())
+            fh.write(open(path+'.key').read())
+        os.remove(path+'.crt')
+        os.remove(path+'.key')
+
+    return path
+
+def get_block(name):
+    """Returns the 64KB block repeated to build file content."""
+    with _lock:
+        if name not in _blocks:
+            digest=hashlib.sha256(name).digest()
+            _blocks[name]=''.join(hashlib.sha256(digest+str(i)).digest() for i in range(2048))
+        return _blocks[name]
+
+def get_content(name,size):
+    """Returns file content (can be used to compute the expected checksum)."""
+    block=get_block(name)
+    return (block*(size/len(block)+1))[:size]
+
+# init.
+
+file_path_prefix='/thredds/fileServer/'
+orp_path='/esg-orp/home.htm'
+cookie_name='esg.openid.saml.cookie'
+cookie_value='stub-session'
+
+_blocks={} # name => content block
+_lock=threading.Lock()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port',type=int,default=8443)
+    parser.add_argument('--no_orp',action='store_true',help='Serve files without ORP authentication')
+    parser.add_argument('--latency',type=float,default=0,help='Seconds added to each file request')
+    parser.add_argument('--no_range',action='store_true',help='Ignore range requests')
+    parser.add_argument('--drop_rate',type=float,default=0,help='Probability for a file response to be cut')
+    parser.add_argument('--rate_limit',type=int,default=0,help='Max bytes per second per response (0 means no limit)')
+    parser.add_argument('--folder',default='%s/datanodestub'%sdconfig.tmp_folder,help='Folder where the credential is created')
+    args = parser.parse_args()
+
+    credential=create_credential(args.folder)
+
+    server=DataNodeStubServer(args.port,credential,not args.no_orp,args.latency,not args.no_range,args.drop_rate,args.rate_limit)
+    print "Serving on %s (credential: %s)"%(server.get_url('foo.nc',1000),credential)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print server.counters
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare the per-dataset and the set-based recompute of dataset flags (status and latest).
+
+Notes
+    - A synthetic database is created: each dataset has 1 to 'max_versions'
+      versions, each version has 'variables' variables, with a random file
+      status mix (all done, all waiting, some variables done, errors..).
+      Dataset flags are randomly set (i.e. stale).
+    - 'per-dataset' mode runs the previous implementation (flags wiped out,
+      then update_datasets__status_and_latest() run until no modifications
+      remain). 'set-based' mode runs
+      sddatasetflag.recompute_datasets_flags(reset=True).
+    - Flags are restored between the two modes, and the results of both
+      modes are compared.
+
+Example
+    sddatasetflagbench.py --datasets 5000 --max_versions 3
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+
+# file status mixes (one per dataset version)
+mixes={
+    'all done':     lambda v,f: sdconst.TRANSFER_STATUS_DONE,
+    'all waiting':  lambda v,f: sdconst.TRANSFER_STATUS_WAITING,
+    'one variable': lambda v,f: sdconst.TRANSFER_STATUS_DONE if v==0 else sdconst.TRANSFER_STATUS_WAITING,
+    'some errors':  lambda v,f: sdconst.TRANSFER_STATUS_ERROR if f==0 else sdconst.TRANSFER_STATUS_DONE,
+    'random':       lambda v,f: random.choice([sdconst.TRANSFER_STATUS_DONE,sdconst.TRANSFER_STATUS_DONE,sdconst.TRANSFER_STATUS_ERROR,sdconst.TRANSFER_STATUS_WAITING,sdconst.TRANSFER_STATUS_RUNNING]),
+}
+dataset_statuses=[sdconst.DATASET_STATUS_EMPTY,sdconst.DATASET_STATUS_IN_PROGRESS,sdconst.DATASET_STATUS_COMPLETE]
+
+def populate(conn,args):
+    now=time.strftime("%Y-%m-%d %H:%M:%S")
+    mix_names=sorted(mixes.keys())
+    c=conn.cursor()
+
+    dataset_count=0
+    file_count=0
+    for i in range(args.datasets):
+        path_without_version='CMIP5/output1/BENCH/IPSL-CM5A-LR/historical/mon/atmos/Amon/r%ii1p1'%i
+
+        for version_idx in range(random.randint(1,args.max_versions)):
+            version='v%i0101'%(2011+version_idx)
+            path='%s/%s'%(path_without_version,version)
+            variable_count=args.variables if version_idx==0 else random.choice([args.variables,1]) # some versions drop variables (quality check)
+            c.execute("insert into dataset (dataset_functional_id,status,crea_date,path,path_without_version,version,local_path,latest,latest_date,model,project,timestamp) values (?,?,?,?,?,?,?,?,?,?,?,?)",
+                      (path.replace('/','.'),random.choice(dataset_statuses),now,path,path_without_version,version,path,random.randint(0,1),now,'IPSL-CM5A-LR','CMIP5','%i-01-01T00:00:00Z'%(2011+version_idx)))
+            dataset_id=c.lastrowid
+            dataset_count+=1
+
+            mix=mixes[random.choice(mix_names)]
+            for v in range(variable_count):
+                for f in range(args.files):
+                    local_path='%s/var%i/var%i_%i.nc'%(path,v,v,f)
+                    c.execute("insert into file (url,file_functional_id,filename,local_path,data_node,size,crea_date,status,priority,model,project,variable,dataset_id,insertion_group_id,timestamp) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                              ('http://esgf-node0.example.org/thredds/fileServer/%s'%local_path,local_path.replace('/','.'),os.path.basename(local_path),local_path,'esgf-node0.example.org',1,now,mix(v,f),sdconst.DEFAULT_PRIORITY,'IPSL-CM5A-LR','CMIP5','var%i'%v,dataset_id,1,now))
+                    file_count+=1
+
+    conn.commit()
+    c.close()
+
+    return (dataset_count,file_count)
+
+def get_flags(conn):
+    c=conn.cursor()
+    c.execute("select dataset_id,status,latest,latest_date from dataset order by dataset_id")
+    flags=[tuple(rs) for rs in c.fetchall()]
+    c.close()
+
+    return flags
+
+def restore_flags(conn,flags):
+    conn.executemany("update dataset set status=?,latest=?,latest_date=? where dataset_id=?",[(status,latest,latest_date,dataset_id) for (dataset_id,status,latest,latest_date) in flags])
+    conn.commit()
+
+def run_per_dataset(conn):
+    """Previous implementation of sddatasetflag.reset_datasets_flags()."""
+    import sddatasetflag
+    import sdmodifyquery
+
+    passes=0
+    statement_count=conn.get_statement_count()
+    start=time.time()
+
+    stdout,stderr=sys.stdout,sys.stderr
+    sys.stdout=sys.stderr=open(os.devnull,'w') # hide progress dots
+    try:
+        sdmodifyquery.wipeout_datasets_flags()
+
+        count=sddatasetflag.update_datasets__status_and_latest()
+        passes+=1
+        while count>0:
+            count=sddatasetflag.update_datasets__status_and_latest()
+            passes+=1
+    finally:
+        sys.stdout.close()
+        sys.stdout,sys.stderr=stdout,stderr
+
+    return ['per-dataset',passes,conn.get_statement_count()-statement_count,'%.2f'%(time.time()-start)]
+
+def run_set_based(conn):
+    import sddatasetflag
+
+    statement_count=conn.get_statement_count()
+    start=time.time()
+
+    modified_datasets=sddatasetflag.recompute_datasets_flags(reset=True)
+
+    return ['set-based',1,conn.get_statement_count()-statement_count,'%.2f'%(time.time()-start)],modified_datasets
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sddb
+
+    random.seed(args.seed)
+
+    (dataset_count,file_count)=populate(sddb.conn,args)
+
+    conn=sdbenchutils.install_counting_connection()
+
+    # sddatasetflag and its dependencies must be imported after the counting connection is installed
+    import sddatasetflag
+
+    initial_flags=get_flags(conn)
+
+    rows=[]
+    rows.append(run_per_dataset(conn))
+    per_dataset_flags=get_flags(conn)
+
+    restore_flags(conn,initial_flags)
+
+    row,modified_datasets=run_set_based(conn)
+    rows.append(row)
+    set_based_flags=get_flags(conn)
+
+    differences=len([1 for (a,b) in zip(per_dataset_flags,set_based_flags) if a[1:3]!=b[1:3]]) # status and latest
+
+    print "Datasets: %i, files: %i"%(dataset_count,file_count)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Mode','Passes','SQL statements','Wall time (s)'])
+    print ""
+    print "Set-based diff report: %i modified dataset(s), %i status change(s), %i latest flag change(s)"%(len(modified_datasets),len([d for d in modified_datasets if d.status!=d.old_status]),len([d for d in modified_datasets if d.latest!=d.old_latest]))
+    print "Datasets with different flags (per-dataset vs set-based): %i"%differences
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets',type=int,default=5000,help='Number of datasets (without version)')
+    parser.add_argument('--max_versions',type=int,default=3)
+    parser.add_argument('--variables',type=int,default=3,help='Number of variables per dataset version')
+    parser.add_argument('--files',type=int,default=4,help='Number of files per variable')
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--folder',default='%s/datasetflagbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
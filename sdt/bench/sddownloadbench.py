@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare HTTP transfer clients (wget vs native).
+
+Notes
+    - Files are downloaded from a local HTTPS stand-in data node, with ORP
+      authentication and X509 client certificate (see 'sddatanodestub' module).
+    - Transfers run through sdget.download(), as the daemon does.
+    - CPU time includes child processes (i.e. 'sdget.sh' and wget).
+
+Example
+    sddownloadbench.py --files 200 --size 100000 --parallel 8
+"""
+
+import os
+import time
+import shutil
+import resource
+import argparse
+import threading
+import Queue
+import sdconfig
+import sdconst
+import sdbenchutils
+import sddatanodestub
+
+def get_cpu_time():
+    li=[resource.getrusage(resource.RUSAGE_SELF),resource.getrusage(resource.RUSAGE_CHILDREN)]
+    return sum(r.ru_utime+r.ru_stime for r in li)
+
+def worker(client,queue,results):
+    import sdget # imported in the main thread by run()
+
+    while True:
+        try:
+            (url,local_path)=queue.get(False)
+        except Queue.Empty:
+            break
+
+        (status,killed,error_msg,local_checksum)=sdget.download(url,local_path,http_client=client,timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT)
+
+        results.append((status,local_path))
+
+def run_client(client,server,args):
+    import sdget_native
+
+    sdget_native.reset()
+    server.reset_counters()
+
+    dest_folder='%s/data/%s'%(args.folder,client)
+    if os.path.isdir(dest_folder):
+        shutil.rmtree(dest_folder)
+
+    queue=Queue.Queue()
+    for i in range(args.files):
+        name='file%i.nc'%i
+        queue.put((server.get_url(name,args.size),'%s/%s'%(dest_folder,name)))
+
+    results=[]
+
+    cpu_start=get_cpu_time()
+    start=time.time()
+
+    threads=[]
+    for i in range(args.parallel):
+        th=threading.Thread(target=worker,args=(client,queue,results))
+        th.start()
+        threads.append(th)
+    for th in threads:
+        th.join()
+
+    wall_time=time.time()-start
+    cpu_time=get_cpu_time()-cpu_start
+
+    failed=len([status for (status,local_path) in results if status!=0])
+    for (status,local_path) in results:
+        if status==0:
+            assert os.path.getsize(local_path)==args.size
+
+    return [client,'%.2f'%wall_time,'%.1f'%(args.files/wall_time),'%.1f'%(args.files*args.size/wall_time/1e6),'%.2f'%cpu_time,failed,server.counters['connections'],server.counters['orp_redirects']]
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdget
+
+    # the stub certificate is used as ESGF credential
+    sdconfig.security_dir_mode=sdconst.SECURITY_DIR_TMP
+    sdconfig.tmp_folder=args.folder
+    sdconfig.esgf_x509_proxy=sddatanodestub.create_credential(sdconfig.get_security_dir())
+
+    server=sddatanodestub.start(sdconfig.esgf_x509_proxy,latency=args.latency)
+
+    rows=[]
+    for client in (sdconst.HTTP_CLIENT_WGET,sdconst.HTTP_CLIENT_NATIVE):
+        rows.append(run_client(client,server,args))
+
+    server.shutdown()
+    server.server_close()
+
+    print "Files: %i, file size: %i, parallel: %i, latency: %.2f"%(args.files,args.size,args.parallel,args.latency)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Client','Wall time (s)','Files per second','MB per second','CPU time (s)','Failed','TCP connections','ORP redirects'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=200)
+    parser.add_argument('--size',type=int,default=100000,help='File size (bytes)')
+    parser.add_argument('--parallel',type=int,default=8)
+    parser.add_argument('--latency',type=float,default=0,help='Seconds added to each file request')
+    parser.add_argument('--folder',default='%s/downloadbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
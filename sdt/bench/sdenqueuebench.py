@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to benchmark files insertion (enqueue).
+
+Notes
+    - Synthetic files are generated (no search-API call).
+    - This script uses a scratch database (see 'sdbenchutils' module).
+
+Example
+    sdenqueuebench.py --files 100000 --mode bulk
+"""
+
+import time
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+
+def insert_legacy(sdenqueue,files):
+    """Insert files one by one (i.e. without bulk insertion)."""
+    from sdtypes import File
+    for f in files:
+        sdenqueue.add_file(File(**f))
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdbenchutils
+    conn=sdbenchutils.install_counting_connection()
+    import sdenqueue
+    import sdfiledao
+
+    files=sdbenchutils.generate_file_dicts(args.files,args.datanodes,dataset_size=args.dataset_size)
+
+    statement_count_before=conn.get_statement_count()
+    start=time.time()
+
+    for i in range(0,len(files),sdconst.PROCESSING_CHUNKSIZE):
+        chunk=files[i:i+sdconst.PROCESSING_CHUNKSIZE]
+
+        if args.mode=='bulk':
+            sdenqueue.add_files(chunk)
+        else:
+            insert_legacy(sdenqueue,chunk)
+
+    if args.mode=='bulk':
+        sdfiledao.update_highest_waiting_priority(sdenqueue._inserted_priorities)
+
+    conn.commit()
+
+    wall_time=time.time()-start
+    statement_count=conn.get_statement_count()-statement_count_before
+
+    rows=[]
+    rows.append(['Mode',args.mode])
+    rows.append(['Files',args.files])
+    rows.append(['Files per dataset',args.dataset_size])
+    rows.append(['Data nodes',args.datanodes])
+    rows.append(['Wall time (s)','%.2f'%wall_time])
+    rows.append(['Rows per second','%.0f'%(args.files/wall_time)])
+    rows.append(['DB statements',statement_count])
+    rows.append(['DB statements per file','%.2f'%(statement_count/float(args.files))])
+
+    sdbenchutils.print_report("Enqueue benchmark",rows)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=20000)
+    parser.add_argument('--datanodes',type=int,default=5)
+    parser.add_argument('--dataset_size',type=int,default=250,help='Number of files per dataset')
+    parser.add_argument('--mode',choices=['bulk','legacy'],default='bulk')
+    parser.add_argument('--folder',default='%s/enqueuebench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare the previous and the batched event emission and delivery (transfer module to post-processing module).
+
+Notes
+    - Emission: 'events' events (including 'duplicates' ratio of identical
+      events) are inserted one by one (previous implementation), then with
+      sdeventdao (coalesced, executemany).
+    - Delivery: events are sent to a local stand-in of the post-processing
+      server (see 'sdppstub' module), one scheduler iteration per tick.
+      'previous' mode replays the previous implementation (200 events per
+      iteration, new connection for each call, no compression, events
+      marked as sent one by one). 'batched' mode runs
+      sdtask.process_async_event().
+    - Last, delivery timeouts are simulated (response of every 3rd call is
+      delayed beyond the client timeout), to check that no event is stored
+      twice by the post-processing server.
+
+Example
+    sdeventbench.py --events 20000 --latency 0.05 --connect_latency 0.05
+"""
+
+import time
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+import sdppstub
+
+def generate_events(args):
+    from sdtypes import Event
+
+    now=time.strftime("%Y-%m-%d %H:%M:%S")
+    events=[]
+    for i in range(args.events):
+        if i>0 and i%int(1/args.duplicates)==0:
+            i=i-1 # same as previous event
+
+        e=Event(name=sdconst.EVENT_VARIABLE_COMPLETE)
+        e.project='CMIP6'
+        e.model='IPSL-CM6A-LR'
+        e.dataset_pattern='CMIP6/CMIP/BENCH/IPSL-CM6A-LR/historical/r%ii1p1f1/Amon/tas/gr/v20180803'%(i/10)
+        e.variable='var%i'%(i%10)
+        e.filename_pattern=''
+        e.crea_date=now
+        e.priority=sdconst.DEFAULT_PRIORITY
+        events.append(e)
+
+    return events
+
+def run_emission(conn,args):
+    import sdsqlutils
+    import sdeventdao
+
+    rows=[]
+    for mode in ('per-row insert','executemany (coalesced)'):
+        conn.execute("delete from event")
+        conn.commit()
+
+        events=generate_events(args)
+
+        statement_count=conn.get_statement_count()
+        start=time.time()
+
+        if mode=='per-row insert':
+            for e in events:
+                sdsqlutils.insert(e,sdeventdao.keys_to_insert,False,conn)
+        else:
+            for e in events:
+                sdeventdao.add_event(e,commit=False,conn=conn)
+            sdeventdao.flush_events(conn)
+        conn.commit()
+
+        duration=time.time()-start
+
+        c=conn.cursor()
+        c.execute("select count(1) from event")
+        count=c.fetchone()[0]
+        c.close()
+
+        rows.append([mode,len(events),count,conn.get_statement_count()-statement_count,'%.2f'%duration])
+
+    return rows
+
+def reset_events(conn):
+    conn.execute("update event set status=?",(sdconst.EVENT_STATUS_NEW,))
+    conn.commit()
+
+def get_remaining_events(conn):
+    c=conn.cursor()
+    c.execute("select count(1) from event where status=?",(sdconst.EVENT_STATUS_NEW,))
+    count=c.fetchone()[0]
+    c.close()
+
+    return count
+
+def run_ticks(conn,tick_func,args):
+    ticks=0
+    start=time.time()
+    while get_remaining_events(conn)>0:
+        tick_func()
+        ticks+=1
+
+    return (ticks,time.time()-start)
+
+def run_previous(conn,server,args):
+    """Previous implementation of sdtask.process_async_event()."""
+    import pyjsonrpc
+    import sdsqlutils
+    import sdeventdao
+
+    def tick():
+        events=sdeventdao.get_events(status=sdconst.EVENT_STATUS_NEW,limit=200)
+        client=pyjsonrpc.HttpClient(url=server.get_url(),username='bench',password='bench',timeout=30) # previous 'sdppproxy' reset the connection on each call
+        client.event([e.__dict__ for e in events])
+        for e in events:
+            e.status=sdconst.EVENT_STATUS_OLD
+            sdsqlutils.update(e,['status'],False,conn)
+        conn.commit()
+
+    reset_events(conn)
+    server.reset()
+    (ticks,duration)=run_ticks(conn,tick,args)
+
+    return ['previous',ticks,server.counters['requests'],server.counters['connections'],'%.1f'%(server.counters['bytes']/1024.0),len(server.events),'%.2f'%duration]
+
+def run_batched(conn,server,args,mode='batched'):
+    import sdtask
+    import sdppproxy
+
+    sdppproxy.url=server.get_url()
+    sdppproxy.service=None
+    sdtask.event_batch_size=200
+
+    reset_events(conn)
+    server.reset()
+    (ticks,duration)=run_ticks(conn,sdtask.process_async_event,args)
+
+    return [mode,ticks,server.counters['requests'],server.counters['connections'],'%.1f'%(server.counters['bytes']/1024.0),len(server.events),'%.2f'%duration]
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    conn=sdbenchutils.install_counting_connection()
+
+    emission_rows=run_emission(conn,args)
+
+    server=sdppstub.start(latency=args.latency,connect_latency=args.connect_latency)
+
+    delivery_rows=[]
+    delivery_rows.append(run_previous(conn,server,args))
+    delivery_rows.append(run_batched(conn,server,args))
+
+    # delivery timeouts
+    import sdppproxy
+    sdppproxy.timeout=0.5
+    server.hang_every=3
+    server.hang=1
+    delivery_rows.append(run_batched(conn,server,args,mode='batched (timeouts)'))
+    duplicates=server.counters['duplicates']
+
+    if sdppproxy.service is not None:
+        sdppproxy.service.close()
+    time.sleep(server.hang) # let delayed responses complete
+    server.shutdown()
+    server.server_close()
+
+    print "Events: %i (%i%% duplicates), delivery latency: %.3fs, connection latency: %.3fs"%(args.events,args.duplicates*100,args.latency,args.connect_latency)
+    print ""
+    print sdbenchutils.tabulate(emission_rows,headers=['Emission','Events','Rows inserted','SQL statements','Wall time (s)'])
+    print ""
+    print sdbenchutils.tabulate(delivery_rows,headers=['Delivery','Ticks','Requests','Connections','Sent (KB)','Events stored','Wall time (s)'])
+    print ""
+    print "Timeouts: %i duplicate event(s) ignored by the post-processing stand-in"%duplicates
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events',type=int,default=20000)
+    parser.add_argument('--duplicates',type=float,default=0.1,help='Ratio of identical events')
+    parser.add_argument('--latency',type=float,default=0.05,help='Seconds added to each request')
+    parser.add_argument('--connect_latency',type=float,default=0.05,help='Seconds added to each new connection (TLS handshake)')
+    parser.add_argument('--folder',default='%s/eventbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare one thread per transfer with the fixed-size transfer pool.
+
+Notes
+    - No file is transferred: each item runs a 'sleep' child process in its
+      own process group, as 'sdget.sh' does (short items just sleep).
+    - 'churn' starts many short items (50ms), and reports wall time and the
+      max number of live threads.
+    - 'shutdown' stops in-flight items: with one thread per item, child
+      processes are found by walking the process tree (as the scheduler used
+      to do), and with the pool, items are stopped with their cancellation
+      token.
+    - 'drain' checks that queued and in-flight items all complete.
+
+Example
+    sdexecutorbench.py --items 2000 --slots 64 --inflight 100
+"""
+
+import os
+import time
+import Queue
+import signal
+import argparse
+import threading
+import subprocess
+import sdconfig
+import sdbenchutils
+
+class Item():
+    def __init__(self,index,duration):
+        self.index=index
+        self.duration=duration
+        self.status=None
+
+class Service():
+    exception_occurs=False
+
+    @classmethod
+    def run(cls,item,token):
+        if item.duration<1:
+            time.sleep(item.duration) # short items don't need a child process
+            item.status='done'
+            return
+
+        p=subprocess.Popen(['sleep',str(item.duration)],preexec_fn=os.setpgrp)
+
+        def kill(reason):
+            try:
+                os.killpg(p.pid,signal.SIGTERM)
+            except OSError,e:
+                pass
+
+        token.add_callback(kill)
+        try:
+            p.wait()
+        finally:
+            token.remove_callback(kill)
+
+        item.status='cancelled' if token.is_cancelled() else 'done'
+
+    @classmethod
+    def cancel(cls,item,reason):
+        item.status='cancelled'
+
+class PeakThreadCounter(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.peak=0
+        self.stopped=False
+
+    def run(self):
+        while not self.stopped:
+            self.peak=max(self.peak,threading.active_count())
+            time.sleep(0.001)
+
+def run_thread_per_item(items,output_queue):
+    """Previous behaviour (one thread per item)."""
+    import sdworkerutils
+
+    def target(item):
+        Service.run(item,sdworkerutils.CancellationToken())
+        output_queue.put(item)
+
+    threads=[]
+    for item in items:
+        th=threading.Thread(target=target,args=(item,))
+        th.setDaemon(True)
+        th.start()
+        threads.append(th)
+
+    return threads
+
+def run_churn(args):
+    import sdworkerutils
+
+    rows=[]
+    for mode in ('thread per item','pool'):
+        items=[Item(i,0.05) for i in range(args.items)]
+        output_queue=Queue.Queue()
+
+        counter=PeakThreadCounter()
+        counter.start()
+
+        start=time.time()
+        if mode=='pool':
+            pool=sdworkerutils.WorkerPool('bench',args.slots,Service,output_queue)
+            pool.start()
+            for item in items:
+                pool.submit(item)
+            pool.drain()
+            pool.stop()
+            pool.join()
+        else:
+            for th in run_thread_per_item(items,output_queue):
+                th.join()
+        duration=time.time()-start
+
+        counter.stopped=True
+        counter.join()
+
+        rows.append(['churn',mode,args.items,output_queue.qsize(),'%.2f'%duration,counter.peak-1])
+
+    return rows
+
+def kill_child_processes():
+    """Previous shutdown (the whole process tree is walked)."""
+    import psutil
+
+    for child in psutil.Process(os.getpid()).children(True):
+        try:
+            child.terminate()
+        except psutil.NoSuchProcess,e:
+            pass
+
+def run_shutdown(args):
+    import sdworkerutils
+
+    rows=[]
+    for mode in ('thread per item','pool'):
+        items=[Item(i,60) for i in range(args.inflight)]
+        output_queue=Queue.Queue()
+
+        if mode=='pool':
+            pool=sdworkerutils.WorkerPool('bench',args.inflight,Service,output_queue)
+            pool.start()
+            for item in items:
+                pool.submit(item)
+        else:
+            threads=run_thread_per_item(items,output_queue)
+
+        while count_sleep_children()<args.inflight: # wait for all child processes to be started
+            time.sleep(0.1)
+
+        start=time.time()
+        if mode=='pool':
+            pool.cancel('shutdown')
+            while pool.get_pending_count()>0:
+                time.sleep(0.01)
+        else:
+            kill_child_processes()
+            for th in threads:
+                th.join()
+        duration=time.time()-start
+
+        if mode=='pool':
+            pool.stop()
+            pool.join()
+
+        rows.append(['shutdown',mode,args.inflight,output_queue.qsize(),'%.2f'%duration,''])
+
+    return rows
+
+def count_sleep_children():
+    import psutil
+
+    return len(psutil.Process(os.getpid()).children(True))
+
+def run_drain(args):
+    import sdworkerutils
+
+    items=[Item(i,1) for i in range(args.slots)]
+    output_queue=Queue.Queue()
+
+    pool=sdworkerutils.WorkerPool('bench',args.slots/4 or 1,Service,output_queue,max_queue_size=args.slots)
+    pool.start()
+
+    start=time.time()
+    for item in items:
+        pool.submit(item)
+    idle=pool.drain()
+    duration=time.time()-start
+
+    pool.stop()
+    pool.join()
+
+    done=len([i for i in items if i.status=='done'])
+
+    return [['drain','pool','%i (idle=%s)'%(len(items),idle),done,'%.2f'%duration,'']]
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+
+    rows=[]
+    rows.extend(run_churn(args))
+    rows.extend(run_shutdown(args))
+    rows.extend(run_drain(args))
+
+    print "Items: %i, pool slots: %i, in-flight items at shutdown: %i"%(args.items,args.slots,args.inflight)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Test','Mode','Items','Items returned','Duration (s)','Max live threads'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items',type=int,default=2000)
+    parser.add_argument('--slots',type=int,default=64)
+    parser.add_argument('--inflight',type=int,default=100)
+    parser.add_argument('--folder',default='%s/executorbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare per-task Globus polling with the batched Globus download manager.
+
+Notes
+    - The Transfer API is emulated by a local fake (see 'sdglobusstub'
+      module), which copies files from a scratch folder, with the given
+      latency for each call.
+    - Files are handed to the download manager in waves (one wave per
+      scheduler tick), as when transfer slots are freed.
+    - 'per-task polling' mode only replays the API calls of the previous
+      implementation (new access token on each tick, one 'task' call per
+      active task, endpoints activated on each wave). 'sddmgo' mode runs the
+      'sddmgo' module (including file verification and database updates).
+    - 'Max tick (s)' is the longest time spent in one scheduler tick.
+
+Example
+    sdglobusbench.py --files 2000 --datanodes 4 --waves 100 --latency 0.02
+"""
+
+import os
+import time
+import hashlib
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+import sdglobusstub
+
+def prepare_files(args):
+    """Create source files, and point local paths to the scratch folder."""
+    import sddb
+
+    sdbenchutils.populate_waiting_files(sddb.conn,args.files,args.datanodes)
+
+    c=sddb.conn.cursor()
+    c.execute("select file_id,url,local_path from file")
+    for (file_id,url,local_path) in c.fetchall():
+        content=os.urandom(args.size)
+        source_path='%s/source/%s'%(args.folder,url.split('/',3)[3])
+        if not os.path.isdir(os.path.dirname(source_path)):
+            os.makedirs(os.path.dirname(source_path))
+        with open(source_path,'wb') as fh:
+            fh.write(content)
+
+        c.execute("update file set size=?,checksum=?,checksum_type=?,local_path=?,status=? where file_id=?",
+                  (args.size,hashlib.md5(content).hexdigest(),sdconst.CHECKSUM_TYPE_MD5,'%s/data/%s'%(args.folder,local_path),sdconst.TRANSFER_STATUS_RUNNING,file_id))
+    sddb.conn.commit()
+    c.close()
+
+def get_waves(args):
+    import sdfiledao
+    import sddatasetdao
+
+    transfers=sdfiledao.get_files(status=sdconst.TRANSFER_STATUS_RUNNING)
+
+    datasets={}
+    for tr in transfers:
+        if tr.dataset_id not in datasets:
+            datasets[tr.dataset_id]=sddatasetdao.get_dataset(dataset_id=tr.dataset_id)
+        tr.dataset=datasets[tr.dataset_id]
+
+    wave_size=(len(transfers)+args.waves-1)/args.waves
+
+    return [transfers[i:i+wave_size] for i in range(0,len(transfers),wave_size)]
+
+def run_ticks(args,tick_func,is_over):
+    """Call 'tick_func' every 'args.tick' seconds until 'is_over' returns True.
+
+    Returns
+        (tick count,max tick duration,wall time)
+    """
+    start=time.time()
+    ticks=0
+    max_tick=0
+
+    while not is_over():
+        begin=time.time()
+        tick_func()
+        duration=time.time()-begin
+
+        ticks+=1
+        max_tick=max(max_tick,duration)
+
+        time.sleep(max(0,args.tick-duration))
+
+    return (ticks,max_tick,time.time()-start)
+
+def run_per_task_polling(args,service):
+    """Previous behaviour (API calls only)."""
+    from globusonline.transfer import api_client
+    import sddmgo
+
+    waves=get_waves(args)
+    tasks=set()
+    task_count=[0]
+
+    def get_api():
+        _, _, access_token = api_client.goauth.get_access_token(username='bench', password='bench')
+        return api_client.TransferAPIClient(username='bench', goauth=access_token)
+
+    def activate(api,ep):
+        code, reason, reqs = api.endpoint_activation_requirements(ep, type='delegate_proxy')
+        api.endpoint_activate(ep, reqs)
+
+    def tick():
+
+        # transfers_end()
+        api=get_api()
+        for task_id in list(tasks):
+            code, reason, data = api.task(task_id, fields="status")
+            if data['status']=="SUCCEEDED":
+                tasks.remove(task_id)
+
+        # transfers_begin()
+        if len(waves)>0:
+            api=get_api()
+            activate(api,sddmgo.dst_endpoint)
+
+            groups={}
+            for tr in waves.pop(0):
+                src_endpoint, src_path, path = sddmgo.map_to_globus(tr.url)
+                groups.setdefault(src_endpoint,[]).append((src_path,tr.get_full_local_path()))
+
+            for src_endpoint,items in groups.iteritems():
+                activate(api,src_endpoint)
+                code, message, data = api.transfer_submission_id()
+                t = api_client.Transfer(data['value'], src_endpoint, sddmgo.dst_endpoint)
+                for (src_path,dst_path) in items:
+                    t.add_item(src_path,dst_path)
+                code, message, data = api.transfer(t)
+                tasks.add(data['task_id'])
+                task_count[0]+=1
+
+    (ticks,max_tick,duration)=run_ticks(args,tick,lambda: len(waves)==0 and len(tasks)==0)
+
+    return ['per-task polling',task_count[0],'',ticks,service.get_request_count(),service.counters.get('task',0),service.counters.get('get_access_token',0),service.counters.get('endpoint_activate',0),'%.3f'%max_tick,'%.1f'%duration]
+
+def run_sddmgo(args,service):
+    import sddmgo
+    import sdcounter
+
+    waves=get_waves(args)
+    ended=[]
+
+    def tick():
+        ended.extend(sddmgo.transfers_end())
+
+        if len(waves)>0:
+            sddmgo.transfers_begin(waves.pop(0))
+
+    (ticks,max_tick,duration)=run_ticks(args,tick,lambda: len(waves)==0 and len(sddmgo.globus_tasks)==0 and sddmgo.can_leave())
+
+    done=len([tr for tr in ended if tr.status==sdconst.TRANSFER_STATUS_DONE])
+
+    return ['sddmgo',sdcounter.get('globus.task'),done,ticks,service.get_request_count(),service.counters.get('task_list',0),service.counters.get('get_access_token',0),service.counters.get('endpoint_activate',0),'%.3f'%max_tick,'%.1f'%duration]
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+
+    prepare_files(args)
+
+    rows=[]
+    for mode in ('per-task polling','sddmgo'):
+        service=sdglobusstub.FakeTransferService('%s/source'%args.folder,latency=args.latency,task_duration=args.task_duration)
+        sdglobusstub.install(service)
+
+        import sddmgo
+        sddmgo.globus_endpoints=dict(('esgf-node%i.example.org'%i,sddmgo.Endpoint('esgf-node%i#bench'%i)) for i in range(args.datanodes))
+        sddmgo.poll_min_interval=args.poll_min_interval
+        sddmgo.poll_max_interval=args.poll_max_interval
+
+        if mode=='sddmgo':
+            rows.append(run_sddmgo(args,service))
+        else:
+            rows.append(run_per_task_polling(args,service))
+
+        service.stop()
+
+    print "Files: %i, data nodes: %i, waves: %i, task duration: %.1fs, API latency: %.3fs, tick: %.1fs"%(args.files,args.datanodes,args.waves,args.task_duration,args.latency,args.tick)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Mode','Tasks','Files done','Ticks','API requests','Status requests','Token requests','Activations','Max tick (s)','Wall time (s)'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=2000)
+    parser.add_argument('--datanodes',type=int,default=4)
+    parser.add_argument('--size',type=int,default=4096,help='File size (bytes)')
+    parser.add_argument('--waves',type=int,default=100,help='Number of transfers_begin() calls')
+    parser.add_argument('--task_duration',type=float,default=5,help='Seconds for the fake Globus to complete a task')
+    parser.add_argument('--latency',type=float,default=0.02,help='Seconds added to each API call')
+    parser.add_argument('--tick',type=float,default=0.2,help='Seconds between two scheduler ticks')
+    parser.add_argument('--poll_min_interval',type=float,default=1)
+    parser.add_argument('--poll_max_interval',type=float,default=8)
+    parser.add_argument('--folder',default='%s/globusbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains a local fake of the Globus Transfer API (used by benchmarks).
+
+Notes
+    - install() registers fake 'globusonline.transfer.api_client' modules
+      (client, goauth and x509_proxy), so 'sddmgo' can be imported and run
+      without Globus account nor Globus client library.
+    - Only the calls used by 'sddmgo' are implemented ('task_list' only
+      supports the 'task_id:id1,id2,..' filter).
+    - Tasks are run by a background thread: 'task_duration' seconds after
+      submission, files are copied from 'source_folder' (source paths are
+      relative to it) to their destination path, and the task is
+      'SUCCEEDED'.
+    - Each call waits 'latency' seconds, and is counted (by method).
+    - Access tokens expire after 'token_lifetime' seconds (calls with an
+      expired token fail with HTTP 401).
+
+Example
+    sdglobusstub.py --files 10
+"""
+
+import os
+import sys
+import time
+import uuid
+import types
+import shutil
+import argparse
+import tempfile
+import threading
+
+class APIError(Exception):
+    def __init__(self,status_code,message):
+        Exception.__init__(self,message)
+        self.status_code=status_code
+
+class Transfer(object):
+    def __init__(self,submission_id,source_endpoint,destination_endpoint,**kw):
+        self.submission_id=submission_id
+        self.source_endpoint=source_endpoint
+        self.destination_endpoint=destination_endpoint
+        self.items=[]
+
+    def add_item(self,source_path,destination_path,recursive=False,verify_size=None):
+        self.items.append(dict(source_path=source_path,destination_path=destination_path))
+
+class ActivationRequirements(object):
+    def __init__(self):
+        self.values={}
+
+    def get_requirement_value(self,type,name):
+        return self.values.get((type,name),'fake-%s'%name)
+
+    def set_requirement_value(self,type,name,value):
+        self.values[(type,name)]=value
+
+class FakeTransferService(object):
+    """This class holds the state of the fake Transfer API (tasks and counters)."""
+
+    def __init__(self,source_folder,latency=0,task_duration=1,token_lifetime=3600):
+        self.source_folder=source_folder
+        self.latency=latency               # seconds added to each call
+        self.task_duration=task_duration   # seconds between task submission and task completion
+        self.token_lifetime=token_lifetime # seconds
+        self.tasks={}                      # task_id => {'status','items','end'}
+        self.counters={}
+        self.lock=threading.Lock()
+        self.stopped=False
+
+        self._thread=threading.Thread(target=self.run_tasks)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self):
+        self.stopped=True
+        self._thread.join()
+
+    def call(self,name,token=None):
+        with self.lock:
+            self.counters[name]=self.counters.get(name,0)+1
+
+        time.sleep(self.latency)
+
+        if token is not None and get_token_expiry(token)<=time.time():
+            raise APIError(401,'Token expired')
+
+    def get_request_count(self):
+        with self.lock:
+            return sum(self.counters.values())
+
+    def run_tasks(self):
+        while not self.stopped:
+            now=time.time()
+
+            with self.lock:
+                ended=[task for task in self.tasks.itervalues() if task['status']=='ACTIVE' and task['end']<=now]
+
+            for task in ended:
+                for item in task['items']:
+                    if not os.path.isdir(os.path.dirname(item['destination_path'])):
+                        os.makedirs(os.path.dirname(item['destination_path']))
+                    shutil.copyfile(os.path.join(self.source_folder,item['source_path'].lstrip('/')),item['destination_path'])
+                task['status']='SUCCEEDED'
+
+            time.sleep(0.05)
+
+class TransferAPIClient(object):
+    def __init__(self,username,goauth=None,**kw):
+        self.username=username
+        self.goauth=goauth
+
+    def task_list(self,filter=None,fields=None,limit=None,offset=0):
+        _service.call('task_list',self.goauth)
+
+        task_ids=filter.split(':',1)[1].split(',')
+        with _service.lock:
+            docs=[dict(task_id=task_id,status=_service.tasks[task_id]['status']) for task_id in task_ids if task_id in _service.tasks]
+
+        return (200,'OK',{'DATA':docs,'length':len(docs),'offset':offset,'limit':limit})
+
+    def task(self,task_id,fields=None):
+        _service.call('task',self.goauth)
+
+        with _service.lock:
+            return (200,'OK',{'task_id':task_id,'status':_service.tasks[task_id]['status']})
+
+    def submission_id(self):
+        _service.call('submission_id',self.goauth)
+
+        return (200,'OK',{'value':str(uuid.uuid4())})
+
+    transfer_submission_id=submission_id
+
+    def transfer(self,transfer):
+        _service.call('transfer',self.goauth)
+
+        task_id=str(uuid.uuid4())
+        with _service.lock:
+            _service.tasks[task_id]={'status':'ACTIVE','items':transfer.items,'end':time.time()+_service.task_duration}
+
+        return (202,'Accepted',{'task_id':task_id})
+
+    def endpoint_activation_requirements(self,endpoint_name,**kw):
+        _service.call('endpoint_activation_requirements',self.goauth)
+
+        return (200,'OK',ActivationRequirements())
+
+    def endpoint_activate(self,endpoint_name,filled_requirements,**kw):
+        _service.call('endpoint_activate',self.goauth)
+
+        return (200,'OK',{'code':'Activated'})
+
+def get_access_token(username=None,password=None,ca_certs=None):
+    _service.call('get_access_token')
+
+    return (username,password,'un=%s|tokenid=%s|expiry=%d|sig=fake'%(username,uuid.uuid4(),int(time.time()+_service.token_lifetime)))
+
+def create_proxy_from_file(issuer_cred_file,public_key,lifetime_hours=None):
+    return 'fake-proxy'
+
+def get_token_expiry(token):
+    for field in token.split('|'):
+        if field.startswith('expiry='):
+            return int(field[len('expiry='):])
+
+def install(service):
+    """Register fake 'globusonline' modules (must be called before 'sddmgo' is imported)."""
+    global _service
+
+    _service=service
+
+    api_client=types.ModuleType('globusonline.transfer.api_client')
+    api_client.TransferAPIClient=TransferAPIClient
+    api_client.Transfer=Transfer
+    api_client.APIError=APIError
+
+    api_client.goauth=types.ModuleType('globusonline.transfer.api_client.goauth')
+    api_client.goauth.get_access_token=get_access_token
+
+    api_client.x509_proxy=types.ModuleType('globusonline.transfer.api_client.x509_proxy')
+    api_client.x509_proxy.create_proxy_from_file=create_proxy_from_file
+
+    globusonline=types.ModuleType('globusonline')
+    globusonline.transfer=types.ModuleType('globusonline.transfer')
+    globusonline.transfer.api_client=api_client
+
+    sys.modules['globusonline']=globusonline
+    sys.modules['globusonline.transfer']=globusonline.transfer
+    sys.modules['globusonline.transfer.api_client']=api_client
+    sys.modules['globusonline.transfer.api_client.goauth']=api_client.goauth
+    sys.modules['globusonline.transfer.api_client.x509_proxy']=api_client.x509_proxy
+
+# init.
+
+_service=None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=10)
+    parser.add_argument('--task_duration',type=float,default=1)
+    args = parser.parse_args()
+
+    folder=tempfile.mkdtemp()
+    service=FakeTransferService(folder,task_duration=args.task_duration)
+    install(service)
+
+    from globusonline.transfer import api_client
+
+    _, _, token = api_client.goauth.get_access_token(username='foo',password='bar')
+    api=api_client.TransferAPIClient(username='foo',goauth=token)
+
+    code, reason, data = api.transfer_submission_id()
+    t=api_client.Transfer(data['value'],'src#endpoint','dst#endpoint')
+    for i in range(args.files):
+        with open('%s/src_%i'%(folder,i),'w') as fh:
+            fh.write('x'*i)
+        t.add_item('/src_%i'%i,'%s/dst/dst_%i'%(folder,i))
+    code, reason, data = api.transfer(t)
+
+    while api.task(data['task_id'])[2]['status']=='ACTIVE':
+        time.sleep(0.1)
+
+    print "Task %s: %s (%i files copied)"%(data['task_id'],api.task(data['task_id'])[2]['status'],len(os.listdir('%s/dst'%folder)))
+    print service.counters
+
+    service.stop()
+    shutil.rmtree(folder)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to benchmark search-API paginated calls (pooled connections vs one connection per call).
+
+Notes
+    - Calls are sent to a local stand-in search-API (see 'sdsolrstub' module).
+    - Connections are counted on the server side, so both modes can be compared.
+
+Example
+    sdhttppoolbench.py --files 20000 --page_size 500 --queries 8 --parallel 3
+"""
+
+import time
+import threading
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+import sdsolrstub
+
+def run_queries(url,count):
+    import sdtypes
+    import sdproxy
+    import sdurlutils # imported in the main thread by run()
+
+    service=sdproxy.SearchAPIProxy()
+    for i in range(count):
+        request=sdtypes.Request(url=sdurlutils.add_solr_output_format(url),pagination=True)
+        response=service.call_web_service__PAGINATION(request)
+        response.delete()
+
+def run_mode(mode,url,server,args):
+    import sdhttppool
+    import sdcounter
+
+    sdconfig.http_pool=(mode=='pool')
+    sdhttppool.reset()
+    sdcounter.reset()
+    server.counters.update({'connections':0,'requests':0,'errors':0})
+
+    start=time.time()
+
+    threads=[]
+    for i in range(args.parallel):
+        th=threading.Thread(target=run_queries,args=(url,args.queries/args.parallel))
+        th.start()
+        threads.append(th)
+    for th in threads:
+        th.join()
+
+    wall_time=time.time()-start
+
+    return [mode,'%.2f'%wall_time,server.counters['requests'],server.counters['connections'],'%.0f'%(server.counters['requests']/wall_time)]
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdproxy
+    import sdhttppool
+    import sdnetutils
+
+    sdconst.SEARCH_API_CHUNKSIZE=args.page_size
+    sdconfig.searchapi_output_format=args.format
+    sdnetutils.search_api_parser=sdnetutils.get_search_api_parser()
+
+    docs=[sdsolrstub.to_solr_doc(f) for f in sdsolrstub.get_files(args.playback,args.files)]
+    server=sdsolrstub.start(docs,gzip=args.gzip)
+
+    rows=[]
+    for mode in ('urllib','pool'):
+        rows.append(run_mode(mode,server.get_url(),server,args))
+
+    sdhttppool.reset() # close keep-alive connections
+    server.shutdown()
+    server.server_close()
+
+    print "Files per query: %i, page size: %i, queries: %i, parallel: %i, gzip: %s"%(args.files,args.page_size,args.queries,args.parallel,args.gzip)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Mode','Wall time (s)','HTTP requests','TCP connections','Requests per second'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=20000,help='Number of docs returned by each query')
+    parser.add_argument('--page_size',type=int,default=500)
+    parser.add_argument('--queries',type=int,default=6)
+    parser.add_argument('--parallel',type=int,default=3)
+    parser.add_argument('--format',choices=[sdconst.SEARCH_API_OUTPUT_FORMAT_XML,sdconst.SEARCH_API_OUTPUT_FORMAT_JSON],default=sdconst.SEARCH_API_OUTPUT_FORMAT_XML)
+    parser.add_argument('--gzip',action='store_true')
+    parser.add_argument('--playback',metavar='FILE',default=None,help='File recorded with --record option (synthetic files are used if not set)')
+    parser.add_argument('--folder',default='%s/httppoolbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare hot queries duration with the previous single-column indexes and with the composite indexes.
+
+Notes
+    - 'files' files are spread over 'datanodes' data nodes (1/3 done, 1% running,
+      the rest waiting), and 'events' events are added (half of them new).
+    - Hot queries are the ones checked by the 'sdqueryplan' module. Each
+      query is run 'repeat' times.
+    - Index maintenance cost is measured with file status updates (one
+      transaction per file, as the daemon does).
+
+Example
+    sdindexbench.py --files 200000 --datanodes 20
+"""
+
+import time
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+
+previous_indexes=[
+    "create index idx_file_1 on file (status)",
+    "create index idx_file_2 on file (priority)",
+    "create index idx_file_5 on file (dataset_id)",
+    "create index idx_event_2 on event (status)"]
+composite_indexes=['idx_file_14','idx_file_15','idx_file_16','idx_event_5']
+
+def populate(conn,args):
+    sdbenchutils.populate_waiting_files(conn,args.files,args.datanodes)
+    conn.execute("update file set status=? where file_id%3=0",(sdconst.TRANSFER_STATUS_DONE,))
+    conn.execute("update file set status=? where file_id%100=1",(sdconst.TRANSFER_STATUS_RUNNING,))
+    conn.execute("update file set priority=priority+(file_id%5)")
+
+    now=time.strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany("insert into event (name,status,project,model,dataset_pattern,variable,filename_pattern,crea_date,priority) values (?,?,?,?,?,?,?,?,?)",
+                     [(sdconst.EVENT_VARIABLE_COMPLETE,sdconst.EVENT_STATUS_NEW if i%2==0 else sdconst.EVENT_STATUS_OLD,'CMIP5','IPSL-CM5A-LR','CMIP5/output1/BENCH/IPSL-CM5A-LR/historical/mon/atmos/Amon/r%ii1p1/v20110101'%i,'tas','',now,sdconst.DEFAULT_PRIORITY) for i in range(args.events)])
+    conn.commit()
+
+def use_previous_indexes(conn):
+    for name in composite_indexes:
+        conn.execute("drop index %s"%name)
+    for q in previous_indexes:
+        conn.execute(q)
+    conn.commit()
+
+def use_composite_indexes(conn):
+    import sddbversion
+
+    sddbversion.upgrade_312(conn)
+
+def measure_queries(conn,args):
+    """Returns dict (query name => (average duration in ms,plan ok))."""
+    import sdqueryplan
+
+    durations={}
+    for (name,query,params) in sdqueryplan.get_hot_queries():
+        start=time.time()
+        for i in range(args.repeat):
+            c=conn.cursor()
+            c.execute(query,params)
+            c.fetchall()
+            c.close()
+        durations[name]=((time.time()-start)/args.repeat*1000,sdqueryplan.is_plan_ok(sdqueryplan.get_plan(query,params,conn)))
+
+    conn.rollback() # 'sdeventdao.add_events' query inserts one event
+
+    return durations
+
+def measure_updates(conn,args):
+    """Returns average file status update duration in ms."""
+    c=conn.cursor()
+    c.execute("select file_id from file where status=? limit ?",(sdconst.TRANSFER_STATUS_WAITING,args.updates))
+    file_ids=[rs[0] for rs in c.fetchall()]
+    c.close()
+
+    start=time.time()
+    for status in (sdconst.TRANSFER_STATUS_RUNNING,sdconst.TRANSFER_STATUS_WAITING):
+        for file_id in file_ids:
+            conn.execute("update file set status=? where file_id=?",(status,file_id))
+            conn.commit()
+
+    return (time.time()-start)/(2*len(file_ids))*1000
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sddb
+    import sdqueryplan
+
+    conn=sddb.conn
+
+    populate(conn,args)
+
+    use_previous_indexes(conn)
+    previous=measure_queries(conn,args)
+    previous_update=measure_updates(conn,args)
+
+    use_composite_indexes(conn)
+    composite=measure_queries(conn,args)
+    composite_update=measure_updates(conn,args)
+
+    rows=[]
+    for (name,query,params) in sdqueryplan.get_hot_queries():
+        rows.append([name,'%.3f'%previous[name][0],'OK' if previous[name][1] else 'FAIL','%.3f'%composite[name][0],'OK' if composite[name][1] else 'FAIL'])
+    rows.append(['file status update (commit)','%.3f'%previous_update,'','%.3f'%composite_update,''])
+
+    print "Files: %i, data nodes: %i, events: %i"%(args.files,args.datanodes,args.events)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Query','Single-column (ms)','Plan','Composite (ms)','Plan'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=200000)
+    parser.add_argument('--datanodes',type=int,default=20)
+    parser.add_argument('--events',type=int,default=20000)
+    parser.add_argument('--repeat',type=int,default=20)
+    parser.add_argument('--updates',type=int,default=500,help='Number of files updated to measure index maintenance cost')
+    parser.add_argument('--folder',default='%s/indexbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
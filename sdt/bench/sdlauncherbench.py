@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare the fixed sleep between transfer starts with the per-data-node token bucket launcher.
+
+Notes
+    - No transfer is done: the start func only records when each transfer
+      is started.
+    - 'sleep' mode is the previous behaviour (the scheduler sleeps
+      1/rate seconds after each start, whatever the data node).
+    - 'launcher' mode uses 'sdlauncher' module, with one bucket per data
+      node (same rate, and 'burst' transfers can be started at once).
+    - 'Scheduler blocked' is the time spent in the call which starts the
+      transfers (i.e. the time the scheduler main loop can't process ended
+      transfers).
+    - 'Max starts per second' is the max number of transfers started on
+      one data node during any one second window (must not exceed
+      rate+burst in 'launcher' mode).
+
+Example
+    sdlauncherbench.py --datanodes 4 --transfers 20 --rate 10 --burst 2
+"""
+
+import time
+import argparse
+import threading
+import sdconfig
+import sdbenchutils
+
+def get_max_starts_per_second(start_times):
+    start_times=sorted(start_times)
+
+    count=0
+    j=0
+    for i in range(len(start_times)):
+        while start_times[i]-start_times[j]>=1:
+            j+=1
+        count=max(count,i-j+1)
+
+    return count
+
+def get_transfers(args):
+    from sdtypes import File
+
+    transfers=[]
+    for i in range(args.transfers):
+        for n in range(args.datanodes):
+            transfers.append(File(file_id=n*args.transfers+i,data_node='dn%i.example.org'%n))
+
+    return transfers
+
+def run_mode(mode,args):
+    import sdlauncher
+
+    started={} # file_id => start time
+    cancelled=[]
+    done=threading.Event()
+
+    transfers=get_transfers(args)
+
+    def start_func(tr):
+        started[tr.file_id]=time.time()
+        if len(started)==len(transfers):
+            done.set()
+
+    def cancel_func(tr):
+        cancelled.append(tr)
+
+    begin=time.time()
+
+    if mode=='sleep':
+        for tr in transfers:
+            start_func(tr)
+            time.sleep(1.0/args.rate)
+        blocked=time.time()-begin
+    else:
+        sdlauncher.quit=0
+        sdlauncher.launch_rate=args.rate
+        sdlauncher.launch_burst=args.burst
+
+        launcher=sdlauncher.LauncherThread(start_func,cancel_func)
+        launcher.start()
+        launcher.submit(transfers)
+        blocked=time.time()-begin
+
+        done.wait()
+
+        sdlauncher.quit=1
+        launcher.join()
+
+    all_started=max(started.values())-begin
+
+    rows=[]
+    for n in range(args.datanodes):
+        data_node='dn%i.example.org'%n
+        start_times=[started[tr.file_id] for tr in transfers if tr.data_node==data_node]
+        rows.append([mode,data_node,'%.3f'%blocked,'%.2f'%(min(start_times)-begin),'%.2f'%(max(start_times)-begin),get_max_starts_per_second(start_times)])
+
+    rows.append([mode,'all','%.3f'%blocked,'','%.2f'%all_started,''])
+
+    return rows
+
+def run_shutdown(args):
+    """Stop the launcher while transfers are still queued."""
+    import sdlauncher
+
+    started=[]
+    cancelled=[]
+
+    sdlauncher.quit=0
+    sdlauncher.launch_rate=args.rate
+    sdlauncher.launch_burst=args.burst
+
+    transfers=get_transfers(args)
+
+    launcher=sdlauncher.LauncherThread(lambda tr: started.append(tr),lambda tr: cancelled.append(tr))
+    launcher.start()
+    launcher.submit(transfers)
+
+    time.sleep(0.5)
+
+    sdlauncher.quit=1
+    begin=time.time()
+    launcher.join()
+    stop_duration=time.time()-begin
+
+    return (len(transfers),len(started),len(cancelled),launcher.get_pending_count(),stop_duration)
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+
+    rows=[]
+    rows.extend(run_mode('sleep',args))
+    rows.extend(run_mode('launcher',args))
+
+    (total,started,cancelled,pending,stop_duration)=run_shutdown(args)
+
+    print "Data nodes: %i, transfers per data node: %i, rate: %.1f per second, burst: %i"%(args.datanodes,args.transfers,args.rate,args.burst)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Mode','Data node','Scheduler blocked (s)','First start (s)','Last start (s)','Max starts per second'])
+    print ""
+    print "Shutdown: %i transfers queued, %i started, %i given back, %i left pending, launcher stopped in %.2fs"%(total,started,cancelled,pending,stop_duration)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datanodes',type=int,default=4)
+    parser.add_argument('--transfers',type=int,default=20,help='Number of transfers per data node')
+    parser.add_argument('--rate',type=float,default=10,help='Transfer starts per second')
+    parser.add_argument('--burst',type=int,default=2)
+    parser.add_argument('--folder',default='%s/launcherbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare metadata storage backends (see 'sdmts' module).
+
+Notes
+    - Synthetic files are generated (no search-API call).
+    - Each stage reads all files chunk by chunk and writes them in a new store
+      (as most pipeline stages do).
+    - Filter stages (attribute projection, duplicates removal, status filter)
+      are timed separately, as they are pushed down to SQL when possible.
+
+Example
+    sdmtsbench.py --files 200000 --stages 10
+"""
+
+import time
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+
+def identity(files):
+    return files
+
+def run_backend(name,lowmem,lowmem_storage,files,stages):
+    import sdtypes
+    import sdpipelineprocessing
+    import sdsimplefilter
+    import sdlmattrfilter
+    import sdrmdup
+
+    # stores created by the pipeline use those parameters
+    sdconfig.lowmem=lowmem
+    sdconfig.lowmem_storage=lowmem_storage
+
+    start=time.time()
+
+    metadata=sdtypes.Metadata()
+    for i in range(0,len(files),sdconst.SEARCH_API_CHUNKSIZE):
+        metadata.add_files(files[i:i+sdconst.SEARCH_API_CHUNKSIZE])
+
+    load_time=time.time()-start
+
+    for i in range(stages):
+        po=sdpipelineprocessing.ProcessingObject(identity)
+        metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+
+    total_time=time.time()-start
+
+    start=time.time()
+
+    light_metadata=sdlmattrfilter.run(metadata,['file_functional_id','data_node'])
+    assert light_metadata.count()==len(files)
+    light_metadata.delete()
+    metadata=sdrmdup.run(metadata,'file_functional_id')
+    metadata=sdsimplefilter.run(metadata,'status',sdconst.TRANSFER_STATUS_NEW,'keep')
+
+    filter_time=time.time()-start
+
+    assert metadata.count()==len(files)
+    assert metadata.get_one_file()==files[0]
+
+    metadata.delete()
+
+    return [name,'%.2f'%load_time,'%.2f'%total_time,'%.0f'%(len(files)*stages/total_time),'%.2f'%filter_time]
+
+def run(args):
+    files=sdbenchutils.generate_file_dicts(args.files,5)
+
+    # search-API returns more attributes than needed by synda
+    for f in files:
+        f['description']=[u'Near-Surface Air Temperature']
+        f['experiment_family']=[u'All',u'Historical']
+        f['frequency']=[u'mon']
+        f['replica']=False
+        f['retracted']=False
+        f['score']=1.0
+
+    backends=[('MemoryStorage',False,None),
+              ('DatabaseStorage',True,sdconst.STORAGE_BACKEND_JSON),
+              ('ColumnarDatabaseStorage',True,sdconst.STORAGE_BACKEND_COLUMNAR)]
+
+    rows=[]
+    for (name,lowmem,lowmem_storage) in backends:
+        if args.backend is None or args.backend==name:
+            rows.append(run_backend(name,lowmem,lowmem_storage,files,args.stages))
+
+    print "Files: %i, stages: %i"%(args.files,args.stages)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Backend','Load time (s)','Total time (s)','Files per second (per stage)','Filter stages time (s)'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=50000)
+    parser.add_argument('--stages',type=int,default=10)
+    parser.add_argument('--backend',choices=['MemoryStorage','DatabaseStorage','ColumnarDatabaseStorage'],default=None)
+    parser.add_argument('--folder',default='%s/mtsbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
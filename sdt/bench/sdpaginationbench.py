@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to benchmark one big paginated search-API query (sequential vs parallel pagination).
+
+Notes
+    - Calls are sent to a local stand-in search-API (see 'sdsolrstub' module),
+      with simulated latency and errors.
+    - Each row runs the same query with a different 'parallel_pagination' value.
+    - The stand-in search-API runs in the same process (it competes with the
+      parsers for the GIL), so the speedup is lower than with remote indexes.
+
+Example
+    sdpaginationbench.py --files 100000 --page_size 2000 --latency 0.5 --threads 1,4,8
+"""
+
+import time
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+import sdsolrstub
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdtypes
+    import sdproxy
+    import sdnetutils
+    import sdurlutils
+    import sdcounter
+    import sdhttppool
+
+    sdconst.SEARCH_API_CHUNKSIZE=args.page_size
+    sdconfig.searchapi_output_format=args.format
+    sdnetutils.search_api_parser=sdnetutils.get_search_api_parser()
+    sdhttppool.pool_maxsize=max(args.threads)
+    sdproxy.retry_delay=args.retry_delay
+
+    docs=[sdsolrstub.to_solr_doc(f) for f in sdsolrstub.get_files(args.playback,args.files)]
+    server=sdsolrstub.start(docs,latency=args.latency,error_rate=args.error_rate)
+
+    rows=[]
+    for threads in args.threads:
+        sdproxy.parallel_pagination=threads
+        sdcounter.reset()
+        server.counters.update({'connections':0,'requests':0,'errors':0})
+
+        start=time.time()
+
+        request=sdtypes.Request(url=sdurlutils.add_solr_output_format(server.get_url()),pagination=True)
+        try:
+            response=sdproxy.SearchAPIProxy().call_web_service__PAGINATION(request)
+        except Exception,e:
+            # sequential pagination fails on first error (the whole query is retried by the caller)
+            rows.append([threads,'failed','',server.counters['requests'],server.counters['errors'],sdcounter.get('search_api.page_retry')])
+            continue
+
+        wall_time=time.time()-start
+
+        # pages must be in offset order
+        assert [f['checksum'] for f in response.get_files()]==[d['checksum'] for d in docs]
+        response.delete()
+
+        rows.append([threads,'%.2f'%wall_time,'%.0f'%(args.files/wall_time),server.counters['requests'],server.counters['errors'],sdcounter.get('search_api.page_retry')])
+
+    sdhttppool.reset() # close keep-alive connections
+    server.shutdown()
+    server.server_close()
+
+    print "Files: %i, page size: %i, latency: %.2fs, error rate: %.2f"%(args.files,args.page_size,args.latency,args.error_rate)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Parallel pagination','Wall time (s)','Files per second','HTTP requests','HTTP errors','Page retries'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=50000,help='Number of docs returned by the query')
+    parser.add_argument('--page_size',type=int,default=2000)
+    parser.add_argument('--latency',type=float,default=0.5,help='Seconds added to each request')
+    parser.add_argument('--error_rate',type=float,default=0,help='Probability for a request to fail')
+    parser.add_argument('--retry_delay',type=float,default=0.1,help='Seconds before the first page retry (doubled after each retry)')
+    parser.add_argument('--threads',type=lambda s: [int(i) for i in s.split(',')],default=[1,4,8],help='Comma separated list of parallel_pagination values')
+    parser.add_argument('--format',choices=[sdconst.SEARCH_API_OUTPUT_FORMAT_XML,sdconst.SEARCH_API_OUTPUT_FORMAT_JSON],default=sdconst.SEARCH_API_OUTPUT_FORMAT_XML)
+    parser.add_argument('--playback',metavar='FILE',default=None,help='File recorded with --record option (synthetic files are used if not set)')
+    parser.add_argument('--folder',default='%s/paginationbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
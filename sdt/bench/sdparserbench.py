@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare search-API response parsers (buffered vs streaming).
+
+Notes
+    - Search-API responses (XML and JSON) are rebuilt from a file recorded
+      with 'synda search --record FILE' (or from synthetic files if no file
+      is given), so no search-API call is made (see 'sdsolrstub' module).
+    - Each parser runs in a dedicated process, so peak RSS is not polluted
+      by previous runs.
+
+Example
+    synda search CMIP6 tas --record /tmp/tas.json
+    sdparserbench.py --playback /tmp/tas.json --files 9000
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+import argparse
+import sdconfig
+import sdbenchutils
+import sdsolrstub
+
+def get_maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KB on Linux
+
+def run_child(args):
+    """Parse one response and print the measures (runs in a dedicated process)."""
+    import sdapp
+    import sdtypes
+    import sdxml
+    import sdjson
+
+    parser=sdxml if args.format=='xml' else sdjson
+    metadata=sdtypes.Metadata(lowmem=args.lowmem)
+
+    rss_before=get_maxrss()
+    start=time.time()
+
+    if args.parser=='buffered':
+        with open(args.response,'r') as fh:
+            buf=fh.read()
+        di=parser.parse_metadata(buf)
+        metadata.add_files(di['files'])
+        count=len(di['files'])
+    else:
+        with open(args.response,'r') as fh:
+            di=parser.parse_metadata_stream(fh,metadata)
+        count=di['num_result']
+
+    elapsed=time.time()-start
+
+    assert metadata.count()==count
+
+    print json.dumps({'count':count,'elapsed':elapsed,'rss':get_maxrss()-rss_before})
+
+def run(args):
+    docs=[sdsolrstub.to_solr_doc(f) for f in sdsolrstub.get_files(args.playback,args.files)]
+
+    responses={'xml':'%s/response.xml'%args.folder,'json':'%s/response.json'%args.folder}
+    with open(responses['xml'],'w') as fh:
+        sdsolrstub.write_xml_response(fh,docs,len(docs))
+    with open(responses['json'],'w') as fh:
+        sdsolrstub.write_json_response(fh,docs,len(docs))
+    del docs
+
+    rows=[]
+    for format_ in ('xml','json'):
+        for parser in ('buffered','streaming'):
+            cmd=[sys.executable,os.path.abspath(__file__),'--child','--format',format_,'--parser',parser,'--response',responses[format_],'--folder',args.folder]
+            if args.lowmem:
+                cmd.append('--lowmem')
+            result=json.loads(subprocess.check_output(cmd).splitlines()[-1])
+
+            rows.append([format_,parser,'%.1f'%(os.path.getsize(responses[format_])/1e6),result['count'],'%.2f'%result['elapsed'],'%.0f'%(result['count']/result['elapsed']),'%.1f'%(result['rss']/1024.0)])
+
+    print "Files: %i, lowmem: %s"%(args.files,args.lowmem)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Format','Parser','Response size (MB)','Docs','Time (s)','Docs per second','Peak RSS increase (MB)'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=9000,help='Number of docs per response')
+    parser.add_argument('--playback',metavar='FILE',default=None,help='File recorded with --record option (synthetic files are used if not set)')
+    parser.add_argument('--lowmem',action='store_true',help='Store parsed files in a disk-based store')
+    parser.add_argument('--folder',default='%s/parserbench'%sdconfig.tmp_folder,help='Scratch folder')
+
+    # internal options
+    parser.add_argument('--child',action='store_true',help=argparse.SUPPRESS)
+    parser.add_argument('--format',choices=['xml','json'],help=argparse.SUPPRESS)
+    parser.add_argument('--parser',choices=['buffered','streaming'],help=argparse.SUPPRESS)
+    parser.add_argument('--response',help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    if args.child:
+        run_child(args)
+    else:
+        run(args)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains a local stand-in of the post-processing JSON-RPC server (used by benchmarks).
+
+Notes
+    - Only 'event' and 'test1' methods are implemented. Received events are
+      kept in memory, and events already received (same 'delivery_id') are
+      ignored, as in the post-processing module.
+    - Plain HTTP is used (no TLS). 'connect_latency' seconds are added when
+      a connection is accepted (to emulate the TLS handshake), and 'latency'
+      seconds are added to each request.
+    - HTTP/1.1 keep-alive and gzip-compressed requests are supported.
+      Accepted connections, requests and received bytes are counted.
+    - Delivery timeouts can be simulated: the response of every
+      'hang_every'-th 'event' call is delayed by 'hang' seconds (events are
+      stored before the delay, as when the server is slow to answer).
+
+Example
+    sdppstub.py --port 18270
+"""
+
+import sys
+import time
+import socket
+import argparse
+import threading
+import pyjsonrpc
+
+class PostProcessingStubHandler(pyjsonrpc.HttpRequestHandler):
+    protocol_version='HTTP/1.1' # keep-alive
+
+    def setup(self):
+        pyjsonrpc.HttpRequestHandler.setup(self)
+        self.server.incr('connections')
+
+        self.methods={'test1':self.test1,'event':self.event} # per-instance (pyjsonrpc default is a class attribute)
+
+        if self.server.connect_latency>0:
+            time.sleep(self.server.connect_latency)
+
+    def do_POST(self):
+        self.server.incr('requests')
+        self.server.incr('bytes',int(self.headers.get('Content-Length',0)))
+
+        if self.server.latency>0:
+            time.sleep(self.server.latency)
+
+        pyjsonrpc.HttpRequestHandler.do_POST(self)
+
+    def test1(self,a,b):
+        return {'t':[4,5,6],'sum':a+b}
+
+    def event(self,events):
+        server=self.server
+
+        with server.lock:
+            count=0
+            for e in events:
+                delivery_id=e.get('delivery_id')
+                if delivery_id is None or delivery_id not in server.delivery_ids:
+                    server.events.append(e)
+                    if delivery_id is not None:
+                        server.delivery_ids.add(delivery_id)
+                    count+=1
+
+            server.counters['event_calls']+=1
+            server.counters['duplicates']+=len(events)-count
+            hang=(server.hang_every>0 and server.counters['event_calls']%server.hang_every==0)
+
+        if hang:
+            time.sleep(server.hang)
+
+        return {"error_code":0,"received":len(events),"duplicates":len(events)-count}
+
+    def log_message(self,format,*args):
+        pass
+
+class PostProcessingStubServer(pyjsonrpc.ThreadingHttpServer):
+    daemon_threads=True
+
+    def __init__(self,port,latency=0,connect_latency=0,hang_every=0,hang=0):
+        pyjsonrpc.ThreadingHttpServer.__init__(self,('127.0.0.1',port),PostProcessingStubHandler)
+        self.latency=latency                 # seconds added to each request
+        self.connect_latency=connect_latency # seconds added to each new connection
+        self.hang_every=hang_every           # delay the response of every 'hang_every'-th 'event' call (0 means never)
+        self.hang=hang                       # seconds
+        self.lock=threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.events=[]
+            self.delivery_ids=set()
+            self.counters={'connections':0,'requests':0,'bytes':0,'event_calls':0,'duplicates':0}
+
+    def incr(self,name,value=1):
+        with self.lock:
+            self.counters[name]+=value
+
+    def handle_error(self,request,client_address):
+        if isinstance(sys.exc_info()[1],socket.error):
+            return # client went away (e.g. delivery timeout)
+
+        pyjsonrpc.ThreadingHttpServer.handle_error(self,request,client_address)
+
+    def get_url(self):
+        return 'http://127.0.0.1:%i/jsonrpc'%self.server_address[1]
+
+def start(port=0,latency=0,connect_latency=0,hang_every=0,hang=0):
+    """Start the stand-in in a background thread (port=0 means any free port)."""
+    server=PostProcessingStubServer(port,latency,connect_latency,hang_every,hang)
+
+    th=threading.Thread(target=server.serve_forever)
+    th.setDaemon(True)
+    th.start()
+
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port',type=int,default=18270)
+    parser.add_argument('--latency',type=float,default=0,help='Seconds added to each request')
+    parser.add_argument('--connect_latency',type=float,default=0,help='Seconds added to each new connection')
+    args = parser.parse_args()
+
+    server=PostProcessingStubServer(args.port,args.latency,args.connect_latency)
+    print "Serving on %s"%server.get_url()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print "%i event(s) received, %s"%(len(server.events),server.counters)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to benchmark parallel search-API queries (see 'sdproxy_mt' module).
+
+Notes
+    - Search-API proxies are replaced with fake ones (no index is contacted):
+      each query sleeps for its latency, then returns a few files (or fails,
+      depending on 'error_rate').
+    - Latencies are mixed: most queries are fast, some are slow.
+
+Example
+    sdproxymtbench.py --queries 200 --hosts 3 --error_rate 0.05
+"""
+
+import time
+import random
+import argparse
+import threading
+import urlparse
+import sdconfig
+import sdconst
+import sdbenchutils
+
+class FakeSearchAPIProxy():
+    def __init__(self,host,error_rate,counters):
+        self.host=host
+        self.error_rate=error_rate
+        self.counters=counters
+        self.lock=threading.Lock()
+
+    def run(self,url=None,attached_parameters=None):
+        import sdtypes
+        from sdexception import SDException
+
+        params=urlparse.parse_qs(urlparse.urlparse(url).query)
+        query_id=int(params['query_id'][0])
+        latency=float(params['latency'][0])
+
+        with self.lock:
+            self.counters['calls']+=1
+
+        time.sleep(latency)
+
+        if random.random()<self.error_rate:
+            with self.lock:
+                self.counters['errors']+=1
+            raise SDException("SDPRMTBE-001","Simulated search-API error (host=%s)"%self.host)
+
+        files=[{'file_functional_id':'query%i.file%i'%(query_id,i),'data_node':self.host,'size':1} for i in range(10)]
+
+        return sdtypes.Metadata(files=files)
+
+def get_latencies(count):
+    """Mixed latencies (80% fast, 15% medium, 5% slow)."""
+    latencies=[]
+    for i in range(count):
+        r=random.random()
+        if r<0.80:
+            latencies.append(random.uniform(0.1,0.5))
+        elif r<0.95:
+            latencies.append(random.uniform(1,3))
+        else:
+            latencies.append(random.uniform(5,10))
+    return latencies
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdproxy_mt
+
+    random.seed(args.seed)
+
+    hosts=['index%i.example.org'%i for i in range(args.hosts)]
+    sdproxy_mt.set_index_hosts(hosts)
+
+    counters={'calls':0,'errors':0}
+    for host in hosts:
+        sdproxy_mt.searchAPIServices[host]['iSearchAPIProxy']=FakeSearchAPIProxy(host,args.error_rate,counters)
+
+    latencies=get_latencies(args.queries)
+    queries=[{'url':'http://%s/esg-search/search?type=File&query_id=%i&latency=%f'%(sdconst.IDXHOSTMARK,i,latency)} for i,latency in enumerate(latencies)]
+
+    start=time.time()
+    metadata=sdproxy_mt.run(queries)
+    wall_time=time.time()-start
+
+    slots=args.hosts*sdproxy_mt.max_thread_per_host
+    ideal_time=max(sum(latencies)/slots,max(latencies))
+
+    rows=[]
+    rows.append(['Queries',args.queries])
+    rows.append(['Hosts',args.hosts])
+    rows.append(['Threads per host',sdproxy_mt.max_thread_per_host])
+    rows.append(['Simulated error rate',args.error_rate])
+    rows.append(['Sum of latencies (s)','%.1f'%sum(latencies)])
+    rows.append(['Ideal wall time (s)','%.1f'%ideal_time])
+    rows.append(['Wall time (s)','%.1f'%wall_time])
+    rows.append(['Search-API calls',counters['calls']])
+    rows.append(['Search-API errors',counters['errors']])
+    rows.append(['Files',metadata.count()])
+
+    sdbenchutils.print_report("Parallel search-API queries benchmark",rows)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries',type=int,default=200)
+    parser.add_argument('--hosts',type=int,default=3)
+    parser.add_argument('--error_rate',type=float,default=0.0,help='Probability for a query to fail')
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--folder',default='%s/proxymtbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare url failover with stored replicas and with search-API calls.
+
+Notes
+    - Synthetic files (each available on several data nodes) go through the
+      protocol and shrink steps of the file pipeline, then are enqueued, so
+      replica urls are stored as in 'synda install'.
+    - Failed transfers are then switched to another url with
+      sdnexturl.run(), first without stored replicas (one search-API call
+      per failure, as before), then with stored replicas.
+    - The search-API is emulated by a local stand-in (see 'sdsolrstub'
+      module), with the given latency. Only the request is sent to the
+      stand-in: the returned urls are the ones of the synthetic files.
+    - Last, one background refresh pass is run (with 'replica_max_age' set
+      to 0, so all stored replicas are stale).
+
+Example
+    sdreplicabench.py --files 5000 --replicas 3 --failures 500 --latency 0.2
+"""
+
+import time
+import copy
+import urllib2
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+import sdsolrstub
+
+def generate_replicas(args):
+    """Returns file dicts (one per replica)."""
+    files=[]
+    for f in sdbenchutils.generate_file_dicts(args.files,1):
+        for r in range(args.replicas):
+            replica=copy.deepcopy(f)
+            replica['type']=sdconst.SA_TYPE_FILE
+            replica['attached_parameters']={}
+            replica['data_node']='esgf-node%i.example.org'%r
+            replica['url_http']=f['url'].replace('esgf-node0.example.org',replica['data_node'])
+            replica['url_gridftp']=replica['url_http'].replace('http://','gsiftp://').replace('/thredds/fileServer','')
+            replica['url_opendap']=replica['url_http'].replace('fileServer','dodsC')
+            del replica['url']
+            files.append(replica)
+
+    return files
+
+def discover_and_enqueue(args):
+    import sddb
+    import sdtypes
+    import sdprotocol
+    import sdshrink
+    import sdenqueue
+    import sdfiledao
+
+    files=generate_replicas(args)
+
+    start=time.time()
+
+    files=sdprotocol.run(files)
+    metadata=sdtypes.Metadata(files=files)
+    metadata=sdshrink.run(metadata)
+
+    for chunk in metadata.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+        sdenqueue.add_files(chunk)
+    sdfiledao.update_highest_waiting_priority(sdenqueue._inserted_priorities)
+    sddb.conn.commit()
+
+    duration=time.time()-start
+
+    c=sddb.conn.cursor()
+    c.execute("select count(1) from file")
+    file_count=c.fetchone()[0]
+    c.execute("select count(1) from file_replica")
+    replica_count=c.fetchone()[0]
+    c.close()
+
+    return (file_count,replica_count,duration)
+
+def run_failovers(mode,server,args):
+    import sddb
+    import sdnexturl
+    import sdfiledao
+    import sdcounter
+    import sdreplicadao
+
+    def get_urls(file_functional_id):
+        """Search-API call (the stand-in only adds the network cost)."""
+        urllib2.urlopen('%s&limit=4&instance_id=%s'%(server.get_url(),file_functional_id)).read()
+        return sdnexturl.prioritize_urlps(stored[file_functional_id])
+
+    transfers=sdfiledao.get_files(limit=args.failures,status=sdconst.TRANSFER_STATUS_WAITING)
+    stored=dict((tr.file_functional_id,sdreplicadao.get_replicas(tr.file_functional_id)) for tr in transfers)
+
+    if mode=='search-API':
+        for tr in transfers:
+            sdreplicadao.delete_replicas(tr.file_functional_id,commit=False)
+    sddb.conn.execute("delete from failed_url")
+    sddb.conn.commit()
+
+    sdnexturl.get_urls=get_urls
+    sdcounter.reset()
+    server.counters.update({'connections':0,'requests':0,'errors':0})
+
+    switched=0
+    start=time.time()
+    for tr in transfers:
+        old_url=tr.url
+        if sdnexturl.run(tr) and tr.url!=old_url:
+            switched+=1
+    duration=time.time()-start
+
+    return [mode,len(transfers),switched,'%.2f'%duration,'%.1f'%(duration/len(transfers)*1000),server.counters['requests'],sdcounter.get('nexturl.cache'),sdcounter.get('nexturl.remote')]
+
+def run_refresh(server,args):
+    """Refresh all stored replicas (as if they were older than 'replica_max_age')."""
+    import sdnexturl
+    import sdcounter
+
+    sdnexturl.replica_max_age=0
+    sdnexturl.refresh_batch_size=args.failures
+
+    time.sleep(1) # so that refresh dates are in the past
+
+    sdcounter.reset()
+    server.counters.update({'connections':0,'requests':0,'errors':0})
+
+    start=time.time()
+    sdnexturl.refresh_stale_replicas()
+    duration=time.time()-start
+
+    return (sdcounter.get('nexturl.refresh'),server.counters['requests'],duration)
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+
+    sdconfig.next_url_on_error=True
+
+    (file_count,replica_count,enqueue_duration)=discover_and_enqueue(args)
+
+    server=sdsolrstub.start([],latency=args.latency)
+
+    rows=[]
+    rows.append(run_failovers('search-API',server,args))
+    rows.append(run_failovers('stored replicas',server,args))
+    (refreshed,refresh_requests,refresh_duration)=run_refresh(server,args)
+
+    server.shutdown()
+    server.server_close()
+
+    print "Files: %i, replicas per file: %i, search-API latency: %.2fs"%(args.files,args.replicas,args.latency)
+    print "Enqueued: %i files, %i replica urls stored (%.2fs)"%(file_count,replica_count,enqueue_duration)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Failover source','Failures','Url switched','Wall time (s)','Per failure (ms)','Search-API requests','nexturl.cache','nexturl.remote'])
+    print ""
+    print "Background refresh: %i file(s) refreshed, %i search-API request(s) (%.2fs)"%(refreshed,refresh_requests,refresh_duration)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=5000)
+    parser.add_argument('--replicas',type=int,default=3,help='Number of data nodes serving each file')
+    parser.add_argument('--failures',type=int,default=500)
+    parser.add_argument('--latency',type=float,default=0.2,help='Seconds added to each search-API request')
+    parser.add_argument('--folder',default='%s/replicabench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
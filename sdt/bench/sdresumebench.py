@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare interrupted transfer handling (resume vs restart).
+
+Notes
+    - Files are downloaded with the native client from a local HTTPS stand-in
+      data node which cuts a part of the responses (see 'sddatanodestub'
+      module). Failed transfers are retried until they succeed.
+    - In 'resume' mode, the stub supports range requests. In 'restart' mode,
+      it ignores them (so each attempt downloads the whole file again).
+    - Downloaded files are checked against the expected content (md5
+      computed while writing, including when the transfer is resumed).
+
+Example
+    sdresumebench.py --files 20 --size 50000000 --drop_rate 0.5
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+import sddatanodestub
+
+def run_mode(mode,args):
+    import sdget_native
+    import sdcounter
+    import sdutils
+
+    server=sddatanodestub.start(sdconfig.esgf_x509_proxy,orp=False,accept_ranges=(mode=='resume'),drop_rate=args.drop_rate)
+
+    dest_folder='%s/data/%s'%(args.folder,mode)
+    if os.path.isdir(dest_folder):
+        shutil.rmtree(dest_folder)
+
+    sdget_native.reset()
+    sdcounter.reset()
+
+    attempts=0
+    corrupted=0
+
+    start=time.time()
+
+    for i in range(args.files):
+        name='file%i.nc'%i
+        local_path='%s/%s'%(dest_folder,name)
+
+        status=None
+        while status!=0:
+            assert attempts<args.files*args.max_attempt,"Too many attempts"
+
+            attempts+=1
+            (status,error_msg,local_checksum)=sdget_native.download_file(server.get_url(name,args.size),local_path,checksum_type=sdconst.CHECKSUM_TYPE_MD5)
+
+        expected_checksum=hashlib.md5(sddatanodestub.get_content(name,args.size)).hexdigest()
+        if local_checksum!=expected_checksum or sdutils.compute_checksum(local_path,sdconst.CHECKSUM_TYPE_MD5)!=expected_checksum:
+            corrupted+=1
+
+    wall_time=time.time()-start
+
+    server.shutdown()
+    server.server_close()
+    sdget_native.reset()
+
+    return [mode,'%.2f'%wall_time,attempts,'%.1f'%(server.counters['bytes_sent']/1e6),'%.1f'%(sdcounter.get('download.resumed_bytes')/1e6),sdcounter.get('download.resumed'),corrupted]
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdget_native
+
+    # the stub certificate is used as ESGF credential
+    sdconfig.esgf_x509_proxy=sddatanodestub.create_credential('%s/.esg'%args.folder)
+
+    rows=[]
+    for mode in ('restart','resume'):
+        rows.append(run_mode(mode,args))
+
+    print "Files: %i, file size: %i, drop rate: %.2f"%(args.files,args.size,args.drop_rate)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Mode','Wall time (s)','Attempts','MB sent by server','MB not downloaded again','Resumed transfers','Corrupted files'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=20)
+    parser.add_argument('--size',type=int,default=50000000,help='File size (bytes)')
+    parser.add_argument('--drop_rate',type=float,default=0.5,help='Probability for a response to be cut')
+    parser.add_argument('--max_attempt',type=int,default=50,help='Max number of attempts per file (on average)')
+    parser.add_argument('--folder',default='%s/resumebench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
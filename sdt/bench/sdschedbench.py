@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to benchmark the transfer scheduler.
+
+Notes
+    - Transfers are simulated (fake_download mode), so no data node is contacted.
+    - This script uses a scratch database (see 'sdbenchutils' module).
+
+Example
+    sdschedbench.py --files 2000 --datanodes 10 --parallel 32 --mode event
+"""
+
+import os
+import time
+import threading
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+
+def watch(db_file,scheduler):
+    """Stop the scheduler when all files have been processed."""
+    while sdbenchutils.get_remaining_count(db_file)>0:
+        time.sleep(0.2)
+
+    scheduler.quit=1
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdbenchutils
+    conn=sdbenchutils.install_counting_connection()
+    import sdcounter
+    import sdfiledao
+    import sdtask
+    import sdtaskscheduler
+
+    sdconfig.download=True
+    sdconfig.fake_download=True
+    sdconfig.fake_download_duration=args.duration
+
+    sdtask.max_transfer=args.parallel
+    sdtask.max_datanode_count=args.parallel
+    sdtask.scheduler_mode=args.mode
+
+    sdbenchutils.populate_waiting_files(conn,args.files,args.datanodes)
+
+    if sdconst.GET_FILES_CACHING:
+        sdfiledao.highest_waiting_priority(True,True) # initializes cache of max priorities
+
+    with open(sdconfig.daemon_pid_file,'w') as fh:
+        fh.write(str(os.getpid()))
+
+    watcher=threading.Thread(target=watch,args=(sdconfig.db_file,sdtaskscheduler))
+    watcher.setDaemon(True)
+
+    if args.mode==sdconst.SCHEDULER_MODE_EVENT:
+        sdtask.load_running_count()
+
+    statement_count_before=conn.get_statement_count()
+    start=time.time()
+
+    watcher.start()
+    sdtaskscheduler.main_loop()
+
+    wall_time=time.time()-start
+    statement_count=conn.get_statement_count()-statement_count_before
+
+    os.remove(sdconfig.daemon_pid_file)
+
+    latency=sdcounter.get_observation('scheduler.eot_latency')
+    batch_size=sdcounter.get_observation('scheduler.eot_batch_size')
+
+    rows=[]
+    rows.append(['Scheduler mode',args.mode])
+    rows.append(['Files',args.files])
+    rows.append(['Data nodes',args.datanodes])
+    rows.append(['Parallel transfers',args.parallel])
+    rows.append(['Simulated transfer duration (s)',args.duration])
+    rows.append(['Wall time (s)','%.2f'%wall_time])
+    rows.append(['Throughput (files/s)','%.1f'%(args.files/wall_time)])
+    if latency is not None:
+        rows.append(['End of transfer latency avg (s)','%.4f'%latency['avg']])
+        rows.append(['End of transfer latency max (s)','%.4f'%latency['max']])
+    if batch_size is not None:
+        rows.append(['End of transfer batch size avg','%.1f'%batch_size['avg']])
+    rows.append(['DB statements',statement_count])
+    rows.append(['DB statements per second','%.1f'%(statement_count/wall_time)])
+    rows.append(['DB statements per file','%.1f'%(statement_count/float(args.files))])
+
+    sdbenchutils.print_report("Scheduler benchmark",rows)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=1000)
+    parser.add_argument('--datanodes',type=int,default=5)
+    parser.add_argument('--parallel',type=int,default=8)
+    parser.add_argument('--duration',type=float,default=0.0,help='Simulated transfer duration (in seconds)')
+    parser.add_argument('--mode',choices=sdconst.SCHEDULER_MODES,default=sdconst.SCHEDULER_MODE_EVENT)
+    parser.add_argument('--folder',default='%s/schedbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
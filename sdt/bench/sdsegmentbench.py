@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to compare segmented transfers with different segment counts.
+
+Notes
+    - Files are downloaded with the native client from a local HTTPS stand-in
+      data node whose per-response bandwidth is capped (to emulate a single
+      TCP stream over a high latency link, see 'sddatanodestub' module).
+    - Transfers run through sdget.download(), as the daemon does, and the
+      checksum is then verified as in 'sddmdefault' module.
+    - Segment count 1 means single stream transfer.
+
+Example
+    sdsegmentbench.py --files 2 --size 200000000 --rate_limit 20000000 --segments 1,2,4,8
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import argparse
+import sdconfig
+import sdconst
+import sdbenchutils
+import sddatanodestub
+
+def run_segment_count(segment_count,server,args):
+    import sdget
+    import sdutils
+    import sdcounter
+
+    dest_folder='%s/data/%i'%(args.folder,segment_count)
+    if os.path.isdir(dest_folder):
+        shutil.rmtree(dest_folder)
+
+    sdcounter.reset()
+    server.reset_counters()
+
+    failed=0
+    corrupted=0
+
+    start=time.time()
+
+    for i in range(args.files):
+        name='file%i.nc'%i
+        local_path='%s/%s'%(dest_folder,name)
+
+        (status,killed,error_msg,local_checksum)=sdget.download(server.get_url(name,args.size),local_path,http_client=sdconst.HTTP_CLIENT_NATIVE,checksum_type=sdconst.CHECKSUM_TYPE_MD5,segment_count=segment_count)
+        if status!=0:
+            failed+=1
+            continue
+
+        if local_checksum is None:
+            local_checksum=sdutils.compute_checksum(local_path,sdconst.CHECKSUM_TYPE_MD5)
+
+        if local_checksum!=hashlib.md5(sddatanodestub.get_content(name,args.size)).hexdigest():
+            corrupted+=1
+
+    wall_time=time.time()-start
+
+    o=sdcounter.get_observation('download.segment_throughput')
+    if o is None:
+        segment_throughput='-'
+    else:
+        segment_throughput='%.1f / %.1f / %.1f'%(o['min'],o['avg'],o['max'])
+
+    return [segment_count,'%.2f'%wall_time,'%.1f'%(args.files*args.size/wall_time/1e6),segment_throughput,sdcounter.get('download.segment_retries'),server.counters['connections'],failed,corrupted]
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdget
+    import sdget_native
+
+    # the stub certificate is used as ESGF credential
+    sdconfig.esgf_x509_proxy=sddatanodestub.create_credential('%s/.esg'%args.folder)
+
+    server=sddatanodestub.start(sdconfig.esgf_x509_proxy,latency=args.latency,drop_rate=args.drop_rate,rate_limit=args.rate_limit)
+
+    rows=[]
+    for segment_count in [int(n) for n in args.segments.split(',')]:
+        sdget_native.reset()
+        rows.append(run_segment_count(segment_count,server,args))
+
+    server.shutdown()
+    server.server_close()
+    sdget_native.reset()
+
+    print "Files: %i, file size: %i, rate limit per stream: %i, latency: %.2f, drop rate: %.2f"%(args.files,args.size,args.rate_limit,args.latency,args.drop_rate)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Segments','Wall time (s)','MB per second','Segment MB/s (min / avg / max)','Segment retries','TCP connections','Failed','Corrupted files'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=2)
+    parser.add_argument('--size',type=int,default=200000000,help='File size (bytes)')
+    parser.add_argument('--segments',default='1,2,4,8',help='Comma separated list of segment counts')
+    parser.add_argument('--rate_limit',type=int,default=20000000,help='Max bytes per second per stream')
+    parser.add_argument('--latency',type=float,default=0.1,help='Seconds added to each file request')
+    parser.add_argument('--drop_rate',type=float,default=0,help='Probability for a response to be cut')
+    parser.add_argument('--folder',default='%s/segmentbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains a local stand-in for the search-API (used by benchmarks).
+
+Notes
+    - Responses are rebuilt from a file recorded with 'synda search --record FILE'
+      (or from synthetic files), so no ESGF index is contacted.
+    - 'offset' and 'limit' parameters are honoured, so paginated calls can be
+      tested. Other search parameters are ignored.
+    - Both XML and JSON output formats are supported ('format' parameter).
+    - HTTP/1.1 keep-alive and gzip encoding are supported. Accepted
+      connections and requests are counted.
+    - Network latency and errors can be simulated ('latency' and 'error_rate').
+
+Example
+    sdsolrstub.py --playback /tmp/tas.json --port 8080
+    curl 'http://localhost:8080/esg-search/search?limit=10&offset=0'
+"""
+
+import time
+import json
+import gzip
+import random
+import urlparse
+import argparse
+import threading
+import StringIO
+import BaseHTTPServer
+import SocketServer
+from xml.sax.saxutils import escape,quoteattr
+import sdconst
+import sdbenchutils
+
+class SolrStubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version='HTTP/1.1' # keep-alive
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.incr('connections')
+
+    def do_GET(self):
+        self.server.incr('requests')
+
+        if self.server.latency>0:
+            time.sleep(self.server.latency)
+
+        if random.random()<self.server.error_rate:
+            self.server.incr('errors')
+            self.send_error(500)
+            return
+
+        params=urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        offset=int(params.get('offset',['0'])[0])
+        limit=int(params.get('limit',[str(sdconst.SEARCH_API_CHUNKSIZE)])[0])
+        json_=('json' in params.get('format',['application/solr+xml'])[0])
+
+        docs=self.server.docs[offset:offset+limit]
+
+        fh=StringIO.StringIO()
+        if json_:
+            write_json_response(fh,docs,len(self.server.docs))
+        else:
+            write_xml_response(fh,docs,len(self.server.docs))
+        body=fh.getvalue()
+
+        self.send_response(200)
+        if self.server.gzip and 'gzip' in self.headers.get('Accept-Encoding',''):
+            body=compress(body)
+            self.send_header('Content-Encoding','gzip')
+        self.send_header('Content-Type','application/json' if json_ else 'text/xml')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,format,*args):
+        pass
+
+class SolrStubServer(SocketServer.ThreadingMixIn,BaseHTTPServer.HTTPServer):
+    daemon_threads=True
+
+    def __init__(self,port,docs,gzip=False,latency=0,error_rate=0):
+        BaseHTTPServer.HTTPServer.__init__(self,('127.0.0.1',port),SolrStubHandler)
+        self.docs=docs
+        self.gzip=gzip
+        self.latency=latency       # seconds added to each request
+        self.error_rate=error_rate # probability for a request to fail (HTTP 500)
+        self.counters={'connections':0,'requests':0,'errors':0}
+        self.lock=threading.Lock()
+
+    def incr(self,name):
+        with self.lock:
+            self.counters[name]+=1
+
+    def get_url(self):
+        return 'http://127.0.0.1:%i/esg-search/search?type=File'%self.server_address[1]
+
+def start(docs,port=0,gzip=False,latency=0,error_rate=0):
+    """Start the stub in a background thread (port=0 means any free port).
+
+    Returns
+        SolrStubServer object (use get_url() to retrieve the search-API url)
+    """
+    server=SolrStubServer(port,docs,gzip,latency,error_rate)
+
+    th=threading.Thread(target=server.serve_forever)
+    th.setDaemon(True)
+    th.start()
+
+    return server
+
+def compress(buf):
+    fh=StringIO.StringIO()
+    with gzip.GzipFile(fileobj=fh,mode='wb') as gz:
+        gz.write(buf)
+    return fh.getvalue()
+
+def get_files(playback,count):
+    """Returns 'count' files, from a recorded file if 'playback' is set, else synthetic files."""
+    if playback is not None:
+        with open(playback,'r') as fh:
+            recorded=json.load(fh)
+
+        assert len(recorded)>0
+        return [recorded[i%len(recorded)] for i in range(count)]
+    else:
+        files=sdbenchutils.generate_file_dicts(count,5)
+        for f in files:
+            f['url_http']=f.pop('url')
+            f['variable']=[f['variable']]
+            f['description']=[u'Near-Surface Air Temperature']
+            f['replica']=False
+            f['latest']=True
+        return files
+
+def to_solr_doc(f):
+    """Returns search-API doc (i.e. reverts parser transformations)."""
+    doc={}
+
+    urls=[]
+    for (key,protocol) in (('url_http','HTTPServer'),('url_gridftp','GridFTP'),('url_opendap','OPENDAP'),('url_globus','Globus')):
+        if f.get(key) is not None:
+            urls.append('%s|application/netcdf|%s'%(f[key],protocol))
+    if len(urls)>0:
+        doc['url']=urls
+
+    for k,v in f.iteritems():
+        if k.startswith('url') or k=='attached_parameters' or v is None or isinstance(v,dict):
+            continue
+        doc[k]=v
+
+    return doc
+
+def to_xml_value(k,v):
+    if isinstance(v,list):
+        return '<arr name=%s>%s</arr>'%(quoteattr(k),''.join('<str>%s</str>'%escape(unicode(i)) for i in v))
+    elif isinstance(v,bool):
+        return '<bool name=%s>%s</bool>'%(quoteattr(k),'true' if v else 'false')
+    elif isinstance(v,(int,long)):
+        return '<long name=%s>%i</long>'%(quoteattr(k),v)
+    else:
+        return '<str name=%s>%s</str>'%(quoteattr(k),escape(unicode(v)))
+
+def write_xml_response(fh,docs,num_found):
+    fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<response>\n')
+    fh.write('<lst name="responseHeader"><int name="status">0</int><int name="QTime">1</int></lst>\n')
+    fh.write('<result name="response" numFound="%i" start="0">\n'%num_found)
+    for doc in docs:
+        fh.write(('<doc>%s</doc>\n'%''.join(to_xml_value(k,v) for k,v in doc.iteritems())).encode('utf-8'))
+    fh.write('</result>\n')
+    fh.write('<lst name="facet_counts"><lst name="facet_queries"/><lst name="facet_fields"/></lst>\n')
+    fh.write('</response>\n')
+
+def write_json_response(fh,docs,num_found):
+    json.dump({'responseHeader':{'status':0,'QTime':1},
+               'response':{'numFound':num_found,'start':0,'docs':docs},
+               'facet_counts':{'facet_queries':{},'facet_fields':{}}},fh)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=50000,help='Number of docs served')
+    parser.add_argument('--playback',metavar='FILE',default=None,help='File recorded with --record option (synthetic files are used if not set)')
+    parser.add_argument('--port',type=int,default=8080)
+    parser.add_argument('--gzip',action='store_true')
+    parser.add_argument('--latency',type=float,default=0,help='Seconds added to each request')
+    parser.add_argument('--error_rate',type=float,default=0,help='Probability for a request to fail')
+    args = parser.parse_args()
+
+    docs=[to_solr_doc(f) for f in get_files(args.playback,args.files)]
+
+    server=SolrStubServer(args.port,docs,args.gzip,args.latency,args.error_rate)
+    print "Serving %i docs on %s"%(len(docs),server.get_url())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print server.counters
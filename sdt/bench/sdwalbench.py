@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to measure database contention between the transfer daemon and concurrent readers (e.g. 'synda list').
+
+Notes
+    - A fake-download workload runs in the main process during 'duration'
+      seconds: waiting files are set to 'running' by batch, then to 'done'
+      one by one (one transaction each, as the daemon does), at most 'rate'
+      transfers per second.
+    - Meanwhile, 'readers' processes run a 'synda list'-like query (all
+      files with their dataset, sorted) in a loop.
+    - 'rollback journal' mode replays the previous setup (default
+      settings, 12000s writer timeout, 120s reader timeout). 'wal' mode
+      uses the 'sddb' module connection settings, with read-only reader
+      connections and a WAL checkpoint every 'checkpoint_interval' seconds.
+    - Readers pause 'pause' seconds between two listings. With no pause at
+      all, there is always an active reader, so the WAL file is never
+      truncated (it keeps growing until readers stop).
+
+Example
+    sdwalbench.py --files 100000 --readers 2 --duration 10
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import argparse
+import multiprocessing
+import sdconfig
+import sdconst
+import sdbenchutils
+
+list_query="select f.file_functional_id,f.status,f.size,d.dataset_functional_id from file f join dataset d on f.dataset_id=d.dataset_id order by f.file_functional_id"
+
+def get_percentile(values,percent):
+    if len(values)==0:
+        return 0
+
+    values=sorted(values)
+    return values[min(len(values)-1,int(len(values)*percent/100.0))]
+
+def open_connection(mode,timeout,read_only=False):
+    import sddb
+
+    if mode=='wal':
+        return sddb.open_connection(timeout,read_only=read_only)
+    else:
+        return sqlite3.connect(sdconfig.db_file,timeout) # previous setup
+
+def reader(mode,duration,pause,result_queue):
+    conn=open_connection(mode,120,read_only=True)
+
+    latencies=[]
+    errors=0
+    stop=time.time()+duration
+    while time.time()<stop:
+        start=time.time()
+        try:
+            c=conn.cursor()
+            c.execute(list_query)
+            c.fetchall()
+            c.close()
+            latencies.append(time.time()-start)
+        except sqlite3.OperationalError,e:
+            errors+=1
+
+        time.sleep(pause)
+
+    conn.close()
+
+    result_queue.put((latencies,errors))
+
+def writer(conn,mode,args):
+    """Fake-download workload.
+
+    Returns
+        (transfer count,transaction latencies,errors,max WAL size,checkpoints)
+    """
+    import sddb
+
+    latencies=[]
+    errors=0
+    transfer_count=0
+    max_wal_size=0
+    checkpoints=[0,0] # total,complete
+    last_checkpoint=time.time()
+
+    stop=time.time()+args.duration
+    while time.time()<stop:
+
+        # transfers_begin
+        start=time.time()
+        try:
+            c=conn.cursor()
+            c.execute("select file_id from file where status=? limit ?",(sdconst.TRANSFER_STATUS_WAITING,args.batch))
+            file_ids=[rs[0] for rs in c.fetchall()]
+            c.executemany("update file set status=?,start_date=? where file_id=?",[(sdconst.TRANSFER_STATUS_RUNNING,time.strftime("%Y-%m-%d %H:%M:%S"),file_id) for file_id in file_ids])
+            conn.commit()
+            c.close()
+            latencies.append(time.time()-start)
+        except sqlite3.OperationalError,e:
+            conn.rollback()
+            errors+=1
+            continue
+
+        if len(file_ids)==0:
+            break
+
+        # transfers_end
+        for file_id in file_ids:
+            if args.rate>0:
+                time.sleep(1.0/args.rate)
+
+            start=time.time()
+            try:
+                conn.execute("update file set status=?,end_date=?,error_msg=? where file_id=?",(sdconst.TRANSFER_STATUS_DONE,time.strftime("%Y-%m-%d %H:%M:%S"),'',file_id))
+                conn.commit()
+                latencies.append(time.time()-start)
+                transfer_count+=1
+            except sqlite3.OperationalError,e:
+                conn.rollback()
+                errors+=1
+
+        if mode=='wal':
+            wal_file="%s-wal"%sdconfig.db_file
+            if os.path.isfile(wal_file):
+                max_wal_size=max(max_wal_size,os.path.getsize(wal_file))
+
+            if time.time()-last_checkpoint>=args.checkpoint_interval:
+                last_checkpoint=time.time()
+                checkpoints[0]+=1
+                if sddb.checkpoint()==0:
+                    checkpoints[1]+=1
+
+    return (transfer_count,latencies,errors,max_wal_size,checkpoints)
+
+def run_mode(mode,template_db_file,args):
+    import sddb
+
+    sdconfig.db_file="%s/sdt_%s.db"%(args.folder,mode.replace(' ','_'))
+    for suffix in ('','-wal','-shm'):
+        if os.path.isfile(sdconfig.db_file+suffix):
+            os.remove(sdconfig.db_file+suffix)
+    shutil.copy(template_db_file,sdconfig.db_file)
+
+    conn=open_connection(mode,12000)
+    if mode=='wal':
+        sddb.conn=conn # sddb.checkpoint() uses the module connection
+
+    result_queue=multiprocessing.Queue()
+    readers=[multiprocessing.Process(target=reader,args=(mode,args.duration,args.pause,result_queue)) for i in range(args.readers)]
+    for p in readers:
+        p.start()
+
+    start=time.time()
+    (transfer_count,latencies,errors,max_wal_size,checkpoints)=writer(conn,mode,args)
+    duration=time.time()-start
+
+    reader_latencies=[]
+    reader_errors=0
+    for p in readers:
+        (li,count)=result_queue.get()
+        reader_latencies.extend(li)
+        reader_errors+=count
+    for p in readers:
+        p.join()
+
+    conn.close()
+
+    return [mode,
+            '%.0f'%(transfer_count/duration),
+            '%.1f'%(get_percentile(latencies,50)*1000),
+            '%.1f'%(get_percentile(latencies,99)*1000),
+            '%.0f'%(max(latencies)*1000),
+            errors,
+            len(reader_latencies),
+            '%.0f'%(get_percentile(reader_latencies,50)*1000),
+            reader_errors,
+            '%.1f'%(max_wal_size/1024.0/1024) if mode=='wal' else '-',
+            '%i/%i'%(checkpoints[1],checkpoints[0]) if mode=='wal' else '-']
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sddb
+
+    sdbenchutils.populate_waiting_files(sddb.conn,args.files,10)
+
+    # template database (rollback journal, so it can be copied)
+    sddb.set_journal_mode(sddb.conn,'delete')
+    sddb.conn.close()
+    template_db_file=sdconfig.db_file
+
+    rows=[]
+    for mode in ('rollback journal','wal'):
+        rows.append(run_mode(mode,template_db_file,args))
+
+    sddb.conn=None
+
+    print "Files: %i, readers: %i, duration: %is"%(args.files,args.readers,args.duration)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Mode','Transfers/s','Writer p50 (ms)','Writer p99 (ms)','Writer max (ms)','Writer errors','Listings','Listing p50 (ms)','Listing errors','Max WAL (MB)','Complete checkpoints'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files',type=int,default=100000)
+    parser.add_argument('--readers',type=int,default=2,help='Number of concurrent reader processes')
+    parser.add_argument('--duration',type=int,default=10,help='Seconds per mode')
+    parser.add_argument('--rate',type=int,default=200,help='Max number of transfers per second (0 means no limit)')
+    parser.add_argument('--pause',type=float,default=0.2,help='Seconds between two listings of a reader')
+    parser.add_argument('--batch',type=int,default=8,help='Number of transfers started per scheduler iteration')
+    parser.add_argument('--checkpoint_interval',type=int,default=2,help='Seconds')
+    parser.add_argument('--folder',default='%s/walbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
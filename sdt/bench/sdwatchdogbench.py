@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module is used to check watchdog stall and throughput detection.
+
+Notes
+    - Slow transfers are emulated with a local HTTPS stand-in data node whose
+      per-response bandwidth is capped (see 'sddatanodestub' module). A
+      stalled transfer is emulated with a near zero bandwidth.
+    - Transfers run through sdget.download() (wget and native clients), with
+      the watchdog thread running, as in the daemon.
+    - The cost of one watchdog pass is also compared with a scan of all
+      processes of the host (as done by the previous watchdog).
+
+Example
+    sdwatchdogbench.py --min_throughput 200000 --window 5 --stall_timeout 5
+"""
+
+import os
+import time
+import shutil
+import argparse
+import threading
+import sdconfig
+import sdconst
+import sdbenchutils
+import sddatanodestub
+
+def run_transfer(client,name,server,args):
+    import sdget
+    import sdwatchdog
+
+    local_path='%s/data/%s/%s'%(args.folder,client,name)
+    if os.path.isdir(os.path.dirname(local_path)):
+        shutil.rmtree(os.path.dirname(local_path))
+
+    watch=sdwatchdog.register(name,local_path)
+
+    start=time.time()
+    try:
+        (status,killed,error_msg,local_checksum)=sdget.download(server.get_url(name,args.size),local_path,http_client=client,watch=watch)
+    finally:
+        sdwatchdog.unregister(watch)
+    duration=time.time()-start
+
+    return [client,server.rate_limit,status,killed,'%.1f'%duration,watch.kill_reason]
+
+def scan_all_processes():
+    """Previous watchdog scan (all host processes are inspected)."""
+    import psutil
+
+    count=0
+    for pid in psutil.pids():
+        try:
+            p=psutil.Process(pid)
+            if len(p.cmdline())>0 and p.cmdline()[0]=='wget':
+                count+=1
+        except Exception,e:
+            pass
+
+    return count
+
+def run_scan_cost(args):
+    import sdwatchdog
+
+    start=time.time()
+    scan_all_processes()
+    scan_duration=time.time()-start
+
+    watches=[sdwatchdog.register('scan%i'%i,'/nonexistent/scan%i'%i) for i in range(args.registered)]
+    start=time.time()
+    sdwatchdog.check_transfers(time.time())
+    check_duration=time.time()-start
+    for w in watches:
+        sdwatchdog.unregister(w)
+
+    return (scan_duration,check_duration)
+
+def run(args):
+    # must be here (scratch database must be set before database connection is opened)
+    import sdapp
+    import sdget
+    import sdwatchdog
+    import sdcounter
+
+    # the stub certificate is used as ESGF credential
+    sdconfig.security_dir_mode=sdconst.SECURITY_DIR_TMP
+    sdconfig.tmp_folder=args.folder
+    sdconfig.esgf_x509_proxy=sddatanodestub.create_credential(sdconfig.get_security_dir())
+
+    sdwatchdog.check_interval=1
+    sdwatchdog.stall_timeout=args.stall_timeout
+    sdwatchdog.min_throughput=args.min_throughput
+    sdwatchdog.window=args.window
+
+    th=sdwatchdog.FrozenDownloadCheckerThread()
+    th.setDaemon(True)
+    th.start()
+
+    rows=[]
+    for rate_limit in (args.min_throughput*4,args.min_throughput/4,1):
+        server=sddatanodestub.start(sdconfig.esgf_x509_proxy,rate_limit=rate_limit)
+
+        for client in (sdconst.HTTP_CLIENT_WGET,sdconst.HTTP_CLIENT_NATIVE):
+            rows.append(run_transfer(client,'rate%i.nc'%rate_limit,server,args))
+
+        server.shutdown()
+        server.server_close()
+
+    sdwatchdog.quit=1
+
+    (scan_duration,check_duration)=run_scan_cost(args)
+
+    print "File size: %i, min throughput: %i, window: %i, stall timeout: %i"%(args.size,args.min_throughput,args.window,args.stall_timeout)
+    print ""
+    print sdbenchutils.tabulate(rows,headers=['Client','Server rate (B/s)','Status','Killed','Duration (s)','Kill reason'])
+    print ""
+    print "Killed counters: stalled=%i, slow=%i"%(sdcounter.get('watchdog.killed.stalled'),sdcounter.get('watchdog.killed.slow'))
+    print "Host process scan: %.3fs, registry check (%i transfers): %.3fs"%(scan_duration,args.registered,check_duration)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size',type=int,default=4000000,help='File size (bytes)')
+    parser.add_argument('--min_throughput',type=int,default=200000,help='Bytes per second')
+    parser.add_argument('--window',type=int,default=5,help='Seconds')
+    parser.add_argument('--stall_timeout',type=int,default=5,help='Seconds')
+    parser.add_argument('--registered',type=int,default=100,help='Number of registered transfers when measuring check cost')
+    parser.add_argument('--folder',default='%s/watchdogbench'%sdconfig.tmp_folder,help='Scratch folder')
+    args = parser.parse_args()
+
+    sdbenchutils.use_scratch_folder(args.folder)
+
+    run(args)
@@ -36,6 +36,7 @@ def create_configuration_file_sample(path):
     config.add_section('daemon')
     config.set('daemon', 'user', '')
     config.set('daemon', 'group', '')
+    config.set('daemon', 'scheduler_mode', 'polling')
 
     config.add_section('module')
     config.set('module', 'download', 'true')
@@ -54,6 +55,12 @@ def create_configuration_file_sample(path):
     config.set('core', 'data_path', '')
     config.set('core', 'db_path', '')
     config.set('core', 'sandbox_path', '')
+    config.set('core', 'db_journal_mode', 'wal')
+    config.set('core', 'db_synchronous', 'normal')
+    config.set('core', 'db_cache_size', '-20000')
+    config.set('core', 'db_mmap_size', '268435456')
+    config.set('core', 'db_temp_store', 'memory')
+    config.set('core', 'db_checkpoint_interval', '300')
 
     config.add_section('interface')
     config.set('interface', 'unicode_term', '0')
@@ -72,6 +79,7 @@ def create_configuration_file_sample(path):
     config.add_section('index')
     config.set('index', 'indexes', 'esgf-data.dkrz.de')
     config.set('index', 'default_index', 'esgf-data.dkrz.de')
+    config.set('index', 'parallel_pagination', '1')
 
     config.add_section('locale')
     config.set('locale', 'country', '')
@@ -82,7 +90,18 @@ def create_configuration_file_sample(path):
     config.set('download', 'get_only_latest_version', 'true')
     config.set('download', 'hpss', '1')
     config.set('download', 'http_fallback', 'false')
+    config.set('download', 'replica_max_age', '168')
     config.set('download', 'gridftp_opt', '')
+    config.set('download', 'http_client', 'wget')
+    config.set('download', 'segmentation_threshold', '0')
+    config.set('download', 'max_segment_per_file', '4')
+    config.set('download', 'watchdog_stall_timeout', '600')
+    config.set('download', 'watchdog_min_throughput', '0')
+    config.set('download', 'watchdog_window', '600')
+    config.set('download', 'adaptive_concurrency', 'false')
+    config.set('download', 'launch_rate', '1')
+    config.set('download', 'launch_burst', '1')
+    config.set('download', 'launch_rate_per_datanode', '')
     config.set('download', 'incremental_mode_for_datasets', 'false')
     config.set('download', 'continue_on_cert_errors', 'false')
 
@@ -93,6 +112,8 @@ def create_configuration_file_sample(path):
     config.add_section('globustransfer')
     config.set('globustransfer', 'esgf_endpoints', '/esg/config/esgf_endpoints.xml')
     config.set('globustransfer', 'destination_endpoint', 'destination#endpoint')
+    config.set('globustransfer', 'max_files_per_task', '1000')
+    config.set('globustransfer', 'max_task_size', '0')
 
     with open(path, 'w') as fh:
         config.write(fh)
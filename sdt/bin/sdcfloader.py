@@ -37,6 +37,7 @@ default_options={'max_parallel_download':'8',
                  'get_only_latest_version':'true',
                  'user':'',
                  'group':'',
+                 'scheduler_mode':'polling',
                  'hpss':'0',
                  'download':'true',
                  'post_processing':'false',
@@ -44,6 +45,12 @@ default_options={'max_parallel_download':'8',
                  'data_path':'',
                  'sandbox_path':'',
                  'db_path':'',
+                 'db_journal_mode':'wal',
+                 'db_synchronous':'normal',
+                 'db_cache_size':'-20000',
+                 'db_mmap_size':'268435456',
+                 'db_temp_store':'memory',
+                 'db_checkpoint_interval':'300',
                  'default_path':'',
                  'selection_path':'',
                  'security_dir_mode':'tmpuid',
@@ -54,19 +61,33 @@ default_options={'max_parallel_download':'8',
                  'ignorecase':'true',
                  'default_listing_size':'small',
                  'http_fallback':'false',
+                 'replica_max_age':'168',
                  'gridftp_opt':'',
+                 'http_client':'wget',
+                 'segmentation_threshold':'0',
+                 'max_segment_per_file':'4',
+                 'watchdog_stall_timeout':'600',
+                 'watchdog_min_throughput':'0',
+                 'watchdog_window':'600',
+                 'adaptive_concurrency':'false',
+                 'launch_rate':'1',
+                 'launch_burst':'1',
+                 'launch_rate_per_datanode':'',
                  'check_parameter':'1',
                  'verbosity_level':'info',
                  'scheduler_profiling':'0',
                  'lfae_mode':'abort',
                  'indexes':'esgf-node.ipsl.fr,esgf-data.dkrz.de,esgf-index1.ceda.ac.uk',
                  'default_index':'esgf-node.ipsl.fr',
+                 'parallel_pagination':'1',
                  'nearest':'false',
                  'nearest_mode':'geolocation',
                  'openid':'https://esgf-node.ipsl.fr/esgf-idp/openid/foo',
                  'password':'foobar',
                  'incorrect_checksum_action':'remove',
                  'incremental_mode_for_datasets':'false',
+                 'max_files_per_task':'1000',
+                 'max_task_size':'0',
                  'continue_on_cert_errors':'false'}
 
 if __name__ == '__main__':
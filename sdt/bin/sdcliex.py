@@ -111,7 +111,8 @@ def list():
 
 def metric():
     buf="""  synda metric -g data_node -m rate -p CMIP5
-  synda metric -g project -m size"""
+  synda metric -g project -m size
+  synda metric -m concurrency"""
     return buf
 
 def open():
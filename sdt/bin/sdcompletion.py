@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains dataset and variable completion counters routines.
+
+Notes
+    - Counters are maintained by database triggers (see 'sddbobj' module), so
+      dataset and variable status can be computed without scanning the
+      dataset files.
+    - check() recomputes the counters from the 'file' table and reports
+      differences (drift). rebuild() recomputes the counters from scratch.
+"""
+
+import argparse
+import sdapp
+import sddb
+import sddbobj
+import sdlog
+
+def get_dataset_counters(dataset_id,conn=sddb.conn):
+    """Returns dict with 'total' and per status ('done', 'error', 'waiting', 'running') files count."""
+    c = conn.cursor()
+    c.execute(dataset_counters_query,(dataset_id,))
+    rs=c.fetchone()
+    c.close()
+
+    return to_dict(rs)
+
+def get_variable_counters(dataset_id,variable,conn=sddb.conn):
+    """Returns dict with 'total' and per status ('done', 'error', 'waiting', 'running') files count."""
+    c = conn.cursor()
+    c.execute(variable_counters_query,(dataset_id,variable or ''))
+    rs=c.fetchone()
+    c.close()
+
+    return to_dict(rs)
+
+def exists_one_complete_variable(dataset_id,conn=sddb.conn):
+    """Returns True if at least one variable of the dataset has all its files done."""
+    c = conn.cursor()
+    c.execute(complete_variable_query,(dataset_id,))
+    rs=c.fetchone()
+    c.close()
+
+    return rs is not None
+
+def to_dict(rs):
+    if rs is None:
+        return dict((column,0) for column in columns) # no file
+
+    return dict(zip(columns,rs))
+
+def get_counters(query,key_length,conn):
+    """Returns dict (key => counters tuple)."""
+    counters={}
+
+    c = conn.cursor()
+    c.execute(query)
+    for rs in c.fetchall():
+        rs=tuple(rs)
+        if rs[key_length]>0: # rows with no file left are ignored
+            counters[rs[:key_length]]=rs[key_length:]
+    c.close()
+
+    return counters
+
+def check(conn=sddb.conn):
+    """Compare counters with the 'file' table (the database is not modified).
+
+    Returns
+        list of (table,key,stored counters,expected counters) tuples (empty list if there is no drift)
+    """
+    drifts=[]
+    for (table,key) in tables:
+        stored=get_counters("select %s,%s from %s"%(key,','.join(columns),table),len(key.split(',')),conn)
+        expected=get_counters(sddbobj.get_counters_select(table),len(key.split(',')),conn)
+
+        for k in sorted(set(stored.keys()+expected.keys())):
+            if stored.get(k)!=expected.get(k):
+                drifts.append((table,k,stored.get(k),expected.get(k)))
+
+    if len(drifts)>0:
+        sdlog.warning("SDCOMPLE-002","Completion counters drift detected (%i row(s))"%len(drifts))
+
+    return drifts
+
+def rebuild(conn=sddb.conn):
+    """Recompute counters from scratch."""
+    sddbobj.rebuild_counters(conn)
+    conn.commit()
+
+    sdlog.info("SDCOMPLE-001","Completion counters rebuilt")
+
+# init.
+
+columns=['total']+sddbobj.counter_statuses
+tables=[('dataset_counter','dataset_id'),('variable_counter','dataset_id,variable')]
+
+# queries (also checked by 'sdqueryplan' module)
+dataset_counters_query="select %s from dataset_counter where dataset_id=?"%','.join(columns)
+variable_counters_query="select %s from variable_counter where dataset_id=? and variable=?"%','.join(columns)
+complete_variable_query="select 1 from variable_counter where dataset_id=? and total>0 and done=total limit 1"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action',choices=['check','rebuild'])
+    args = parser.parse_args()
+
+    if args.action=='check':
+        drifts=check()
+        for (table,key,stored,expected) in drifts:
+            print "%s %s: stored=%s, expected=%s (columns: %s)"%(table,key,stored,expected,','.join(columns))
+        print "%i drift(s) found"%len(drifts)
+    elif args.action=='rebuild':
+        rebuild()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the adaptive per-data-node concurrency controller (AIMD).
+
+Notes
+    - Each data node has a window (max number of parallel transfers), which is
+      used instead of 'max_parallel_download_per_datanode' when
+      'adaptive_concurrency' is true.
+    - Ended transfers are grouped in rounds (a round ends when 'window'
+      transfers have ended on the data node). At the end of a round, the
+      aggregate throughput of the round (bytes transferred / round duration)
+      is compared with the previous round's one: while it improves, the
+      window grows by one (additive increase). If an increase doesn't
+      improve throughput, it is reverted, and the window is kept for
+      'probe_interval' rounds before trying to increase it again (so the
+      window follows data node capacity changes).
+    - When a transfer fails with an error likely caused by data node load
+      (e.g. timeout), the window is divided by two (multiplicative decrease),
+      at most once per round.
+    - Windows are bounded by 1 and 'max_parallel_download', and are persisted
+      (so learned values survive restarts).
+    - Funcs are called from the scheduler thread only (not thread safe).
+"""
+
+import time
+import atexit
+import argparse
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdcounter
+import sddb
+import sdsqlitedict
+
+class DataNodeState():
+    def __init__(self,window,throughput):
+        self.window=window
+        self.throughput=throughput # aggregate throughput of the previous round (None after a decrease)
+        self.increased=False       # true if the window has been increased at the end of the previous round
+        self.hold_count=0          # number of rounds since the window has been reverted
+        self.round_start=None
+        self.round_bytes=0
+        self.round_count=0
+        self.decreased=False # true if the window has been decreased during the current round
+
+    def start_round(self,now):
+        self.round_start=now
+        self.round_bytes=0
+        self.round_count=0
+        self.decreased=False
+
+def get_window(data_node):
+    """Returns the max number of parallel transfers for a data node."""
+    return get_state(data_node).window
+
+def transfer_done(tr,now=None):
+    """Update the data node window with an ended transfer (done or error)."""
+    if now is None:
+        now=time.time()
+
+    st=get_state(tr.data_node)
+
+    if st.round_start is None:
+        # first transfer since startup: the round starts with this transfer
+        st.start_round(now-tr.duration if tr.duration is not None else now)
+
+    if is_congestion_error(tr):
+        sdcounter.incr('concurrency.congestion_error')
+
+        if not st.decreased:
+            set_window(tr.data_node,st,max(min_window,st.window/2))
+            sdcounter.incr('concurrency.decrease')
+            sdlog.info("SDCONCUR-001","Window decreased (data_node=%s,window=%d,sdget_status=%s)"%(tr.data_node,st.window,tr.sdget_status))
+
+            # throughput measured before the decrease is not significant anymore
+            st.start_round(now)
+            st.decreased=True
+            st.throughput=None
+            st.increased=False
+
+        return
+
+    st.round_count+=1
+    if tr.status==sdconst.TRANSFER_STATUS_DONE:
+        st.round_bytes+=int(tr.size)
+
+    if st.round_count>=st.window:
+        end_round(tr.data_node,st,now)
+
+def end_round(data_node,st,now):
+    elapsed=now-st.round_start
+
+    if elapsed>0:
+        throughput=st.round_bytes/elapsed
+
+        if st.decreased:
+            pass
+        elif st.throughput is None or throughput>st.throughput*(1+improvement_threshold):
+            increase(data_node,st,throughput)
+        elif st.increased:
+            # last increase didn't improve throughput
+
+            set_window(data_node,st,max(min_window,st.window-1))
+            st.increased=False
+            st.hold_count=0
+            throughput=st.throughput # keep the throughput measured with this window as reference
+        else:
+            st.hold_count+=1
+            if st.hold_count>=probe_interval:
+                increase(data_node,st,throughput)
+
+        st.throughput=throughput
+        _throughputs[data_node]=throughput
+
+    st.start_round(now)
+
+def increase(data_node,st,throughput):
+    st.increased=False
+    st.hold_count=0
+
+    if st.window<max_window:
+        set_window(data_node,st,st.window+1)
+        st.increased=True
+
+        sdcounter.incr('concurrency.increase')
+        sdlog.debug("SDCONCUR-002","Window increased (data_node=%s,window=%d,throughput=%.0f)"%(data_node,st.window,throughput))
+
+def set_window(data_node,st,window):
+    st.window=window
+    _windows[data_node]=window
+
+def is_congestion_error(tr):
+    """Returns True if the transfer failed because of an error likely caused by data node load."""
+    if tr.status!=sdconst.TRANSFER_STATUS_ERROR:
+        return False
+
+    if tr.sdget_status is None:
+        return False
+
+    return int(tr.sdget_status) in congestion_statuses
+
+def get_state(data_node):
+    if data_node not in _states:
+        window=min(max_window,max(min_window,_windows.get(data_node,initial_window)))
+        _states[data_node]=DataNodeState(window,_throughputs.get(data_node))
+        _windows[data_node]=window
+
+    return _states[data_node]
+
+def get_windows():
+    """Returns (data_node,window,throughput) tuples (throughput is the last round aggregate throughput in bytes per second, or None)."""
+    return [(data_node,window,_throughputs.get(data_node)) for (data_node,window) in sorted(_windows.iteritems())]
+
+def flush():
+    _windows.flush()
+    _throughputs.flush()
+
+# init.
+
+min_window=1
+max_window=sdconfig.config.getint('download','max_parallel_download')
+initial_window=sdconfig.config.getint('download','max_parallel_download_per_datanode') # used for data nodes without learned window
+improvement_threshold=0.05 # throughput must improve by at least 5% for the window to grow
+probe_interval=5           # number of rounds to wait before trying to increase the window again
+
+# 'sdget.sh' return codes which mean that the data node may be overloaded
+# (timeouts, connection errors, unexpected HTTP errors, read errors)
+congestion_statuses=(1,21,23,24,25,26,27,28)
+
+_states={} # data_node => DataNodeState
+
+# learned values (written to disk in batch)
+_windows=sdsqlitedict.WriteBehindDict(sdconfig.default_db_folder+"/caches.db",'concurrency_window',value_type=int,flush_interval=sdconst.MAXPRI_CACHE_FLUSH_INTERVAL,pragmas=sddb.get_pragmas())
+_throughputs=sdsqlitedict.WriteBehindDict(sdconfig.default_db_folder+"/caches.db",'concurrency_throughput',value_type=float,flush_interval=sdconst.MAXPRI_CACHE_FLUSH_INTERVAL,pragmas=sddb.get_pragmas())
+atexit.register(flush)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    args = parser.parse_args()
+
+    for (data_node,window,throughput) in get_windows():
+        print data_node,window,throughput
@@ -205,7 +205,6 @@ max_metadata_parallel_download_per_index=3
 sdtc_history_file=os.path.expanduser("~/.sdtc_history")
 
 metadata_parallel_download=False
-http_client='wget' # wget | urllib
 
 # note that variable below only set which low_level mecanism to use to find the nearest (i.e. it's not an on/off flag (the on/off flag is the 'nearest' selection file parameter))
 nearest_schedule='post' # pre | post
@@ -216,7 +215,10 @@ mono_host_retry=False
 proxymt_progress_stat=False
 poddlefix=True
 lowmem=True
+lowmem_storage=sdconst.STORAGE_BACKEND_COLUMNAR # disk-based metadata storage backend used when 'lowmem' is true (json | columnar)
 fix_encoding=False
+http_pool=True # if true, search-API calls use keep-alive connections (one pool per index host)
+streaming_parser=True # if true, search-API responses are parsed while being downloaded (lower memory footprint)
 twophasesearch=False # Beware before enabling this: must be well tested/reviewed as it seems to currently introduce regression.
 stop_download_if_error_occurs=False # If true, stop download if error occurs during download, if false, the download continue. Note that in the case of a certificate renewal error, the daemon always stops not matter if this false is true or false.
 
@@ -245,6 +247,7 @@ progress=config.getboolean('interface','progress')
 download=config.getboolean('module','download')
 metadata_server_type=config.get('core','metadata_server_type')
 url_max_buffer_size=config.get('download', 'url_max_buffer_size')
+http_client=config.get('download','http_client') # wget | native (urllib is only used for direct download)
 
 default_folder=get_path('default_path',default_folder_default_path)
 selection_folder=get_path('selection_path',default_selection_folder)
@@ -260,6 +263,14 @@ cleanup_tree_script="%s/sdcleanup_tree.sh"%bin_folder
 default_selection_file="%s/default.txt"%default_folder
 db_file="%s/sdt.db"%db_folder
 
+# database connection settings (see 'sddb' module)
+db_journal_mode=config.get('core','db_journal_mode')           # wal | delete
+db_synchronous=config.get('core','db_synchronous')             # off | normal | full
+db_cache_size=config.getint('core','db_cache_size')            # pages if positive, KiB if negative
+db_mmap_size=config.getint('core','db_mmap_size')              # bytes (0 disables memory-mapped I/O)
+db_temp_store=config.get('core','db_temp_store')               # default | file | memory
+db_checkpoint_interval=config.getint('core','db_checkpoint_interval') # seconds (0 disables scheduled checkpoints)
+
 #check_path(selection_folder)
 #check_path(data_folder)
 
@@ -290,6 +301,7 @@ show_advanced_options=False
 
 # when true, allow fast cycle for test (used for UAT)
 fake_download=False
+fake_download_duration=0 # simulated transfer duration in seconds (only used when 'fake_download' is true)
 
 copy_ds_attrs=False
 
@@ -47,6 +47,11 @@ TRANSFER_PROTOCOLS=[TRANSFER_PROTOCOL_HTTP,TRANSFER_PROTOCOL_GRIDFTP,TRANSFER_PR
 
 HTTP_CLIENT_URLLIB='urllib'
 HTTP_CLIENT_WGET='wget'
+HTTP_CLIENT_NATIVE='native'
+
+SCHEDULER_MODE_POLLING='polling' # the scheduler main loop wakes up every second
+SCHEDULER_MODE_EVENT='event'     # the scheduler main loop wakes up when a transfer ends or when new transfers are enqueued
+SCHEDULER_MODES=[SCHEDULER_MODE_POLLING,SCHEDULER_MODE_EVENT]
 
 TRANSFER_STATUS_NEW="new"
 TRANSFER_STATUS_WAITING="waiting"
@@ -143,8 +148,12 @@ METADATA_SERVER_TYPES=['esgf_search_api','thredds_catalog','apache_default_listi
 SEARCH_API_CHUNKSIZE=9000
 
 PROCESSING_CHUNKSIZE=5000 # as list maybe duplicated in memory at some point in the pipeline, we use a lower value here than SEARCH_API_CHUNKSIZE
+
 PROCESSING_FETCH_MODE_GENERATOR='generator'
 
+STORAGE_BACKEND_JSON='json'         # one JSON column
+STORAGE_BACKEND_COLUMNAR='columnar' # hot attributes in dedicated columns, other attributes in one binary column
+
 SEARCH_API_HTTP_TIMEOUT=300 # Search-API HTTP timeout (time to wait for HTTP response)
 DIRECT_DOWNLOAD_HTTP_TIMEOUT=30 # Direct download HTTP timeout (time to wait for HTTP response)
 ASYNC_DOWNLOAD_HTTP_TIMEOUT=360 # Async download HTTP timeout (time to wait for HTTP response)
@@ -213,6 +222,8 @@ DATASET_VERSION_FIELDS=['master_id','version','timestamp']+REQUIRED_FIELDS
 POST_PIPELINE_MODES=['file','dataset','generic',None]
 
 ADMIN_SUBCOMMANDS=['autoremove','install','open','pexec','remove','reset','retry','update','upgrade']
+READ_ONLY_SUBCOMMANDS=['history','list','metric','queue','stat','watch'] # these subcommands use a read-only database connection
+READ_ONLY_SUBCOMMANDS_USING_PARAMETERS=['list','metric'] # these subcommands load search-API parameters (see 'sdparam' module)
 
 # security_dir values
 SECURITY_DIR_TMP='tmp'
@@ -221,7 +232,8 @@ SECURITY_DIR_HOME='home'
 SECURITY_DIR_MIXED='mixed'
 
 #Synda release parameters
-SYNDA_VERSION = '3.10'
+SYNDA_VERSION = '3.12'
 
 # miscellaneous
 GET_FILES_CACHING = True   # change to False to disable caching logic in sdfiledao.get_files.
+MAXPRI_CACHE_FLUSH_INTERVAL = 60 # max priority cache is written to disk at most every N seconds (and at exit)
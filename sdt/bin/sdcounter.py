@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains in-process performance counters.
+
+Notes
+    - Counters are kept in memory only (they are reset when the process exits).
+    - Two kinds of counter exist
+        - simple counters, increased with incr()
+        - observations (e.g. latency), recorded with observe() (count, sum, min and max are kept)
+    - All funcs are thread safe.
+"""
+
+import threading
+import argparse
+import sdapp
+import sdlog
+
+def incr(name,value=1):
+    with _lock:
+        _counters[name]=_counters.get(name,0)+value
+
+def get(name,default=0):
+    with _lock:
+        return _counters.get(name,default)
+
+def observe(name,value):
+    with _lock:
+        if name in _observations:
+            o=_observations[name]
+            o['count']+=1
+            o['sum']+=value
+            o['min']=min(o['min'],value)
+            o['max']=max(o['max'],value)
+        else:
+            _observations[name]={'count':1,'sum':value,'min':value,'max':value}
+
+def get_observation(name):
+    """
+    Returns
+        dict with 'count', 'sum', 'min', 'max' and 'avg' keys (or None if nothing has been observed)
+    """
+    with _lock:
+        if name not in _observations:
+            return None
+
+        o=dict(_observations[name])
+
+    o['avg']=o['sum']/float(o['count'])
+
+    return o
+
+def ratio(numerator_name,denominator_names):
+    """Returns numerator/sum(denominators) (e.g. cache hit rate), or None if denominator is zero."""
+    with _lock:
+        numerator=_counters.get(numerator_name,0)
+        denominator=sum(_counters.get(n,0) for n in denominator_names)
+
+    if denominator==0:
+        return None
+    else:
+        return numerator/float(denominator)
+
+def snapshot():
+    """Returns a copy of all counters and observations."""
+    with _lock:
+        counters=dict(_counters)
+        observations=dict((k,dict(v)) for k,v in _observations.iteritems())
+
+    return (counters,observations)
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _observations.clear()
+
+def log_counters(prefix=None):
+    """Write counters in the log file (only counters starting with 'prefix' if set)."""
+    (counters,observations)=snapshot()
+
+    for k in sorted(counters.keys()):
+        if prefix is None or k.startswith(prefix):
+            sdlog.info("SDCOUNTE-001","%s=%s"%(k,counters[k]))
+
+    for k in sorted(observations.keys()):
+        if prefix is None or k.startswith(prefix):
+            o=observations[k]
+            sdlog.info("SDCOUNTE-002","%s (count=%i,avg=%.6f,min=%.6f,max=%.6f)"%(k,o['count'],o['sum']/o['count'],o['min'],o['max']))
+
+# init.
+
+_lock=threading.Lock()
+_counters={}
+_observations={}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    args = parser.parse_args()
+
+    incr('test.foo')
+    observe('test.bar',0.5)
+    observe('test.bar',1.5)
+    print snapshot()
@@ -19,9 +19,33 @@ import sdsqlutils
 from sdtypes import Dataset
 
 def add_dataset(dataset,commit=True,conn=sddb.conn):
-    keys_to_insert=['local_path','path','path_without_version','dataset_functional_id','template','version','status','latest','crea_date','last_mod_date','project','model', 'timestamp']
     return sdsqlutils.insert(dataset,keys_to_insert,commit,conn)
 
+def add_datasets(datasets,commit=True,conn=sddb.conn):
+    """Insert many datasets in one statement (dataset_id is not set)."""
+    return sdsqlutils.insert_many(datasets,keys_to_insert,commit,conn)
+
+def update_datasets(datasets,commit=True,conn=sddb.conn,keys=['status','last_mod_date']):
+    return sdsqlutils.update_many(datasets,keys,commit,conn)
+
+def get_datasets_by_functional_id(dataset_functional_ids,conn=sddb.conn):
+    """
+    Returns
+        dict (dataset_functional_id => Dataset) (datasets not found are missing)
+    """
+    datasets={}
+
+    c = conn.cursor()
+    for chunk in sdsqlutils.split(list(dataset_functional_ids),500):
+        q="select * from dataset where dataset_functional_id in (%s)"%','.join(['?']*len(chunk))
+        c.execute(q,chunk)
+        for rs in c.fetchall():
+            d=sdsqlutils.get_object_from_resultset(rs,Dataset)
+            datasets[d.dataset_functional_id]=d
+    c.close()
+
+    return datasets
+
 def get_dataset_(not_found_raise_exception=False,**search_constraints):
     datasets=get_datasets(**search_constraints)
 
@@ -52,15 +76,14 @@ def get_dataset(path=None,dataset_id=None,dataset_functional_id=None,conn=sddb.c
         raise SDException("SYNCDDAO-123","Too much arguments (path=%s,dataset_id=%s,dataset_functional_id=%s)"%(path,dataset_id,dataset_functional_id,))
 
     if path is not None:
-        q="select * from dataset where path = '%s'" % path
+        c.execute(dataset_by_path_query,(path,))
     elif dataset_id is not None:
-        q="select * from dataset where dataset_id = %i" % dataset_id
+        c.execute(dataset_by_id_query,(dataset_id,))
     elif dataset_functional_id is not None:
-        q="select * from dataset where dataset_functional_id = '%s'" % dataset_functional_id
+        c.execute(dataset_by_functional_id_query,(dataset_functional_id,))
     else:
         raise SDException("SYNCDDAO-124","incorrect arguments")
 
-    c.execute(q)
     rs=c.fetchone()
     if rs is not None:
         d=sdsqlutils.get_object_from_resultset(rs,Dataset)
@@ -124,6 +147,15 @@ def get_datasets(limit=None,conn=sddb.conn,**search_constraints): # don't change
 
     return datasets
 
+# init.
+
+keys_to_insert=['local_path','path','path_without_version','dataset_functional_id','template','version','status','latest','crea_date','last_mod_date','project','model', 'timestamp']
+
+# queries (also checked by 'sdqueryplan' module)
+dataset_by_path_query="select * from dataset where path=?"
+dataset_by_id_query="select * from dataset where dataset_id=?"
+dataset_by_functional_id_query="select * from dataset where dataset_functional_id=?"
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('dataset')
@@ -12,11 +12,12 @@
 """Contains local dataset flags refresh routines."""
 
 import argparse
+import itertools
 import sdapp
 import sddb
 import sddao
+import sddbobj
 import sddatasetdao
-import sdfilequery
 import sddatasetquery
 import sdconst
 import sddatasetutils
@@ -24,8 +25,9 @@ import sdutils
 import sdtime
 import sdlog
 import sdvariable
-import sdmodifyquery
+import sdcompletion
 from sdprogress import SDProgressDot
+from sddatasetversion import DatasetVersions
 from sdexception import SDException
 
 def switch_off_latest_flag_for_all_other_versions(latest_dataset_version,dataset_versions):
@@ -48,10 +50,11 @@ def switch_off_latest_flag_for_all_other_versions(latest_dataset_version,dataset
                 l__d.latest=False
                 sddatasetdao.update_dataset(l__d,False,sddb.conn)
 
-def update_latest_flag(d,force_latest=False):
+def update_latest_flag(d,force_latest=False,commit=True):
     """
     Args:
         force_latest: If 'true', force 'latest' to 'true' no matter what the compute_latest_flag() method say)
+        commit: If 'false', the caller is responsible for committing the transaction
 
     Notes
      - warning: this method update the dataset in database (and in some cases, also all other different versions of this datasets)
@@ -75,7 +78,9 @@ def update_latest_flag(d,force_latest=False):
         pass
 
     sddatasetdao.update_dataset(d,False,sddb.conn) # MOD_B
-    sddb.conn.commit() # commit all datasets modifications together (MOD_A (if any) and MOD_B)
+
+    if commit:
+        sddb.conn.commit() # commit all datasets modifications together (MOD_A (if any) and MOD_B)
 
 def compute_latest_flag(dataset_versions,d):
     """
@@ -215,10 +220,11 @@ def compute_dataset_status(d):
     """This method compute the dataset transfer status."""
     l__status=None
 
-    # retrieve global infos
+    # retrieve global infos (from counters, see 'sdcompletion' module)
     #
-    total_files_count=sdfilequery.count_dataset_files(d,None)
-    total_done_files_count=sdfilequery.count_dataset_files(d,sdconst.TRANSFER_STATUS_DONE)
+    counters=sdcompletion.get_dataset_counters(d.dataset_id)
+    total_files_count=counters['total']
+    total_done_files_count=counters[sdconst.TRANSFER_STATUS_DONE]
 
 
     #########################
@@ -316,11 +322,117 @@ def reset_datasets_flags():
 
     sdlog.info("SYDDFLAG-933","recalculate status and latest flag for all dataset..",True)
 
-    sdmodifyquery.wipeout_datasets_flags() # we reset all flags before starting the main processing (we clean everything to start from scratch)
+    modified_datasets=recompute_datasets_flags(reset=True) # flags are computed from scratch (as if all flags were wiped out)
+
+    sdlog.info("SYDDFLAG-934","modified datasets: %i"%len(modified_datasets),True)
+
+def recompute_datasets_flags(reset=False,dry_run=False,conn=sddb.conn):
+    """
+    Set status and latest flag for all datasets, using set-based queries.
+
+    Args:
+        reset: If 'true', current 'latest' flags are ignored (flags are computed from scratch)
+        dry_run: If 'true', the database is not modified
+
+    Returns
+        Modified datasets (with 'old_status' and 'old_latest' attributes)
+
+    Notes
+        - This func gives the same result as running update_datasets__status_and_latest()
+          until no modifications remain, but in one pass: status is computed
+          for all datasets with GROUP BY queries, then the 'latest' flag is
+          computed for each group of versions (i.e. datasets with the same
+          'path_without_version')
+        - In a group, complete versions are processed from the oldest to
+          the most recent (instead of dataset_id order), so the result
+          doesn't depend on the order in which versions were inserted
+        - All modifications are applied in one transaction
+        - If 'reset' is true, completion counters are rebuilt from the 'file'
+          table first (in the same transaction, so a dry run doesn't modify
+          them either), as counters may have drifted (e.g. after a database
+          restore or a manual SQL modification)
+    """
+    modified_datasets=[]
+    now=sdtime.now()
+
+    if reset:
+        sddbobj.rebuild_counters(conn)
+
+    datasets=sddatasetquery.get_datasets_with_computed_status(conn)
+
+    for path_without_version,versions in itertools.groupby(datasets,key=lambda d: d.path_without_version):
+
+        dataset_versions=DatasetVersions()
+        for d in versions:
+            d.old_status=d.status
+            d.old_latest=bool(d.latest)
+
+            d.status=d.computed_status
+            d.latest=False if reset else d.old_latest
+
+            dataset_versions.add_dataset_version(d)
+
+        compute_latest_flags(dataset_versions)
+
+        for d in dataset_versions.get_datasets():
+            if d.latest and not d.old_latest:
+                d.latest_date=now # "latest_date" is set when dataset "latest" flag switches from False to True
+
+            if d.status!=d.old_status or d.latest!=d.old_latest:
+                modified_datasets.append(d)
+
+    if not dry_run:
+        sddatasetdao.update_datasets(modified_datasets,commit=False,conn=conn,keys=['status','latest','latest_date'])
+        conn.commit()
+    elif reset:
+        conn.rollback() # rebuilt counters are discarded
+
+    sdlog.info("SYDDFLAG-631","modified datasets: %i"%len(modified_datasets))
+
+    return modified_datasets
+
+def compute_latest_flags(dataset_versions):
+    """
+    Set 'latest' flag for all versions of a dataset.
+
+    Note
+        Same rules as compute_latest_flag() (only complete dataset can be
+        promoted, 'latest' is never downgraded by the dataset itself, and a
+        version can only replace an older 'latest' version if it passes the
+        quality check), with 'variable_count' attribute used for the quality
+        check.
+    """
+    datasets=dataset_versions.get_datasets()
+
+    oldest_first=lambda a,b: 1 if dataset_versions.compare(a,b) else (-1 if dataset_versions.compare(b,a) else 0)
+
+    latest_datasets=sorted([d for d in datasets if d.latest],cmp=oldest_first)
+    complete_datasets=sorted([d for d in datasets if d.status==sdconst.DATASET_STATUS_COMPLETE],cmp=oldest_first)
+
+    current_latest=latest_datasets[-1] if len(latest_datasets)>0 else None
+
+    for d in complete_datasets:
+
+        if current_latest is None:
+            # we set latest if no other have the latest flag
+
+            current_latest=d
+        elif not dataset_versions.compare(d,current_latest):
+            # we never downgrade a "latest"
+
+            continue
+        elif d.variable_count < (current_latest.variable_count * 0.5): # if variable number drops
+            sdlog.info("SYDDFLAG-741","'latest' flag not set for '%s'. you can set it manually with './start.sh -L %s'"%(d.dataset_functional_id,d.dataset_functional_id))
+        else:
+            current_latest=d
+
+    if current_latest is not None and len(complete_datasets)>0:
+        for d in datasets:
+            d.latest=(d is current_latest)
 
-    count=update_datasets__status_and_latest()
-    while count>0:
-        count=update_datasets__status_and_latest()
+def print_flags_report(modified_datasets):
+    for d in modified_datasets:
+        print "%s: status %s => %s, latest %s => %s"%(d.dataset_functional_id,d.old_status,d.status,d.old_latest,d.latest)
 
 def update_datasets__status_and_latest():
     """
@@ -421,7 +533,9 @@ def update_datasets_status():
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('action',choices=['update_incomplete_datasets_status','update_complete_datasets_status','update_datasets_status'])
+    parser.add_argument('action',choices=['update_incomplete_datasets_status','update_complete_datasets_status','update_datasets_status','recompute_datasets_flags'])
+    parser.add_argument('-n','--dry_run',action='store_true')
+    parser.add_argument('-r','--reset',action='store_true',help="Ignore current 'latest' flags (recompute_datasets_flags action only)")
     args = parser.parse_args()
 
     if args.action=='update_incomplete_datasets_status':
@@ -430,5 +544,7 @@ if __name__ == '__main__':
         update_complete_datasets_status()
     elif args.action=='update_datasets_status':
         update_datasets_status()
+    elif args.action=='recompute_datasets_flags':
+        print_flags_report(recompute_datasets_flags(reset=args.reset,dry_run=args.dry_run))
     else:
         assert False
@@ -37,21 +37,21 @@ def get_dataset_stats(d):
     c = sddb.conn.cursor()
 
     # -- size by status -- #
-    c.execute("select status,sum(size) as size from file where dataset_id=? group by status",(d.dataset_id,))
+    c.execute(dataset_size_by_status_query,(d.dataset_id,))
     rs=c.fetchone()
     while rs is not None:
         stat['size'][rs['status']]=rs['size']
         rs=c.fetchone()
 
     # -- count by status -- #
-    c.execute("select status,count(1) as count from file where dataset_id=? group by status",(d.dataset_id,))
+    c.execute(dataset_count_by_status_query,(d.dataset_id,))
     rs=c.fetchone()
     while rs is not None:
         stat['count'][rs['status']]=rs['count']
         rs=c.fetchone()
 
     # -- how many variable, regardless of the file status -- #
-    c.execute("select count(distinct variable) from file where dataset_id=?",(d.dataset_id,))
+    c.execute(dataset_variable_count_query,(d.dataset_id,))
     rs=c.fetchone()
     count=rs[0]
     stat['variable_count']=count
@@ -63,7 +63,7 @@ def get_dataset_versions(i__d,i__compute_stats):
     datasetVersions=DatasetVersions()
 
     c = sddb.conn.cursor()
-    c.execute("select * from dataset where path_without_version=?",(i__d.path_without_version,))
+    c.execute(dataset_versions_query,(i__d.path_without_version,))
     rs=c.fetchone()
     while rs!=None:
 
@@ -77,6 +77,50 @@ def get_dataset_versions(i__d,i__compute_stats):
 
     return datasetVersions
 
+def get_datasets_with_computed_status(conn=sddb.conn):
+    """Returns all datasets, grouped by 'path_without_version', with status computed from the file counters.
+
+    Notes
+        - status is computed with the same rules as sddatasetflag.compute_dataset_status(),
+          but for all datasets at once, from the 'dataset_counter' and
+          'variable_counter' tables (see 'sdcompletion' module), so the 'file'
+          table is not read
+        - 'variable_count' is the number of variables which have at least one file
+        - returned Dataset objects only contain the columns needed to compute flags,
+          plus 'computed_status' and 'variable_count' attributes
+    """
+    datasets=[]
+
+    q="""select d.dataset_id, d.dataset_functional_id, d.path_without_version, d.version, d.timestamp, d.status, d.latest, d.latest_date,
+           case
+             when ifnull(dc.done,0)=0 then '%(empty)s'
+             when dc.total=dc.done then '%(complete)s'
+             when exists (select 1 from variable_counter vc where vc.dataset_id=d.dataset_id and vc.total>0 and vc.done=vc.total) then '%(in_progress)s'
+             else '%(empty)s'
+           end as computed_status,
+           (select count(1) from variable_counter vc where vc.dataset_id=d.dataset_id and vc.total>0) as variable_count
+         from dataset d
+         left join dataset_counter dc on dc.dataset_id=d.dataset_id
+         order by d.path_without_version, d.dataset_id"""%{'empty':sdconst.DATASET_STATUS_EMPTY,
+                                                          'complete':sdconst.DATASET_STATUS_COMPLETE,
+                                                          'in_progress':sdconst.DATASET_STATUS_IN_PROGRESS}
+
+    c = conn.cursor()
+    c.execute(q)
+    for rs in c.fetchall():
+        datasets.append(sdsqlutils.get_object_from_resultset(rs,Dataset))
+    c.close()
+
+    return datasets
+
+# init.
+
+# queries (also checked by 'sdqueryplan' module)
+dataset_size_by_status_query="select status,sum(size) as size from file where dataset_id=? group by status"
+dataset_count_by_status_query="select status,count(1) as count from file where dataset_id=? group by status"
+dataset_variable_count_query="select count(distinct variable) from file where dataset_id=?"
+dataset_versions_query="select * from dataset where path_without_version=?"
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     args = parser.parse_args()
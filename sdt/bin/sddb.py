@@ -9,7 +9,22 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This script contains database I/O routines."""
+"""This script contains database I/O routines.
+
+Notes
+    - All writes go through the module connection ('conn').
+    - Connection settings (journal mode, synchronous, cache size, mmap size
+      and temporary storage) are set from the 'core' section of the
+      configuration file. In WAL journal mode, readers don't block the
+      writer (and vice versa), so a long 'synda list' doesn't stall the
+      transfer daemon.
+    - Read-only subcommands switch the module connection to read-only (see
+      set_read_only()), and other readers can open their own read-only
+      connection (see open_connection()).
+    - WAL journal mode requires shared memory, so it must not be used if
+      the database is on a network filesystem (set 'db_journal_mode' to
+      'delete' in this case).
+"""
 
 import os
 import argparse
@@ -61,12 +76,106 @@ def connect():
     #  (If you want autocommit mode, then set isolation_level to None)
 
     # open connection
-    conn=sqlite3.connect(sdconfig.db_file,timeout)
-    conn.row_factory=sqlite3.Row # this is for "by name" colums indexing
+    conn=open_connection(timeout)
 
     # create DB object
     sddbobj.create_tables(conn)
     sddbobj.create_indexes(conn)
+    sddbobj.create_triggers(conn)
+
+def open_connection(timeout,read_only=False):
+    """Returns a new connection to the database.
+
+    Note
+        a read-only connection never takes the write lock (in WAL journal
+        mode, it neither blocks nor waits for the writer).
+    """
+    conn=sqlite3.connect(sdconfig.db_file,timeout)
+    conn.row_factory=sqlite3.Row # this is for "by name" colums indexing
+
+    set_pragmas(conn,get_pragmas())
+
+    if read_only:
+        conn.execute("pragma query_only=1")
+
+    return conn
+
+def get_pragmas():
+    """Returns connection settings as a list of (pragma,value)."""
+    return [('journal_mode',sdconfig.db_journal_mode),
+            ('synchronous',sdconfig.db_synchronous),
+            ('cache_size',sdconfig.db_cache_size),
+            ('mmap_size',sdconfig.db_mmap_size),
+            ('temp_store',sdconfig.db_temp_store)]
+
+def set_pragmas(conn,pragmas):
+    for (name,value) in pragmas:
+        if name=='journal_mode':
+            set_journal_mode(conn,value)
+        else:
+            conn.execute("pragma %s=%s"%(name,value))
+
+def set_journal_mode(conn,journal_mode):
+    """Journal mode is persistent (i.e. stored in the database file), so it is only modified if needed.
+
+    Note
+        switching journal mode requires that no other connection uses the
+        database. If it fails, the current mode is kept (it will be switched
+        the next time the database is opened).
+    """
+    current_journal_mode=get_journal_mode(conn)
+
+    if current_journal_mode!=journal_mode.lower():
+        try:
+            conn.execute("pragma journal_mode=%s"%journal_mode)
+        except sqlite3.OperationalError,e:
+            sdlog.info("SDDATABA-005","Cannot switch journal mode from %s to %s (%s)"%(current_journal_mode,journal_mode,str(e)))
+
+def get_journal_mode(conn):
+    c=conn.cursor()
+    c.execute("pragma journal_mode")
+    journal_mode=c.fetchone()[0]
+    c.close()
+
+    return journal_mode.lower()
+
+def set_read_only():
+    """Prevent any modification using the module connection (used by read-only subcommands)."""
+    conn.execute("pragma query_only=1")
+
+def checkpoint(timeout=1000):
+    """Copy WAL file content into the database file, then truncate the WAL file.
+
+    Notes
+        - The checkpoint waits for active readers (at most 'timeout'
+          milliseconds), as pages used by readers can't be overwritten. If
+          readers are still active after that, pages not used by readers are
+          copied, and the WAL file is truncated by a later checkpoint.
+        - Writers (including other processes) are blocked during the wait.
+        - This func must only be called outside a transaction.
+
+    Returns
+        number of pages remaining in the WAL file
+    """
+    if get_journal_mode(conn)!='wal':
+        return 0
+
+    c=conn.cursor()
+
+    c.execute("pragma busy_timeout")
+    busy_timeout=c.fetchone()[0]
+
+    c.execute("pragma busy_timeout=%i"%timeout)
+    try:
+        c.execute("pragma wal_checkpoint(TRUNCATE)")
+        (busy,log_count,checkpointed_count)=c.fetchone()
+    finally:
+        c.execute("pragma busy_timeout=%i"%busy_timeout)
+        c.close()
+
+    sdlog.debug("SDDATABA-006","WAL checkpoint (busy=%i,wal_pages=%i,checkpointed_pages=%i)"%(busy,log_count,checkpointed_count))
+
+    return log_count-checkpointed_count
 
 def disconnect():
     global conn
@@ -86,14 +195,32 @@ def disconnect():
     #   http://www.mail-archive.com/sqlite-users@mailinglists.sqlite.org/msg59080.html
     #   https://code.djangoproject.com/ticket/19292
     #
-    if os.path.exists(sdconfig.db_file):
-        if not sdtools.is_group_writable(sdconfig.db_file):
-            if sdtools.set_file_permission(sdconfig.db_file):
-                sdlog.info("SDDATABA-003","File permissions have been modified ('%s')"%sdconfig.db_file)
-            else:
-                # we come here when user have not enough priviledge to set file permission
-
-                sdlog.info("SDDATABA-004","Missing privilege to modify file permissions ('%s')"%sdconfig.db_file)
+    # in WAL journal mode, readers also need write access to the '-shm' file
+    #
+    for f in (sdconfig.db_file,"%s-wal"%sdconfig.db_file,"%s-shm"%sdconfig.db_file):
+        if os.path.exists(f):
+            if not sdtools.is_group_writable(f):
+                if sdtools.set_file_permission(f):
+                    sdlog.info("SDDATABA-003","File permissions have been modified ('%s')"%f)
+                else:
+                    # we come here when user have not enough priviledge to set file permission
+
+                    sdlog.info("SDDATABA-004","Missing privilege to modify file permissions ('%s')"%f)
+
+def get_data_version():
+    """Returns a value which changes each time another connection (e.g. another process) commits changes in the database.
+
+    Notes
+        - This is a cheap call (no table is read).
+        - As python sqlite3 module commits any pending transaction before a
+          PRAGMA statement, this func must only be called outside a transaction.
+    """
+    c=conn.cursor()
+    c.execute("pragma data_version")
+    version=c.fetchone()[0]
+    c.close()
+
+    return version
 
 def is_connected():
     if (conn==None):
@@ -11,6 +11,8 @@
 
 """This script contains database objects."""
 
+import sdconst
+
 
 def create_tables(conn):
     """
@@ -36,6 +38,14 @@ def create_tables(conn):
             - timestamp column contains is the ESGF timestamp attribute (aka "last update")
         - 'generic_cache' table
             - 'realm' column is a group of keys/values (e.g. rtt, geo, etc..)
+        - 'dataset_counter' and 'variable_counter' tables
+            - contain the number of files of each dataset (and of each variable of each dataset), in total and by status
+            - are maintained by triggers on the 'file' table (see create_triggers()), so they are updated in the same transaction as the files
+            - 'variable' column contains an empty string for files without variable
+            - are rebuilt from the 'file' table when created (see 'sdcompletion' module to check them)
+        - 'file_replica' table
+            - contains the urls of all replicas of not yet transferred files (see 'sdreplicadao' module)
+            - 'protocol' column contains the search-API url field name (e.g. url_http, url_gridftp)
         - 'history' table
             - 'selection_file' column is not used (it was initially added in
               case 'selection_filename' column would not be sufficient for
@@ -64,14 +74,59 @@ def create_tables(conn):
 
     conn.execute("create table if not exists generic_cache (realm TEXT, name TEXT, value TEXT)")
 
+    conn.execute("create table if not exists failed_url (url_id INTEGER PRIMARY KEY, url TEXT, file_id INTEGER)")
+    conn.execute("create table if not exists file_replica (file_functional_id TEXT, url TEXT, protocol TEXT, refresh_date TEXT)")
+
+    counters_exist=table_exists(conn,'dataset_counter')
+    conn.execute("create table if not exists dataset_counter (dataset_id INTEGER PRIMARY KEY, total INT, done INT, error INT, waiting INT, running INT)")
+    conn.execute("create table if not exists variable_counter (dataset_id INT, variable TEXT, total INT, done INT, error INT, waiting INT, running INT)")
+    if not counters_exist:
+        rebuild_counters(conn) # existing files must be counted (e.g. database created with a previous version)
+
     conn.commit()
 
+def create_triggers(conn):
+    """Maintain 'dataset_counter' and 'variable_counter' tables when files are added, removed or when their status changes."""
+
+    conn.execute("create trigger if not exists trg_file_counter_1 after insert on file begin %s %s end"%(get_counters_insert('new'),get_counters_update('new','+')))
+    conn.execute("create trigger if not exists trg_file_counter_2 after delete on file begin %s end"%get_counters_update('old','-'))
+    conn.execute("create trigger if not exists trg_file_counter_3 after update of status,dataset_id,variable on file when old.status is not new.status or old.dataset_id is not new.dataset_id or old.variable is not new.variable begin %s %s %s end"%(get_counters_update('old','-'),get_counters_insert('new'),get_counters_update('new','+')))
+
+def get_counters_insert(row):
+    return ("insert or ignore into dataset_counter (dataset_id,total,done,error,waiting,running) values (%(row)s.dataset_id,0,0,0,0,0);"
+            "insert or ignore into variable_counter (dataset_id,variable,total,done,error,waiting,running) values (%(row)s.dataset_id,ifnull(%(row)s.variable,''),0,0,0,0,0);")%{'row':row}
+
+def get_counters_update(row,sign):
+    assignments=','.join(["total=total%s1"%sign]+["%s=%s%s(%s.status='%s')"%(status,status,sign,row,status) for status in counter_statuses])
+
+    return ("update dataset_counter set %(assignments)s where dataset_id=%(row)s.dataset_id;"
+            "update variable_counter set %(assignments)s where dataset_id=%(row)s.dataset_id and variable=ifnull(%(row)s.variable,'');")%{'assignments':assignments,'row':row}
+
+def rebuild_counters(conn):
+    """Recompute 'dataset_counter' and 'variable_counter' tables from the 'file' table."""
+    conn.execute("delete from dataset_counter")
+    conn.execute("delete from variable_counter")
+    conn.execute("insert into dataset_counter (dataset_id,total,done,error,waiting,running) %s"%get_counters_select('dataset_counter'))
+    conn.execute("insert into variable_counter (dataset_id,variable,total,done,error,waiting,running) %s"%get_counters_select('variable_counter'))
+
+def get_counters_select(table):
+    """Returns the query which computes counters from the 'file' table."""
+    key="dataset_id,ifnull(variable,'')" if table=='variable_counter' else "dataset_id"
+    columns="count(1),%s"%','.join(["sum(status='%s')"%status for status in counter_statuses])
+
+    return "select %s,%s from file group by %s"%(key,columns,key)
+
+def table_exists(conn,name):
+    c = conn.cursor()
+    c.execute("select count(1) from sqlite_master where type='table' and name=?",(name,))
+    count=c.fetchone()[0]
+    c.close()
+
+    return count>0
+
 def create_indexes(conn):
-    conn.execute("create        index if not exists idx_file_1 on file (status)")
-    conn.execute("create        index if not exists idx_file_2 on file (priority)")
     conn.execute("create        index if not exists idx_file_3 on file (crea_date)")
     conn.execute("create unique index if not exists idx_file_4 on file (file_functional_id)")
-    conn.execute("create        index if not exists idx_file_5 on file (dataset_id)")
     conn.execute("create        index if not exists idx_file_6 on file (tracking_id)") # not uniq (when fetching two different versions of the same dataset, many identical file are duplicated, resulting in tracking_id duplicates)
     conn.execute("create        index if not exists idx_file_7 on file (checksum)")    # not uniq (when fetching two different versions of the same dataset, many identical file are duplicated, resulting in checksum duplicates)
     conn.execute("create        index if not exists idx_file_8 on file (insertion_group_id)")
@@ -91,6 +146,20 @@ def create_indexes(conn):
     conn.execute("create        index if not exists idx_file_without_dataset_1 on file_without_dataset (file_id)")
     conn.execute("create unique index if not exists idx_param_1 on param (name,value)")
     conn.execute("create        index if not exists idx_event_1 on event (name)")
-    conn.execute("create        index if not exists idx_event_2 on event (status)")
     conn.execute("create        index if not exists idx_event_3 on event (crea_date)")
+    conn.execute("create        index if not exists idx_event_4 on event (dataset_pattern,name)") # events coalescing (see 'sdeventdao' module)
     conn.execute("create        index if not exists idx_file_13 on file (data_node)")
+    conn.execute("create unique index if not exists idx_failed_url_1 on failed_url (url)")
+    conn.execute("create unique index if not exists idx_file_replica_1 on file_replica (file_functional_id, url)")
+    conn.execute("create        index if not exists idx_file_replica_2 on file_replica (refresh_date)")
+    conn.execute("create unique index if not exists idx_variable_counter_1 on variable_counter (dataset_id, variable)")
+
+    # composite indexes matching hot queries (see 'sdqueryplan' module)
+    conn.execute("create        index if not exists idx_file_14 on file (status, data_node, priority desc, checksum)") # next transfers of a data node (see 'sdtransferqueue' and 'sdfiledao' modules), per data node counts
+    conn.execute("create        index if not exists idx_file_15 on file (dataset_id, status, size)")                  # dataset stats
+    conn.execute("create        index if not exists idx_file_16 on file (dataset_id, variable, status)")              # dataset files and variables
+    conn.execute("create        index if not exists idx_event_5 on event (status, priority desc, crea_date)")         # events delivery
+
+# init.
+
+counter_statuses=[sdconst.TRANSFER_STATUS_DONE,sdconst.TRANSFER_STATUS_ERROR,sdconst.TRANSFER_STATUS_WAITING,sdconst.TRANSFER_STATUS_RUNNING] # 'dataset_counter' and 'variable_counter' columns (in addition to 'total')
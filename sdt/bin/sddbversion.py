@@ -14,6 +14,8 @@
 from distutils.version import LooseVersion
 import sdapp
 import sdlog
+import sdconfig
+import sddbobj
 import sddbnormalize
 import sddbversionutils
 from sdexception import SDException
@@ -63,10 +65,39 @@ def upgrade_db(conn,current_db_version,new_db_version):
 
 # -- upgrade procs -- #
 
+def upgrade_312(conn):
+
+    # composite indexes (see 'sddbobj' and 'sdqueryplan' modules) are created
+    # when the connection is opened, so single-column indexes which are now a
+    # prefix of a composite index (or not used anymore) can be removed
+    sddbobj.create_indexes(conn)
+
+    conn.execute("drop index if exists idx_file_1") # file (status)
+    conn.execute("drop index if exists idx_file_2") # file (priority)
+    conn.execute("drop index if exists idx_file_5") # file (dataset_id)
+    conn.execute("drop index if exists idx_event_2") # event (status)
+
+    conn.commit()
+
+    sddbversionutils.update_db_version(conn,'3.12')
+
+def upgrade_311(conn):
+    import sddb # not at the top as 'sddb' module imports this module
+
+    # journal mode is persistent (stored in the database file). It is switched
+    # when the connection is opened, but this is only logged if it fails (e.g.
+    # database locked by a daemon started with the previous binary), so we
+    # make sure it is done before upgrading db version.
+    sddb.set_journal_mode(conn,sdconfig.db_journal_mode)
+    if sddb.get_journal_mode(conn)!=sdconfig.db_journal_mode.lower():
+        raise SDException("SDDBVERS-320","Cannot switch database journal mode to %s: stop all synda processes and retry"%sdconfig.db_journal_mode)
+
+    sddbversionutils.update_db_version(conn,'3.11')
+
 def upgrade_310(conn):
 
-    conn.execute("CREATE TABLE failed_url ( url_id INTEGER PRIMARY KEY, url TEXT, file_id INTEGER)")
-    conn.execute("CREATE UNIQUE INDEX idx_failed_url_1 ON failed_url (url)")
+    conn.execute("CREATE TABLE IF NOT EXISTS failed_url ( url_id INTEGER PRIMARY KEY, url TEXT, file_id INTEGER)") # may already exist (see 'sddbobj' module)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_failed_url_1 ON failed_url (url)")
     conn.execute("ALTER TABLE file ADD COLUMN searchapi_host VARCHAR")
 
     conn.commit()
@@ -145,6 +176,8 @@ def upgrade_30(conn):
 # init.
 
 upgrade_procs={
+    '3.12': upgrade_312,
+    '3.11': upgrade_311,
     '3.10': upgrade_310,
     '3.9': upgrade_39,
     '3.8': upgrade_38,
@@ -36,6 +36,7 @@ def purge_error_and_waiting_transfer(conn=sddb.conn):
     """
     c = conn.cursor()
     c.execute("delete from selection__file where file_id in (select file_id from file where status in (?,?))",(sdconst.TRANSFER_STATUS_ERROR,sdconst.TRANSFER_STATUS_WAITING))
+    c.execute("delete from file_replica where file_functional_id in (select file_functional_id from file where status in (?,?))",(sdconst.TRANSFER_STATUS_ERROR,sdconst.TRANSFER_STATUS_WAITING))
     c.execute("delete from file where status in (?,?)",(sdconst.TRANSFER_STATUS_ERROR,sdconst.TRANSFER_STATUS_WAITING))
     nbr=c.rowcount
     c.close()
@@ -104,7 +104,9 @@ def run(files,
 
         # transfer
 
-        (status,killed,script_stderr)=sdget.download(f.url,local_path,debug,http_client,timeout,verbosity,buffered,hpss)
+        checksum_type=f.checksum_type if verify_checksum and not missing_remote_checksum_attrs else None
+
+        (status,killed,script_stderr,local_checksum)=sdget.download(f.url,local_path,debug,http_client,timeout,verbosity,buffered,hpss,checksum_type)
 
 
         # post-transfer
@@ -133,7 +135,8 @@ def run(files,
                 else:
 
                     remote_checksum=f.checksum
-                    local_checksum=sdutils.compute_checksum(local_path,f.checksum_type)
+                    if local_checksum is None:
+                        local_checksum=sdutils.compute_checksum(local_path,f.checksum_type)
 
                     if local_checksum==remote_checksum:
                         print_stderr('File successfully downloaded, checksum OK (%s)'%local_path)
@@ -21,6 +21,7 @@ import time
 import Queue
 import sdapp
 import sdlog
+import sddb
 import sdconst
 import sdexception
 import sdlogon
@@ -28,19 +29,25 @@ import sdconfig
 import sdtime
 import sdfiledao
 import sdevent
+import sdeventdao
 import sdutils
 import sdtools
 import sdget
 import sdtrace
 import sdnexturl
 import sdworkerutils
+import sdcounter
+import sdwatchdog
+import sdwakeup
+import sdlauncher
+import sdreplicadao
 
 class Download():
     exception_occurs=False # this flag is used to stop the event loop if exception occurs in thread
 
     @classmethod
-    def run(cls,tr):
-        cls.start_transfer_script(tr)
+    def run(cls,tr,token):
+        cls.start_transfer_script(tr,token)
 
         # unset metrics fields if transfer did not complete successfully
         if tr.status!=sdconst.TRANSFER_STATUS_DONE:
@@ -48,24 +55,63 @@ class Download():
             tr.rate=None
 
     @classmethod
-    def start_transfer_script(cls,tr):
+    def cancel(cls,tr,reason):
+        """Give back a transfer which has not been started."""
+        tr.status=sdconst.TRANSFER_STATUS_WAITING
+        tr.error_msg="Transfer cancelled before start (%s)"%reason
+
+    @classmethod
+    def fail(cls,tr,exception):
+        """Set error status when an unexpected error occurs in the transfer thread."""
+        tr.status=sdconst.TRANSFER_STATUS_ERROR
+        tr.priority -= 1
+        tr.error_msg="Error occurs during download (%s)"%str(exception)
+        tr.end_date=sdtime.now()
+        tr.duration=None
+        tr.rate=None
+
+        if os.path.isfile(tr.get_full_local_path()):
+            try:
+                os.remove(tr.get_full_local_path())
+            except Exception,e:
+                sdlog.error("SDDMDEFA-529","Error occurs during file suppression (%s,%s)"%(tr.get_full_local_path(),str(e)))
+
+    @classmethod
+    def start_transfer_script(cls,tr,token):
 
         sdlog.info("JFPDMDEF-001","Will download url=%s"%(tr.url,))
         if sdconfig.fake_download:
+            if sdconfig.fake_download_duration>0:
+                time.sleep(sdconfig.fake_download_duration) # simulate transfer duration
+            tr.end_date=sdtime.now()
             tr.status=sdconst.TRANSFER_STATUS_DONE
             tr.error_msg=""
             tr.sdget_error_msg=""
             return
 
+        # checksum is computed during the transfer if the client supports it
+        checksum_type=None
+        if tr.checksum is not None:
+            checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5 # fallback to 'md5' (arbitrary)
+
         # main
-        (tr.sdget_status,killed,tr.sdget_error_msg)=sdget.download(tr.url,
-                                                                   tr.get_full_local_path(),
-                                                                   debug=False,
-                                                                   http_client=sdconst.HTTP_CLIENT_WGET,
-                                                                   timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,
-                                                                   verbosity=0,
-                                                                   buffered=True,
-                                                                   hpss=hpss)
+        watch=sdwatchdog.register(tr.file_id,tr.get_full_local_path())
+        token.add_callback(watch.kill) # cancelling the transfer kills the transfer process (or aborts the in-process transfer)
+        try:
+            (tr.sdget_status,killed,tr.sdget_error_msg,local_checksum)=sdget.download(tr.url,
+                                                                                      tr.get_full_local_path(),
+                                                                                      debug=False,
+                                                                                      http_client=sdconfig.http_client,
+                                                                                      timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,
+                                                                                      verbosity=0,
+                                                                                      buffered=True,
+                                                                                      hpss=hpss,
+                                                                                      checksum_type=checksum_type,
+                                                                                      segment_count=tr.segment_count,
+                                                                                      watch=watch)
+        finally:
+            token.remove_callback(watch.kill)
+            sdwatchdog.unregister(watch)
 
 
         # check
@@ -88,9 +134,9 @@ class Download():
             if remote_checksum!=None:
                 # remote checksum exists
 
-                # compute local checksum
-                checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5 # fallback to 'md5' (arbitrary)
-                local_checksum=sdutils.compute_checksum(tr.get_full_local_path(),checksum_type)
+                # compute local checksum (if not already done during the transfer)
+                if local_checksum is None:
+                    local_checksum=sdutils.compute_checksum(tr.get_full_local_path(),checksum_type)
 
                 # compare local and remote checksum
                 if remote_checksum==local_checksum:
@@ -136,6 +182,13 @@ class Download():
                     sdlog.error("SDDMDEFA-528","Error occurs during file suppression (%s,%s)"%(tr.get_full_local_path(),str(e)))
 
             # Set status
+            if token.is_cancelled():
+                # transfer has been stopped on purpose (e.g. shutdown), so it is retried later
+
+                tr.status=sdconst.TRANSFER_STATUS_WAITING
+                tr.error_msg="Transfer cancelled (%s)"%token.reason
+                return
+
             if killed:
 
                 # OLD WAY
@@ -196,7 +249,10 @@ class Download():
                 tr.priority -= 1
                 tr.error_msg='Error occurs during download.'
 
-def end_of_transfer(tr):
+            if watch.is_killed() and tr.status==sdconst.TRANSFER_STATUS_ERROR:
+                tr.error_msg="Download killed by the watchdog (%s)"%watch.kill_reason
+
+def end_of_transfer(tr,commit=True):
 
     # log
     if tr.status==sdconst.TRANSFER_STATUS_DONE:
@@ -213,12 +269,15 @@ def end_of_transfer(tr):
         sdlog.info("SDDMDEFA-102","Transfer failed (%s)"%str(tr))
 
     # update file
-    sdfiledao.update_file(tr)
+    sdfiledao.update_file(tr,commit=commit)
 
     # IMPORTANT: code below must run AFTER the file status has been saved in DB
 
     if tr.status==sdconst.TRANSFER_STATUS_DONE:
-        sdevent.file_complete_event(tr) # trigger 'file complete' event
+        if sdconfig.next_url_on_error:
+            sdreplicadao.delete_replicas(tr.file_functional_id,commit=False) # other urls are not needed anymore
+
+        sdevent.file_complete_event(tr,commit=commit) # trigger 'file complete' event
 
     # TODO: maybe do some rollback here in case fatal exception occurs in 'file_complete_event'
     #       (else, we have a file marked as 'done' with the corresponding event un-triggered)
@@ -228,30 +287,91 @@ def end_of_transfer(tr):
         sdlog.info("SDDMDEFA-147","Stopping daemon as sdget.download() returned fatal error.")
         raise sdexception.FatalException()
 
-def start_transfer_thread(tr):
-    th=sdworkerutils.WorkerThread(tr,eot_queue,Download)
-    th.setDaemon(True) # if main thread quits, we kill running threads (note though that forked child processes are NOT killed and continue running after that !)
-    th.start()
+def start_transfer(tr):
+    tr.start_date=sdtime.now() # time spent waiting for a launch token is not part of the transfer duration
+
+    executor.submit(tr)
+
+def cancel_transfer(tr):
+    """Give back a transfer which has not been started (shutdown)."""
+    tr.status=sdconst.TRANSFER_STATUS_WAITING
+    tr.error_msg="Transfer not started (shutdown)"
+    tr.eot_queued_time=time.time()
+    eot_queue.put(tr)
+
+    sdwakeup.notify(sdwakeup.WAKEUP_EOT)
 
 def transfers_end():
-    for i in range(8): # arbitrary
-        try:
-            task=eot_queue.get_nowait() # raises Empty when empty
-            end_of_transfer(task)
+    """Process all pending end-of-transfer items in one transaction.
+
+    Notes
+        - Items are acknowledged (task_done) only once the transaction is
+          committed.
+        - If the transaction is rolled back, all drained items (including
+          the failing one, as the error may be transient, e.g. locked
+          database) are put back in the queue, so their status is not lost.
+
+    Returns
+        List of processed transfers
+    """
+    transfers=[]
+    fatal_exception=None
+
+    try:
+        while True:
+            try:
+                tr=eot_queue.get_nowait() # raises Empty when empty
+            except Queue.Empty, e:
+                break
+
+            transfers.append(tr)
+
+            try:
+                end_of_transfer(tr,commit=False)
+            except sdexception.FatalException, e:
+                # we keep processing the remaining items so their status is saved before the daemon stops
+                fatal_exception=e
+
+        if len(transfers)>0:
+            sdeventdao.flush_events() # events triggered by the batch are inserted all at once
+            sddb.conn.commit()
+            sdcounter.observe('scheduler.eot_batch_size',len(transfers))
+    except:
+
+        # debug
+        #sdtrace.log_exception(stderr=True)
+
+        sdeventdao.discard_events()
+        sddb.conn.rollback()
+
+        sdlog.error("SDDMDEFA-504","End of transfer batch rolled back (%i item(s) put back in the queue)"%len(transfers))
+        for tr in transfers:
+            eot_queue.put(tr)
             eot_queue.task_done()
-        except Queue.Empty, e:
-            pass
-        except sdexception.FatalException, e:
-            raise
-        except:
 
-            # debug
-            #sdtrace.log_exception(stderr=True)
+        raise
+
+    for tr in transfers:
+        eot_queue.task_done()
+        sdcounter.observe('scheduler.eot_latency',time.time()-tr.eot_queued_time)
+
+    if fatal_exception is not None:
+        raise fatal_exception
 
-            raise
+    return transfers
 
 def transfers_begin(transfers):
 
+    executor.start() # threads are only created when the first transfer starts
+
+    if sdconfig.fake_download:
+        # no datanode is contacted in this mode, so no certificate nor pacing is needed
+
+        for tr in transfers:
+            start_transfer(tr)
+
+        return
+
     # renew certificate if needed
     try:
         sdlogon.renew_certificate(sdconfig.openid,sdconfig.password,force_renew_certificate=False)
@@ -259,18 +379,30 @@ def transfers_begin(transfers):
         sdlog.error("SDDMDEFA-502","Exception occured while retrieving certificate (%s)"%str(e))
         raise
 
-    for tr in transfers:
-        start_transfer_thread(tr)
-        time.sleep(1) # this sleep is not to be too agressive with datanodes
+    # transfers are started by the launcher thread, at the pace of each data node (not to be too agressive with datanodes)
+    if not launcher.isAlive():
+        launcher.start()
+
+    launcher.submit(transfers)
+
+def cancel_transfers():
+    """Stop running transfers (they are marked for retry).
+
+    Note
+        This func is called from the signal handler.
+    """
+    executor.cancel('shutdown')
 
 def can_leave():
-    return eot_queue.empty()
+    return eot_queue.empty() and launcher.get_pending_count()==0 and executor.get_pending_count()==0
 
 def fatal_exception():
-    return Download.exception_occurs
+    return Download.exception_occurs or launcher.exception_occurs
 
 # module init.
 
 hpss=sdconfig.config.getboolean('download','hpss') # hpss & parse_output hack
 eot_queue=Queue.Queue() # eot means "End Of Task"
 incorrect_checksum_action=sdconfig.config.get('behaviour','incorrect_checksum_action')
+executor=sdworkerutils.WorkerPool('transfer',sdconfig.config.getint('download','max_parallel_download'),Download,eot_queue)
+launcher=sdlauncher.LauncherThread(start_transfer,cancel_transfer)
@@ -11,14 +11,28 @@
 
 """This script contains download management funcs (Globus implementation).
 
-Note
-    sddmgo means 'SynDa Download Manager Globus'
+Notes
+    - sddmgo means 'SynDa Download Manager Globus'
+    - The access token and the Transfer API client are kept until the token
+      expires, and endpoints are only re-activated when their activation is
+      getting old (or when a task is 'INACTIVE').
+    - Files are grouped by source endpoint, and each group is split in
+      Globus tasks of at most 'max_files_per_task' files and 'max_task_size'
+      bytes.
+    - Task status is retrieved in bulk (one 'task_list' request for up to
+      'task_list_limit' tasks). Each task is polled on its own schedule: the
+      interval doubles (up to 'poll_max_interval') while the status doesn't
+      change.
+    - Files of ended tasks are verified (size, checksum) by the verification
+      pool threads. The scheduler thread then saves all verified files in
+      one transaction.
 """
 
 import os
 import time
 import re
 import abc
+import Queue
 import urlparse
 from datetime import datetime, timedelta
 from xml.etree.ElementTree import fromstring
@@ -28,129 +42,351 @@ import sdconst
 from sdexception import SDException,FatalException
 import sdconfig
 import sdtime
+import sddb
 import sdfiledao
+import sdreplicadao
 import sdevent
+import sdeventdao
 import sdutils
+import sdcounter
+import sdworkerutils
 from globusonline.transfer import api_client
 from globusonline.transfer.api_client import x509_proxy
 
+class AccessToken():
+    """This class caches the Globus access token until it expires."""
+
+    def __init__(self):
+        self.value=None
+        self.expiry=0
+
+    def get(self):
+        if self.value is None or time.time()>=self.expiry-token_renewal_margin:
+            _, _, self.value = api_client.goauth.get_access_token(username=globus_username, password=globus_password)
+            self.expiry=get_token_expiry(self.value)
+
+            sdcounter.incr('globus.token')
+            sdlog.info("SDDMGLOB-030","Globus access token renewed (expiry=%s)"%time.ctime(self.expiry))
+
+        return self.value
+
+    def invalidate(self):
+        self.value=None
+
+class Verification():
+    """This class verifies the files of ended Globus tasks (run by the verification pool threads)."""
+
+    exception_occurs=False
+
+    @classmethod
+    def run(cls,tr,token):
+        if tr.globus_task_status=="SUCCEEDED":
+            verify_file(tr)
+        else:
+            tr.status = sdconst.TRANSFER_STATUS_ERROR
+            tr.priority -= 1
+            tr.error_msg = "Error occurs during download."
+
+            remove_local_file(tr)
+
+    @classmethod
+    def cancel(cls,tr,reason):
+        tr.status=sdconst.TRANSFER_STATUS_WAITING
+        tr.error_msg="Transfer verification cancelled (%s)"%reason
+
+    @classmethod
+    def fail(cls,tr,exception):
+        """Set error status when an unexpected error occurs during verification."""
+        tr.status=sdconst.TRANSFER_STATUS_ERROR
+        tr.priority -= 1
+        tr.error_msg="Error occurs during verification (%s)"%str(exception)
+
+        remove_local_file(tr)
+
+def get_token_expiry(token):
+    """Returns token expiry time (goauth tokens contain an 'expiry=<epoch>' field)."""
+    m=re.search(r'expiry=(\d+)',token)
+    if m is not None:
+        return int(m.group(1))
+    else:
+        return time.time()+token_default_lifetime
+
+def get_api():
+    """Returns the Transfer API client (a new client is only created when the access token changes)."""
+    global _api,_api_token
+
+    token=access_token.get()
+
+    if _api is None or _api_token!=token:
+        _api=api_client.TransferAPIClient(username=globus_username, goauth=token)
+        _api_token=token
+
+    return _api
+
+def api_call(method,*args,**kw):
+    """Call a Transfer API method (the access token is renewed once if it has been rejected)."""
+    try:
+        return getattr(get_api(),method)(*args,**kw)
+    except api_client.APIError,e:
+        if e.status_code!=401:
+            raise
+
+        sdlog.info("SDDMGLOB-031","Access token rejected, renewing it (%s)"%str(e))
+        access_token.invalidate()
+
+        return getattr(get_api(),method)(*args,**kw)
+
 def transfers_end():
+    """
+    Returns
+        List of transfers which are not running anymore (i.e. done or error)
 
-    _, _, access_token = api_client.goauth.get_access_token(username=globus_username, password=globus_password)
-    api = api_client.TransferAPIClient(username=globus_username, goauth=access_token)
+    Note
+        Files of ended tasks are verified in background threads, so those
+        files are returned by a later call.
+    """
 
-    for task_id in globus_tasks:
+    # save files verified since last call
+    transfers=commit_verified_transfers()
 
-        code, reason, data = api.task(task_id, fields="status")
-        status = data['status']
+    # check tasks due for polling
+    for (task_id,status) in poll_tasks().iteritems():
+        task=globus_tasks[task_id]
 
         sdlog.debug("SDDMGLOB-016", "Checking the status of Globus transfer tasks, id: %s, status: %s" % (task_id, status))
-        for item in globus_tasks[task_id]['items']:
-            tr = item['tr']
-            if status == "SUCCEEDED":
 
-                assert tr.size is not None
+        if status == "SUCCEEDED" or status == "FAILED":
+            verifier.start()
 
-                if int(tr.size) != os.path.getsize(tr.get_full_local_path()):
-                    sdlog.error("SDDMGLOB-002","size don't match (remote_size=%i,local_size=%i,local_path=%s)"%(int(tr.size),os.path.getsize(tr.get_full_local_path()),tr.get_full_local_path()))
+            for item in task['items']:
+                tr=item['tr']
+                tr.globus_task_status=status
+                verifier.submit(tr)
 
-                # retrieve local and remote checksum
-                checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5
-                local_checksum=sdutils.compute_checksum(tr.get_full_local_path(),checksum_type)
-                remote_checksum=tr.checksum # retrieve remote checksum
+            if status == "FAILED":
+                sdlog.info("SDDMGLOB-101", "Globus task failed (task_id=%s,file_count=%d)" % (task_id,len(task['items'])))
 
-                if remote_checksum!=None:
-                    # remote checksum exists
+            # Remove the task from the list of active tasks
+            globus_tasks.pop(task_id, None)
 
-                    # compare local and remote checksum
-                    if remote_checksum==local_checksum:
-                        # checksum is ok
+        elif status == "INACTIVE":
+            # Reactivate both source and destination endpoints
+            activate_endpoint(task['src_endpoint'], force=True)
+            activate_endpoint(force=True)
 
-                        tr.status = sdconst.TRANSFER_STATUS_DONE
-                    else:
-                        # checksum is not ok
+    return transfers
 
-                        if incorrect_checksum_action=="remove":
-                            tr.status=sdconst.TRANSFER_STATUS_ERROR
-                            tr.priority -= 1
-                            tr.error_msg="File corruption detected: local checksum doesn't match remote checksum"
+def poll_tasks():
+    """Retrieve the status of tasks due for polling.
 
-                            # remove file from local repository
-                            sdlog.error("SDDMGLOB-155","checksum don't match: remove local file (local_checksum=%s,remote_checksum=%s,local_path=%s)"%(local_checksum,remote_checksum,tr.get_full_local_path()))
-                            try:
-                                os.remove(tr.get_full_local_path())
-                            except Exception,e:
-                                sdlog.error("SDDMGLOB-158","error occurs while removing local file (%s)"%tr.get_full_local_path())
+    Returns
+        dict (task_id => status)
+    """
+    now=time.time()
+    task_ids=[task_id for (task_id,task) in globus_tasks.iteritems() if task['next_poll']<=now]
 
-                        elif incorrect_checksum_action=="keep":
-                            sdlog.info("SDDMGLOB-157","local checksum doesn't match remote checksum (%s)"%tr.get_full_local_path())
-                            
-                            tr.status=sdconst.TRANSFER_STATUS_DONE
+    if len(task_ids)==0:
+        return {}
 
-                        else:
-                            raise FatalException("SDDMGLOB-507","incorrect value (%s)"%incorrect_checksum_action)
-                else:
-                    # remote checksum is missing
-                    # NOTE: we DON'T store the local checksum ('file' table contains only the REMOTE checksum)
+    statuses={}
+    for i in range(0,len(task_ids),task_list_limit):
+        chunk=task_ids[i:i+task_list_limit]
 
-                    tr.status = sdconst.TRANSFER_STATUS_DONE
+        code, reason, data = api_call('task_list', filter="task_id:%s"%','.join(chunk), fields="task_id,status", limit=len(chunk))
 
-                if tr.status == sdconst.TRANSFER_STATUS_DONE:
-                    tr.end_date=sdtime.now() # WARNING: this is not the real end of transfer date but the date when we ask the globus scheduler if the transfer is done.
-                    tr.error_msg=""
-                    sdlog.info("SDDMGLOB-101", "Transfer done (%s)" % str(tr))
+        for doc in data['DATA']:
+            statuses[doc['task_id']]=doc['status']
 
-            elif status == "FAILED":
-                tr.status = sdconst.TRANSFER_STATUS_ERROR
-                tr.priority -= 1
-                tr.error_msg = "Error occurs during download."
+        sdcounter.incr('globus.poll_request')
 
-                sdlog.info("SDDMGLOB-101", "Transfer failed (%s)" % str(tr))
+    for task_id in task_ids:
+        task=globus_tasks[task_id]
+        status=statuses.get(task_id)
 
-                # Remove local file if exists
-                if os.path.isfile(tr.get_full_local_path()):
-                    try:
-                        os.remove(tr.get_full_local_path())
-                    except Exception,e:
-                        sdlog.error("SDDMGLOB-528","Error occurs during file suppression (%s,%s)"%(tr.get_full_local_path(),str(e)))
+        if status is None:
+            sdlog.info("SDDMGLOB-032","Globus task not found in task list (task_id=%s)"%task_id)
+        elif status==task['status']:
+            task['poll_interval']=min(task['poll_interval']*2,poll_max_interval)
+        else:
+            task['poll_interval']=poll_min_interval
+            task['status']=status
 
-            elif status == "INACTIVE":
-                # Reactivate both source and destination endpoints
-                activate_endpoint(api, globus_tasks[task_id]['src_endpoint'])
-                activate_endpoint(api)
-            elif status == "ACTIVE":
-                pass
+        task['next_poll']=now+task['poll_interval']
 
+    sdcounter.incr('globus.poll_task',len(task_ids))
 
-            # update file
-            sdfiledao.update_file(tr)
+    return statuses
 
+def verify_file(tr):
+    """Check the size and the checksum of a downloaded file and set transfer status accordingly."""
+    local_path=tr.get_full_local_path()
 
-            if tr.status == sdconst.TRANSFER_STATUS_DONE:
+    assert tr.size is not None
 
-                # TODO: maybe add a try/except and do some rollback here in
-                # case fatal exception occurs in 'file_complete_event' (else,
-                # we have a file marked as 'done' with the corresponding event
-                # un-triggered)
+    if not os.path.isfile(local_path):
+        tr.status=sdconst.TRANSFER_STATUS_ERROR
+        tr.priority -= 1
+        tr.error_msg="Local file not found after Globus transfer"
 
-                # NOTE: code below must run AFTER the file status has been
-                # saved in DB (because it makes DB queries which expect the
-                # file status to exist)
+        sdlog.error("SDDMGLOB-003","local file not found (local_path=%s)"%local_path)
+        return
 
-                sdevent.file_complete_event(tr) # trigger 'file complete' event
+    if int(tr.size) != os.path.getsize(local_path):
+        sdlog.error("SDDMGLOB-002","size don't match (remote_size=%i,local_size=%i,local_path=%s)"%(int(tr.size),os.path.getsize(local_path),local_path))
 
+    if tr.checksum!=None:
+        # remote checksum exists
 
-        # Remove the tasks from the lists of active tasks
-        if status == "SUCCEEDED" or status == "FAILED":
-            globus_tasks.pop(task_id, None)
+        checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5
+        try:
+            local_checksum=sdutils.compute_checksum(local_path,checksum_type)
+        except Exception,e:
+            sdlog.error("SDDMGLOB-004","Error occurs while computing checksum (%s,%s)"%(local_path,str(e)))
+            local_checksum=None
+
+        check_checksum(tr,local_checksum)
+    else:
+        # remote checksum is missing
+        # NOTE: we DON'T store the local checksum ('file' table contains only the REMOTE checksum)
+
+        tr.status = sdconst.TRANSFER_STATUS_DONE
+
+        set_done(tr)
+
+def remove_local_file(tr):
+    # Remove local file if exists
+    if os.path.isfile(tr.get_full_local_path()):
+        try:
+            os.remove(tr.get_full_local_path())
+        except Exception,e:
+            sdlog.error("SDDMGLOB-528","Error occurs during file suppression (%s,%s)"%(tr.get_full_local_path(),str(e)))
+
+def check_checksum(tr,local_checksum):
+    """Compare local and remote checksum and set transfer status accordingly."""
+
+    remote_checksum=tr.checksum
+
+    if local_checksum is None:
+        # checksum computation failed (already logged)
+
+        tr.status=sdconst.TRANSFER_STATUS_ERROR
+        tr.priority -= 1
+        tr.error_msg="Error occurs while computing local checksum"
+
+    elif remote_checksum==local_checksum:
+        # checksum is ok
+
+        tr.status = sdconst.TRANSFER_STATUS_DONE
+    else:
+        # checksum is not ok
+
+        if incorrect_checksum_action=="remove":
+            tr.status=sdconst.TRANSFER_STATUS_ERROR
+            tr.priority -= 1
+            tr.error_msg="File corruption detected: local checksum doesn't match remote checksum"
+
+            # remove file from local repository
+            sdlog.error("SDDMGLOB-155","checksum don't match: remove local file (local_checksum=%s,remote_checksum=%s,local_path=%s)"%(local_checksum,remote_checksum,tr.get_full_local_path()))
+            try:
+                os.remove(tr.get_full_local_path())
+            except Exception,e:
+                sdlog.error("SDDMGLOB-158","error occurs while removing local file (%s)"%tr.get_full_local_path())
+
+        elif incorrect_checksum_action=="keep":
+            sdlog.info("SDDMGLOB-157","local checksum doesn't match remote checksum (%s)"%tr.get_full_local_path())
+
+            tr.status=sdconst.TRANSFER_STATUS_DONE
+
+        else:
+            raise FatalException("SDDMGLOB-507","incorrect value (%s)"%incorrect_checksum_action)
+
+    if tr.status == sdconst.TRANSFER_STATUS_DONE:
+        set_done(tr)
+
+def set_done(tr):
+    tr.end_date=sdtime.now() # WARNING: this is not the real end of transfer date but the date when we ask the globus scheduler if the transfer is done.
+    tr.error_msg=""
+
+def commit_verified_transfers():
+    """Save all verified files in one transaction.
+
+    Note
+        Items are acknowledged (task_done) only once the transaction is
+        committed. If the transaction is rolled back, they are put back in
+        the queue.
+
+    Returns
+        List of saved transfers
+    """
+    transfers=[]
+
+    try:
+        while True:
+            try:
+                tr=verify_queue.get_nowait() # raises Empty when empty
+            except Queue.Empty, e:
+                break
+
+            transfers.append(tr)
+
+            end_of_transfer(tr,commit=False)
+
+        if len(transfers)>0:
+            sdeventdao.flush_events() # events triggered by the batch are inserted all at once
+            sddb.conn.commit()
+            sdcounter.observe('globus.commit_batch_size',len(transfers))
+    except:
+        sdeventdao.discard_events()
+        sddb.conn.rollback()
+
+        sdlog.error("SDDMGLOB-033","Verified files batch rolled back (%i item(s) put back in the queue)"%len(transfers))
+        for tr in transfers:
+            verify_queue.put(tr)
+            verify_queue.task_done()
+
+        raise
+
+    for tr in transfers:
+        verify_queue.task_done()
+        sdcounter.observe('globus.verify_latency',time.time()-tr.eot_queued_time)
+
+    return transfers
+
+def end_of_transfer(tr,commit=True):
+
+    # log
+    if tr.status == sdconst.TRANSFER_STATUS_DONE:
+        sdlog.info("SDDMGLOB-101", "Transfer done (%s)" % str(tr))
+    else:
+        sdlog.info("SDDMGLOB-101", "Transfer failed (%s)" % str(tr))
+
+    # update file
+    sdfiledao.update_file(tr,commit=commit)
+
+    if tr.status == sdconst.TRANSFER_STATUS_DONE:
+
+        # TODO: maybe add a try/except and do some rollback here in
+        # case fatal exception occurs in 'file_complete_event' (else,
+        # we have a file marked as 'done' with the corresponding event
+        # un-triggered)
+
+        # NOTE: code below must run AFTER the file status has been
+        # saved in DB (because it makes DB queries which expect the
+        # file status to exist)
+
+        if sdconfig.next_url_on_error:
+            sdreplicadao.delete_replicas(tr.file_functional_id,commit=False) # other urls are not needed anymore
+
+        sdevent.file_complete_event(tr,commit=commit) # trigger 'file complete' event
 
 def transfers_begin(transfers):
 
+    if len(transfers)==0:
+        return
+
     # Activate the destination endpoint
 
-    _, _, access_token = api_client.goauth.get_access_token(username=globus_username, password=globus_password)
-    api = api_client.TransferAPIClient(username=globus_username, goauth=access_token)
-    activate_endpoint(api)
+    activate_endpoint()
 
     # Divide all files that are to be transferred into groups based on the source globus endpoint
 
@@ -160,11 +396,8 @@ def transfers_begin(transfers):
         src_endpoint, src_path, path = map_to_globus(tr.url)
         local_path = tr.get_full_local_path()
         if not src_endpoint in globus_transfers:
-            globus_transfers[src_endpoint] = {
-                    'src_endpoint': src_endpoint,
-                    'items': []
-            }
-        globus_transfers[src_endpoint]['items'].append({
+            globus_transfers[src_endpoint] = []
+        globus_transfers[src_endpoint].append({
                 'src_path': src_path,
                 'dst_path': local_path,
                 'tr': tr
@@ -176,29 +409,65 @@ def transfers_begin(transfers):
     for src_endpoint in globus_transfers:
 
         # Activate the source endpoint
-        activate_endpoint(api, src_endpoint)
+        activate_endpoint(src_endpoint)
+
+        for items in split_items(globus_transfers[src_endpoint]):
+            submit_task(src_endpoint, items)
+
+def split_items(items):
+    """Split the items of one source endpoint into tasks of at most 'max_files_per_task' files and 'max_task_size' bytes."""
+    batches=[]
+    batch=[]
+    batch_size=0
 
-        # Create a transfer and add files to the transfer
+    for item in items:
+        size=int(item['tr'].size or 0)
 
-        code, message, data = api.transfer_submission_id()
-        if code != 200:
-            raise FatalException()
-        submission_id = data['value']
-        t = api_client.Transfer(submission_id, src_endpoint, dst_endpoint)
-        sdlog.info("SDDMGLOB-004", "Globus transfer, source endpoint: %s, destination endpoint: %s" % (src_endpoint, dst_endpoint))
-        for item in globus_transfers[src_endpoint]['items']:
-            t.add_item(item['src_path'], item['dst_path'])
-            sdlog.info("SDDMGLOB-005", "Globus transfer item, source path: %s, destination path: %s" % (item['src_path'], item['dst_path']))
+        if len(batch)>0 and (len(batch)>=max_files_per_task or (max_task_size>0 and batch_size+size>max_task_size)):
+            batches.append(batch)
+            batch=[]
+            batch_size=0
 
-        # Submit the transfer
+        batch.append(item)
+        batch_size+=size
 
-        code, message, data = api.transfer(t)
-        if code != 202:
-            sdlog.error("SDDMGLOB-006","Error: Cannot add a transfer: (%s, %s)"% (code, message))
-            raise FatalException()
-        task_id = data['task_id']
-        sdlog.info("SDDMGLOB-007", "Submitted Globus task, id: %s" % task_id)
-        globus_tasks[task_id] = globus_transfers[src_endpoint]
+    if len(batch)>0:
+        batches.append(batch)
+
+    return batches
+
+def submit_task(src_endpoint, items):
+
+    # Create a transfer and add files to the transfer
+
+    code, message, data = api_call('transfer_submission_id')
+    if code != 200:
+        raise FatalException()
+    submission_id = data['value']
+    t = api_client.Transfer(submission_id, src_endpoint, dst_endpoint)
+    sdlog.info("SDDMGLOB-004", "Globus transfer, source endpoint: %s, destination endpoint: %s" % (src_endpoint, dst_endpoint))
+    for item in items:
+        t.add_item(item['src_path'], item['dst_path'])
+        sdlog.info("SDDMGLOB-005", "Globus transfer item, source path: %s, destination path: %s" % (item['src_path'], item['dst_path']))
+
+    # Submit the transfer
+
+    code, message, data = api_call('transfer', t)
+    if code != 202:
+        sdlog.error("SDDMGLOB-006","Error: Cannot add a transfer: (%s, %s)"% (code, message))
+        raise FatalException()
+    task_id = data['task_id']
+    sdlog.info("SDDMGLOB-007", "Submitted Globus task, id: %s, file_count: %d" % (task_id, len(items)))
+    globus_tasks[task_id] = {
+            'src_endpoint': src_endpoint,
+            'items': items,
+            'status': None,
+            'poll_interval': poll_min_interval,
+            'next_poll': time.time()+poll_min_interval
+    }
+
+    sdcounter.incr('globus.task')
+    sdcounter.observe('globus.task_file_count',len(items))
 
 
 def map_to_globus(url):
@@ -219,26 +488,37 @@ def map_to_globus(url):
     return src_endpoint, src_path, path
 
 
-def activate_endpoint(api, ep=None):
+def activate_endpoint(ep=None, force=False):
     if ep is None:
         ep = dst_endpoint
 
-    code, reason, reqs = api.endpoint_activation_requirements(ep, type='delegate_proxy')
+    if not force and time.time()-endpoint_activation_time.get(ep,0)<activation_interval:
+        return # still activated
+
+    code, reason, reqs = api_call('endpoint_activation_requirements', ep, type='delegate_proxy')
     public_key = reqs.get_requirement_value("delegate_proxy", "public_key")
     proxy = x509_proxy.create_proxy_from_file(sdconfig.esgf_x509_proxy, public_key, lifetime_hours=72)
     reqs.set_requirement_value("delegate_proxy", "proxy_chain", proxy)
     try:
-        code, reason, result = api.endpoint_activate(ep, reqs)
+        code, reason, result = api_call('endpoint_activate', ep, reqs)
     except api_client.APIError as e:
         sdlog.error("SDDMGLOB-028","Error: Cannot activate the source endpoint: (%s)"% str(e))
         raise FatalException()
 
+    endpoint_activation_time[ep]=time.time()
+
+    sdcounter.incr('globus.activation')
+
+
+def cancel_transfers():
+    pass # Globus tasks are not cancelled on shutdown (no process nor connection is held by the daemon)
 
 def can_leave():
-    return True
+    return verifier.get_pending_count()==0 and verify_queue.qsize()==0
 
 def fatal_exception():
-    return False
+    return Verification.exception_occurs
+
 
 
 NS = "http://www.esgf.org/whitelist"
@@ -331,14 +611,35 @@ dst_endpoint = sdconfig.config.get('globustransfer', 'destination_endpoint')
 endpoints_filepath = sdconfig.config.get('globustransfer', 'esgf_endpoints')
 if endpoints_filepath:
     globus_endpoints = LocalEndpointDict(endpoints_filepath).endpointDict()
+max_files_per_task = sdconfig.config.getint('globustransfer', 'max_files_per_task')
+max_task_size = sdconfig.config.getint('globustransfer', 'max_task_size') # bytes (0 means no limit)
 
 incorrect_checksum_action=sdconfig.config.get('behaviour','incorrect_checksum_action')
 
+token_renewal_margin=300       # seconds before expiry at which the access token is renewed
+token_default_lifetime=3600    # used if token expiry can't be read from the token
+activation_interval=12*3600    # seconds between two activations of the same endpoint (proxy lifetime is 72 hours)
+poll_min_interval=5            # seconds between two polls of a task whose status just changed
+poll_max_interval=120          # max seconds between two polls of a task whose status doesn't change
+task_list_limit=100            # max number of tasks per 'task_list' request
+verify_thread_count=2          # verification is I/O bound, more threads would compete with running transfers for disk bandwidth
+
+access_token=AccessToken()
+endpoint_activation_time={}    # endpoint => time of last activation
+_api=None
+_api_token=None
+
+verify_queue=Queue.Queue()     # verified files, waiting to be saved by the scheduler thread
+verifier=sdworkerutils.WorkerPool('globus-verify',verify_thread_count,Verification,verify_queue,max_queue_size=0)
+
 '''
 All Globus active transfer tasks are stored by transfer_begin() in
 globus_tasks = {
     <task_id>: {
         'src_endpoint': <src_endpoint>,
+        'status': <last polled status>,
+        'poll_interval': <seconds>,
+        'next_poll': <time>,
         'items': [
             {
                 'src_path': <src_path>,
@@ -18,6 +18,7 @@ Notes
 """
 
 import sys
+import time
 import argparse
 import json
 import sdapp
@@ -38,6 +39,9 @@ import sdtime
 import sdpipelineprocessing
 from sdexception import SDException
 import sdprogress
+import sdwakeup
+import sdcounter
+import sdreplicadao
 
 def run(metadata,timestamp_right_boundary=None):
     """
@@ -71,15 +75,25 @@ def run(metadata,timestamp_right_boundary=None):
 
         sdlog.info("SDENQUEU-103","Insert files and datasets..")
 
+        _inserted_priorities.clear()
+        start_time=time.time()
+
         po=sdpipelineprocessing.ProcessingObject(add_files)
         metadata=sdpipelineprocessing.run_pipeline(metadata,po)
 
+        duration=time.time()-start_time
+        sdlog.info("SDENQUEU-105","%i file(s) inserted in %.1f seconds (%.0f rows/s)"%(count,duration,count/duration if duration>0 else 0))
+
         sdlog.info("SDENQUEU-104","Fill timestamp..")
 
         fix_timestamp()
 
         sddb.conn.commit() # final commit (we do all insertion/update in one transaction).
 
+        sdfiledao.update_highest_waiting_priority(_inserted_priorities) # deferred max priority cache update (only once files are committed)
+
+        sdwakeup.notify(sdwakeup.WAKEUP_ENQUEUE)
+
         if sdconfig.progress:
             sdprogress.ProgressThread.stop() # spinner stop
 
@@ -127,11 +141,68 @@ def keep_recent_datasets(datasets):
     return li
 
 def add_files(files):
+    """Insert one chunk of files (bulk mode).
+
+    Notes
+        - all datasets of the chunk are retrieved with one query, missing
+          datasets are created with one statement and files are inserted with
+          one statement.
+        - max priority cache is updated once all chunks have been committed (see run()).
+    """
+    files=[File(**f) for f in files]
+
     for f in files:
-        add_file(File(**f))
+        sdlog.info("SDENQUEU-003","Create transfer (local_path=%s,url=%s)"%(f.get_full_local_path(),f.url))
+
+    datasets=add_datasets(files)
+
+    now=sdtime.now()
+    for f in files:
+        d=datasets[f.dataset_functional_id]
+        check_local_path_format(d,f)
+
+        f.dataset_id=d.dataset_id
+        f.status=sdconst.TRANSFER_STATUS_WAITING
+        f.crea_date=now
+
+        if f.data_node not in _inserted_priorities or f.priority>_inserted_priorities[f.data_node]:
+            _inserted_priorities[f.data_node]=f.priority
+
+    sdfiledao.add_files(files,commit=False)
+    sdreplicadao.add_replicas(files,commit=False)
+
+    sdcounter.incr('enqueue.files',len(files))
+
     return [] # nothing to return (end of processing)
 
+def add_datasets(files):
+    """Create or update datasets of a chunk of files.
+
+    Returns:
+        dict (dataset_functional_id => Dataset)
+    """
+    first_files={} # dataset_functional_id => first file of the dataset in the chunk
+    for f in files:
+        if f.dataset_functional_id not in first_files:
+            first_files[f.dataset_functional_id]=f
+
+    datasets=sddatasetdao.get_datasets_by_functional_id(first_files.keys())
+
+    # update existing datasets
+    for d in datasets.itervalues():
+        update_dataset(d,first_files[d.dataset_functional_id])
+    sddatasetdao.update_datasets(datasets.values(),commit=False)
+
+    # create missing datasets
+    new_datasets=[build_dataset(f) for (dataset_functional_id,f) in first_files.iteritems() if dataset_functional_id not in datasets]
+    if len(new_datasets)>0:
+        sddatasetdao.add_datasets(new_datasets,commit=False)
+        datasets.update(sddatasetdao.get_datasets_by_functional_id([d.dataset_functional_id for d in new_datasets])) # retrieve dataset_id
+
+    return datasets
+
 def add_file(f):
+    """Insert one file (not used by run(), which inserts files in bulk)."""
     sdlog.info("SDENQUEU-003","Create transfer (local_path=%s,url=%s)"%(f.get_full_local_path(),f.url))
 
     f.dataset_id=add_dataset(f)
@@ -139,6 +210,7 @@ def add_file(f):
     f.crea_date=sdtime.now()
 
     sdfiledao.add_file(f,commit=False)
+    sdreplicadao.add_replicas([f],commit=False)
 
 def add_dataset(f):
     """
@@ -147,68 +219,79 @@ def add_dataset(f):
     """
     d=sddatasetdao.get_dataset(dataset_functional_id=f.dataset_functional_id)
     if d is not None:
+        update_dataset(d,f)
 
-        # check dataset local path format
-        #
-        # (once a dataset has been created using one local_path format, it
-        # cannot be changed anymore without removing the all dataset /
-        # restarting the dataset from scratch).
-        #
-        if d.local_path!=f.dataset_local_path:
-            raise SDException("SDENQUEU-008","Incorrect local path format (existing_format=%s,new_format=%s)"%(d.local_path,f.dataset_local_path))
+        sddatasetdao.update_dataset(d,commit=False)
 
-        # compute new dataset status
-        if d.status==sdconst.DATASET_STATUS_IN_PROGRESS:
-            d.status=sdconst.DATASET_STATUS_IN_PROGRESS
+        return d.dataset_id
 
-        elif d.status==sdconst.DATASET_STATUS_EMPTY:
-            d.status=sdconst.DATASET_STATUS_EMPTY
+    else:
+        d=build_dataset(f)
 
-        elif d.status==sdconst.DATASET_STATUS_COMPLETE:
-            d.status=sdconst.DATASET_STATUS_IN_PROGRESS # this means that a dataset may be "in-progress" and also "latest"
+        return sddatasetdao.add_dataset(d,commit=False)
 
+def update_dataset(d,f):
+    """Update dataset attributes when new files are added to an existing dataset."""
 
-        # Note related to the "latest" dataset column
-        #
-        # Adding new files to a datasets may change the status, but don't
-        # change dataset "latest" flag.  This is because a dataset can only
-        # downgrade here ("complete" => "in-progress"), or stay the same. And
-        # when a dataset downgrade, "latest" flag, if true, stay as is, and if
-        # false, stay as is also.
+    check_local_path_format(d,f)
 
-        # "last_mod_date" is only modified here (i.e. it is not modified when
-        # dataset's files status change). in other words, it changes only when
-        # adding new files to it using this script.
-        #
-        d.last_mod_date=sdtime.now()
+    # compute new dataset status
+    if d.status==sdconst.DATASET_STATUS_IN_PROGRESS:
+        d.status=sdconst.DATASET_STATUS_IN_PROGRESS
 
+    elif d.status==sdconst.DATASET_STATUS_EMPTY:
+        d.status=sdconst.DATASET_STATUS_EMPTY
 
-        sddatasetdao.update_dataset(d,commit=False)
+    elif d.status==sdconst.DATASET_STATUS_COMPLETE:
+        d.status=sdconst.DATASET_STATUS_IN_PROGRESS # this means that a dataset may be "in-progress" and also "latest"
 
-        return d.dataset_id
 
-    else:
-        sdlog.info("SDENQUEU-002","create dataset (dataset_path=%s)"%(f.dataset_path))
+    # Note related to the "latest" dataset column
+    #
+    # Adding new files to a datasets may change the status, but don't
+    # change dataset "latest" flag.  This is because a dataset can only
+    # downgrade here ("complete" => "in-progress"), or stay the same. And
+    # when a dataset downgrade, "latest" flag, if true, stay as is, and if
+    # false, stay as is also.
+
+    # "last_mod_date" is only modified here (i.e. it is not modified when
+    # dataset's files status change). in other words, it changes only when
+    # adding new files to it using this script.
+    #
+    d.last_mod_date=sdtime.now()
 
-        d=Dataset()
+def check_local_path_format(d,f):
+    # check dataset local path format
+    #
+    # (once a dataset has been created using one local_path format, it
+    # cannot be changed anymore without removing the all dataset /
+    # restarting the dataset from scratch).
+    #
+    if d.local_path!=f.dataset_local_path:
+        raise SDException("SDENQUEU-008","Incorrect local path format (existing_format=%s,new_format=%s)"%(d.local_path,f.dataset_local_path))
 
-        d.local_path=f.dataset_local_path
-        d.path=f.dataset_path
-        d.path_without_version=f.dataset_path_without_version
-        d.dataset_functional_id=f.dataset_functional_id
-        d.template=f.dataset_template
-        d.version=f.dataset_version
-        d.project=f.project
-        d.status=sdconst.DATASET_STATUS_EMPTY
-        d.latest=False
-        d.crea_date=sdtime.now()
-        d.last_mod_date=sdtime.now()
+def build_dataset(f):
+    sdlog.info("SDENQUEU-002","create dataset (dataset_path=%s)"%(f.dataset_path))
 
-        # non-mandatory attributes
-        d.timestamp=f.dataset_timestamp if hasattr(f,'dataset_timestamp') else None
-        d.model=f.model if hasattr(f,'model') else None
+    d=Dataset()
 
-        return sddatasetdao.add_dataset(d,commit=False)
+    d.local_path=f.dataset_local_path
+    d.path=f.dataset_path
+    d.path_without_version=f.dataset_path_without_version
+    d.dataset_functional_id=f.dataset_functional_id
+    d.template=f.dataset_template
+    d.version=f.dataset_version
+    d.project=f.project
+    d.status=sdconst.DATASET_STATUS_EMPTY
+    d.latest=False
+    d.crea_date=sdtime.now()
+    d.last_mod_date=sdtime.now()
+
+    # non-mandatory attributes
+    d.timestamp=f.dataset_timestamp if hasattr(f,'dataset_timestamp') else None
+    d.model=f.model if hasattr(f,'model') else None
+
+    return d
 
 def fix_timestamp():
 
@@ -256,6 +339,10 @@ def fix_timestamp():
 
         pass
 
+# init.
+
+_inserted_priorities={} # data_node => highest priority of inserted files (used for deferred max priority cache update)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-p', '--priority',required=False,type=int,default=None)
@@ -23,6 +23,7 @@ import sddb
 import sdproduct
 import sdmodifyquery
 import sdevent
+import sdeventdao
 import sddbpagination
 import sdfilequery
 import sdconst
@@ -95,6 +96,7 @@ def variable():
     for v in di.values():
         SDProgressDot.print_char(".")
         sdevent.variable_complete_output12_event(v.project,v.model,v.dataset_pattern,v.name,commit=False)
+    sdeventdao.flush_events()
     sddb.conn.commit() # we do all insertion commit in one transaction
 
 if __name__ == '__main__':
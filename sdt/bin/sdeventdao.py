@@ -9,7 +9,15 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""Contains event DAO SQL queries."""
+"""Contains event DAO SQL queries.
+
+Notes
+    - Events added with commit=False are kept in memory, and inserted all at
+      once (executemany) by flush_events(), which must be called before the
+      transaction is committed (discard_events() must be called on rollback).
+    - Events are coalesced: an event is not inserted if an identical event
+      is already waiting to be sent (i.e. with 'new' status).
+"""
 
 import argparse
 import sdapp
@@ -18,12 +26,56 @@ import sdsqlutils
 import sdconst
 import sdconfig
 from sdtypes import Event
+from sdexception import SDException
 
 def add_event(event,commit=True,conn=sddb.conn):
-    keys_to_insert=['name', 'status', 'project', 'model', 'dataset_pattern', 'variable', 'filename_pattern', 'crea_date', 'priority']
-
     #if sdconfig.config.getboolean('module','post_processing'): # obsolete: now insert event systematically even if post_processing module not enabled (this is to prevent losing events if post_processing has been disabled by error)
-    sdsqlutils.insert(event,keys_to_insert,commit,conn)
+    _pending_events.append(event)
+
+    if commit:
+        flush_events(conn)
+        conn.commit()
+
+def flush_events(conn=sddb.conn):
+    """Insert pending events (the caller is responsible for committing the transaction)."""
+    global _pending_events
+
+    events=_pending_events
+    _pending_events=[]
+
+    return add_events(events,commit=False,conn=conn)
+
+def discard_events():
+    global _pending_events
+
+    _pending_events=[]
+
+def add_events(events,commit=True,conn=sddb.conn):
+    """Insert events in one statement.
+
+    Returns
+        number of inserted events (duplicates are not inserted)
+    """
+    if len(events)==0:
+        return 0
+
+    # coalesce identical events of the batch
+    unique_events={}
+    for e in events:
+        key=tuple(e.__dict__[k] for k in coalescing_keys)
+        if key not in unique_events:
+            unique_events[key]=e
+
+    before=conn.total_changes
+    c = conn.cursor()
+    c.executemany(add_events_query,[[e.__dict__[k] for k in keys_to_insert]+[sdconst.EVENT_STATUS_NEW]+list(key) for (key,e) in unique_events.iteritems()])
+    c.close()
+    count=conn.total_changes-before
+
+    if commit:
+        conn.commit()
+
+    return count
 
 def get_events(limit=None,conn=sddb.conn,**search_constraints):
     """
@@ -33,13 +85,8 @@ def get_events(limit=None,conn=sddb.conn,**search_constraints):
     """
     events=[]
 
-    search_placeholder=sdsqlutils.build_search_placeholder(search_constraints)
-    orderby="priority DESC, crea_date ASC"
-    limit_clause="limit %i"%limit if limit is not None else ""
-
     c = conn.cursor()
-    q="select * from event where %s order by %s %s"%(search_placeholder,orderby,limit_clause)
-    c.execute(q,search_constraints)
+    c.execute(build_get_events_query(search_constraints,limit),search_constraints)
     rs=c.fetchone()
     while rs!=None:
         events.append(sdsqlutils.get_object_from_resultset(rs,Event))
@@ -48,15 +95,33 @@ def get_events(limit=None,conn=sddb.conn,**search_constraints):
 
     return events
 
+def build_get_events_query(search_constraints,limit=None):
+    search_placeholder=sdsqlutils.build_search_placeholder(search_constraints)
+    limit_clause="limit %i"%limit if limit is not None else ""
+
+    return "select * from event where %s order by priority DESC, crea_date ASC %s"%(search_placeholder,limit_clause)
+
 def update_events(events,commit=True,conn=sddb.conn):
     keys=['status'] # TODO: maybe add this too => ,'last_mod_date'
 
-    for e in events:
-        rowcount=sdsqlutils.update(e,keys,commit,conn)
-    
-        # check
-        if rowcount==0:
-            raise SDException("SDEVEDAO-001","event not found (event_id=%s)"%e.event_id)
+    rowcount=sdsqlutils.update_many(events,keys,commit,conn)
+
+    # check
+    if rowcount!=len(events):
+        raise SDException("SDEVEDAO-001","event not found (%i events updated, %i expected)"%(rowcount,len(events)))
+
+def get_delivery_id(e):
+    """Returns the event identifier sent to the post-processing module (used to ignore duplicates when a batch is sent twice)."""
+    return '%s-%i'%(e.crea_date,e.event_id)
+
+# init.
+
+keys_to_insert=['name', 'status', 'project', 'model', 'dataset_pattern', 'variable', 'filename_pattern', 'crea_date', 'priority']
+coalescing_keys=['name', 'project', 'model', 'dataset_pattern', 'variable', 'filename_pattern']
+_pending_events=[]
+
+# queries (also checked by 'sdqueryplan' module)
+add_events_query="insert into event (%s) select %s where not exists (select 1 from event where status=? and %s)"%(', '.join(keys_to_insert),', '.join(['?']*len(keys_to_insert)),' and '.join(['%s is ?'%k for k in coalescing_keys])) # identical events already waiting to be sent are not inserted
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -11,6 +11,7 @@
 
 """Contains file DAO SQL queries."""
 
+import atexit
 import sdapp
 from sdexception import SDException
 import sddb
@@ -21,6 +22,8 @@ import sdlog
 from sdtime import SDTimer
 import sdconst
 import sdsqlitedict
+import sdtransferqueue
+import sdcounter
 
 def update_transfer_last_access_date(i__date,i__transfer_id,conn=sddb.conn):
     # no commit here (will be committed in updatelastaccessdate())
@@ -29,14 +32,19 @@ def update_transfer_last_access_date(i__date,i__transfer_id,conn=sddb.conn):
     c.close()
 
 def add_file(file,commit=True,conn=sddb.conn):
-    keys_to_insert=['status', 'crea_date', 'url', 'local_path', 'filename', 'file_functional_id', 'tracking_id', 'priority', 'checksum', 'checksum_type', 'size', 'variable', 'project', 'model', 'data_node', 'dataset_id', 'insertion_group_id', 'timestamp']
-    # for future:, 'searchapi_host']
-
     if not sdconst.GET_FILES_CACHING:
-        return sdsqlutils.insert(file,keys_to_insert,commit,conn)
+        id_ = sdsqlutils.insert(file,keys_to_insert,commit,conn)
+
+        if file.status==sdconst.TRANSFER_STATUS_WAITING:
+            sdtransferqueue.push(id_,file.data_node,file.priority,file.checksum)
+
+        return id_
     else:
         id_ = sdsqlutils.insert(file,keys_to_insert,commit,conn)
 
+        if file.status==sdconst.TRANSFER_STATUS_WAITING:
+            sdtransferqueue.push(id_,file.data_node,file.priority,file.checksum)
+
         priority = file.__dict__['priority']
         data_node = file.__dict__['data_node']
         hipri = highest_waiting_priority( data_node )
@@ -46,10 +54,39 @@ def add_file(file,commit=True,conn=sddb.conn):
 
         return id_
 
+def add_files(files,commit=True,conn=sddb.conn):
+    """Insert many files in one statement.
+
+    Note
+        The max priority cache is not updated here (caller must call
+        update_highest_waiting_priority() once all files are inserted).
+    """
+    rowcount=sdsqlutils.insert_many(files,keys_to_insert,commit,conn)
+
+    sdtransferqueue.invalidate() # file_id is not known here
+
+    return rowcount
+
+def update_highest_waiting_priority(priorities):
+    """Update the max priority cache after a bulk insertion.
+
+    Args
+        priorities: dict (data_node => highest priority of inserted waiting files)
+    """
+    if not sdconst.GET_FILES_CACHING:
+        return
+
+    for data_node,priority in priorities.iteritems():
+        hipri = highest_waiting_priority( data_node )
+        if hipri is None or priority>hipri:
+            # inserted files are waiting, so the new value is the inserted files max priority (no need to query the database)
+            highest_waiting_priority.vals[data_node] = priority
+
 def delete_file(tr,commit=True,conn=sddb.conn):
     c = conn.cursor()
 
     c.execute("delete from selection__file where file_id=?",(tr.file_id,)) # also delete entries from junction table
+    c.execute("delete from file_replica where file_functional_id=?",(tr.file_functional_id,))
     c.execute("delete from file where file_id=?",(tr.file_id,))
     # note that we don't delete entries (if any) from post_processing tables (this will be done in a batch procedure which will be manually executed from time to time)
 
@@ -142,13 +179,10 @@ def get_files(limit=None,conn=sddb.conn,**search_constraints): # don't change ar
     files=[]
     c = conn.cursor()
 
-    search_placeholder=sdsqlutils.build_search_placeholder(search_constraints)
-    limit_clause="limit %i"%limit if limit is not None else ""
-
     getfirst = priority_clause( data_node, use_cache, c )
     if getfirst=='':
         return []
-    q="select * from file where %s %s %s"%(search_placeholder,getfirst,limit_clause)
+    q=build_get_files_query(search_constraints,getfirst,limit)
     c.execute(q,search_constraints)
     rs=c.fetchone()
 
@@ -159,7 +193,7 @@ def get_files(limit=None,conn=sddb.conn,**search_constraints): # don't change ar
         # an early return.
         highest_waiting_priority( data_node, c )   # compute the priority to retry at
         getfirst = priority_clause( data_node, use_cache, c )
-        q="select * from file where %s %s %s"%(search_placeholder,getfirst,limit_clause)
+        q=build_get_files_query(search_constraints,getfirst,limit)
         c.execute(q,search_constraints)
         rs = c.fetchone()
 
@@ -178,15 +212,21 @@ def get_files(limit=None,conn=sddb.conn,**search_constraints): # don't change ar
     return files
 get_files.files = {}
 
+def build_get_files_query(search_constraints,getfirst,limit=None):
+    search_placeholder=sdsqlutils.build_search_placeholder(search_constraints)
+    limit_clause="limit %i"%limit if limit is not None else ""
+
+    return "select * from file where %s %s %s"%(search_placeholder,getfirst,limit_clause)
+
 def priority_clause( data_node, use_cache, cursor ):
     if use_cache:
         pri = highest_waiting_priority(data_node)
         if pri is None:
             getfirst = ''
         else:
-            getfirst = "AND priority=%s" % pri
+            getfirst = cached_priority_clause % pri
     else:
-        getfirst = "ORDER BY priority DESC, checksum"
+        getfirst = ordered_priority_clause
     return getfirst
 
 def highest_waiting_priority( data_node, cursor=None, connection=sddb.conn ):
@@ -195,41 +235,78 @@ def highest_waiting_priority( data_node, cursor=None, connection=sddb.conn ):
     data node, or one of the specified data nodes if several are provided.
     - When called with a data_node and cursor, it will update its value for that data_node.
     - If cursor==True, then this function will create and close its own cursor.
-    - If data_node==True, then this function will be applied to all data nodes.
+    - If data_node==True, then this function will be applied to all data nodes (one query).
     """
     if cursor is None:
+        if data_node in highest_waiting_priority.vals:
+            sdcounter.incr('maxpri_cache.hit')
+        else:
+            sdcounter.incr('maxpri_cache.miss')
         return (highest_waiting_priority.vals).get(data_node,None)
     else:
+        hwp0 = SDTimer.get_time()
         if cursor==True:
             c = connection.cursor()
         else:
             c = cursor
         if data_node==True:
-            q = "SELECT data_node FROM file GROUP BY data_node"
+            # MAX() ignores NULL, so data nodes without waiting files get None
+            q = "SELECT data_node, MAX(CASE WHEN status='waiting' THEN priority END) FROM file GROUP BY data_node"
             c.execute(q)
-            data_nodes = [tup[0] for tup in c.fetchall()]
+            vals = dict((tup[0],tup[1]) for tup in c.fetchall())
+            data_nodes = vals.keys()
+            for dn in data_nodes:
+                highest_waiting_priority.vals[dn] = vals[dn]
+            sdcounter.incr('maxpri_cache.recompute',len(data_nodes))
         else:
             data_nodes = [data_node]
-        for dn in data_nodes:
-            hwp0 = SDTimer.get_time()
-            q = "SELECT MAX(priority) FROM file WHERE status='waiting' AND data_node='%s'" % dn
-            c.execute(q)
-            val = c.fetchone()
-            if len(val)>0:
-                highest_waiting_priority.vals[dn] = val[0]
-            else:
-                highest_waiting_priority.vals.pop(dn,None)
-            hwp1 = SDTimer.get_elapsed_time( hwp0, show_microseconds=True )
-            #sdlog.info("SDFILDAO-300","time %s to recompute priority=%s for %s" %
-            #           (hwp1,val[0],dn) )
-            #sdlog.info("SDFILDAO-301","  query %s" % q )
+            c.execute(highest_waiting_priority_query,(data_node,))
+            highest_waiting_priority.vals[data_node] = c.fetchone()[0]
+            sdcounter.incr('maxpri_cache.recompute')
+        hwp1 = SDTimer.get_elapsed_time( hwp0, show_microseconds=True )
+        #sdlog.info("SDFILDAO-300","time %s to recompute priority for %s" %
+        #           (hwp1,data_nodes) )
         if cursor==True:
             c.close()
+        if len(data_nodes)==0:
+            return None
         return (highest_waiting_priority.vals).get(data_nodes[0],None)
-# The cache is a database masquerading as a dictionary.  A real dictionary in memory would be:
-# highest_waiting_priority.vals = {}
-highest_waiting_priority.vals=sdsqlitedict.SqliteStringDict(
-    sdconfig.default_db_folder+"/caches.db", 'maxpri', None )
+# The cache is kept in memory (typed values) and written to disk in batch (write-behind), so
+# reading it costs nothing and updating it doesn't commit a transaction each time.
+highest_waiting_priority.vals=sdsqlitedict.WriteBehindDict(
+    sdconfig.default_db_folder+"/caches.db", 'maxpri', value_type=int, flush_interval=sdconst.MAXPRI_CACHE_FLUSH_INTERVAL, pragmas=sddb.get_pragmas() )
+atexit.register(highest_waiting_priority.vals.flush)
+
+keys_to_insert=['status', 'crea_date', 'url', 'local_path', 'filename', 'file_functional_id', 'tracking_id', 'priority', 'checksum', 'checksum_type', 'size', 'variable', 'project', 'model', 'data_node', 'dataset_id', 'insertion_group_id', 'timestamp']
+# for future:, 'searchapi_host']
+
+# queries (also checked by 'sdqueryplan' module)
+ordered_priority_clause="ORDER BY priority DESC, checksum"
+cached_priority_clause="AND priority=%s"
+highest_waiting_priority_query="SELECT MAX(priority) FROM file WHERE status='waiting' AND data_node=?"
+dataset_files_query="select * from file where dataset_id=? order by variable %s"
+
+def refresh_highest_waiting_priority():
+    """Reload the max priority cache if another process may have modified it (e.g. files enqueued by 'synda install').
+
+    Notes
+        - The cache is reloaded when the main database or the cache database
+          is modified by another process (the other process writes the cache
+          when it flushes it, which may happen after the files are committed).
+        - Must be called outside a transaction (see sddb.get_data_version()).
+    """
+    version=sddb.get_data_version()
+    if refresh_highest_waiting_priority.data_version is not None and version!=refresh_highest_waiting_priority.data_version:
+        highest_waiting_priority.vals.reload()
+        sdlog.debug("SYNCDDAO-301","Database modified by another process: max priority cache reloaded")
+    elif highest_waiting_priority.vals.refresh():
+        sdlog.debug("SYNCDDAO-302","Max priority cache modified by another process: cache reloaded")
+    refresh_highest_waiting_priority.data_version=version
+refresh_highest_waiting_priority.data_version=None
+
+def get_highest_waiting_priority_hit_rate():
+    """Returns the max priority cache hit rate (None if the cache has not been used yet)."""
+    return sdcounter.ratio('maxpri_cache.hit',['maxpri_cache.hit','maxpri_cache.miss'])
 
 def get_dataset_files(d,conn=sddb.conn,limit=None):
     """
@@ -244,9 +321,7 @@ def get_dataset_files(d,conn=sddb.conn,limit=None):
 
     limit_clause="limit %i"%limit if limit is not None else ""
 
-    q="select * from file where dataset_id = %i order by variable %s" % (d.dataset_id,limit_clause)
-
-    c.execute(q)
+    c.execute(dataset_files_query%limit_clause,(d.dataset_id,))
 
     rs=c.fetchone()
     while rs!=None:
@@ -273,3 +348,6 @@ def update_file(file,commit=True,conn=sddb.conn):
     elif rowcount>1:
         raise SDException("SYNCDDAO-120","duplicate functional primary key (file_id=%i)"%(i__tr.file_id,))
 
+    if file.status==sdconst.TRANSFER_STATUS_WAITING:
+        sdtransferqueue.push(file.file_id,file.data_node,file.priority,file.checksum) # e.g. transfer retried with another url
+
@@ -31,8 +31,7 @@ def transfer_status_count(status=None,conn=sddb.conn):
     assert status!=None
 
     c=conn.cursor()
-    q="select count(1) from file where status = '%s'" % status
-    c.execute(q)
+    c.execute(transfer_status_count_query,(status,))
     rs=c.fetchone()
 
     if rs==None:
@@ -43,20 +42,27 @@ def transfer_status_count(status=None,conn=sddb.conn):
     return count
 
 def transfer_running_count_by_datanode( conn=sddb.conn ):
-    c = conn.cursor()
+    rcs = {r:0 for r in get_waiting_datanodes(conn)}
+    rcs.update( get_running_count_by_datanode(conn) )
+    return rcs
+
+def get_waiting_datanodes( conn=sddb.conn ):
     if sdconst.GET_FILES_CACHING:
         # Get a list of 'waiting' data nodes from the highest-priority cache
         dns = [dn for dn in sdfiledao.highest_waiting_priority.vals.keys() if
                sdfiledao.highest_waiting_priority.vals[dn] is not None]
-        rcs = {r:0 for r in dns}
     else:
         # Get a list of 'waiting' data nodes from the database
-        q = "SELECT data_node FROM file WHERE status='waiting' GROUP BY data_node"
-        c.execute(q)
-        rcs = {r[0]:0 for r in c.fetchall()}
-    q = "SELECT data_node,COUNT(data_node) FROM file WHERE status='running' GROUP BY data_node"
-    c.execute(q)
-    rcs.update( {r[0]:r[1] for r in c.fetchall()} )
+        c = conn.cursor()
+        c.execute(waiting_datanodes_query)
+        dns = [r[0] for r in c.fetchall()]
+        c.close()
+    return dns
+
+def get_running_count_by_datanode( conn=sddb.conn ):
+    c = conn.cursor()
+    c.execute(running_count_by_datanode_query)
+    rcs = {r[0]:r[1] for r in c.fetchall()}
     c.close()
     return rcs
 
@@ -90,9 +96,9 @@ def count_dataset_files(d,file_status,conn=sddb.conn):
     c = conn.cursor()
 
     if file_status is None:
-        c.execute("select count(1) from file where dataset_id=?",(d.dataset_id,))
+        c.execute(dataset_files_count_query,(d.dataset_id,))
     else:
-        c.execute("select count(1) from file where dataset_id=? and status=?",(d.dataset_id,file_status,))
+        c.execute(dataset_files_count_by_status_query,(d.dataset_id,file_status,))
 
     rs=c.fetchone()
     nbr=rs[0]
@@ -183,6 +189,15 @@ def get_download_speed_over_time():
 
     return li
 
+# init.
+
+# queries (also checked by 'sdqueryplan' module)
+transfer_status_count_query="select count(1) from file where status=?"
+waiting_datanodes_query="SELECT data_node FROM file WHERE status='waiting' GROUP BY data_node"
+running_count_by_datanode_query="SELECT data_node,COUNT(data_node) FROM file WHERE status='running' GROUP BY data_node"
+dataset_files_count_query="select count(1) from file where dataset_id=?"
+dataset_files_count_by_status_query="select count(1) from file where dataset_id=? and status=?"
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     args = parser.parse_args()
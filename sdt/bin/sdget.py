@@ -12,8 +12,9 @@
 """This module contains data file download routines.
 
 Notes
-    - This module provides 3 ways to download data file
+    - This module provides 4 ways to download data file
         - urllib2 (pure python)
+        - native (pure python, used by the daemon)
         - wget (external script)
         - gridftp (external script)
     - This module is mainly used as module, but can also be used as script for basic
@@ -29,11 +30,29 @@ import sdconfig
 import sdutils
 import sdconst
 import sdget_urllib
+import sdget_native
+import sdget_segmented
 from sdtools import print_stderr
 
-def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,verbosity=0,buffered=True,hpss=False):
+def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,verbosity=0,buffered=True,hpss=False,checksum_type=None,segment_count=1,watch=None):
+    """
+    Returns
+        (status,killed,script_stderr,local_checksum) tuple
+
+    Note
+        'local_checksum' is only set if the client computes it while
+        downloading (i.e. native client, with 'checksum_type' set). Else, it
+        is None and the checksum must be computed from the local file.
+
+        'segment_count' is only used by the native client (if greater than
+        1, the file is downloaded with parallel range requests).
+
+        'watch' is the 'sdwatchdog.TransferWatch' object of the transfer, if
+        any (progress is reported to it, and it is used to kill the transfer).
+    """
     killed=False
     script_stderr=None
+    local_checksum=None
 
     transfer_protocol=sdutils.get_transfer_protocol(url)
 
@@ -46,9 +65,17 @@ def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,ti
 
             li=prepare_args(url,full_local_path,sdconfig.data_download_script_http,debug,timeout,verbosity,hpss)
 
-            (status,script_stderr)=run_download_script(li,buffered)
+            (status,script_stderr)=run_download_script(li,buffered,watch)
 
-            killed=is_killed(transfer_protocol,status)
+            killed=is_killed(transfer_protocol,status,http_client)
+
+        elif http_client==sdconst.HTTP_CLIENT_NATIVE:
+            if segment_count>1:
+                (status,script_stderr,local_checksum)=sdget_segmented.download_file(url,full_local_path,segment_count,timeout,checksum_type,watch)
+            else:
+                (status,script_stderr,local_checksum)=sdget_native.download_file(url,full_local_path,timeout,checksum_type,watch)
+
+            killed=is_killed(transfer_protocol,status,http_client)
 
         else:
             assert False
@@ -61,7 +88,7 @@ def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,ti
 
         li=prepare_args(url,full_local_path,sdconfig.data_download_script_gridftp,debug,timeout,verbosity,hpss)
 
-        (status,script_stderr)=run_download_script(li,buffered)
+        (status,script_stderr)=run_download_script(li,buffered,watch)
 
         killed=is_killed(transfer_protocol,status)
 
@@ -73,29 +100,35 @@ def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,ti
 
         assert False
 
-    return (status,killed,script_stderr)
+    return (status,killed,script_stderr,local_checksum)
+
+def run_download_script(li,buffered,watch=None):
+    kwargs={}
+    if watch is not None:
+        # the script runs in its own process group, so the watchdog can kill it with wget
+        kwargs['preexec_fn']=os.setpgrp
+        kwargs['on_start']=watch.set_process
 
-def run_download_script(li,buffered):
     if buffered:
-        return run_download_script_BUFSTDXXX(li)
+        return run_download_script_BUFSTDXXX(li,**kwargs)
     else:
-        return run_download_script_RTSTDXXX(li)
+        return run_download_script_RTSTDXXX(li,**kwargs)
 
-def run_download_script_RTSTDXXX(li):
+def run_download_script_RTSTDXXX(li,**kwargs):
 
     # start a new process (fork is blocking here, so thread will wait until child is done)
-    status=sdutils.get_status(li,shell=False)
+    status=sdutils.get_status(li,shell=False,**kwargs)
 
     return (status,None)
 
-def run_download_script_BUFSTDXXX(li):
+def run_download_script_BUFSTDXXX(li,**kwargs):
 
     # start a new process (fork is blocking here, so thread will wait until child is done)
     #
     # note
     #  in the child shell script, stderr for error message
     #
-    (status,stdout,stderr)=sdutils.get_status_output(li,shell=False)
+    (status,stdout,stderr)=sdutils.get_status_output(li,shell=False,**kwargs)
 
 
     # download scripts may
@@ -153,16 +186,16 @@ def run_download_script_BUFSTDXXX(li):
 
     return (status,stderr)
 
-def is_killed(transfer_protocol,status):
-    """This func return True if child process has been killed."""
+def is_killed(transfer_protocol,status,http_client=sdconfig.http_client):
+    """This func return True if child process (or in-process transfer) has been killed."""
 
     if transfer_protocol==sdconst.TRANSFER_PROTOCOL_HTTP:
-        if sdconfig.http_client==sdconst.HTTP_CLIENT_WGET:
+        if http_client in (sdconst.HTTP_CLIENT_WGET,sdconst.HTTP_CLIENT_NATIVE):
             if status in (7,29):
                 return True
             else:
                 return False
-        elif sdconfig.http_client==sdconst.HTTP_CLIENT_URLLIB:
+        elif http_client==sdconst.HTTP_CLIENT_URLLIB:
             return False
         else:
             assert False
@@ -222,7 +255,7 @@ if __name__ == '__main__':
         if os.path.isfile(local_path):
             os.remove(local_path)
 
-        (status,killed,script_stderr)=download(url,local_path,debug=True)
+        (status,killed,script_stderr,local_checksum)=download(url,local_path,debug=True)
 
         if status!=0:
             if not args.quiet:
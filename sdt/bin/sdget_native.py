@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains file transfer functions for HTTP protocol (in-process impl.).
+
+Notes
+    - Unlike 'sdget.sh', no process is forked: the file is downloaded by the
+      calling thread.
+    - There is one session per data node (scheme+host+port), so connections,
+      TLS sessions and ORP cookies are reused between transfers.
+    - The X509 client certificate (sdconfig.esgf_x509_proxy) is sent to the
+      data node and to the ORP. As with 'sdget.sh', server certificate is not
+      checked.
+    - Errors are mapped to 'sdget.sh' return codes (see 'sdget.sh' header),
+      so both clients are handled the same way downstream.
+    - If a checksum type is given, the checksum is computed while the file is
+      written (so the file doesn't need to be read again).
+    - Interrupted transfers are resumed with HTTP range requests when the
+      server supports them (see 'PartialFile' class).
+"""
+
+import os
+import re
+import sys
+import json
+import socket
+import argparse
+import urlparse
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connection import HTTPConnection
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import sdapp
+import sdconst
+import sdconfig
+import sdlog
+import sdutils
+import sdcounter
+
+class DataNodeAdapter(HTTPAdapter):
+    """Transport adapter with large socket receive buffer."""
+
+    def init_poolmanager(self,*args,**kwargs):
+        kwargs['socket_options']=HTTPConnection.default_socket_options+[(socket.SOL_SOCKET,socket.SO_RCVBUF,socket_buffer_size)]
+        HTTPAdapter.init_poolmanager(self,*args,**kwargs)
+
+class AbortException(Exception):
+    pass
+
+class ResumeException(Exception):
+    pass
+
+class PartialFile():
+    """File being downloaded.
+
+    Notes
+        - Data are written in '<local_path>.part', which is renamed to
+          '<local_path>' once the transfer is complete.
+        - Metadata needed to resume the transfer (url, expected size, bytes
+          written, validator) are stored in '<local_path>.part.json'.
+        - Hash objects can't be saved, so when a transfer is resumed, the
+          checksum of the bytes already written is computed again from the
+          local partial file.
+    """
+
+    def __init__(self,local_path,url,checksum_type):
+        self.local_path=local_path
+        self.path='%s.part'%local_path
+        self.metadata_path='%s.part.json'%local_path
+        self.url=url
+        self.checksum_type=checksum_type
+        self.f=None
+        self.digest=None
+        self.metadata=self.load_metadata() # None if there is nothing to resume
+
+    def load_metadata(self):
+        if not os.path.isfile(self.path):
+            self.discard()
+            return None
+
+        try:
+            with open(self.metadata_path,'r') as fh:
+                metadata=json.load(fh)
+        except Exception,e:
+            self.discard()
+            return None
+
+        if metadata['url']!=self.url or not metadata['accept_ranges']:
+            self.discard()
+            return None
+
+        return metadata
+
+    def get_resume_headers(self):
+        """Returns HTTP headers used to resume the transfer (empty if the transfer starts from scratch)."""
+        if self.metadata is None:
+            return {}
+
+        offset=os.path.getsize(self.path)
+        if offset==0:
+            return {}
+
+        headers={'Range':'bytes=%d-'%offset}
+        if self.metadata['validator'] is not None:
+            headers['If-Range']=self.metadata['validator'] # if the remote file has changed, the whole file is returned
+
+        return headers
+
+    def open(self,response):
+        """Open the partial file (to append data if the server returns the requested range)."""
+        offset=0
+
+        if response.status_code==206:
+            offset=get_range_start(response.headers.get('Content-Range',''))
+            if offset!=os.path.getsize(self.path):
+                raise ResumeException("Incorrect range returned by the server (%s)"%response.headers.get('Content-Range'))
+
+            self.f=open(self.path,'r+b')
+            self.f.seek(offset)
+
+            sdcounter.incr('download.resumed')
+            sdcounter.incr('download.resumed_bytes',offset) # bytes not downloaded again
+            sdlog.info("SDGETNAT-002","Resume transfer (offset=%d,url=%s)"%(offset,self.url))
+        else:
+            if self.metadata is not None:
+                # server ignored the range request (e.g. remote file has changed)
+
+                sdcounter.incr('download.resume_fallback')
+
+            self.f=open(self.path,'wb')
+
+        if self.checksum_type is not None:
+            self.digest=sdutils.get_checksum_object(self.checksum_type)
+            if offset>0:
+                self.update_digest_from_disk(offset)
+
+        content_length=response.headers.get('Content-Length')
+
+        self.metadata={'url':self.url,
+                       'size':offset+int(content_length) if content_length is not None else None,
+                       'bytes_written':offset,
+                       'accept_ranges':(response.status_code==206 or response.headers.get('Accept-Ranges','none').lower()=='bytes'),
+                       'validator':response.headers.get('ETag',response.headers.get('Last-Modified'))}
+        self.save_metadata()
+
+    def update_digest_from_disk(self,size):
+        with open(self.path,'rb') as fh:
+            remaining=size
+            while remaining>0:
+                data=fh.read(min(read_size,remaining))
+                if len(data)==0:
+                    break
+                self.digest.update(data)
+                remaining-=len(data)
+
+    def write(self,data):
+        self.f.write(data)
+        self.metadata['bytes_written']+=len(data)
+
+        if self.digest is not None:
+            self.digest.update(data)
+
+    def close(self):
+        """Close the partial file (data and metadata are kept, so the transfer can be resumed)."""
+        if self.f is not None:
+            self.f.close()
+            self.f=None
+            self.save_metadata()
+
+    def save_metadata(self):
+        with open(self.metadata_path,'w') as fh:
+            json.dump(self.metadata,fh)
+
+    def is_complete(self):
+        """Returns False if the connection has been closed before the end of the file."""
+        return self.metadata['size'] is None or self.metadata['bytes_written']==self.metadata['size']
+
+    def is_resumable(self):
+        return self.metadata is not None and self.metadata['accept_ranges'] and self.metadata['bytes_written']>0
+
+    def complete(self):
+        os.rename(self.path,self.local_path)
+        os.remove(self.metadata_path)
+
+    def discard(self):
+        for path in (self.path,self.metadata_path):
+            if os.path.isfile(path):
+                os.remove(path)
+        self.metadata=None
+
+    def get_checksum(self):
+        return self.digest.hexdigest() if self.digest is not None else None
+
+def download_file(url,local_path,timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,checksum_type=None,watch=None):
+    """Download one file.
+
+    Notes
+        - If the transfer fails and the server accepts range requests, the
+          partial file is kept, so the next attempt resumes where this one
+          stopped (see 'PartialFile' class).
+        - If 'watch' is set ('sdwatchdog.TransferWatch' object), written bytes
+          are reported to it, and the transfer is aborted if it gets killed.
+
+    Returns
+        (status,error_msg,checksum) tuple, with status being a 'sdget.sh'
+        return code, and checksum being None if 'checksum_type' is not set or
+        if the transfer failed
+    """
+
+    # check arguments
+    if not local_path.startswith('/'):
+        return (3,"Incorrect format: local file path must start with a slash (%s)"%local_path,None)
+    if os.path.exists(local_path):
+        return (2,"Local file already exists (%s)"%local_path,None)
+
+    # create local folder
+    try:
+        destdir=os.path.dirname(local_path)
+        if not os.path.isdir(destdir):
+            os.makedirs(destdir)
+
+        partial=PartialFile(local_path,url,checksum_type)
+    except (IOError,OSError),e:
+        return (30,"Local file creation error (%s)"%local_path,None)
+
+    try:
+        (status,error_msg)=transfer(url,partial,timeout,watch)
+    finally:
+        partial.close()
+
+    if status==0:
+        try:
+            partial.complete()
+        except (IOError,OSError),e:
+            return (30,"Local file creation error (%s)"%local_path,None)
+    else:
+        if not partial.is_resumable():
+            # remove partial file (this is to not have thousand of empty files)
+            partial.discard()
+
+        sdlog.debug("SDGETNAT-001","Transfer failed with error %d (%s,%s)"%(status,error_msg,url))
+
+        return (status,error_msg,None)
+
+    return (status,error_msg,partial.get_checksum())
+
+def transfer(url,partial,timeout,watch=None):
+    """Write response body into 'partial'."""
+    headers=partial.get_resume_headers()
+
+    (status,error_msg,response,redirect_count)=get(url,headers,timeout)
+    if status!=0:
+        return (status,error_msg)
+
+    try:
+        if response.status_code==416 and len(headers)>0:
+            # partial file doesn't match the remote file anymore, so we start from scratch
+
+            response.close()
+            partial.discard()
+
+            return transfer(url,partial,timeout,watch)
+        elif response.status_code not in (200,206):
+            return get_http_error(response,redirect_count)
+
+        try:
+            partial.open(response)
+        except (IOError,OSError),e:
+            return (30,"Local file creation error (%s)"%partial.path)
+
+        socket2disk(response,partial,watch)
+
+        if not partial.is_complete():
+            return (1,"Connection closed before the end of the file (%d/%d bytes)"%(partial.metadata['bytes_written'],partial.metadata['size']))
+
+        return (0,"")
+    except AbortException,e:
+        return (7,"Transfer aborted")
+    except ResumeException,e:
+        partial.close()
+        partial.discard()
+        return (1,str(e))
+    except Exception,e:
+        return (1,"Transfer failed (%s)"%str(e))
+    finally:
+        response.close() # give the connection back to the pool
+
+def get(url,headers,timeout):
+    """Send a GET request, following redirects (ORP authentication).
+
+    Notes
+        - Redirects are followed here (not by 'requests'), so we know if an
+          error occurs before or after the redirect to the ORP (as
+          'sdparsewgetoutput.sh' does for wget).
+        - ORP cookies are stored in the session, so next transfers from the
+          same data node skip the redirects.
+        - Response body is not read (caller must close the response).
+
+    Returns
+        (status,error_msg,response,redirect_count) tuple (response is None if status is not 0)
+    """
+    session=get_session(url)
+    redirect_count=0
+
+    try:
+        while True:
+            response=session.get(url,headers=headers,timeout=timeout,stream=True,allow_redirects=False,verify=verify)
+
+            if response.is_redirect:
+                redirect_count+=1
+                url=urlparse.urljoin(url,response.headers['location'])
+                response.close()
+
+                if redirect_count>max_redirect:
+                    return (12,"Permission error (you need to susbscribe to the required role/group to access the data (e.g. cmip5-research)).",None,redirect_count)
+            else:
+                break
+    except requests.exceptions.Timeout,e:
+        return (25 if redirect_count==0 else 21,"Read error (Connection timed out) in headers (%s)"%str(e),None,redirect_count)
+    except requests.exceptions.ConnectionError,e:
+        return (23 if redirect_count==0 else 28,"Connection error (%s)"%str(e),None,redirect_count)
+    except Exception,e:
+        return (1,"Transfer failed (%s)"%str(e),None,redirect_count)
+
+    if response.status_code==403:
+        response.close()
+        return (22 if redirect_count==0 else 20,"403 Forbidden",None,redirect_count)
+
+    return (0,"",response,redirect_count)
+
+def get_http_error(response,redirect_count):
+    """Returns (status,error_msg) tuple for unexpected HTTP status code."""
+    return (23 if redirect_count==0 else 24,"HTTP error %d"%response.status_code)
+
+def socket2disk(response,partial,watch=None):
+    if watch is not None:
+        abort_callback=lambda: abort_response(response)
+        watch.add_abort_callback(abort_callback)
+
+    try:
+        for data in response.raw.stream(read_size,decode_content=False):
+            if is_aborted(watch):
+                raise AbortException()
+
+            partial.write(data)
+
+            if watch is not None:
+                watch.add_bytes(len(data))
+
+        if is_aborted(watch):
+            raise AbortException() # connection may have been shut down by abort_response()
+    except AbortException,e:
+        raise
+    except Exception,e:
+        if is_aborted(watch):
+            raise AbortException() # read error caused by abort_response()
+        raise
+    finally:
+        if watch is not None:
+            watch.remove_abort_callback(abort_callback)
+
+def abort_response(response):
+    """Shut down the response connection, so a thread blocked reading it returns (called from another thread)."""
+    try:
+        connection=response.raw.connection
+        if connection is not None and connection.sock is not None:
+            connection.sock.shutdown(socket.SHUT_RDWR)
+    except Exception,e:
+        pass # connection already closed
+
+def is_aborted(watch):
+    """Returns True if the transfer must be aborted (shutdown or killed by the watchdog)."""
+    return quit==1 or (watch is not None and watch.is_killed())
+
+def get_range_start(content_range):
+    """Returns the first byte position of a 'Content-Range' header (e.g. 'bytes 100-199/200' => 100)."""
+    m=re.match(r'^bytes (\d+)-\d+/(\d+|\*)$',content_range.strip())
+    if m is None:
+        raise ResumeException("Incorrect Content-Range header (%s)"%content_range)
+    return int(m.group(1))
+
+def get_session(url):
+    u=urlparse.urlparse(url)
+    key=(u.scheme,u.netloc)
+
+    with _lock:
+        if key not in _sessions:
+            _sessions[key]=create_session()
+
+        return _sessions[key]
+
+def create_session():
+    session=requests.Session()
+
+    adapter=DataNodeAdapter(pool_connections=1,pool_maxsize=pool_maxsize)
+    session.mount('http://',adapter)
+    session.mount('https://',adapter)
+
+    if os.path.isfile(sdconfig.esgf_x509_proxy):
+        session.cert=sdconfig.esgf_x509_proxy # file contains both the certificate and the private key
+
+    return session
+
+def reset():
+    """Close all connections."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+# init.
+
+max_redirect=2                   # two redirects are needed for ORP authentication (to the ORP and back)
+read_size=262144
+socket_buffer_size=4194304       # socket receive buffer size (the kernel may cap it, see net.core.rmem_max)
+verify=False                     # same as wget '--no-check-certificate' option (set per request, as session setting is overridden by REQUESTS_CA_BUNDLE env. var.)
+pool_maxsize=sdconfig.config.getint('download','max_parallel_download_per_datanode') # max number of kept-alive connections per data node
+
+quit=0 # set to 1 to abort running transfers (e.g. during shutdown)
+
+_sessions={} # (scheme,netloc) => requests.Session
+_lock=threading.Lock()
+
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('url')
+    parser.add_argument('local_path')
+    parser.add_argument('-t','--timeout',type=int,default=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT)
+    parser.add_argument('-c','--checksum_type',choices=sdconst.CHECKSUM_TYPES,default=None)
+    args = parser.parse_args()
+
+    (status,error_msg,checksum)=download_file(args.url,args.local_path,args.timeout,args.checksum_type)
+
+    if status!=0:
+        print >> sys.stderr, error_msg
+    elif checksum is not None:
+        print checksum
+
+    sys.exit(status)
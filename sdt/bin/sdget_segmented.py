@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains segmented file transfer funcs for HTTP protocol.
+
+Notes
+    - The file is split into byte ranges (segments), which are downloaded in
+      parallel (one thread and one connection per segment). This is used for
+      big files (see 'segmentation_threshold' parameter), as one TCP stream
+      can't use the whole bandwidth on high latency links.
+    - Data node sessions of the native client are used (see 'sdget_native'
+      module).
+    - The local file ('<local_path>.part') is preallocated, then each segment
+      is written at its own offset.
+    - Each segment is retried on its own (from where it stopped).
+    - The checksum can't be computed while writing (segments are not written
+      in order), so it is computed by the caller once the file is complete.
+    - If the server doesn't support range requests, the file is downloaded in
+      one stream (see 'sdget_native' module).
+    - Unlike single stream transfers, a failed segmented transfer is not
+      resumed (the partial file is removed).
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+import sdapp
+import sdconst
+import sdlog
+import sdcounter
+import sdget_native
+
+class Segment():
+    def __init__(self,index,start,end):
+        self.index=index
+        self.start=start
+        self.end=end       # last byte (inclusive)
+        self.offset=start  # next byte to download
+        self.attempts=0
+        self.duration=0
+        self.status=None
+        self.error_msg=''
+
+    def get_size(self):
+        return self.end-self.start+1
+
+    def is_complete(self):
+        return self.offset>self.end
+
+    def get_throughput(self):
+        """Returns throughput (MB per second)."""
+        if self.duration>0:
+            return (self.offset-self.start)/self.duration/1e6
+        else:
+            return 0
+
+class SegmentThread(threading.Thread):
+    def __init__(self,url,path,validator,segment,timeout,watch):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.watch=watch
+        self.url=url
+        self.path=path
+        self.validator=validator
+        self.segment=segment
+        self.timeout=timeout
+        self.retry=True # set to False if retrying can't help (e.g. remote file has changed)
+
+    def run(self):
+        seg=self.segment
+
+        while seg.attempts<max_segment_attempt:
+            seg.attempts+=1
+
+            start=time.time()
+            (seg.status,seg.error_msg)=self.download()
+            seg.duration+=time.time()-start
+
+            if seg.status==0 or not self.retry:
+                break
+
+            sdcounter.incr('download.segment_retries')
+            sdlog.info("SDGETSEG-003","Segment failed, will retry (index=%d,attempt=%d,status=%d,error=%s,url=%s)"%(seg.index,seg.attempts,seg.status,seg.error_msg,self.url))
+
+    def download(self):
+        seg=self.segment
+
+        headers={'Range':'bytes=%d-%d'%(seg.offset,seg.end)}
+        if self.validator is not None:
+            headers['If-Range']=self.validator
+
+        (status,error_msg,response,redirect_count)=sdget_native.get(self.url,headers,self.timeout)
+        if status!=0:
+            return (status,error_msg)
+
+        if self.watch is not None:
+            abort_callback=lambda: sdget_native.abort_response(response)
+            self.watch.add_abort_callback(abort_callback)
+
+        try:
+            if response.status_code==200:
+                self.retry=False
+                return (1,"Remote file has changed during the transfer")
+            elif response.status_code!=206:
+                return sdget_native.get_http_error(response,redirect_count)
+
+            if sdget_native.get_range_start(response.headers.get('Content-Range',''))!=seg.offset:
+                self.retry=False
+                return (1,"Incorrect range returned by the server (%s)"%response.headers.get('Content-Range'))
+
+            with open(self.path,'r+b') as fh:
+                fh.seek(seg.offset)
+
+                for data in response.raw.stream(sdget_native.read_size,decode_content=False):
+                    if sdget_native.is_aborted(self.watch):
+                        raise sdget_native.AbortException()
+
+                    data=data[:seg.end+1-seg.offset]
+                    fh.write(data)
+                    seg.offset+=len(data)
+
+                    if self.watch is not None:
+                        self.watch.add_bytes(len(data))
+
+                    if seg.is_complete():
+                        break
+
+            if sdget_native.is_aborted(self.watch):
+                raise sdget_native.AbortException() # connection may have been shut down by abort_response()
+
+            if not seg.is_complete():
+                return (1,"Connection closed before the end of the segment (%d/%d bytes)"%(seg.offset-seg.start,seg.get_size()))
+
+            return (0,"")
+        except sdget_native.AbortException,e:
+            self.retry=False
+            return (7,"Transfer aborted")
+        except sdget_native.ResumeException,e:
+            self.retry=False
+            return (1,str(e))
+        except (IOError,OSError),e:
+            self.retry=False
+            return (30,"Local file creation error (%s)"%self.path)
+        except Exception,e:
+            if sdget_native.is_aborted(self.watch):
+                self.retry=False
+                return (7,"Transfer aborted")
+
+            return (1,"Transfer failed (%s)"%str(e))
+        finally:
+            if self.watch is not None:
+                self.watch.remove_abort_callback(abort_callback)
+
+            response.close()
+
+def download_file(url,local_path,segment_count,timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,checksum_type=None,watch=None):
+    """Download one file using 'segment_count' parallel connections.
+
+    Note
+        'watch' is the 'sdwatchdog.TransferWatch' object of the transfer (if any).
+
+    Returns
+        (status,error_msg,checksum) tuple, with status being a 'sdget.sh'
+        return code, and checksum being None unless the file has been
+        downloaded in one stream (see 'sdget_native.download_file()')
+    """
+
+    # check arguments
+    if not local_path.startswith('/'):
+        return (3,"Incorrect format: local file path must start with a slash (%s)"%local_path,None)
+    if os.path.exists(local_path):
+        return (2,"Local file already exists (%s)"%local_path,None)
+
+    # retrieve file size and check if range requests are supported
+    (status,error_msg,size,validator)=get_file_info(url,timeout)
+    if status!=0:
+        sdlog.debug("SDGETSEG-001","Transfer failed with error %d (%s,%s)"%(status,error_msg,url))
+        return (status,error_msg,None)
+
+    if size is not None:
+        segment_count=min(segment_count,size/min_segment_size)
+
+    if size is None or segment_count<2:
+        return sdget_native.download_file(url,local_path,timeout,checksum_type,watch)
+
+    # preallocate local file
+    path='%s.part'%local_path
+    try:
+        destdir=os.path.dirname(local_path)
+        if not os.path.isdir(destdir):
+            os.makedirs(destdir)
+
+        sdget_native.PartialFile(local_path,url,None).discard() # partial file from a previous single stream transfer, if any
+
+        with open(path,'wb') as fh:
+            fh.truncate(size)
+    except (IOError,OSError),e:
+        return (30,"Local file creation error (%s)"%local_path,None)
+
+    segments=split(size,segment_count)
+
+    threads=[SegmentThread(url,path,validator,seg,timeout,watch) for seg in segments]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    for seg in segments:
+        sdcounter.observe('download.segment_throughput',seg.get_throughput())
+        sdlog.info("SDGETSEG-002","Segment %s (index=%d,size=%d,duration=%.1f,throughput=%.1f MB/s,attempts=%d,url=%s)"%('done' if seg.status==0 else 'failed',seg.index,seg.get_size(),seg.duration,seg.get_throughput(),seg.attempts,url))
+
+    failed=[seg for seg in segments if seg.status!=0]
+
+    if len(failed)>0:
+        if os.path.isfile(path):
+            os.remove(path)
+
+        sdlog.debug("SDGETSEG-001","Transfer failed with error %d (%s,%s)"%(failed[0].status,failed[0].error_msg,url))
+
+        return (failed[0].status,"Segment %d failed (%s)"%(failed[0].index,failed[0].error_msg),None)
+
+    try:
+        os.rename(path,local_path)
+    except (IOError,OSError),e:
+        return (30,"Local file creation error (%s)"%local_path,None)
+
+    sdcounter.incr('download.segmented')
+
+    return (0,"",None)
+
+def get_file_info(url,timeout):
+    """Retrieve remote file size and validator with a one byte range request.
+
+    Returns
+        (status,error_msg,size,validator) tuple, with size being None if range requests are not supported
+    """
+    (status,error_msg,response,redirect_count)=sdget_native.get(url,{'Range':'bytes=0-0'},timeout)
+    if status!=0:
+        return (status,error_msg,None,None)
+
+    try:
+        if response.status_code==200:
+            return (0,"",None,None)
+        elif response.status_code!=206:
+            (status,error_msg)=sdget_native.get_http_error(response,redirect_count)
+            return (status,error_msg,None,None)
+
+        m=re.match(r'^bytes 0-0/(\d+)$',response.headers.get('Content-Range','').strip())
+        if m is None:
+            return (0,"",None,None)
+
+        return (0,"",int(m.group(1)),response.headers.get('ETag',response.headers.get('Last-Modified')))
+    finally:
+        response.close()
+
+def split(size,segment_count):
+    """Returns Segment list covering 'size' bytes."""
+    segment_size=(size+segment_count-1)/segment_count
+
+    segments=[]
+    for i in range(segment_count):
+        start=i*segment_size
+        end=min(size,start+segment_size)-1
+        if start<=end:
+            segments.append(Segment(i,start,end))
+
+    return segments
+
+# init.
+
+max_segment_attempt=3       # max number of attempts per segment
+min_segment_size=16777216   # smaller files are downloaded with less segments (or in one stream)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('url')
+    parser.add_argument('local_path')
+    parser.add_argument('-n','--segment_count',type=int,default=4)
+    parser.add_argument('-t','--timeout',type=int,default=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT)
+    args = parser.parse_args()
+
+    (status,error_msg,checksum)=download_file(args.url,args.local_path,args.segment_count,args.timeout)
+
+    if status!=0:
+        print >> sys.stderr, error_msg
+
+    sys.exit(status)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the HTTP connection pool used for search-API calls.
+
+Notes
+    - There is one session per host (scheme+host+port), so connections (and
+      TLS sessions) are kept alive and reused between pagination calls.
+    - The number of connections per host is bounded by 'pool_maxsize'
+      (callers wait for a free connection when all are busy).
+    - gzip/deflate encoding is requested and transparently decoded.
+    - Opened connections and requests are counted (see 'sdcounter' module),
+      so reused connections count is 'requests - opened connections'.
+"""
+
+import argparse
+import urlparse
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool,HTTPSConnectionPool
+from requests.packages.urllib3.connection import HTTPConnection,HTTPSConnection
+import sdapp
+import sdconfig
+import sdcounter
+import sdlog
+
+# sockets are counted (not connection objects), as a discarded connection
+# object is given back to the pool and reconnected when reused
+
+class CountingHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        sdcounter.incr('http_pool.connection_opened')
+        return HTTPConnection._new_conn(self)
+
+class CountingHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        sdcounter.incr('http_pool.connection_opened')
+        return HTTPSConnection._new_conn(self)
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls=CountingHTTPConnection
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls=CountingHTTPSConnection
+
+class PoolAdapter(HTTPAdapter):
+    """Transport adapter which counts opened connections."""
+
+    def init_poolmanager(self,*args,**kwargs):
+        HTTPAdapter.init_poolmanager(self,*args,**kwargs)
+        self.poolmanager.pool_classes_by_scheme={'http':CountingHTTPConnectionPool,'https':CountingHTTPSConnectionPool}
+
+class PooledResponse():
+    """File-like object used to read the response body incrementally.
+
+    Note
+        close() must be called to give the connection back to the pool.
+    """
+
+    def __init__(self,response):
+        self.response=response
+        self.response.raw.decode_content=True # gzip/deflate
+
+    def read(self,size=-1):
+        raw=self.response.raw
+
+        if size<0:
+            return raw.read()
+
+        # with compressed content, a block may decode to nothing before the end of the stream
+        data=raw.read(size)
+        while len(data)==0 and not raw.closed:
+            data=raw.read(size)
+
+        return data
+
+    def close(self):
+        """Release the connection.
+
+        Note
+            The unread part of the body (e.g. facet_counts) is read, so the
+            connection can be reused. If it is too big, the connection is
+            closed instead.
+        """
+        raw=self.response.raw
+
+        try:
+            drained=0
+            while drained<max_drain_size:
+                data=raw.read(read_size)
+                if len(data)==0 and raw.closed:
+                    break
+                drained+=len(data)
+            else:
+                self.response.close() # discard the connection
+                return
+        except Exception,e:
+            self.response.close() # discard the connection
+            return
+
+        raw.release_conn()
+
+def get(url,timeout):
+    """Send a GET request using the pooled session of the host.
+
+    Returns
+        PooledResponse object
+    """
+    session=get_session(url)
+
+    sdcounter.incr('http_pool.request')
+
+    response=session.get(url,timeout=timeout,stream=True,verify=verify)
+    try:
+        response.raise_for_status()
+    except:
+        response.close()
+        raise
+
+    return PooledResponse(response)
+
+def get_session(url):
+    u=urlparse.urlparse(url)
+    key=(u.scheme,u.netloc)
+
+    with _lock:
+        if key not in _sessions:
+            _sessions[key]=create_session()
+
+        return _sessions[key]
+
+def create_session():
+    session=requests.Session()
+
+    adapter=PoolAdapter(pool_connections=1,pool_maxsize=pool_maxsize,pool_block=True)
+    session.mount('http://',adapter)
+    session.mount('https://',adapter)
+
+    session.headers['Accept-Encoding']='gzip, deflate'
+
+    return session
+
+def get_stats():
+    requests_count=sdcounter.get('http_pool.request')
+    opened=sdcounter.get('http_pool.connection_opened')
+
+    return {'requests':requests_count,'connections_opened':opened,'connections_reused':max(requests_count-opened,0)}
+
+def log_stats():
+    stats=get_stats()
+    if stats['requests']>0:
+        sdlog.debug("SDHTPOOL-001","HTTP pool stats (requests=%d,connections-opened=%d,connections-reused=%d)"%(stats['requests'],stats['connections_opened'],stats['connections_reused']))
+
+def reset():
+    """Close all connections."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+# init.
+
+pool_maxsize=sdconfig.max_metadata_parallel_download_per_index # max number of connections per host
+read_size=65536
+max_drain_size=1048576 # max number of unread bytes read to keep the connection alive
+verify=True
+
+_sessions={} # (scheme,netloc) => requests.Session
+_lock=threading.Lock()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('url')
+    parser.add_argument('-n','--count',type=int,default=3,help='Number of calls')
+    args = parser.parse_args()
+
+    for i in range(args.count):
+        fh=get(args.url,60)
+        print "%d bytes"%len(fh.read())
+        fh.close()
+
+    print get_stats()
@@ -215,4 +215,9 @@ m0026="""synda daemon start"""
 
 m0027="You must either be root, or part of the synda group to perform this command."
 m0028="Unable to access credentials file necessary to perform this action, please make sure you have sufficient " \
-      "permissions for the said file then retry the command."
\ No newline at end of file
+      "permissions for the said file then retry the command."
+
+m0029="""
+            priority all 2000
+            priority cmip5.output1.MIROC.MIROC4h.rcp45.6hr.atmos.6hrLev.r1i1p1.v20110926.ua_6hrLev_MIROC4h_rcp45_r1i1p1_2029081100-2029082018.nc 2000
+"""
\ No newline at end of file
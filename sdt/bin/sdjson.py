@@ -11,6 +11,7 @@
 
 """This module translate search-api json output to python object."""
 
+import re
 import argparse
 import json
 import sdapp
@@ -56,6 +57,57 @@ def parse_parameters(buffer):
 
     return params
 
+def parse_doc(doc_node):
+    """Returns file (or dataset) from a 'doc' node."""
+    l__dict={}
+
+    """
+    SAMPLE
+
+    {
+    "id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601|esgf2.dkrz.de",
+    "data_node":"esgf2.dkrz.de",
+    "instance_id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601",
+    "size":23697992,
+    "type":"Dataset",
+    "variable":["sbl",
+      "snc",
+      "snd",
+      "snm",
+      "snw",
+      "tsn"],
+    "score":1.0
+    },
+    """
+
+    for attr_name,attr_value in doc_node.iteritems():
+
+        # TODO: maybe move transformation below in a downstream
+        #       step (e.g. in the generic pipeline) so to keep
+        #       original xml stream not altered when using dump
+        #       action in raw mode.
+
+        if attr_name=="url":
+            # url array have three subitems (GRIDFTP, HTTPServer and openDAP)
+            # url array entry sample => http://bmbf-ipcc-ar5.dkrz.de/thredds/fileServer/cmip5/output1/MPI-M/MPI-ESM-P/historical/mon/atmos/Amon/r1i1p1/v20120315/tasmin/tasmin_Amon_MPI-ESM-P_historical_r1i1p1_185001-200512.nc|application/netcdf|HTTPServer
+
+            for item in attr_value:
+                url=item.split('|')[0] # keep only first field (i.e. keep only the file url)
+                protocol=item.split('|')[-1]
+
+                if protocol.upper()=="HTTPSERVER":
+                    l__dict['url_http']=url
+                elif protocol.upper()=="GRIDFTP":
+                    l__dict['url_gridftp']=url
+                elif protocol.upper()=="GLOBUS":
+                    l__dict['url_globus']=url
+                elif protocol.upper()=="OPENDAP":
+                    l__dict['url_opendap']=url
+        else:
+            l__dict[attr_name]=attr_value
+
+    return l__dict
+
 def parse_metadata(buffer):
     """Parse result for both type (Dataset and File)."""
     xmldoc=None
@@ -89,69 +141,154 @@ def parse_metadata(buffer):
     doc_nodes=body_node["docs"]
 
     for doc_node in doc_nodes: # file/dataset loop
-        l__dict={}
-
-        """
-        SAMPLE
-
-        {
-        "id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601|esgf2.dkrz.de",
-        "data_node":"esgf2.dkrz.de",
-        "instance_id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601",
-        "size":23697992,
-        "type":"Dataset",
-        "variable":["sbl",
-          "snc",
-          "snd",
-          "snm",
-          "snw",
-          "tsn"],
-        "score":1.0
-        },
-        """
-
-        for attr_name,attr_value in doc_node.iteritems():
-
-            # TODO: maybe move transformation below in a downstream
-            #       step (e.g. in the generic pipeline) so to keep
-            #       original xml stream not altered when using dump
-            #       action in raw mode.
-
-            if attr_name=="url":
-                # url array have three subitems (GRIDFTP, HTTPServer and openDAP)
-                # url array entry sample => http://bmbf-ipcc-ar5.dkrz.de/thredds/fileServer/cmip5/output1/MPI-M/MPI-ESM-P/historical/mon/atmos/Amon/r1i1p1/v20120315/tasmin/tasmin_Amon_MPI-ESM-P_historical_r1i1p1_185001-200512.nc|application/netcdf|HTTPServer
-
-                for item in attr_value:
-                    url=item.split('|')[0] # keep only first field (i.e. keep only the file url)
-                    protocol=item.split('|')[-1]
-
-                    if protocol.upper()=="HTTPSERVER":
-                        l__dict['url_http']=url
-                    elif protocol.upper()=="GRIDFTP":
-                        l__dict['url_gridftp']=url
-                    elif protocol.upper()=="GLOBUS":
-                        l__dict['url_globus']=url
-                    elif protocol.upper()=="OPENDAP":
-                        l__dict['url_opendap']=url
-            else:
-                l__dict[attr_name]=attr_value
-
+        l__dict=parse_doc(doc_node)
         l__files.append(l__dict)
 
     sdlog.debug("SYNDJSON-014","files-count=%d"%len(l__files))
 
     return {'files':l__files,'num_found':l__num_found,'num_result':len(l__files)}
 
+def parse_metadata_stream(fh,metadata):
+    """Incremental version of parse_metadata().
+
+    Files are added to 'metadata' (chunk by chunk) while 'fh' is being read, so
+    the whole document is never kept in memory.
+
+    Notes
+        - 'docs' array items are decoded one by one (using JSONDecoder.raw_decode()),
+          so only one doc (plus one read buffer) is kept in memory.
+        - 'numFound' must come before 'docs' (which is always the case with
+          the Solr JSON response writer).
+        - what follows the 'docs' array (e.g. facet_counts) is not parsed.
+
+    Returns
+        same dict as parse_metadata(), without 'files' key
+    """
+    reader=StreamReader(fh)
+    l__files=[]
+    count=0
+
+    # move to 'docs' array
+    m=reader.search(docs_regex)
+    if m is None:
+        raise SDException("SYNDJSON-002","'docs' array not found")
+
+    m_num_found=num_found_regex.search(reader.buf,0,m.start())
+    if m_num_found is None:
+        raise SDException("SYNDJSON-003","'numFound' attribute not found")
+    l__num_found=int(m_num_found.group(1))
+
+    reader.pos=m.end()
+
+    # docs loop
+    while True:
+        c=reader.skip(', \t\r\n')
+        if c is None:
+            raise SDException("SYNDJSON-004","Unexpected end of document")
+        elif c==']':
+            break
+
+        l__files.append(parse_doc(reader.decode()))
+        count+=1
+
+        if len(l__files)>=chunksize:
+            metadata.add_files(l__files)
+            l__files=[]
+
+    if len(l__files)>0:
+        metadata.add_files(l__files)
+
+    sdlog.debug("SYNDJSON-015","files-count=%d"%count)
+
+    return {'num_found':l__num_found,'num_result':count}
+
+class StreamReader():
+    """Incremental JSON reader (used to decode a JSON document one value at a time)."""
+
+    def __init__(self,fh):
+        self.fh=fh
+        self.buf=''
+        self.pos=0
+        self.eof=False
+        self.decoder=json.JSONDecoder()
+
+    def read(self):
+        """Append next block to the buffer (returns False if end of stream is reached)."""
+        if self.eof:
+            return False
+
+        block=self.fh.read(read_size)
+        if len(block)==0:
+            self.eof=True
+            return False
+
+        # drop already processed data
+        self.buf=self.buf[self.pos:]+block
+        self.pos=0
+
+        return True
+
+    def search(self,regex):
+        """Search regex from current position (reads the stream until found)."""
+        while True:
+            m=regex.search(self.buf,self.pos)
+            if m is not None:
+                return m
+
+            if not self.read():
+                return None
+
+    def skip(self,chars):
+        """Skip 'chars' and returns the next character (None if end of stream is reached)."""
+        while True:
+            while self.pos<len(self.buf) and self.buf[self.pos] in chars:
+                self.pos+=1
+
+            if self.pos<len(self.buf):
+                return self.buf[self.pos]
+
+            if not self.read():
+                return None
+
+    def decode(self):
+        """Decode the JSON value starting at current position."""
+        while True:
+            try:
+                value,end=self.decoder.raw_decode(self.buf,self.pos)
+                self.pos=end
+                return value
+            except ValueError:
+                # value may be incomplete: read more data and retry
+
+                if not self.read():
+                    raise
+
+# init.
+
+chunksize=1000   # number of files added to the store at once (streaming mode)
+read_size=65536
+docs_regex=re.compile(r'"docs"\s*:\s*\[')
+num_found_regex=re.compile(r'"numFound"\s*:\s*(\d+)')
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-f','--file',required=True)
+    parser.add_argument('-s','--stream',action='store_true',help='Use incremental parser')
     args = parser.parse_args()
 
-    # read search-api output sample
-    with open(args.file, 'r') as fh:
-        buffer=fh.read()
+    if args.stream:
+        from sdtypes import Metadata
+        metadata=Metadata()
+        with open(args.file, 'r') as fh:
+            result=parse_metadata_stream(fh,metadata)
+        result['files']=metadata.get_files()
+    else:
+
+        # read search-api output sample
+        with open(args.file, 'r') as fh:
+            buffer=fh.read()
 
-    #result=parse_parameters(buffer)
-    result=parse_metadata(buffer)
+        #result=parse_parameters(buffer)
+        result=parse_metadata(buffer)
 
     print "%s\n"%json.dumps(result,indent=4, separators=(',', ': '))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the rate-limited transfer launcher.
+
+Notes
+    - New connections to a data node are paced with a token bucket: each
+      data node gets 'launch_rate' tokens per second, up to 'launch_burst'
+      tokens, and one token is needed to start a transfer. Data nodes have
+      their own bucket, so they don't wait for each other.
+    - Bucket parameters can be set per data node (see
+      'launch_rate_per_datanode' parameter).
+    - The scheduler only queues transfers (submit() never blocks). Transfers
+      are started by the launcher thread as soon as a token is available.
+    - On shutdown, transfers not started yet are given back (see 'cancel'
+      callback), so they can be marked for retry.
+"""
+
+import time
+import argparse
+import threading
+import collections
+import sdapp
+import sdconfig
+import sdlog
+import sdtrace
+import sdcounter
+from sdexception import SDException
+
+class TokenBucket():
+    def __init__(self,rate,burst,now):
+        self.rate=float(rate)   # tokens per second (0 means no pacing)
+        self.burst=max(1,burst) # max number of tokens
+        self.tokens=self.burst
+        self.last=now
+
+    def refill(self,now):
+        self.tokens=min(self.burst,self.tokens+(now-self.last)*self.rate)
+        self.last=now
+
+    def take(self,now):
+        """Returns True if a token has been taken."""
+        if self.rate<=0:
+            return True
+
+        self.refill(now)
+        if self.tokens>=1:
+            self.tokens-=1
+            return True
+        else:
+            return False
+
+    def get_wait_time(self,now):
+        """Returns the number of seconds before the next token is available."""
+        if self.rate<=0:
+            return 0
+
+        self.refill(now)
+        return max(0,(1-self.tokens)/self.rate)
+
+class LauncherThread(threading.Thread):
+    """This class starts queued transfers, data node by data node, at the pace of each data node bucket."""
+
+    def __init__(self,start_func,cancel_func):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.start_func=start_func   # called (from the launcher thread) to start a transfer
+        self.cancel_func=cancel_func # called (from the launcher thread) with transfers not started on shutdown
+        self.exception_occurs=False
+        self._cond=threading.Condition()
+        self._pending=collections.OrderedDict() # data_node => deque of (transfer,submit time)
+        self._buckets={}                        # data_node => TokenBucket
+
+    def submit(self,transfers):
+        """Queue transfers (doesn't block)."""
+        now=time.time()
+
+        with self._cond:
+            for tr in transfers:
+                if tr.data_node not in self._pending:
+                    self._pending[tr.data_node]=collections.deque()
+                self._pending[tr.data_node].append((tr,now))
+
+            self._cond.notify()
+
+    def get_pending_count(self):
+        with self._cond:
+            return sum(len(q) for q in self._pending.itervalues())
+
+    def run(self):
+        try:
+            while True:
+                (launches,cancelled)=self.next_launches()
+
+                for (tr,submit_time) in launches:
+                    sdcounter.observe('launcher.wait',time.time()-submit_time)
+                    self.start_func(tr)
+
+                if cancelled is not None:
+                    for (tr,submit_time) in cancelled:
+                        self.cancel_func(tr)
+
+                    sdlog.info("SDLAUNCH-002","Launcher stopped (%d transfer(s) not started)"%len(cancelled))
+                    break
+        except Exception,e:
+            sdlog.error("SDLAUNCH-003","Launcher thread didn't complete successfully")
+            sdtrace.log_exception(stderr=True)
+
+            self.exception_occurs=True
+
+    def next_launches(self):
+        """Wait until some transfers can be started.
+
+        Returns
+            (launches,cancelled) tuple, with cancelled being None unless the launcher is stopping
+        """
+        with self._cond:
+            while True:
+                if quit==1:
+                    cancelled=[]
+                    for q in self._pending.itervalues():
+                        cancelled.extend(q)
+                    self._pending.clear()
+                    return ([],cancelled)
+
+                now=time.time()
+                launches=[]
+                wait_time=check_interval
+
+                for data_node in self._pending.keys():
+                    q=self._pending[data_node]
+                    bucket=self.get_bucket(data_node,now)
+
+                    while len(q)>0 and bucket.take(now):
+                        launches.append(q.popleft())
+
+                    if len(q)>0:
+                        wait_time=min(wait_time,bucket.get_wait_time(now))
+                    else:
+                        del self._pending[data_node]
+
+                if len(launches)>0:
+                    return (launches,None)
+
+                self._cond.wait(wait_time)
+
+    def get_bucket(self,data_node,now):
+        if data_node not in self._buckets:
+            (rate,burst)=bucket_parameters.get(data_node,(launch_rate,launch_burst))
+            self._buckets[data_node]=TokenBucket(rate,burst,now)
+
+            sdlog.debug("SDLAUNCH-001","Token bucket created (data_node=%s,rate=%s,burst=%d)"%(data_node,rate,burst))
+
+        return self._buckets[data_node]
+
+def parse_bucket_parameters(value):
+    """Parse 'launch_rate_per_datanode' parameter.
+
+    Sample
+        esgf-data1.llnl.gov:5:10,vesg.ipsl.upmc.fr:0.5
+
+    Returns
+        dict (data_node => (rate,burst))
+    """
+    parameters={}
+
+    for item in value.split(','):
+        item=item.strip()
+        if len(item)==0:
+            continue
+
+        fields=item.split(':')
+        try:
+            if len(fields)==2:
+                parameters[fields[0]]=(float(fields[1]),launch_burst)
+            elif len(fields)==3:
+                parameters[fields[0]]=(float(fields[1]),int(fields[2]))
+            else:
+                raise ValueError()
+        except ValueError,e:
+            raise SDException("SDLAUNCH-010","Incorrect value for launch_rate_per_datanode (%s)"%item)
+
+    return parameters
+
+# init.
+
+launch_rate=sdconfig.config.getfloat('download','launch_rate')
+launch_burst=sdconfig.config.getint('download','launch_burst')
+bucket_parameters=parse_bucket_parameters(sdconfig.config.get('download','launch_rate_per_datanode'))
+
+check_interval=1 # max number of seconds the launcher thread sleeps (quit flag is checked at this interval)
+quit=0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    args = parser.parse_args()
+
+    print "default: rate=%s, burst=%d"%(launch_rate,launch_burst)
+    for data_node,(rate,burst) in sorted(bucket_parameters.iteritems()):
+        print "%s: rate=%s, burst=%d"%(data_node,rate,burst)
@@ -16,17 +16,6 @@ Note
 """
 
 import sdapp
-import sdconst
-import sdpipelineprocessing
 
 def run(metadata,attrs_to_keep):
-    metadata_cpy=metadata.copy() # prevent modify original data
-    po=sdpipelineprocessing.ProcessingObject(attribute_filter,attrs_to_keep)
-    light_metadata=sdpipelineprocessing.run_pipeline(metadata_cpy,po)
-    return light_metadata
-
-def attribute_filter(files,kept_attrs):
-    new_files=[]
-    for f in files:
-        new_files.append(dict((k, f[k]) for k in kept_attrs))
-    return new_files
+    return metadata.project(attrs_to_keep) # original data is not modified (and not copied)
@@ -45,6 +45,20 @@ def print_rate(groupby,project_,dry_run=False):
     # print
     print tabulate(li,headers=headers,tablefmt="plain",numalign="decimal")
 
+def print_concurrency(dry_run=False):
+    import sdconcurrency
+
+    if dry_run:
+        return
+
+    # prepare
+    unit='MiB/s'
+    headers=['Data_Node','Window','Rate (%s)'%unit]
+    li=[(t[0],t[1],format_size(t[2]) if t[2] is not None else '') for t in sdconcurrency.get_windows()]
+
+    # print
+    print tabulate(li,headers=headers,tablefmt="plain",numalign="decimal")
+
 def print_size(groupby,project_,dry_run=False):
 
     # retrieve metrics from local database
@@ -25,9 +25,11 @@ import sdlog
 import sdconst
 from sdtools import print_stderr
 
-def modify():
-    """Change priority value for already existing transfer."""
-    sdmodifyquery.change_priority(priority)
+def change_priority(priority,file_functional_id=None):
+    """Change priority value for already existing waiting transfer(s) (all of them if 'file_functional_id' is None)."""
+    nbr=sdmodifyquery.change_priority(priority,file_functional_id)
+    sdlog.info("SDMODIFY-432","%i transfer priority modified"%(nbr))
+    return nbr
 
 def pause_all():
     sdlog.info("SDMODIFY-431","Moving transfer from waiting to pause..")
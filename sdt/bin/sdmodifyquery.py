@@ -18,6 +18,7 @@ import sddb
 import sdlog
 import sdconst
 import sdfiledao
+import sdtransferqueue
 
 def change_replica(file_functional_id,new_replica,conn=sddb.conn):
     (url,data_node)=new_replica
@@ -27,6 +28,8 @@ def change_replica(file_functional_id,new_replica,conn=sddb.conn):
     conn.commit()
     c.close()
 
+    sdtransferqueue.invalidate()
+
 def change_status(old_status,new_status,conn=sddb.conn):
     nbr=0
 
@@ -40,17 +43,36 @@ def change_status(old_status,new_status,conn=sddb.conn):
         sdfiledao.highest_waiting_priority( True, c )
     c.close()
 
+    sdtransferqueue.invalidate()
+
     return nbr
 
-def change_priority(new_priority,conn=sddb.conn):
-    """Change priority value for already existing transfer."""
+def change_priority(new_priority,file_functional_id=None,conn=sddb.conn):
+    """Change priority value for already existing waiting transfer(s).
+
+    Args
+        file_functional_id: if None, all waiting transfers are modified
+
+    Returns
+        number of modified files
+    """
+    sdlog.info("SDMODIFQ-002","updating priority (file=%s,new priority=%s)"%(file_functional_id if file_functional_id is not None else 'all',new_priority))
+
     c=conn.cursor()
-    sdlog.info("SDMODIFQ-002","updating %s selection (new priority=%s)"%(u_s.filename,new_priority))
-    res=c.execute("UPDATE file SET priority = ? WHERE EXISTS (SELECT 1 FROM selection__file WHERE file.file_id = selection__file.file_id AND selection__file.selection_id = ?)",(new_priority,u_s.get_selection_id(),))
-    modified_files_count=c.rowcount
+    if file_functional_id is None:
+        c.execute("update file set priority=? where status=?",(new_priority,sdconst.TRANSFER_STATUS_WAITING))
+    else:
+        c.execute("update file set priority=? where status=? and file_functional_id=?",(new_priority,sdconst.TRANSFER_STATUS_WAITING,file_functional_id))
+    nbr=c.rowcount
     conn.commit()
+    if sdconst.GET_FILES_CACHING:
+        sdfiledao.highest_waiting_priority( True, c )
     c.close()
 
+    sdtransferqueue.invalidate()
+
+    return nbr
+
 def wipeout_datasets_flags(status=None,latest=0,conn=sddb.conn):
     """Reset flags on all datasets."""
     c=conn.cursor()
@@ -17,6 +17,7 @@ Note
 
 import os
 import json
+import marshal
 import copy
 import uuid
 import sqlite3
@@ -25,6 +26,7 @@ import shutil
 import sddbpagination
 import sdconst
 import sdconfig
+from sdexception import SDException
 
 # abstract class
 class Storage():
@@ -51,6 +53,48 @@ class Storage():
     def disconnect(self):
         pass
 
+    # declarative filters
+    #
+    # Notes
+    #     - those methods are destructive (like 'run_pipeline'): the returned
+    #       store replaces the current store, which may be deleted.
+    #     - default implementation is chunk-by-chunk in python. Subclasses push
+    #       them down to SQL when possible.
+
+    def filter_equal(self,key,value,keep):
+        """Keep (or remove) files with an exact match on one attribute."""
+        return self.rewrite(filter_equal_files,key,value,keep)
+
+    def filter_in(self,keys,values,keep):
+        """Keep (or remove) files whose 'keys' attributes match one of 'values' (list of tuples)."""
+        return self.rewrite(filter_in_files,keys,set(values),keep)
+
+    def distinct(self,keys):
+        """Remove duplicates on 'keys' (first file wins)."""
+        return self.rewrite(distinct_files,keys,set())
+
+    def project(self,keys):
+        """Returns a new store containing only 'keys' attributes (current store is not modified)."""
+        store=self.new_store()
+        for chunk in self.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+            store.append_files(project_files(chunk,keys))
+        return store
+
+    def rewrite(self,func,*args):
+        store=self.new_store()
+        for chunk in self.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+            store.append_files(func(chunk,*args))
+        return store
+
+    def new_store(self):
+        return self.__class__()
+
+    def get_total_size(self):
+        total_size=0
+        for chunk in self.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+            total_size+=compute_size(chunk)
+        return total_size
+
 class MemoryStorage(Storage):
 
     def __init__(self):
@@ -94,6 +138,13 @@ class MemoryStorage(Storage):
         assert self.count()>0
         return self.files[0]
 
+    def rewrite(self,func,*args):
+        self.files=func(self.files,*args)
+        return self
+
+    def get_total_size(self):
+        return compute_size(self.files)
+
 class DatabaseStorage(Storage):
 
     def __init__(self,dbfile=None):
@@ -223,18 +274,14 @@ class DatabaseStorage(Storage):
         store.connect() # not sure if needed
 
     def append_files(self,files):
-
-        # WARNING: slow perf here. Maybe replace rown-by-row insert with array insert.
         with contextlib.closing(self.conn.cursor()) as c:
-            for f in files:
 
-                # multicol table
-                #tu=(f['id'], f['size'], f['data_node'], json.dumps(f))
-                #c.execute("INSERT INTO data (%s) VALUES (?, ?, ?, ?)"%columns, tu)
+            # multicol table
+            #tu=(f['id'], f['size'], f['data_node'], json.dumps(f))
+            #c.execute("INSERT INTO data (%s) VALUES (?, ?, ?, ?)"%columns, tu)
 
-                # monocol table
-                tu=(json.dumps(f),)
-                c.execute("INSERT INTO data (%s) VALUES (?)"%columns, tu)
+            # monocol table
+            c.executemany("INSERT INTO data (%s) VALUES (?)"%columns, ((json.dumps(f),) for f in files))
 
             self.conn.commit()
 
@@ -263,7 +310,7 @@ class DatabaseStorage(Storage):
         shutil.copy(self.dbfile,dbfile_cpy)
 
         # create new instance
-        cpy=DatabaseStorage(dbfile=dbfile_cpy)
+        cpy=self.__class__(dbfile=dbfile_cpy)
 
         # re-open ori connection
         self.connect()
@@ -287,6 +334,222 @@ class DatabaseStorage(Storage):
 
         return file_
 
+class ColumnarDatabaseStorage(DatabaseStorage):
+    """Disk-based storage with hot attributes stored in dedicated columns.
+
+    Notes
+        - Hot attributes (see 'hot_keys') are stored in dedicated columns (so they
+          can be used in SQL queries). Other attributes are stored in one BLOB
+          column using 'marshal' encoding (faster and more compact than JSON).
+        - 'hot_mask' column tells which hot attributes are present in the file
+          (a missing attribute and a None attribute are not the same thing).
+        - Columns have no declared type, so values are returned with their
+          original type (no sqlite type affinity conversion).
+    """
+
+    def create_table(self,name='data'):
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("CREATE TABLE %s (%s)"%(name,columnar_columns_definition))
+            self.conn.commit()
+
+    def get_files(self):
+        """WARNING: this func loads all the data in memory."""
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("SELECT %s from data"%columnar_columns)
+            return [decode(rs) for rs in c]
+
+    def get_chunks_GENERATOR(self):
+        """This method is used to loop over all files using yield without consuming too much memory ('yield' based impl.)
+
+        Note
+            It is not possible to write anywhere in the db file between two yields !
+        """
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("select %s from data"%columnar_columns)
+            while True:
+                results = c.fetchmany(sdconst.PROCESSING_CHUNKSIZE)
+                if not results:
+                    break
+
+                yield [decode(rs) for rs in results]
+
+    def merge(self,store):
+        store.disconnect() # not sure if needed (more info => https://www.sqlite.org/lang_detach.html)
+
+        self.conn.execute("ATTACH DATABASE '%s' AS incoming"%store.dbfile)
+        self.conn.execute("insert into data (%s) select %s from incoming.data"%(columnar_columns,columnar_columns))
+        self.conn.commit() # commit all attached databases (TBC)
+        self.conn.execute("DETACH DATABASE incoming")
+
+        store.connect() # not sure if needed
+
+    def append_files(self,files):
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.executemany("INSERT INTO data (%s) VALUES (%s)"%(columnar_columns,','.join(['?']*(len(hot_keys)+2))), (encode(f) for f in files))
+            self.conn.commit()
+
+    def get_one_file(self):
+        assert self.count()>0
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("SELECT %s from data LIMIT 1"%columnar_columns)
+            file_=decode(c.fetchone())
+
+        return file_
+
+    def filter_equal(self,key,value,keep):
+        if key not in hot_keys:
+            return DatabaseStorage.filter_equal(self,key,value,keep)
+
+        self.check_hot_keys([key])
+
+        # 'IS' is used instead of '=' so None values match (as in python)
+        with contextlib.closing(self.conn.cursor()) as c:
+            if keep:
+                c.execute("DELETE FROM data WHERE NOT (%s IS ?)"%key,(value,))
+            else:
+                c.execute("DELETE FROM data WHERE %s IS ?"%key,(value,))
+            self.conn.commit()
+
+        return self
+
+    def filter_in(self,keys,values,keep):
+        if not all(k in hot_keys for k in keys):
+            return DatabaseStorage.filter_in(self,keys,values,keep)
+
+        self.check_hot_keys(keys)
+
+        # values are loaded in a temporary table, so the filter is one statement
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("CREATE TEMP TABLE filter_values (%s)"%', '.join(keys))
+            c.executemany("INSERT INTO filter_values VALUES (%s)"%','.join(['?']*len(keys)),values)
+            c.execute("DELETE FROM data WHERE %s EXISTS (SELECT 1 FROM filter_values v WHERE %s)"%('NOT' if keep else '',' AND '.join(['v.%s IS data.%s'%(k,k) for k in keys])))
+            c.execute("DROP TABLE filter_values")
+            self.conn.commit()
+
+        return self
+
+    def distinct(self,keys):
+        if not all(k in hot_keys for k in keys):
+            return DatabaseStorage.distinct(self,keys)
+
+        self.check_hot_keys(keys)
+
+        # rowid order is the insertion order, so the first file wins
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("DELETE FROM data WHERE rowid NOT IN (SELECT MIN(rowid) FROM data GROUP BY %s)"%', '.join(keys))
+            self.conn.commit()
+
+        return self
+
+    def project(self,keys):
+        if not all(k in hot_keys for k in keys):
+            return DatabaseStorage.project(self,keys)
+
+        self.check_hot_keys(keys)
+
+        mask=get_hot_mask(keys)
+        store=self.new_store()
+
+        store.disconnect()
+
+        self.conn.execute("ATTACH DATABASE '%s' AS projection"%store.dbfile)
+        self.conn.execute("INSERT INTO projection.data (%s) SELECT %s, hot_mask & %i, ? FROM data"%(columnar_columns,', '.join(hot_keys),mask),(sqlite3.Binary(marshal.dumps({})),))
+        self.conn.commit()
+        self.conn.execute("DETACH DATABASE projection")
+
+        store.connect()
+
+        return store
+
+    def check_hot_keys(self,keys):
+        """Raise exception if one file doesn't have all 'keys' attributes (same behaviour as python implementation)."""
+        mask=get_hot_mask(keys)
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("SELECT 1 FROM data WHERE hot_mask & %i != %i LIMIT 1"%(mask,mask))
+            if c.fetchone() is not None:
+                raise SDException("SDMTSTOR-001","Attribute not found in file attributes (keys=%s)"%(','.join(keys),))
+
+    def get_total_size(self):
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("SELECT SUM(CAST(size AS INTEGER)) FROM data WHERE hot_mask & %i"%get_hot_mask(['size']))
+            total_size=c.fetchone()[0]
+        return total_size if total_size is not None else 0
+
+def encode(f):
+    """Returns file as a row of the columnar table."""
+    row=[]
+    mask=0
+    attrs=f.copy()
+
+    for i,k in enumerate(hot_keys):
+        if k in attrs:
+            mask|=1<<i
+            row.append(attrs.pop(k))
+        else:
+            row.append(None)
+
+    row.append(mask)
+    row.append(sqlite3.Binary(marshal.dumps(attrs)))
+
+    return row
+
+def decode(rs):
+    """Returns file from a row of the columnar table."""
+    f=marshal.loads(str(rs[-1]))
+    mask=rs[-2]
+
+    for i,k in enumerate(hot_keys):
+        if mask & (1<<i):
+            f[k]=rs[i]
+
+    return f
+
+def get_hot_mask(keys):
+    mask=0
+    for k in keys:
+        mask|=1<<hot_keys.index(k)
+    return mask
+
+def filter_equal_files(files,key,value,keep):
+    new_files=[]
+    for f in files:
+
+        if key not in f:
+            raise SDException("SDMTSTOR-001","Attribute not found in file attributes (keys=%s)"%(key,))
+
+        if (f[key]==value)==keep:
+            new_files.append(f)
+
+    return new_files
+
+def filter_in_files(files,keys,values,keep):
+    new_files=[]
+    for f in files:
+
+        if not all(k in f for k in keys):
+            raise SDException("SDMTSTOR-001","Attribute not found in file attributes (keys=%s)"%(','.join(keys),))
+
+        if (tuple(f[k] for k in keys) in values)==keep:
+            new_files.append(f)
+
+    return new_files
+
+def distinct_files(files,keys,seen):
+    """'seen' is shared between chunks."""
+    new_files=[]
+    for f in files:
+        uniq_id=tuple(f[k] for k in keys)
+        if uniq_id not in seen:
+            new_files.append(f)
+            seen.add(uniq_id)
+    return new_files
+
+def project_files(files,keys):
+    return [dict((k, f[k]) for k in keys) for f in files]
+
+def compute_size(files):
+    return sum(int(f['size']) for f in files if 'size' in f)
+
 def get_uniq_fullpath_db_filename():
     dbfilename='sdt_transient_storage_%s_%s.db'%(str(os.getpid()),str(uuid.uuid4()))
     dbfile=os.path.join(sdconfig.db_folder,dbfilename)
@@ -294,7 +557,10 @@ def get_uniq_fullpath_db_filename():
 
 def get_new_store(lowmem=False):
     if lowmem:
-        return DatabaseStorage()
+        if sdconfig.lowmem_storage==sdconst.STORAGE_BACKEND_COLUMNAR:
+            return ColumnarDatabaseStorage()
+        else:
+            return DatabaseStorage()
     else:
         return MemoryStorage()
 
@@ -305,3 +571,8 @@ def get_new_store(lowmem=False):
 
 columns='attrs'
 columns_definition='attrs TEXT'
+
+# columnar table
+hot_keys=['file_functional_id','data_node','size','status','dataset_functional_id'] # do not change order (it is used in 'hot_mask' column)
+columnar_columns=', '.join(hot_keys+['hot_mask','attrs'])
+columnar_columns_definition=', '.join(hot_keys+['hot_mask INT','attrs BLOB'])
@@ -28,7 +28,6 @@ import sdrtt
 import sdconfig
 import sdlog
 import sdgc
-import sdpipelineprocessing
 import sdconst
 import sdlmattrfilter
 from sdexception import SDException
@@ -45,39 +44,18 @@ def run(metadata):
     light_metadata=sdlmattrfilter.run(metadata,[functional_id_keyname,'data_node']) # create light list with needed columns only, not to overload system memory.
 
     score=build_score_table(light_metadata,functional_id_keyname) # warning: load list in memory
+    del light_metadata
 
     # filtering to keep nearest datanode
-    for id in score:
-        datanodes=score[id]
-        dn=get_nearest_dn(datanodes)
-        score[id]=dn # replace list with scalar
+    nearest=[(id_,get_nearest_dn(datanodes)) for (id_,datanodes) in score.iteritems()]
+    del score
 
-    # at this point, 'score' table is in the form: [id]=dn
-
-    # 'score' data structure transformation
-    score=dict(((k, score[k]),False) for k in score) # warning: two list in memory simultaneously !
-
-    # at this point, 'score' table is in the form: [(id,dn)]=False
-
-    # final filtering (come back to files list)
-    po=sdpipelineprocessing.ProcessingObject(keep_nearest_file,functional_id_keyname,score)
-    metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+    # final filtering (pushed down to SQL when possible, so the store is not copied)
+    metadata.keep_in([functional_id_keyname,'data_node'],nearest) # keep the nearest replicate
+    metadata.distinct([functional_id_keyname,'data_node']) # prevent keeping duplicate (memo: duplicate != replicate). i.e. some exact same file may be present multiple time in the list (see 'Type-A' in sdshrink for more info).
 
     return metadata
 
-def keep_nearest_file(files,functional_id_keyname,score):
-    new_files=[]
-
-    for f in files:
-        id_=f[functional_id_keyname]
-        dn=f['data_node']
-        if (id_,dn) in score: # add the nearest replicate
-            if not score[(id_,dn)]: # prevent adding duplicate (memo: duplicate != replicate). i.e. some exact same file may be present multiple time in the list (see 'Type-A' in sdshrink for more info).
-                new_files.append(f)
-                score[(id_,dn)]=True
-
-    return new_files
-
 def build_score_table(light_metadata,functional_id_keyname):
     score={}
     
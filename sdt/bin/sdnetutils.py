@@ -12,6 +12,7 @@
 """This module contains network functions."""
 
 import os
+import codecs
 import urllib2
 import requests
 import sdtypes
@@ -22,6 +23,7 @@ import sdlog
 import sdconst
 import sdconfig
 import sdpoodlefix
+import sdhttppool
 import httplib
 import sdtrace
 import ssl
@@ -38,8 +40,11 @@ class HTTPSClientAuthHandler(urllib2.HTTPSHandler):
             return httplib.HTTPSConnection(host, key_file=self.key, cert_file=self.cert)
 
 def call_web_service(url,timeout=sdconst.SEARCH_API_HTTP_TIMEOUT,lowmem=False): # default is to load list resulting from HTTP call in memory (should work on lowmem machine as response should not exceed SEARCH_API_CHUNKSIZE)
+    if sdconfig.streaming_parser:
+        return call_web_service__STREAMING(url,timeout,lowmem)
+
     start_time=SDTimer.get_time()
-    buf=HTTP_GET(url,timeout)
+    buf=SEARCH_API_GET(url,timeout)
     elapsed_time=SDTimer.get_elapsed_time(start_time)
 
     buf=fix_encoding(buf)
@@ -73,8 +78,39 @@ def call_web_service(url,timeout=sdconst.SEARCH_API_HTTP_TIMEOUT,lowmem=False):
 
     return sdtypes.Response(call_duration=elapsed_time,lowmem=lowmem,**di) # RAM storage is ok here as one response is limited by SEARCH_API_CHUNKSIZE
 
+def call_web_service__STREAMING(url,timeout,lowmem):
+    """Same as call_web_service(), but the response is parsed while being downloaded.
+
+    Note
+        'call_duration' includes parsing time (download and parsing overlap)
+    """
+    start_time=SDTimer.get_time()
+    response=sdtypes.Response(lowmem=lowmem)
+
+    sock=HTTP_OPEN(url,timeout)
+    try:
+        fh=FixEncodingReader(sock) if sdconfig.fix_encoding else sock
+        di=search_api_parser.parse_metadata_stream(fh,response)
+    except Exception,e:
+
+        # same as call_web_service() (parsing error is likely due to a network error)
+
+        sdlog.info('SDNETUTI-001','XML parsing error (exception=%s). Most of the time, this error is due to a network error.'%str(e))
+        sdtrace.log_exception()
+
+        raise SDException('SDNETUTI-008','Network error (see log for details)')
+    finally:
+        sock.close()
+
+    response.num_found=di['num_found']
+    response.call_duration=SDTimer.get_elapsed_time(start_time)
+
+    sdlog.debug("SDNETUTI-044","files-count=%d"%di['num_result'])
+
+    return response
+
 def call_param_web_service(url,timeout):
-    buf=HTTP_GET(url,timeout)
+    buf=SEARCH_API_GET(url,timeout)
 
     buf=fix_encoding(buf)
 
@@ -103,6 +139,22 @@ def fix_encoding(buf):
 
     return buf
 
+class FixEncodingReader():
+    """Streaming version of fix_encoding() (wraps a file-like object)."""
+
+    def __init__(self,fh):
+        self.fh=fh
+        self.decoder=codecs.getincrementaldecoder('utf-8')('ignore')
+
+    def read(self,size=-1):
+        while True:
+            buf=self.fh.read(size)
+            final=(len(buf)==0 or size<0)
+            buf=self.decoder.decode(buf,final).encode('utf-8')
+
+            if len(buf)>0 or final:
+                return buf
+
 def HTTP_GET_2(url,timeout=20,verify=True):
     """requests impl."""
 
@@ -120,6 +172,49 @@ def HTTP_GET_2(url,timeout=20,verify=True):
 
     return buf
 
+def HTTP_OPEN(url,timeout=20):
+    """Returns a file-like object, so the body can be read incrementally (must be closed by the caller)."""
+
+    sock=None
+
+    try:
+        if sdconfig.http_pool:
+            sock=sdhttppool.get(url,timeout)
+        else:
+            sdpoodlefix.start(url)
+
+            sock=urllib2.urlopen(url, timeout=timeout)
+    except Exception, e:
+        errmsg="HTTP query failed (url=%s,exception=%s,timeout=%d)"%(url,str(e),timeout)
+        errcode="SDNETUTI-002"
+
+        raise SDException(errcode,errmsg)
+
+    finally:
+        if not sdconfig.http_pool:
+            sdpoodlefix.stop()
+
+    return sock
+
+def SEARCH_API_GET(url,timeout=20):
+    """Same as HTTP_GET(), but use pooled connections if enabled."""
+
+    if not sdconfig.http_pool:
+        return HTTP_GET(url,timeout)
+
+    sock=HTTP_OPEN(url,timeout)
+    try:
+        buf=sock.read()
+    except Exception, e:
+        errmsg="HTTP query failed (url=%s,exception=%s,timeout=%d)"%(url,str(e),timeout)
+        errcode="SDNETUTI-002"
+
+        raise SDException(errcode,errmsg)
+    finally:
+        sock.close()
+
+    return buf
+
 def HTTP_GET(url,timeout=20):
     """urllib impl."""
 
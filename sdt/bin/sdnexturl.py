@@ -10,27 +10,72 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This script contains next url routine."""
+"""This script contains next url routine.
+
+Notes
+    - Urls of all replicas of a file are stored when the file is enqueued
+      (see 'file_replica' table), so switching to another url is a local
+      lookup. The search-API is only used for files without stored replicas
+      (e.g. files enqueued with 'http_fallback' disabled), and the result is
+      then stored.
+    - Failovers are counted ('nexturl.cache' and 'nexturl.remote' counters).
+    - Stored replicas of not yet transferred files are refreshed in
+      background (see ReplicaRefresherThread).
+    - run() is called from transfer threads, so each thread uses its own
+      database connection.
+"""
 # multiple changes by JfP to make fallback more flexible.
 
+import time
 import argparse
+import threading
 import sdlog
 import sdutils
 import sdconst
 import sdquicksearch
 import sdexception
 import sdconfig
+import sdtime
+import sdcounter
+import sdprotocol
+import sdreplicadao
+import sddb
 import sqlite3
 
+class ReplicaRefresherThread(threading.Thread):
+    """This class refreshes stored replicas older than 'replica_max_age' hours."""
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+
+    def run(self):
+        while True:
+
+            # exit event aware sleep
+            for i in range(refresh_interval):
+                if quit==1:
+                    break
+                time.sleep(1)
+
+            # exit event
+            if quit==1:
+                break
+
+            try:
+                refresh_stale_replicas()
+            except Exception as e:
+                sdlog.error("SDNEXTUR-020","Error occurs while refreshing replicas (%s)"%str(e))
+
 def run(tr):
     """
     Returns
         True: url has been switched to a new one
         False: nothing changed (same url)
     """
+    conn=get_connection()
+    c = conn.cursor()
     try:
-        conn = sqlite3.connect(sdconfig.db_file,120)  # 2 minute timeout
-        c = conn.cursor()
         c.execute("INSERT INTO failed_url(url,file_id) VALUES (?,"+
                   "(SELECT file_id FROM file WHERE file_functional_id=?))",
                   (tr.url, tr.file_functional_id) )
@@ -38,8 +83,10 @@ def run(tr):
     except sqlite3.IntegrityError as e:
         # url is already in the failed_url table
         sdlog.info("SDNEXTUR-001","During database operations, IntegrityError %s"%(e,))
+        conn.rollback()
     except Exception as e:
         sdlog.info("SDNEXTUR-002","During database operations, unknown exception %s"%(e,))
+        conn.rollback()
         return False
     finally:
         c.close()
@@ -55,13 +102,59 @@ def run(tr):
         return False
     except Exception as e:
         sdlog.info("SDNEXTUR-005","Unknown exception (file_functional_id=%s,exception=%s)"%(tr.file_functional_id,str(e)))
-        conn.close()
+        conn.rollback()
         return False
-    finally:
-        conn.close()
+
+def get_connection():
+    """Returns the database connection of the calling thread."""
+    if not hasattr(_local,'conn'):
+        _local.conn=sddb.open_connection(120)  # 2 minute timeout
+
+    return _local.conn
+
+def get_replica_urls(file_functional_id,conn):
+    """Returns a prioritized list of [url,protocol] (stored replicas are used if any, else the search-API is called)."""
+    urlps=sdreplicadao.get_replicas(file_functional_id,conn=conn)
+
+    if len(urlps)>0:
+        sdcounter.incr('nexturl.cache')
+        return prioritize_urlps(urlps)
+
+    sdcounter.incr('nexturl.remote')
+
+    urlps=get_urls(file_functional_id)
+    sdreplicadao.replace_replicas(file_functional_id,keep_replica_urls(urlps),conn=conn)
+
+    return urlps
+
+def keep_replica_urls(urlps):
+    """Returns urls which are stored in 'file_replica' table."""
+    return [urlp for urlp in urlps if urlp[1] in sdprotocol.replica_url_fields]
+
+def refresh_stale_replicas():
+    """Refresh stored replicas older than 'replica_max_age' hours (at most 'refresh_batch_size' files per call)."""
+    conn=get_connection()
+
+    refresh_date_limit=sdtime.substract_hour(sdtime.now(),replica_max_age)
+    file_functional_ids=sdreplicadao.get_stale_replicas(refresh_date_limit,refresh_batch_size,conn=conn)
+
+    for file_functional_id in file_functional_ids:
+        if quit==1:
+            break
+
+        urlps=keep_replica_urls(get_urls(file_functional_id))
+        if len(urlps)==0:
+            urlps=sdreplicadao.get_replicas(file_functional_id,conn=conn) # keep stored replicas if the search-API doesn't know the file anymore
+
+        sdreplicadao.replace_replicas(file_functional_id,urlps,conn=conn)
+
+        sdcounter.incr('nexturl.refresh')
+
+    if len(file_functional_ids)>0:
+        sdlog.info("SDNEXTUR-021","%d stale replica(s) refreshed"%len(file_functional_ids))
 
 def next_url(tr,conn):
-    all_urlps=get_urls(tr.file_functional_id) # [[url1,protocol1],[url2,protocol2],...]
+    all_urlps=get_replica_urls(tr.file_functional_id,conn) # [[url1,protocol1],[url2,protocol2],...]
     sdlog.info("SDNEXTUR-006","all_urpls= %s"%(all_urlps,))
     c = conn.cursor()
     fus = c.execute("SELECT url FROM failed_url WHERE file_id="+
@@ -149,6 +242,16 @@ def prioritize_urlps( urlps ):
         return 5
     return sorted( urlps, key=(lambda urlp: (priprotocol(urlp[1]), priurl(urlp[0]))) )
 
+# init.
+
+replica_max_age=sdconfig.config.getint('download','replica_max_age') # hours
+refresh_interval=600    # seconds between two refresh passes
+refresh_batch_size=100  # max number of files refreshed per pass (not to overload the search-API)
+
+quit=0
+
+_local=threading.local() # per-thread database connection
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
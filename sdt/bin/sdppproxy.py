@@ -11,27 +11,145 @@
 
 """This module contains post-processing proxy.
 
-Note
-    sdppproxy means 'SynDa Post-Processing proxy'
+Notes
+    - sdppproxy means 'SynDa Post-Processing proxy'
+    - The HTTP connection is kept open between calls (keep-alive), and
+      requests are gzip-compressed.
+    - Each event is sent with a delivery identifier, so the post-processing
+      module ignores events already received (i.e. a batch can be sent again
+      after a timeout).
 """
 
+import gzip
+import socket
+import base64
+import httplib
 import urllib2
-import pyjsonrpc
+import urlparse
+import StringIO
+from pyjsonrpc import rpcrequest,rpcresponse,rpcerror
 from pyjsonrpc.rpcerror import MethodNotFound,InternalError
 import argparse
 import sdlog
 import sdconfig
 import sdtrace
 import sdnetutils
+import sdeventdao
 from sdexception import RemoteException
 
+class PersistentHttpClient():
+    """JSON-RPC client which keeps its HTTP connection open between calls.
+
+    Note
+        Same interface as pyjsonrpc.HttpClient (i.e. 'client.method(args)').
+    """
+
+    def __init__(self,url,username=None,password=None,timeout=None,gzipped=True):
+        self.url=url
+        self.username=username
+        self.password=password
+        self.timeout=timeout
+        self.gzipped=gzipped
+        self.connection=None
+        self.request_count=0 # number of requests sent on the current connection
+
+        parsed_url=urlparse.urlparse(url)
+        self.scheme=parsed_url.scheme
+        self.netloc=parsed_url.netloc
+        self.path=parsed_url.path or '/'
+
+    def __getattr__(self,method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        return lambda *args, **kwargs: self.call(method,*args,**kwargs)
+
+    def call(self,method,*args,**kwargs):
+        request_json=rpcrequest.create_request_json(method,*args,**kwargs)
+
+        try:
+            response_json=self.send(request_json)
+        except (httplib.BadStatusLine,socket.error),e:
+            if self.request_count>1 and not isinstance(e,socket.timeout):
+                # the server may have closed the idle connection, so we retry once on a new connection
+
+                self.close()
+                response_json=self.send(request_json)
+            else:
+                raise
+
+        response=rpcresponse.parse_response_json(response_json)
+        if response.error:
+            if response.error.code in rpcerror.jsonrpcerrors:
+                raise rpcerror.jsonrpcerrors[response.error.code](message=response.error.message,data=response.error.data)
+            else:
+                raise rpcerror.JsonRpcError(message=response.error.message,data=response.error.data,code=response.error.code)
+
+        return response.result
+
+    def send(self,request_json):
+        headers={'Content-Type':'application/json','Accept-Encoding':'gzip'}
+
+        if self.username:
+            headers['Authorization']='Basic %s'%base64.b64encode('%s:%s'%(self.username,self.password))
+
+        if self.gzipped:
+            buf=StringIO.StringIO()
+            with gzip.GzipFile(filename='',mode='wb',fileobj=buf) as gz:
+                gz.write(request_json)
+            request_json=buf.getvalue()
+            headers['Content-Encoding']='gzip'
+
+        if self.connection is None:
+            if self.scheme=='https':
+                self.connection=httplib.HTTPSConnection(self.netloc,timeout=self.timeout)
+            else:
+                self.connection=httplib.HTTPConnection(self.netloc,timeout=self.timeout)
+            self.request_count=0
+
+        try:
+            self.request_count+=1
+            self.connection.request('POST',self.path,request_json,headers)
+            response=self.connection.getresponse()
+            data=response.read()
+        except:
+            self.close()
+            raise
+
+        if response.getheader('Connection','').lower()=='close' or response.version<11:
+            self.close()
+
+        if response.status!=httplib.OK:
+            raise urllib2.HTTPError(self.url,response.status,response.reason,response.msg,None)
+
+        if 'gzip' in response.getheader('Content-Encoding',''):
+            data=gzip.GzipFile(fileobj=StringIO.StringIO(data)).read()
+
+        return data
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection=None
+
 def event(events):
+    """Send events to the post-processing module.
+
+    Returns
+        Post-processing response (dict with 'error_code', 'received' and 'duplicates' keys)
+    """
     try:
         sdlog.info("SDPPPROX-001","Push events to postprocessing")
-        serialized_events=[e.__dict__ for e in events] # transform list of event to list of dict (needed, because custom class cannot be serialized to JSON)
-        get_service().event(serialized_events) # send events
+        serialized_events=[] # transform list of event to list of dict (needed, because custom class cannot be serialized to JSON)
+        for e in events:
+            serialized_event=dict(e.__dict__)
+            serialized_event['delivery_id']=sdeventdao.get_delivery_id(e)
+            serialized_events.append(serialized_event)
+        response=get_service().event(serialized_events) # send events
         sdlog.info("SDPPPROX-002","%i events successfully transmitted to postprocessing"%len(serialized_events))
-    except urllib2.URLError,e:
+        return response
+    except (urllib2.URLError,httplib.HTTPException,socket.error),e:
+        get_service().close()
         sdlog.error("SDPPPROX-010","Network error occured (url=%s,port=%s,%s)"%(url,port,str(e)))
         raise RemoteException("SDPPPROX-100","Network error occured")
     except MethodNotFound,e:
@@ -51,13 +169,10 @@ def event(events):
         raise
 
 def get_service():
-    """
-    TODO: add retry mecanism for when service is unreachable
-    """
     global service
 
     if service is None:
-        service=pyjsonrpc.HttpClient(url=url, username=username, password=password, timeout=timeout)
+        service=PersistentHttpClient(url=url, username=username, password=password, timeout=timeout)
 
     return service
 
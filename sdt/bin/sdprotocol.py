@@ -9,7 +9,13 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module selects which protocol to use depending on configuration."""
+"""This module selects which protocol to use depending on configuration.
+
+Note
+    If 'http_fallback' is true, all urls of the file are kept in the
+    'replicas' attribute (they are stored when the file is enqueued, and used
+    if the transfer fails, see 'sdnexturl' module).
+"""
 
 import sys
 import argparse
@@ -19,6 +25,7 @@ import sdconst
 import sdprint
 import sdtools
 import sdlog
+import sdconfig
 from sdexception import SDException
 import sdpostpipelineutils
 
@@ -55,10 +62,17 @@ def run(files):
         else:
             raise SDException("SYNPROTO-003","Incorrect protocol (%s)"%protocol)
 
+        if sdconfig.next_url_on_error:
+            file['replicas']=[[file[key],key] for key in replica_url_fields if key in file and file[key].find('//None')<0]
+
         sdtools.remove_dict_items(file,['url_globus', 'url_gridftp', 'url_http', 'url_opendap'])
 
     return files
 
+# init.
+
+replica_url_fields=['url_gridftp','url_http'] # protocols supported by 'sdget' (opendap and globus urls are not kept)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-1','--print_only_one_item',action='store_true')
@@ -12,6 +12,10 @@
 """This module contains search-api proxy."""
 
 import time
+import copy
+import Queue
+import urlparse
+import threading
 import argparse
 import sdapp
 import sdtypes
@@ -24,6 +28,8 @@ import sdtools
 import sdconfig
 import sdaddap
 import sdurlutils
+import sdindex
+import sdcounter
 
 # not a singleton
 class SearchAPIProxy():
@@ -121,6 +127,9 @@ class SearchAPIProxy():
             This function contain paging management (i.e. make web service calls until all results are returned)
         """
 
+        if parallel_pagination>1:
+            return self.call_web_service__PARALLEL_PAGINATION(request)
+
         # init
         request.limit=sdconst.SEARCH_API_CHUNKSIZE
         request.offset=0
@@ -151,6 +160,166 @@ class SearchAPIProxy():
 
         return paginated_response
 
+    def call_web_service__PARALLEL_PAGINATION(self,request):
+        """Same as call_web_service__PAGINATION(), but pages are retrieved in parallel.
+
+        Notes
+            - all pages of one query are retrieved from the same index, as
+              different indexes may return different result sets (or the same
+              results in a different order), which would duplicate or drop
+              files if pages were mixed.
+            - each page is retried on its own, on the same index (see
+              call_page()). If a page still fails, the whole query is restarted
+              on the next configured index (if any).
+        """
+        urls=get_failover_urls(request._url)
+
+        i=0
+        while True:
+            host_request=copy.copy(request)
+            host_request._url=urls[i]
+
+            try:
+                return self.call_pages(host_request)
+            except:
+                if i>=len(urls)-1:
+                    raise
+                else:
+                    i+=1
+
+                    sdlog.info("SYDPROXY-512","Paginated call failed: restart it on another index (%s)."%urls[i])
+                    sdcounter.incr('search_api.query_failover')
+
+                    time.sleep(retry_delay)
+
+    def call_pages(self,request):
+        """Retrieve all pages of one query from one index.
+
+        Notes
+            - the first page is retrieved alone (as 'num_found' is not known before),
+              then remaining pages are retrieved by up to 'parallel_pagination' threads.
+            - pages are added to the paginated response in offset order (as soon
+              as all previous pages have been added).
+        """
+
+        request.limit=sdconst.SEARCH_API_CHUNKSIZE
+        request.offset=0
+        paginated_response=sdtypes.PaginatedResponse()
+
+        response=self.call_page(request,0)
+        num_found=response.num_found
+        first_page_count=response.count()
+        paginated_response.slurp(response) # warning: response is modified here
+
+        if first_page_count==0 or first_page_count>=num_found:
+            return paginated_response
+
+        offsets=range(request.limit,num_found,request.limit)
+
+        sdlog.debug("SYDPROXY-500","Parallel pagination started (pages=%d,threads=%d,url=%s)"%(len(offsets)+1,min(parallel_pagination,len(offsets)),request.get_url()))
+
+        pages=Queue.Queue()
+        for offset in offsets:
+            pages.put(offset)
+        results=Queue.Queue()
+
+        threads=[]
+        for i in range(min(parallel_pagination,len(offsets))):
+            th=PageThread(self,request,pages,results)
+            th.setDaemon(True)
+            th.start()
+            threads.append(th)
+
+        pending={} # offset => response (pages retrieved before all previous pages)
+        next_offset_idx=0
+        for i in range(len(offsets)):
+            (offset,response,error)=results.get()
+
+            if error is not None:
+
+                # cancel remaining pages (and wait for running ones)
+                try:
+                    while True:
+                        pages.get_nowait()
+                except Queue.Empty:
+                    pass
+                for th in threads:
+                    th.join()
+
+                raise error
+
+            pending[offset]=response
+
+            while next_offset_idx<len(offsets) and offsets[next_offset_idx] in pending:
+                paginated_response.slurp(pending.pop(offsets[next_offset_idx])) # warning: response is modified here
+                next_offset_idx+=1
+
+        return paginated_response
+
+    def call_page(self,request,offset):
+        """Retrieve one page (with retry on the same index, and exponential backoff)."""
+
+        i=0
+        while True:
+            page_request=copy.copy(request)
+            page_request.offset=offset
+
+            try:
+                return self.call_web_service(page_request)
+            except:
+                sdlog.info("SYDPROXY-510","Search-API page call failed (%s)."%page_request.get_url())
+
+                if i>=page_max_retry:
+                    raise
+                else:
+                    sdcounter.incr('search_api.page_retry')
+
+                    time.sleep(retry_delay*2**i)
+                    i+=1
+
+class PageThread(threading.Thread):
+    """Retrieve pages of one paginated call (see call_web_service__PARALLEL_PAGINATION())."""
+
+    def __init__(self,service,request,pages,results):
+        self.service=service
+        self.request=request
+        self.pages=pages     # input queue (offsets)
+        self.results=results # output queue ((offset,response,error) tuples)
+
+        threading.Thread.__init__(self)
+
+    def run(self):
+        while True:
+            try:
+                offset=self.pages.get_nowait()
+            except Queue.Empty:
+                break
+
+            try:
+                response=self.service.call_page(self.request,offset)
+                self.results.put((offset,response,None))
+            except Exception,e:
+                self.results.put((offset,None,e))
+                break
+
+def get_failover_urls(url):
+    """Returns url list, starting with 'url', followed by the same url on the other configured indexes."""
+    host=urlparse.urlparse(url).netloc
+
+    urls=[url]
+    if host in sdindex.index_host_list:
+        for index_host in sdindex.index_host_list:
+            if index_host!=host:
+                urls.append(url.replace('//%s/'%host,'//%s/'%index_host,1))
+
+    return urls
+
+# init.
+
+parallel_pagination=sdconfig.config.getint('index','parallel_pagination')
+page_max_retry=3
+retry_delay=1 # seconds (doubled after each page retry)
+
 if __name__ == '__main__':
 
     url="http://esgf-data.dkrz.de/esg-search/search?fields=*&realm=atmos&project=CMIP5&time_frequency=mon&experiment=rcp26&variable=tasmin&model=CNRM-CM5&model=CSIRO-Mk3-6-0&model=BCC-CSM1-1-m&ensemble=r1i1p1&type=File"
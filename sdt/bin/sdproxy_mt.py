@@ -27,215 +27,230 @@ import sdtools
 import sdtrace
 import sdurlutils
 import sdexception
+import sdhttppool
+
+class SearchTask():
+    """One search-API query, with its retry state."""
+
+    def __init__(self,query):
+        self.query=query
+        self.attempt=0          # number of failed attempts
+        self.failed_hosts=set() # hosts on which the query failed
+        self.not_before=0       # earliest start time (retry backoff)
+
+    def is_eligible(self,host,hosts):
+        """Returns True if the query can run on 'host'.
+
+        Note
+            A failed query is retried on a different host, unless it already
+            failed on all hosts.
+        """
+        if host not in self.failed_hosts:
+            return True
+        else:
+            return self.failed_hosts.issuperset(hosts)
 
-class MetadataThread(threading.Thread):
-    def __init__(self,host,service,query,result_queue,error_queue):
-        self.host=host                 # index
-        self.service=service           # search-API service (SearchAPIProxy object)
-        self.query=query               # query
-        self.result_queue=result_queue # output queue (global thread-safe Queue PTR)
-        self.error_queue=error_queue   # error queue used by the retry mecanism (global thread-safe Queue PTR)
+class WorkQueue():
+    """Thread safe queue shared by all hosts workers.
 
-        threading.Thread.__init__(self)
+    Notes
+        - Any idle worker takes the next query it is eligible for, so a query
+          is started as soon as a worker is free (no polling).
+        - Retried queries are held until their backoff delay expires.
+    """
 
-    def run(self):
-        ap=self.query.get('attached_parameters',{})
+    def __init__(self,hosts):
+        self.hosts=hosts
+        self.tasks=[]
+        self.running=dict((host,0) for host in hosts) # host => number of running queries
+        self.closed=False
+        self.cond=threading.Condition()
+
+    def put(self,task):
+        with self.cond:
+            self.tasks.append(task)
+            self.cond.notify_all()
+
+    def get(self,host):
+        """Returns the next query to run on 'host' (blocks until one is ready).
+
+        Returns
+            SearchTask object, or None if the queue is closed
+        """
+        with self.cond:
+            while True:
+                if self.closed:
+                    return None
+
+                now=time.time()
+                next_time=None
+                for i,task in enumerate(self.tasks):
+                    if task.is_eligible(host,self.hosts):
+                        if task.not_before<=now:
+                            del self.tasks[i]
+                            self.running[host]+=1
+                            return task
+                        elif next_time is None or task.not_before<next_time:
+                            next_time=task.not_before
+
+                self.cond.wait(None if next_time is None else next_time-now)
+
+    def task_done(self,host):
+        with self.cond:
+            self.running[host]-=1
+
+    def get_waiting_count(self):
+        with self.cond:
+            return len(self.tasks)
+
+    def get_running_counts(self):
+        with self.cond:
+            return dict(self.running)
+
+    def close(self):
+        with self.cond:
+            self.closed=True
+            self.cond.notify_all()
+
+class HostWorker(threading.Thread):
+    def __init__(self,host,service,work_queue,done_queue):
+        self.host=host             # index
+        self.service=service       # search-API service (SearchAPIProxy object)
+        self.work_queue=work_queue # input queue (WorkQueue shared by all workers)
+        self.done_queue=done_queue # output queue (thread-safe Queue of (host,task,metadata) tuples, metadata being None if the query failed)
 
-        try:
-            url_with_host_set=self.query['url'].replace(sdconst.IDXHOSTMARK,self.host)
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
 
-            #sdlog.debug("SDPROXMT-012","Using %s"%self.host,stderr=False,logfile=True)
+    def run(self):
+        while True:
+            task=self.work_queue.get(self.host)
+            if task is None:
+                break
 
+            ap=task.query.get('attached_parameters',{})
 
-            # BEWARE: printing stuff on stdxxx is NOT welcome here, as we are
-            # here running inside a progress bar... so printing on stdxxx
-            # result in a big mess. Maybe enable verbose mode here only if
-            # progress is off, or just output to logfile....
-            # Well, in fact, maybe the better is to move the progress here,
-            # (i.e. as the slow part is the remote call, let's have the progress
-            # close to it, not far upstream !).
-            """
-            verbose=sdsquery.get_scalar(self.query,'verbose',default=False,type_=bool) # we cast here as verbose can be str (set from parameter) or bool (set from '-v' option)
-            if verbose:
-                sdtools.print_stderr("Using %s"%self.host)
-            """
+            try:
+                url_with_host_set=task.query['url'].replace(sdconst.IDXHOSTMARK,self.host)
 
+                # BEWARE: printing stuff on stdxxx is NOT welcome here, as we are
+                # here running inside a progress bar... so printing on stdxxx
+                # result in a big mess.
 
-            metadata=self.service.run(url=url_with_host_set,attached_parameters=ap) # service is an instance of SearchAPIProxy
-            metadata.disconnect() # TAGKLK434L3K34K
-            self.result_queue.put(metadata)
-        except Exception, e:
-            # note
-            #  - it's not fatal to come here, because error queries will be
-            #    retried later using a different host (well until "max_retry"
-            #    is reached of course)
+                metadata=self.service.run(url=url_with_host_set,attached_parameters=ap) # service is an instance of SearchAPIProxy
+                metadata.disconnect() # TAGKLK434L3K34K
+                self.done_queue.put((self.host,task,metadata))
 
-            self.error_queue.put(self.query)
+                # release the result now, as the main thread connects it
+                # (sqlite objects can only be used by the thread which
+                # created them, so the store must not be deleted here)
+                del metadata
+            except Exception, e:
+                # note
+                #  - it's not fatal to come here, because error queries will be
+                #    retried later using a different host (well until "max_retry"
+                #    is reached of course)
+                #  - not needed to log here as already done by 'SYDPROXY-400' and 'SYDPROXY-410'
 
-            # not needed to log here as already done by 'SYDPROXY-400' and 'SYDPROXY-410'
-            #sdlog.info("SDPROXMT-001", "Query failed (url=%s)"%(url_with_host_set,))
-            #sdlog.info("SDPROXMT-006", "%s"%(str(e)),)
+                self.done_queue.put((self.host,task,None))
 
-            # debug
-            #sdtrace.log_exception()
+            self.work_queue.task_done(self.host)
 
 def run(i__queries):
-    """This method contains the retry mecanism."""
+    """Run queries on all index hosts and returns the merged result.
+
+    Notes
+        - Each host runs at most 'max_thread_per_host' queries at once.
+        - Results are merged as soon as a query completes.
+        - A failed query is retried on a different host (with backoff),
+          until 'max_retry' attempts are reached.
+    """
 
     # check
     for q in i__queries:
         if sdconst.IDXHOSTMARK not in q['url']:
             raise sdexception.SDException('SDPROXMT-044','Incorrect query: host must not be set at this step')
 
-    # retry loop
-    max_retry=6
-    i=0
     metadata=sdtypes.Metadata()
-    l__queries=i__queries
-    while i < max_retry:
 
-        (success,errors)=run_helper(l__queries)
+    if len(i__queries)<1:
+        return metadata
 
-        metadata.slurp(success) # warning: success is modified here
+    hosts=searchAPIServices.keys()
+    random.shuffle(hosts) # this is to prevent always starting with the same server
 
-        if len(errors)>0:
-            sdlog.info("SDPROXMT-082","%d search-API queries failed"%(len(errors),))
-            sdlog.info("SDPROXMT-083","retry 'failed search-API queries'")
-            l__queries=errors
+    sdlog.debug("SDPROXMT-003","%d search-API queries to process (max_thread_per_host=%d,timeout=%d)"%(len(i__queries),max_thread_per_host,sdconst.SEARCH_API_HTTP_TIMEOUT))
 
-            i+=1
+    work_queue=WorkQueue(hosts)
+    done_queue=Queue.Queue()
 
-            continue
-        else:
-            if i>0:
-                sdlog.info("SDPROXMT-089","retry succeeded")
+    for query in i__queries:
+        work_queue.put(SearchTask(query))
 
-            break
+    start_workers(hosts,work_queue,done_queue)
+
+    remaining=len(i__queries)
+    errors=[]
+    try:
+        while remaining>0:
+            try:
+                (host,task,success)=done_queue.get(True,progress_interval) # timeout is set so to log progress (and to stay interruptible)
+            except Queue.Empty:
+                log_progress(len(i__queries),remaining,work_queue)
+                continue
+
+            if success is not None:
+                success.connect() # TAGKLK434L3K34K
+                metadata.slurp(success) # warning: success is modified here
+
+                if task.attempt>0:
+                    sdlog.info("SDPROXMT-089","retry succeeded (host=%s)"%host)
+
+                remaining-=1
+            else:
+                task.attempt+=1
+                task.failed_hosts.add(host)
+
+                if task.attempt<max_retry:
+                    backoff=get_backoff(task.attempt)
+                    task.not_before=time.time()+backoff
+
+                    sdlog.info("SDPROXMT-083","search-API query failed (host=%s,attempt=%d), retry in %.1f second"%(host,task.attempt,backoff))
+
+                    work_queue.put(task)
+                else:
+                    errors.append(task.query)
+                    remaining-=1
+    finally:
+        work_queue.close() # stop workers
 
     if len(errors)>0:
         sdlog.error("SDPROXMT-084","max retry iteration reached. %d queries did not succeed"%(len(errors),))
 
-    return metadata
-
-def start_new_thread(host,url):
-    sdlog.debug("SDPROXMT-002","Starting new search-API thread (%s)"%host)
-
-    service=searchAPIServices[host]["iSearchAPIProxy"]
-
-    th=MetadataThread(host,service,url,__result_queue,__error_queue)
-    th.setDaemon(True)
-    th.start()
+    sdhttppool.log_stats()
 
-    return th
-
-def all_threads_completed():
-    """
-    Returns:
-      True   => all threads completed
-      False  => threads still running
-    """
-    for host in searchAPIServices.keys():
-        for t in searchAPIServices[host]['threadlist']:
-            if t.is_alive():
-                return False
-
-    return True
-
-def process_query(host,query):
-    """
-    return 
-      True   => query processed
-      False  => query not processed (host is busy)
-    """
-
-    if len(searchAPIServices[host]['threadlist'])<max_thread_per_host:
-
-        searchAPIServices[host]['threadlist'].append(start_new_thread(host,query))
-
-        return True
-    else:
-        return False
-
-def distribute_queries(queries):
-
-    hosts=searchAPIServices.keys()
-
-    random.shuffle(hosts) # this is to prevent always starting with the same server
+    return metadata
 
+def start_workers(hosts,work_queue,done_queue):
     for host in hosts:
+        sdlog.debug("SDPROXMT-002","Starting %d search-API threads (%s)"%(max_thread_per_host,host))
 
-        if len(queries)<1:
-            break
-        else:
-            query=queries.pop()
-
-            status=process_query(host,query)
+        service=searchAPIServices[host]["iSearchAPIProxy"]
 
-            if not status:
-                # host is busy (thread is running on the host)
-                # so we send back query in the stack
+        for i in range(max_thread_per_host):
+            HostWorker(host,service,work_queue,done_queue).start()
 
-                queries.append(query)
+def get_backoff(attempt):
+    """Returns the delay before retrying a query (exponential backoff, with jitter)."""
+    delay=min(retry_backoff*(2**(attempt-1)),max_retry_backoff)
+    return delay*random.uniform(0.5,1.0)
 
-def run_helper(queries):
-    """
-    notes
-      - "queries" is non-threadsafe (i.e. not a Queue), but doesn't matter as threads do not use it
-    """
-    total_query_to_process=len(queries)
-
-    sdlog.debug("SDPROXMT-003","%d search-API queries to process (max_thread_per_host=%d,timeout=%d)"%(total_query_to_process,max_thread_per_host,sdconst.SEARCH_API_HTTP_TIMEOUT))
-
-    while True:
-        if sdconfig.proxymt_progress_stat:
-            sdlog.info("SDPROXMT-033","threads per host: %s"%",".join(['%s=%s'%(host,len(searchAPIServices[host]['threadlist'])) for host in searchAPIServices.keys()]))
-
-        if len(queries)>0:
-            distribute_queries(queries)
-        else:
-            # leave the loop only if all threads completed
-            if all_threads_completed():
-                break
-
-        # remove completed threads from list
-        for host in searchAPIServices.keys():
-            li=[]
-            for t in searchAPIServices[host]['threadlist']:
-                if t.is_alive():
-                    li.append(t)
-            searchAPIServices[host]['threadlist']=li
-
-        # log
-        total_query_already_processed = total_query_to_process - len(queries)
-        if total_query_to_process > 0: # display progress only when there are a lot of queries
-            if len(queries) > 0: # display progress only when still query to process
-                sdlog.info("SDPROXMT-004","total_queries=%d, running_or_done_queries=%d, waiting_queries=%d"%(total_query_to_process,total_query_already_processed,len(queries)))
-
-        # if all services are busy, we sleep to limit loop speed
-        # (note that all the code around the "sleep" call is to detect system overload)
-        sleep_time=10
-        warning_threshold=5 # threshold not to emit warning for every small load exceedance
-        befo=time.time()
-        time.sleep(sleep_time)
-        afte=time.time()
-        diff=afte-befo
-        if diff>sleep_time+warning_threshold:
-            sdlog.warning("SDPROXMT-005","WARNING: system overload detected (sleep takes %d second to complete)."%diff)
-
-    # retrieve result from output queue
-    metadata=sdtypes.Metadata()
-    while not __result_queue.empty():
-        success=__result_queue.get(False) # retrieve result from ONE successful search-API call
-        success.connect() # TAGKLK434L3K34K
-        metadata.slurp(success) # warning: success is modified here
-
-    # retrieve error from output queue and insert them into a list
-    errors=[]
-    while not __error_queue.empty():
-        query=__error_queue.get(False)
-        errors.append(query)
+def log_progress(total,remaining,work_queue):
+    if sdconfig.proxymt_progress_stat:
+        running=work_queue.get_running_counts()
+        sdlog.info("SDPROXMT-033","threads per host: %s"%",".join(['%s=%s'%(host,running[host]) for host in running.keys()]))
 
-    return (metadata,errors)
+    sdlog.info("SDPROXMT-004","total_queries=%d, done_queries=%d, waiting_queries=%d"%(total,total-remaining,work_queue.get_waiting_count()))
 
 def set_index_hosts(index_hosts):
     global searchAPIServices
@@ -244,14 +259,15 @@ def set_index_hosts(index_hosts):
     for index_host in index_hosts:
         searchAPIServices[index_host]={}
         searchAPIServices[index_host]['iSearchAPIProxy']=sdproxy.SearchAPIProxy() # contains service PTR
-        searchAPIServices[index_host]['threadlist']=[]                            # contains threads PTR
 
 # module init
 
 max_thread_per_host=sdconfig.max_metadata_parallel_download_per_index
 
-__result_queue=Queue.Queue() # thread safe data structure to hold search-API result
-__error_queue=Queue.Queue()  # thread safe data structure to hold unsuccessful request (used by the retry mecanism)
+max_retry=6           # max number of attempts per query
+retry_backoff=1       # delay before the first retry (doubled at each attempt)
+max_retry_backoff=30
+progress_interval=10  # seconds between progress messages
 
 searchAPIServices=None # list of search-API services (M queries will be sent to one service at once, resulting in MxN parallel streams, with N the number of service)
 
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module checks that hot queries (i.e. run by the transfer daemon at each iteration or for each transfer) use an index.
+
+Notes
+    - Each query is checked with 'EXPLAIN QUERY PLAN': a query fails if it
+      scans a table or an index (instead of searching it), or if it sorts or
+      groups rows using a temporary B-tree.
+    - Queries are the ones run by the modules named in the first column
+      (module-level query strings, or built by the module own functions for
+      dynamic queries). Queries working on the whole table (e.g. 'synda
+      list') are not hot queries and are not checked.
+    - 'check' action exits with status 1 if any query fails.
+
+Example
+    sdqueryplan.py check
+"""
+
+import re
+import sys
+import argparse
+import sdconst
+
+def check(conn=None):
+    """
+    Returns
+        list of (name,query,plan) tuples (empty list if all queries use an index)
+    """
+    failures=[]
+    for (name,query,params) in get_hot_queries():
+        plan=get_plan(query,params,conn)
+        if not is_plan_ok(plan):
+            failures.append((name,query,plan))
+
+    return failures
+
+def get_plan(query,params,conn=None):
+    """Returns query plan as a list of lines."""
+    if conn is None:
+        import sddb # not at the top, so a scratch database can be set first
+        conn=sddb.conn
+
+    c=conn.cursor()
+    c.execute("explain query plan %s"%query,params)
+    plan=[rs[-1] for rs in c.fetchall()] # last column is the detail (columns differ between SQLite versions)
+    c.close()
+
+    return plan
+
+def is_plan_ok(plan):
+    for detail in plan:
+        if scan_regex.match(detail) is not None and subquery_regex.match(detail) is None:
+            return False
+
+        if 'TEMP B-TREE' in detail:
+            return False
+
+    return True
+
+def print_plans(failures_only=False):
+    """Returns failures count."""
+    failures_count=0
+
+    hot_queries=get_hot_queries()
+    for (name,query,params) in hot_queries:
+        plan=get_plan(query,params)
+        ok=is_plan_ok(plan)
+
+        if not ok:
+            failures_count+=1
+
+        if failures_only and ok:
+            continue
+
+        print "%s %s"%('OK  ' if ok else 'FAIL',name)
+        print "    %s"%query
+        for detail in plan:
+            print "        %s"%detail
+
+    print "%i/%i hot queries use an index"%(len(hot_queries)-failures_count,len(hot_queries))
+
+    return failures_count
+
+def get_hot_queries():
+    """Returns list of (name,query,parameters) tuples.
+
+    Note
+        DAO modules are not imported at the top, so a scratch database can be set first.
+    """
+    import sdfiledao
+    import sdfilequery
+    import sdtransferqueue
+    import sddatasetdao
+    import sddatasetquery
+    import sdvariablequery
+    import sdcompletion
+    import sdeventdao
+
+    waiting_files_constraints={'status':waiting,'data_node':data_node}
+    new_events_constraints={'status':sdconst.EVENT_STATUS_NEW}
+    event_params=[sdconst.EVENT_VARIABLE_COMPLETE,sdconst.EVENT_STATUS_NEW,'CMIP6','IPSL-CM6A-LR',dataset_path,'tas','','2018-08-03 00:00:00',sdconst.DEFAULT_PRIORITY] # see sdeventdao.keys_to_insert
+
+    return [
+        ('sdfiledao.get_files',sdfiledao.build_get_files_query(waiting_files_constraints,sdfiledao.ordered_priority_clause,1),waiting_files_constraints),
+        ('sdfiledao.get_files (priority cache)',sdfiledao.build_get_files_query(waiting_files_constraints,sdfiledao.cached_priority_clause%1000,101),waiting_files_constraints),
+        ('sdfiledao.highest_waiting_priority',sdfiledao.highest_waiting_priority_query,(data_node,)),
+        ('sdfiledao.get_dataset_files',sdfiledao.dataset_files_query%'',(1,)),
+        ('sdtransferqueue._load_datanodes',sdtransferqueue.datanodes_query,(waiting,)),
+        ('sdtransferqueue._load_window',sdtransferqueue.window_query,(waiting,data_node,sdtransferqueue.window_size)),
+        ('sdtransferqueue._get_waiting_files',sdtransferqueue.waiting_files_query%'?,?,?',(waiting,1,2,3)),
+        ('sdfilequery.transfer_status_count',sdfilequery.transfer_status_count_query,(running,)),
+        ('sdfilequery.get_waiting_datanodes',sdfilequery.waiting_datanodes_query,()),
+        ('sdfilequery.get_running_count_by_datanode',sdfilequery.running_count_by_datanode_query,()),
+        ('sdfilequery.count_dataset_files',sdfilequery.dataset_files_count_query,(1,)),
+        ('sdfilequery.count_dataset_files (status)',sdfilequery.dataset_files_count_by_status_query,(1,done)),
+        ('sddatasetquery.get_dataset_stats (size)',sddatasetquery.dataset_size_by_status_query,(1,)),
+        ('sddatasetquery.get_dataset_stats (count)',sddatasetquery.dataset_count_by_status_query,(1,)),
+        ('sddatasetquery.get_dataset_stats (variables)',sddatasetquery.dataset_variable_count_query,(1,)),
+        ('sddatasetquery.get_dataset_versions',sddatasetquery.dataset_versions_query,(dataset_path.rsplit('/',1)[0],)),
+        ('sddatasetdao.get_dataset (path)',sddatasetdao.dataset_by_path_query,(dataset_path,)),
+        ('sdvariablequery.get_variables_files_count_by_status',sdvariablequery.variables_files_count_by_status_query,(1,)),
+        ('sdvariablequery.get_variables_files_count_by_status (variable)',sdvariablequery.variable_files_count_by_status_query,(1,'tas')),
+        ('sdvariablequery.get_variables_files_count',sdvariablequery.variables_files_count_query,(1,)),
+        ('sdcompletion.get_dataset_counters',sdcompletion.dataset_counters_query,(1,)),
+        ('sdcompletion.get_variable_counters',sdcompletion.variable_counters_query,(1,'tas')),
+        ('sdcompletion.exists_one_complete_variable',sdcompletion.complete_variable_query,(1,)),
+        ('sdeventdao.get_events',sdeventdao.build_get_events_query(new_events_constraints,200),new_events_constraints),
+        ('sdeventdao.add_events (coalescing)',sdeventdao.add_events_query,event_params+[sdconst.EVENT_STATUS_NEW,sdconst.EVENT_VARIABLE_COMPLETE,'CMIP6','IPSL-CM6A-LR',dataset_path,'tas','']),
+    ]
+
+
+# init.
+
+scan_regex=re.compile(r'^SCAN ')
+subquery_regex=re.compile(r'^SCAN (SUBQUERY|\(subquery|CONSTANT ROW)')
+
+waiting=sdconst.TRANSFER_STATUS_WAITING
+running=sdconst.TRANSFER_STATUS_RUNNING
+done=sdconst.TRANSFER_STATUS_DONE
+data_node='esgf-node0.example.org' # same as 'sdbenchutils' synthetic files
+dataset_path='CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action',choices=['check','print'],help="'check' prints failing queries only")
+    args = parser.parse_args()
+
+    failures_count=print_plans(failures_only=(args.action=='check'))
+
+    if args.action=='check' and failures_count>0:
+        sys.exit(1)
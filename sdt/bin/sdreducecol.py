@@ -36,7 +36,8 @@ def remove_unused_fields(files):
         ,'forcing'
         ,'description'
         ,'master_id'
-        ,'master_gateway']
+        ,'master_gateway'
+        ,'replicas']
 
     for file in files:
         sdtools.remove_dict_items(file,li)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""Contains replica DAO SQL queries.
+
+Note
+    'file_replica' table contains the urls of all replicas of a file (one row
+    per url), as returned by the search-API. It is used to switch to another
+    url when a transfer fails (see 'sdnexturl' module).
+"""
+
+import argparse
+import sdapp
+import sddb
+import sdtime
+import sdconst
+
+def add_replicas(files,commit=True,conn=sddb.conn):
+    """Store replica urls of enqueued files (files without 'replicas' attribute are skipped)."""
+    now=sdtime.now()
+
+    c = conn.cursor()
+    c.executemany("insert or replace into file_replica (file_functional_id,url,protocol,refresh_date) values (?,?,?,?)",
+                  ((f.file_functional_id,url,protocol,now) for f in files for (url,protocol) in getattr(f,'replicas',[])))
+    c.close()
+
+    if commit:
+        conn.commit()
+
+def replace_replicas(file_functional_id,urlps,commit=True,conn=sddb.conn):
+    """Replace replica urls of one file.
+
+    Args
+        urlps: list of [url,protocol]
+    """
+    now=sdtime.now()
+
+    c = conn.cursor()
+    c.execute("delete from file_replica where file_functional_id=?",(file_functional_id,))
+    c.executemany("insert or replace into file_replica (file_functional_id,url,protocol,refresh_date) values (?,?,?,?)",
+                  ((file_functional_id,url,protocol,now) for (url,protocol) in urlps))
+    c.close()
+
+    if commit:
+        conn.commit()
+
+def get_replicas(file_functional_id,conn=sddb.conn):
+    """Returns list of [url,protocol] (empty list if replicas are not known)."""
+    c = conn.cursor()
+    c.execute("select url,protocol from file_replica where file_functional_id=?",(file_functional_id,))
+    urlps=[[rs[0],rs[1]] for rs in c.fetchall()]
+    c.close()
+
+    return urlps
+
+def get_stale_replicas(refresh_date_limit,limit,conn=sddb.conn):
+    """Returns functional id of not yet transferred files whose replicas have not been refreshed since 'refresh_date_limit'."""
+    c = conn.cursor()
+    c.execute("select distinct r.file_functional_id from file_replica r join file f on f.file_functional_id=r.file_functional_id where r.refresh_date<? and f.status in (?,?) limit ?",
+              (refresh_date_limit,sdconst.TRANSFER_STATUS_WAITING,sdconst.TRANSFER_STATUS_ERROR,limit))
+    li=[rs[0] for rs in c.fetchall()]
+    c.close()
+
+    return li
+
+def delete_replicas(file_functional_id,commit=True,conn=sddb.conn):
+    c = conn.cursor()
+    c.execute("delete from file_replica where file_functional_id=?",(file_functional_id,))
+    c.close()
+
+    if commit:
+        conn.commit()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file_functional_id')
+    args = parser.parse_args()
+
+    for (url,protocol) in get_replicas(args.file_functional_id):
+        print protocol,url
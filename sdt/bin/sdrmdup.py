@@ -24,29 +24,11 @@ import sdapp
 import sdconst
 import sdprint
 import sdpostpipelineutils
-import sdlmattrfilter
-import sdpipelineprocessing
 
 def run(metadata,functional_id_keyname):
-    light_metadata=sdlmattrfilter.run(metadata,[functional_id_keyname,'data_node']) # create light list with needed columns only not to overload system memory
-
-    # list of dict => dict (id=>bool)
-    seen=dict(((f[functional_id_keyname],f['data_node']), False) for f in light_metadata.get_files())
-
-    po=sdpipelineprocessing.ProcessingObject(remove,functional_id_keyname,seen)
-    metadata=sdpipelineprocessing.run_pipeline(metadata,po)
-
+    metadata.distinct([functional_id_keyname,'data_node']) # first item in the loop win (pushed down to SQL when possible)
     return metadata
 
-def remove(files,functional_id_keyname,seen):
-    new_files=[]
-    for f in files:
-        uniq_id=(f[functional_id_keyname],f['data_node']) # tuple
-        if not seen[uniq_id]:
-            new_files.append(f)
-            seen[uniq_id]=True # mark as seen so other duplicate will be excluded (first item in the loop win)
-    return new_files
-
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-1','--print_only_one_item',action='store_true')
@@ -50,17 +50,26 @@ def run(metadata):
 
 def shrink(metadata):
 
-    if sdshrinktest.is_nearestpost_enabled(metadata):
-        # In this case, we remove duplicates by keeping the nearest
-
-        sdlog.info("SDSHRINK-001","Start nearestpost filter..")
-        metadata=sdnearestpost.run(metadata)
-        sdlog.info("SDSHRINK-002","nearestpost filter completed")
-    else:
-        # In this case, we remove duplicates by using a 'uniq' filter
-
-        sdlog.info("SDSHRINK-008","Start uniq filter..")
-        metadata=sdshrinkutils.uniq(metadata)
-        sdlog.info("SDSHRINK-010","uniq filter completed")
+    replicas=sdshrinkutils.collect_replicas(metadata) # urls of the replicas removed below are kept (see 'sdnexturl' module)
+
+    try:
+        if sdshrinktest.is_nearestpost_enabled(metadata):
+            # In this case, we remove duplicates by keeping the nearest
+
+            sdlog.info("SDSHRINK-001","Start nearestpost filter..")
+            metadata=sdnearestpost.run(metadata)
+            sdlog.info("SDSHRINK-002","nearestpost filter completed")
+        else:
+            # In this case, we remove duplicates by using a 'uniq' filter
+
+            sdlog.info("SDSHRINK-008","Start uniq filter..")
+            metadata=sdshrinkutils.uniq(metadata)
+            sdlog.info("SDSHRINK-010","uniq filter completed")
+
+        if replicas is not None:
+            metadata=sdshrinkutils.attach_replicas(metadata,replicas)
+    finally:
+        if replicas is not None:
+            replicas.delete()
 
     return metadata
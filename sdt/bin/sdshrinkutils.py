@@ -11,10 +11,60 @@
 
 """This module contains shrink preprocessing routines."""
 
+import os
+import sqlite3
+import contextlib
 import sdpostpipelineutils
 import sdrmduprep
 import sdrmdup
 import sdlog
+import sdconst
+import sdconfig
+import sdmts
+import sdpipelineprocessing
+
+class ReplicaIndex():
+    """Urls of all replicas of each file.
+
+    Note
+        urls are stored in a transient sqlite database (on disk in lowmem
+        mode), so memory usage doesn't depend on the discovery size.
+    """
+
+    def __init__(self,lowmem=None):
+        lowmem=sdconfig.lowmem if lowmem is None else lowmem
+
+        self.dbfile=sdmts.get_uniq_fullpath_db_filename() if lowmem else ':memory:'
+        self.conn=sqlite3.connect(self.dbfile)
+        self.conn.execute("create table replica (functional_id TEXT, url TEXT, protocol TEXT)")
+        self.conn.execute("create unique index idx_replica_1 on replica (functional_id, url, protocol)")
+        self.conn.commit()
+
+    def add_files(self,files,functional_id_keyname):
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.executemany("insert or ignore into replica (functional_id,url,protocol) values (?,?,?)",
+                          ((f[functional_id_keyname],url,protocol) for f in files for (url,protocol) in f.get('replicas',[])))
+        self.conn.commit()
+
+    def get_replicas(self,functional_ids):
+        """Returns dict (functional_id => list of [url,protocol]), urls being in the order they were found."""
+        replicas={}
+        functional_ids=list(set(functional_ids))
+
+        with contextlib.closing(self.conn.cursor()) as c:
+            for i in xrange(0,len(functional_ids),500): # sqlite limits the number of host parameters
+                ids=functional_ids[i:i+500]
+                c.execute("select functional_id,url,protocol from replica where functional_id in (%s) order by rowid"%','.join(['?']*len(ids)),ids)
+                for (functional_id,url,protocol) in c:
+                    replicas.setdefault(functional_id,[]).append([url,protocol])
+
+        return replicas
+
+    def delete(self):
+        self.conn.close()
+
+        if self.dbfile!=':memory:' and os.path.isfile(self.dbfile):
+            os.remove(self.dbfile)
 
 def uniq(metadata):
 
@@ -46,3 +96,38 @@ def uniq(metadata):
         metadata=sdrmduprep.run(metadata,functional_id_keyname)
 
     return metadata
+
+def collect_replicas(metadata):
+    """Returns urls of all replicas of each file (must be called before replicas are removed).
+
+    Returns
+        ReplicaIndex object (the caller must delete it), or None if files don't have 'replicas' attribute
+    """
+    if metadata.count() < 1:
+        return None
+
+    f=metadata.get_one_file()
+    if 'replicas' not in f:
+        return None
+
+    functional_id_keyname=sdpostpipelineutils.get_functional_identifier_name(f)
+
+    replicas=ReplicaIndex()
+    for chunk in metadata.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+        replicas.add_files(chunk,functional_id_keyname)
+
+    return replicas
+
+def attach_replicas(metadata,replicas):
+    """Set urls of all replicas in the remaining files."""
+    f=metadata.get_one_file()
+    functional_id_keyname=sdpostpipelineutils.get_functional_identifier_name(f)
+
+    po=sdpipelineprocessing.ProcessingObject(set_replicas,functional_id_keyname,replicas)
+    return sdpipelineprocessing.run_pipeline(metadata,po)
+
+def set_replicas(files,functional_id_keyname,replicas):
+    chunk_replicas=replicas.get_replicas([f[functional_id_keyname] for f in files])
+    for f in files:
+        f['replicas']=chunk_replicas.get(f[functional_id_keyname],f.get('replicas',[]))
+    return files
@@ -19,11 +19,9 @@ import sdpipelineprocessing
 
 def run(metadata,filter_name,filter_value,mode):
     if mode=='keep':
-        po=sdpipelineprocessing.ProcessingObject(keep_matching_files,filter_name,filter_value)
-        metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+        metadata.keep_equal(filter_name,filter_value) # pushed down to SQL when possible
     elif mode=='remove':
-        po=sdpipelineprocessing.ProcessingObject(remove_matching_files,filter_name,filter_value)
-        metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+        metadata.remove_equal(filter_name,filter_value) # pushed down to SQL when possible
     elif mode=='remove_substr':
         po=sdpipelineprocessing.ProcessingObject(remove_matching_files_substr,filter_name,filter_value)
         metadata=sdpipelineprocessing.run_pipeline(metadata,po)
@@ -32,44 +30,6 @@ def run(metadata,filter_name,filter_value,mode):
 
     return metadata
 
-def keep_matching_files(files,filter_name,filter_value):
-    """Keeps files with an exact match.
-
-    Note:
-        - If filter name not found in file attributes, raises exception.
-    """
-    new_files=[]
-    for f in files:
-
-        if filter_name not in f:
-            raise SDException("SDSIMPLF-001","Filter name not found in file attributes (filter_name=%s)"%(filter_name,))
-
-        if f[filter_name]==filter_value:
-            new_files.append(f)
-
-    files=new_files
-
-    return files
-
-def remove_matching_files(files,filter_name,filter_value):
-    """Remove files with an exact match.
-
-    Note:
-        If filter name not found in file attributes, raises exception.
-    """
-    new_files=[]
-    for f in files:
-
-        if filter_name not in f:
-            raise SDException("SDSIMPLF-003","Filter name not found in file attributes (filter_name=%s)"%(filter_name,))
-
-        if f[filter_name]!=filter_value:
-            new_files.append(f)
-
-    files=new_files
-
-    return files
-
 def remove_matching_files_substr(files,filter_name,filter_value):
     """Remove files with a substring match.
 
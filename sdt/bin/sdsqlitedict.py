@@ -22,6 +22,7 @@ Credit
 """
 
 import json
+import time
 import collections
 import sqlite3
 import contextlib
@@ -86,13 +87,21 @@ class SqliteStringDict(collections.MutableMapping):
     Sqlite database with an interface of dictionary
     """
 
-    def __init__(self, path, table, isolation_level):
+    def __init__(self, path, table, isolation_level, pragmas=None):
         self.path = path
         self.table = table
         self.isolation_level = isolation_level
         self.conn = sqlite3.connect(self.path,
                                     isolation_level=self.isolation_level)
 
+        # connection settings are best effort (e.g. journal mode cannot be
+        # switched while another process uses the database)
+        for name, value in (pragmas or []):
+            try:
+                self.conn.execute("PRAGMA %s=%s" % (name, value))
+            except sqlite3.OperationalError:
+                pass
+
         with contextlib.closing(self.conn.cursor()) as c:
             c.execute("CREATE TABLE IF NOT EXISTS %s "
                       "(key TEXT PRIMARY KEY, value TEXT)" % self.table)
@@ -147,6 +156,115 @@ class SqliteStringDict(collections.MutableMapping):
         for key, value in self.iteritems():
             yield key
 
+class WriteBehindDict(collections.MutableMapping):
+    """
+    In-memory dictionary persisted in a sqlite table (write-behind)
+
+    Notes
+        - Reads never touch the database.
+        - Modifications are written in one transaction when flush() is called
+          (or on write, if 'flush_interval' seconds have elapsed since the last flush).
+        - Values are stored as TEXT and converted back with 'value_type' (None is kept as is).
+        - Modifications made by other processes are only seen after reload()
+          (see refresh()).
+    """
+
+    def __init__(self, path, table, value_type=str, flush_interval=None,
+                 pragmas=None):
+        self.target = SqliteStringDict(path, table, None, pragmas=pragmas)
+        self.value_type = value_type
+        self.flush_interval = flush_interval
+        self.data = {}
+        self.dirty = set()
+        self.deleted = set()
+        self.last_flush = time.time()
+
+        self.load()
+
+    def load(self):
+        self.data_version = self.get_data_version()
+        self.data = {}
+        for key, value in self.target.iteritems():
+            self.data[key] = self.convert(value)
+
+    def get_data_version(self):
+        """Returns a value which changes each time another connection commits changes in the database."""
+        with contextlib.closing(self.target.conn.cursor()) as c:
+            c.execute("PRAGMA data_version")
+            return c.fetchone()[0]
+
+    def reload(self):
+        """Re-read the table (pending modifications are written first)."""
+        self.flush()
+        self.load()
+
+    def refresh(self):
+        """Reload the table if another connection has modified it.
+
+        Returns
+            True if the table has been reloaded
+        """
+        if self.get_data_version() == self.data_version:
+            return False
+
+        self.reload()
+        return True
+
+    def convert(self, value):
+        if value is None:
+            return None
+        return self.value_type(value)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = self.convert(value)
+        self.dirty.add(key)
+        self.deleted.discard(key)
+        self.flush_if_needed()
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.deleted.add(key)
+        self.dirty.discard(key)
+        self.flush_if_needed()
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data.keys())
+
+    def flush_if_needed(self):
+        if self.flush_interval is not None:
+            if time.time() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        """Write all pending modifications in one transaction."""
+        self.last_flush = time.time()
+
+        if len(self.dirty) == 0 and len(self.deleted) == 0:
+            return
+
+        conn = self.target.conn
+        with contextlib.closing(conn.cursor()) as c:
+            c.execute("BEGIN")
+            c.executemany("INSERT OR REPLACE INTO %s (key, value) "
+                          "VALUES (?, ?)" % self.target.table,
+                          [(k, self.data[k]) for k in self.dirty])
+            c.executemany("DELETE FROM %s "
+                          "WHERE key=?" % self.target.table,
+                          [(k,) for k in self.deleted])
+            c.execute("COMMIT")
+
+        self.dirty.clear()
+        self.deleted.clear()
+
 class SqliteDict(JsonProxyDict):
 
     def __init__(self, path=":memory:", table="dict",
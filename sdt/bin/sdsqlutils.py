@@ -151,6 +151,59 @@ def update(instance,columns_subset_without_pk,commit,conn):
 
     return rowcount
 
+def insert_many(instances,columns_subset,commit,conn):
+    """This func insert many rows in one statement (executemany).
+
+    Note:
+        All instances must be of the same type. Inserted ids are not returned.
+    """
+    if len(instances)==0:
+        return 0
+
+    tablename=get_tablename(instances[0])
+    columns=', '.join(columns_subset)
+    placeholders=':'+', :'.join(columns_subset)
+    query='INSERT INTO %s (%s) VALUES (%s)' % (tablename,columns,placeholders)
+
+    c = conn.cursor()
+    c.executemany(query, (dict((k,instance.__dict__[k]) for k in columns_subset) for instance in instances))
+    rowcount=c.rowcount
+    c.close()
+
+    if commit:
+        conn.commit()
+
+    return rowcount
+
+def update_many(instances,columns_subset_without_pk,commit,conn):
+    """This func update many rows in one statement (executemany).
+
+    Note:
+        All instances must be of the same type.
+    """
+    if len(instances)==0:
+        return 0
+
+    tablename=get_tablename(instances[0])
+    pk=tablename+'_id'
+
+    payload_placeholders=', '.join(['%s=:%s'%(k,k) for k in columns_subset_without_pk])
+    query='UPDATE %s SET %s WHERE %s=:%s' % (tablename,payload_placeholders,pk,pk)
+
+    c = conn.cursor()
+    c.executemany(query, (dict((k,instance.__dict__[k]) for k in columns_subset_without_pk+[pk]) for instance in instances))
+    rowcount=c.rowcount
+    c.close()
+
+    if commit:
+        conn.commit()
+
+    return rowcount
+
+def split(li,size):
+    """Split list in chunks (e.g. to stay below sqlite host parameters limit (999) in 'IN' clause)."""
+    return [li[i:i+size] for i in range(0,len(li),size)]
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('teststring')
@@ -208,7 +208,7 @@ def run(subparsers):
 
     subparser=create_subparser(subparsers,'metric',selection=False,no_default=False,help='Display performance and disk usage metrics',example=sdcliex.metric())
     subparser.add_argument('--groupby','-g',choices=['data_node','project','model'],default='data_node',help='Group-by clause')
-    subparser.add_argument('--metric','-m',choices=['rate','size'],default='rate',help='Metric name')
+    subparser.add_argument('--metric','-m',choices=['rate','size','concurrency'],default='rate',help="Metric name ('concurrency' displays learned per-data-node windows, see 'adaptive_concurrency' parameter)")
     subparser.add_argument('--project','-p',default='CMIP5',help="Project name (must be used with '--groupby=model' else ignored)")
 
     subparser=create_subparser(subparsers,'open',no_default=False,help='Open netcdf file',example=sdcliex.open())
@@ -12,10 +12,11 @@
 
 import sys
 import os
+import time
 import sdapp
 import sdconfig
 import sdfiledao
-import sddao
+import sdtransferqueue
 import sdconst
 import sdfilequery
 import sdtime
@@ -26,18 +27,60 @@ import sdlog
 import sddb
 import sddeletefile
 import sdtrace
-from sdexception import NoTransferWaitingException,FatalException,RemoteException
+import sdwakeup
+import sdutils
+import sdconcurrency
+import sdcounter
+from sdexception import FatalException,RemoteException
 from sdtypes import File
 
 @sdprofiler.timeit
 def delete_transfers():
     sddeletefile.delete_transfers(limit=100)
 
+@sdprofiler.timeit
+def checkpoint_database():
+    """Copy the WAL file content into the database file every 'db_checkpoint_interval' seconds.
+
+    Note
+        SQLite also checkpoints automatically on commit, but this checkpoint
+        can't complete while readers are active, so the WAL file may keep
+        growing when the database is read often (e.g. by 'synda list').
+    """
+    global last_checkpoint
+
+    if sdconfig.db_checkpoint_interval<=0:
+        return
+
+    if time.time()-last_checkpoint<sdconfig.db_checkpoint_interval:
+        return
+
+    last_checkpoint=time.time()
+
+    remaining_pages=sddb.checkpoint()
+    sdcounter.observe('db.wal_remaining_pages',remaining_pages)
+
 @sdprofiler.timeit
 def process_async_event(): # 'async' is because event are waiting in 'event' table before being proceeded
-    events=sdeventdao.get_events(status=sdconst.EVENT_STATUS_NEW,limit=200) # process 200 events at a time (arbitrary)
+    """Send new events to the post-processing module.
+
+    Notes
+        - Events are sent by batch, until no new event remains or
+          'event_delivery_max_duration' is exceeded.
+        - Batch size doubles after each full batch successfully delivered
+          (up to 'event_batch_max_size'), and is halved when delivery fails.
+        - The whole batch is acknowledged by the post-processing module, so
+          all events of the batch are marked as sent in one statement.
+    """
+    global event_batch_size
+
+    start=time.time()
 
-    if len(events)>0:
+    while True:
+        events=sdeventdao.get_events(status=sdconst.EVENT_STATUS_NEW,limit=event_batch_size)
+
+        if len(events)==0:
+            break
 
         try:
             sdppproxy.event(events)
@@ -48,9 +91,17 @@ def process_async_event(): # 'async' is because event are waiting in 'event' tab
             sdeventdao.update_events(events,commit=False)
             sddb.conn.commit()
             sdlog.info("SYNDTASK-001","Events status succesfully updated")
+
+            sdcounter.incr('event.sent',len(events))
+            sdcounter.observe('event.batch_size',len(events))
         except RemoteException,e: # non-fatal
             sddb.conn.rollback()
             sdlog.info("SYNDTASK-002","Error occurs during event processing (%s)"%str(e))
+
+            event_batch_size=max(event_batch_min_size,event_batch_size/2) # events will be sent again (duplicates are ignored by the post-processing module)
+            sdcounter.incr('event.delivery_error')
+
+            break
         except Exception,e: # fatal
             sddb.conn.rollback()
             sdlog.error("SYNDTASK-018","Fatal error occurs during event processing (%s)"%str(e))
@@ -60,6 +111,14 @@ def process_async_event(): # 'async' is because event are waiting in 'event' tab
 
             raise
 
+        if len(events)<event_batch_size:
+            break # no more event
+
+        event_batch_size=min(event_batch_max_size,event_batch_size*2)
+
+        if time.time()-start>event_delivery_max_duration:
+            break # remaining events will be sent during next iteration
+
 @sdprofiler.timeit
 def transfers_end():
     """Process end of transfer instructions.
@@ -68,7 +127,125 @@ def transfers_end():
     this function.
     """
 
-    dmngr.transfers_end()
+    transfers=dmngr.transfers_end()
+
+    for tr in transfers:
+        if tr.status!=sdconst.TRANSFER_STATUS_RUNNING:
+            release_segment_slots(tr)
+
+            if adaptive_concurrency:
+                sdconcurrency.transfer_done(tr)
+
+    if scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+        for tr in transfers:
+            if tr.status!=sdconst.TRANSFER_STATUS_RUNNING:
+                decrement_running_count(tr.data_node)
+
+        if len(transfers)>0:
+            # slots have been freed (and some transfers may have been marked for retry (e.g. sdnexturl))
+            reset_transfers_exhausted()
+
+def load_running_count():
+    """Initialize in-memory running transfers counters from the database.
+
+    Note
+        Only used in 'event' scheduler mode. In this mode, the daemon is the
+        only one to switch transfers from/to 'running' status, so counters are
+        then maintained in memory (no more 'count' queries on the 'file' table).
+    """
+    global running_count_by_datanode
+
+    running_count_by_datanode=sdfilequery.get_running_count_by_datanode()
+
+def increment_running_count(datanode):
+    running_count_by_datanode[datanode]=running_count_by_datanode.get(datanode,0)+1
+
+def decrement_running_count(datanode):
+    count=running_count_by_datanode.get(datanode,0)-1
+
+    if count>0:
+        running_count_by_datanode[datanode]=count
+    else:
+        running_count_by_datanode.pop(datanode,None)
+
+def transfer_running_count():
+    if scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+        return sum(running_count_by_datanode.values())
+    else:
+        return sdfilequery.transfer_running_count()
+
+def transfer_running_count_by_datanode():
+    """Returns the number of slots used by running transfers, by data node.
+
+    Note
+        A segmented transfer uses one slot per segment.
+    """
+    if scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+        count=dict(running_count_by_datanode)
+    else:
+        count=sdfilequery.get_running_count_by_datanode()
+
+    for (datanode,slots) in segment_slots_by_datanode.iteritems():
+        count[datanode]=count.get(datanode,0)+slots
+
+    return count
+
+def get_max_datanode_count(datanode):
+    """Returns the max number of parallel transfers for a data node (learned window if 'adaptive_concurrency' is true)."""
+    if adaptive_concurrency:
+        return sdconcurrency.get_window(datanode)
+    else:
+        return max_datanode_count
+
+def get_segment_count(tr,free_slots):
+    """Returns the number of segments to use to download a file.
+
+    Notes
+        - Only files bigger than 'segmentation_threshold' are segmented.
+        - Extra segments use data node free slots (i.e. slots left once
+          waiting transfers have been started), so segmentation doesn't delay
+          other files.
+        - 'free_slots' is modified.
+    """
+    if not segmentation_enabled:
+        return 1
+
+    if tr.size is None or int(tr.size)<segmentation_threshold:
+        return 1
+
+    if sdutils.get_transfer_protocol(tr.url)!=sdconst.TRANSFER_PROTOCOL_HTTP:
+        return 1
+
+    segment_count=min(max_segment_per_file,1+max(0,free_slots.get(tr.data_node,0)))
+
+    free_slots[tr.data_node]=free_slots.get(tr.data_node,0)-(segment_count-1)
+
+    return segment_count
+
+def take_segment_slots(tr):
+    if tr.segment_count>1:
+        segment_slots_by_datanode[tr.data_node]=segment_slots_by_datanode.get(tr.data_node,0)+tr.segment_count-1
+
+def release_segment_slots(tr):
+    if tr.segment_count>1:
+        slots=segment_slots_by_datanode.get(tr.data_node,0)-(tr.segment_count-1)
+
+        if slots>0:
+            segment_slots_by_datanode[tr.data_node]=slots
+        else:
+            segment_slots_by_datanode.pop(tr.data_node,None)
+
+        tr.segment_count=1
+
+def wakeup(reasons):
+    """Process scheduler wake-up reasons (event scheduler mode)."""
+    if sdwakeup.WAKEUP_ENQUEUE in reasons or sdwakeup.WAKEUP_EXTERNAL in reasons:
+        reset_transfers_exhausted()
+
+def reset_transfers_exhausted():
+    global transfers_exhausted
+
+    transfers_exhausted=False
 
 def prepare_transfer(tr):
 
@@ -77,6 +254,7 @@ def prepare_transfer(tr):
     tr.error_msg=None
     tr.status=sdconst.TRANSFER_STATUS_RUNNING
     tr.start_date=sdtime.now()
+    tr.segment_count=1
 
 def pre_transfer_check_list(tr):
     """
@@ -129,46 +307,54 @@ def pre_transfer_check_list(tr):
 
 @sdprofiler.timeit
 def transfers_begin():
+    global transfers_exhausted
+
     transfers=[]
 
     # how many new transfers can be started:
-    new_transfer_count=max_transfer - sdfilequery.transfer_running_count()
-    # datanode_count[datanode], is number of running transfers for a data node:
-    datanode_count = sdfilequery.transfer_running_count_by_datanode()
+    new_transfer_count=max_transfer - transfer_running_count()
+
+    if scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+        # in this mode, we don't touch the database if no slot is free or if
+        # we already know that there is no waiting transfer left
+        if new_transfer_count<=0 or transfers_exhausted:
+            return
+
     if new_transfer_count>0:
-        transfers_needed = new_transfer_count
-        for i in range(new_transfer_count):
-            for datanode in datanode_count.keys():
-                try:
-                    # Handle per-datanode maximum number of transfers:
-                    try:
-                        new_count = max_datanode_count - datanode_count[datanode]
-                    except KeyError:
-                        sdlog.info("SYNDTASK-189","key error on datanode %s, legal keys are %s"%
-                                   (datanode,datanode_count.keys()) )
-                        new_count = max_datanode_count
-                    if new_count<=0:
-                        continue
-
-                    tr=sddao.get_one_waiting_transfer( datanode )
-
-                    prepare_transfer(tr)
-
-                    if pre_transfer_check_list(tr):
-                        sdfiledao.update_file(tr)
-                        transfers.append(tr)
-
-                    if datanode in datanode_count:
-                        datanode_count[datanode] += 1
-                    else:
-                        datanode_count[datanode] = 1
-                    transfers_needed -= 1
-                    if transfers_needed <= 0:
-                        break
-                except NoTransferWaitingException, e:
-                    pass
-            if transfers_needed <= 0:
-                break
+
+        # invalidate in-memory waiting transfers and max priority cache if needed (e.g. new files enqueued by 'synda install')
+        sdtransferqueue.refresh()
+        if sdconst.GET_FILES_CACHING:
+            sdfiledao.refresh_highest_waiting_priority()
+
+        # datanode_count[datanode], is number of running transfers for a data node:
+        datanode_count = transfer_running_count_by_datanode()
+
+        # Handle per-datanode maximum number of transfers:
+        free_slots={}
+        for datanode in sdtransferqueue.get_datanodes():
+            free_slots[datanode] = get_max_datanode_count(datanode) - datanode_count.get(datanode,0)
+
+        candidates=sdtransferqueue.pop_transfers(new_transfer_count,free_slots)
+
+        for tr in candidates:
+            prepare_transfer(tr)
+
+            if pre_transfer_check_list(tr):
+                tr.segment_count=get_segment_count(tr,free_slots)
+                take_segment_slots(tr)
+
+                sdfiledao.update_file(tr,commit=False)
+                transfers.append(tr)
+
+                if scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+                    increment_running_count(tr.data_node)
+
+        sddb.conn.commit() # all status changes are committed together
+
+        if len(candidates)<new_transfer_count:
+            # not enough waiting transfers to fill all slots (wait for a transfer to end, for a new enqueue or for an external modification before trying again)
+            transfers_exhausted=True
 
     dmngr.transfers_begin(transfers)
 
@@ -184,6 +370,9 @@ def get_download_manager():
     else:
         assert False
 
+def cancel_transfers():
+    dmngr.cancel_transfers()
+
 def can_leave():
     return dmngr.can_leave()
 
@@ -194,6 +383,24 @@ def fatal_exception():
 
 max_transfer=sdconfig.config.getint('download','max_parallel_download')
 max_datanode_count = sdconfig.config.getint('download','max_parallel_download_per_datanode')
+adaptive_concurrency=sdconfig.config.getboolean('download','adaptive_concurrency')
 lfae_mode=sdconfig.config.get('behaviour','lfae_mode')
+scheduler_mode=sdconfig.config.get('daemon','scheduler_mode')
+segmentation_threshold=sdconfig.config.getint('download','segmentation_threshold')
+max_segment_per_file=sdconfig.config.getint('download','max_segment_per_file')
+
+# segmented transfers are only implemented in the native HTTP client
+segmentation_enabled=(segmentation_threshold>0 and max_segment_per_file>1 and sdconfig.http_client==sdconst.HTTP_CLIENT_NATIVE and not sdconfig.config.getboolean('module','globustransfer'))
+
+running_count_by_datanode={} # in-memory running transfers counters (only used in 'event' scheduler mode)
+segment_slots_by_datanode={} # extra slots used by running segmented transfers (i.e. one slot per segment, minus the one counted as a running transfer)
+transfers_exhausted=False    # true when the last 'transfers_begin' call didn't find enough waiting transfers (only used in 'event' scheduler mode)
 
 dmngr=get_download_manager()
+
+event_batch_min_size=50
+event_batch_max_size=5000
+event_batch_size=200              # current events batch size (adapted at each delivery)
+event_delivery_max_duration=5     # max time spent sending events in one scheduler iteration (seconds)
+
+last_checkpoint=time.time()       # last WAL checkpoint (see checkpoint_database())
@@ -21,6 +21,9 @@ import time
 import sdapp
 import sdconfig
 import sdwatchdog
+import sdget_native
+import sdlauncher
+import sdnexturl
 import sddao
 import sdfiledao
 import sdconst
@@ -31,6 +34,9 @@ import sdtask
 import sdprofiler
 import sdfilequery
 import sdsqlutils
+import sdwakeup
+import sdcounter
+import sddb
 from sdexception import FatalException,SDException,OpenIDNotSetException
 from sdtime import SDTimer
 
@@ -48,23 +54,17 @@ def terminate(signal,frame):
         return
 
     sdwatchdog.quit=1
+    sdget_native.quit=1 # abort in-process transfers
+    sdlauncher.quit=1 # transfers not started yet are marked for retry
+    sdnexturl.quit=1
     quit=1
 
 
-    # kill all childs (i.e. abort running transfer(s) if any)
+    # abort running transfer(s) if any (each transfer kills its own process group, so no need to walk child processes)
 
-    sdlog.info("SDTSCHED-005","Cleanup child processes")
+    sdlog.info("SDTSCHED-005","Cancel running transfers")
 
-    import psutil
-    parent = psutil.Process(os.getpid())
-
-    # see TAG54353543DFDSFD for info regarding this block.
-    if hasattr(parent, 'get_children'):
-        for child in parent.get_children(True):
-            resilient_terminate(child)
-    else:
-        for child in parent.children(True):
-            resilient_terminate(child)
+    sdtask.cancel_transfers()
 
 
     sdlog.info("SDTSCHED-006","Waiting for the daemon to stop..")
@@ -77,6 +77,7 @@ def cleanup_running_transfer():
     Notes:
         - remaining "running" transfers exist if the daemon has been killed or if the server rebooted when the daemon was running)
         - if there are still transfers in running state, we switch them to waiting and remove file chunk
+        - chunks downloaded by the native HTTP client ('<file>.part') are kept, so those transfers are resumed (see 'sdget_native' module)
     """
     transfer_list=sdfiledao.get_files(status=sdconst.TRANSFER_STATUS_RUNNING)
 
@@ -98,19 +99,6 @@ def clear_failed_url_file(filename):
     # SQL line "delete from failed_url where col like %/filename"
     sdsqlutils.truncate_part_of_table("failed_url", "url", "%%/%s"%filename )
 
-def resilient_terminate(child):
-    """This func terminate the child and inhibits NoSuchProcess exception if any."""
-
-    import psutil
-
-    if child.is_running():
-        try:
-            child.terminate()
-        except psutil.NoSuchProcess as e:
-            # this may occurs because of race condition. See TAGGFJDGKDF for more info.
-
-            pass
-
 def start_watchdog():
     """Starting download processes watchdog."""
 
@@ -120,6 +108,14 @@ def start_watchdog():
     frozenCheckerThread.setDaemon(True)
     frozenCheckerThread.start()
 
+def start_replica_refresher():
+    """Starting stored replicas refresher (only used if 'http_fallback' is true)."""
+
+    sdlog.info("SDTSCHED-994","Starting replica refresher..")
+
+    refresherThread=sdnexturl.ReplicaRefresherThread()
+    refresherThread.start()
+
 def cleanup():
     # this func is only used in 'nohup' execution mode
 
@@ -149,9 +145,30 @@ def run_soft_tasks():
     if sdconfig.config.getboolean('module','post_processing'):
         sdtask.process_async_event()
 
+    sdtask.checkpoint_database()
+
 @sdprofiler.timeit
 def can_leave():
-    return sdfilequery.transfer_running_count()==0 and sdtask.can_leave()
+    return sdtask.transfer_running_count()==0 and sdtask.can_leave()
+
+def wait_for_event():
+    """Sleep until something happens (event scheduler mode).
+
+    Note
+        When the timeout expires, we check if the database has been modified
+        by another process (e.g. files enqueued by 'synda install'). This check
+        doesn't read any table.
+    """
+    global data_version
+
+    reasons=sdwakeup.wait(main_loop_sleep)
+
+    version=sddb.get_data_version()
+    if version!=data_version:
+        data_version=version
+        reasons.add(sdwakeup.WAKEUP_EXTERNAL)
+
+    sdtask.wakeup(reasons)
 
 def event_loop():
     global scheduler_state
@@ -160,10 +177,14 @@ def event_loop():
 
     scheduler_state=2
     start_watchdog()
+    if sdconfig.next_url_on_error:
+        start_replica_refresher()
     cleanup_running_transfer()
     clear_failed_url()
     if sdconst.GET_FILES_CACHING:
         sdfiledao.highest_waiting_priority( True, True ) #initializes cache of max priorities
+    if sdtask.scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+        sdtask.load_running_count()
     scheduler_state=1
 
     if sdconfig.download:
@@ -200,14 +221,30 @@ def event_loop():
 
     sdlog.info("SDTSCHED-902","Transfer daemon is now up and running",stderr=True)
 
+    main_loop()
+
+def main_loop():
+    global data_version
+
+    if sdtask.scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+        sdlog.info("SDTSCHED-910","Scheduler running in 'event' mode")
+        data_version=sddb.get_data_version()
+
     while True:
         evlp0 = SDTimer.get_time()
         assert os.path.isfile(sdconfig.daemon_pid_file)
 
-        if quit==0:
-            run_soft_tasks()
+        if sdtask.scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+            # in this mode, end of transfers are processed first, so freed slots are refilled in the same iteration
+            run_hard_tasks()
+
+            if quit==0:
+                run_soft_tasks()
+        else:
+            if quit==0:
+                run_soft_tasks()
 
-        run_hard_tasks()
+            run_hard_tasks()
 
         if sdtask.fatal_exception():
             sdlog.error("SDTSCHED-002","Fatal exception occured during download",stderr=True)
@@ -219,7 +256,10 @@ def event_loop():
                 sdlog.info("SDTSCHED-003","Running transfer processing completed",stderr=False)
                 break
 
-        time.sleep(main_loop_sleep)
+        if sdtask.scheduler_mode==sdconst.SCHEDULER_MODE_EVENT:
+            wait_for_event()
+        else:
+            time.sleep(main_loop_sleep)
 
         #sdlog.debug("SDTSCHED-400","end of event loop")
         evlp1 = SDTimer.get_elapsed_time( evlp0, show_microseconds=True )
@@ -228,6 +268,12 @@ def event_loop():
     print
     evlp1 = SDTimer.get_elapsed_time( evlp0, show_microseconds=True )
     sdlog.info("SDTSCHED-401","%s time for once through event loop"%(evlp1))
+
+    hit_rate=sdfiledao.get_highest_waiting_priority_hit_rate()
+    if hit_rate is not None:
+        sdlog.info("SDTSCHED-402","Max priority cache hit rate: %.3f"%hit_rate)
+    sdcounter.log_counters()
+
     sdlog.info("SDTSCHED-901","Scheduler successfully stopped",stderr=True)
 
 # module init.
@@ -236,7 +282,9 @@ quit=0 # 0 => start, 1 => stop
 scheduler_state=0 # 0 => stopped, 1 => running, 2 => starting
 # jfp Previously wwe had main_loop_sleep=9.  1 gives much better throughput if there are many
 # parallel downloads.  0 might cause a lot of spinning in low-volume use...
+# In 'event' scheduler mode, this is the maximum time the main loop sleeps without any event.
 main_loop_sleep=1
+data_version=None # last known database data version (only used in 'event' scheduler mode)
 sdlog.set_default_logger(sdconst.LOGGER_CONSUMER)
 
 if sdconfig.prevent_daemon_and_ihm:
@@ -377,6 +377,8 @@ def metric(args):
         sdmetric.print_size(args.groupby,args.project,dry_run=args.dry_run)
     elif args.metric=='rate':
         sdmetric.print_rate(args.groupby,args.project,dry_run=args.dry_run)
+    elif args.metric=='concurrency':
+        sdmetric.print_concurrency(dry_run=args.dry_run)
 
 def remove(args):
     import sdremove,syndautils
@@ -534,7 +536,7 @@ def param(args):
     sdparam.print_(args)
 
 def pexec(args):
-    import sdsearch, sdpporder, sddb, syndautils, sdconst, sdpostpipelineutils, sdhistorydao, sddeferredbefore, sddomainutils
+    import sdsearch, sdpporder, sdeventdao, sddb, syndautils, sdconst, sdpostpipelineutils, sdhistorydao, sddeferredbefore, sddomainutils
 
     if args.order_name=='cdf':
         selection_filename=None
@@ -597,6 +599,7 @@ def pexec(args):
                             for e_name in e_names:
                                     sdpporder.submit(e_name,d['project'],d['model'],d['local_path'],commit=False)
 
+        sdeventdao.flush_events()
         sddb.conn.commit()
 
         if dataset_found_count>0:
@@ -645,6 +648,7 @@ def pexec(args):
                                 order_variable_count += 1
                                 sdpporder.submit(sdconst.EVENT_CDS_VARIABLE, d['project'], d['model'], d['local_path'], variable=v, commit=False)
 
+        sdeventdao.flush_events()
         sddb.conn.commit()
 
         if dataset_found_count > 0:
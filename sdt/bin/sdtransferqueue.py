@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the in-memory waiting transfers queue (used by the transfer scheduler).
+
+Notes
+    - There is one heap per data node. Heap items are (-priority,checksum,file_id)
+      tuples, so transfers are popped in the same order as
+      "ORDER BY priority DESC, checksum".
+    - Heaps only contain keys. Files are retrieved in bulk from the 'file' table
+      when popped, and entries which are not 'waiting' anymore are skipped (so a
+      stale entry never starts a transfer).
+    - Heaps are loaded lazily, 'window_size' entries at a time. When a heap is
+      empty and the data node may still have waiting files, the next window is
+      loaded.
+    - The queue is kept coherent with in-process modifications using push() and
+      invalidate(). Modifications made by other processes (e.g. 'synda install',
+      'synda retry') are detected using the database data version (see refresh()).
+    - The queue is only loaded in the daemon. In other processes, push() and
+      invalidate() do nothing.
+"""
+
+import heapq
+import argparse
+import sdapp
+import sddb
+import sdconst
+import sdsqlutils
+import sddatasetdao
+import sdcounter
+import sdlog
+from sdtypes import File
+
+def refresh(conn=sddb.conn):
+    """Invalidate the queue if another process has modified the database.
+
+    Note
+        must be called outside a transaction (see sddb.get_data_version())
+    """
+    global _data_version
+
+    version=sddb.get_data_version()
+    if version!=_data_version:
+        if _data_version is not None:
+            sdlog.debug("SDTRQUEU-001","Database modified by another process: waiting transfers queue invalidated")
+        invalidate()
+        _data_version=version
+
+def invalidate(data_node=None):
+    """Drop cached entries (all data nodes if 'data_node' is None).
+
+    Note
+        must be called each time the priority, the status or the data node of
+        waiting transfers are modified in bulk (e.g. 'priority' and 'retry' actions)
+    """
+    global _datanodes_loaded
+
+    if data_node is None:
+        _heaps.clear()
+        _complete.clear()
+        _floors.clear()
+        _datanodes_loaded=False
+    else:
+        if data_node in _heaps:
+            _reset_datanode(data_node)
+
+    sdcounter.incr('transfer_queue.invalidate')
+
+def push(file_id,data_node,priority,checksum):
+    """Add a waiting transfer in the queue (must be called each time a file switches to 'waiting' status)."""
+
+    if not _datanodes_loaded:
+        # nothing to do as everything will be loaded from the database on first use
+        return
+
+    if data_node not in _heaps:
+        _reset_datanode(data_node) # will be loaded on next pop
+        return
+
+    key=_get_key(priority,checksum,file_id)
+
+    if _complete[data_node] or key<_floors[data_node]:
+        heapq.heappush(_heaps[data_node],key)
+    else:
+        # beyond the loaded window: will be retrieved with the next window
+        pass
+
+def get_datanodes(conn=sddb.conn):
+    """Returns data nodes which may have waiting transfers."""
+    _load_datanodes(conn)
+
+    return [dn for dn in _heaps if len(_heaps[dn])>0 or not _complete[dn]]
+
+def pop_transfers(count,free_slots,conn=sddb.conn):
+    """Pop up to 'count' waiting transfers, with no more than free_slots[data_node] transfers per data node.
+
+    Notes
+        - Data nodes are served in turn (data node with the highest priority transfer first).
+        - Returned files are still 'waiting' in the database (caller is in charge of the status change).
+        - 'free_slots' is modified.
+
+    Returns
+        File list (with 'dataset' attribute set)
+    """
+    transfers=[]
+    popped_ids=set() # popped transfers are still 'waiting' in the database, so they must be excluded if a window is loaded
+
+    while len(transfers)<count:
+        popped=[] # (data_node,file_id) list
+
+        active=[dn for dn in get_datanodes(conn) if free_slots.get(dn,0)>0]
+        while len(transfers)+len(popped)<count and len(active)>0:
+            for dn in sorted(active,key=lambda dn: _head(dn,popped_ids,conn)):
+                if len(transfers)+len(popped)>=count:
+                    break
+
+                file_id=_pop(dn,popped_ids,conn)
+                if file_id is None:
+                    active.remove(dn)
+                    continue
+
+                popped.append((dn,file_id))
+                popped_ids.add(file_id)
+
+                free_slots[dn]-=1
+                if free_slots[dn]<=0:
+                    active.remove(dn)
+
+        if len(popped)==0:
+            break
+
+        files=_get_waiting_files([file_id for (dn,file_id) in popped],conn)
+
+        for (dn,file_id) in popped:
+            f=files.pop(file_id,None)
+            if f is None:
+                # stale entry (transfer not waiting anymore, or duplicate entry)
+
+                free_slots[dn]+=1
+                sdcounter.incr('transfer_queue.stale')
+            else:
+                transfers.append(f)
+
+    _set_datasets(transfers,conn)
+
+    return transfers
+
+def _get_key(priority,checksum,file_id):
+    return (-priority,checksum,file_id)
+
+def _reset_datanode(data_node):
+    _heaps[data_node]=[]
+    _complete[data_node]=False
+    _floors[data_node]=None
+
+def _load_datanodes(conn):
+    global _datanodes_loaded
+
+    if _datanodes_loaded:
+        return
+
+    c=conn.cursor()
+    c.execute(datanodes_query,(sdconst.TRANSFER_STATUS_WAITING,))
+    for rs in c.fetchall():
+        _reset_datanode(rs[0])
+    c.close()
+
+    _datanodes_loaded=True
+
+def _load_window(data_node,excluded_ids,conn):
+    """Load the next window of waiting transfers for one data node (heap must be empty)."""
+
+    c=conn.cursor()
+    c.execute(window_query,(sdconst.TRANSFER_STATUS_WAITING,data_node,window_size+len(excluded_ids)))
+    rows=c.fetchall()
+    c.close()
+
+    keys=[_get_key(rs[1],rs[2],rs[0]) for rs in rows if rs[0] not in excluded_ids]
+
+    # rows are sorted, so the list is already a heap
+    _heaps[data_node]=keys
+    _complete[data_node]=(len(rows)<window_size+len(excluded_ids))
+    _floors[data_node]=keys[-1] if len(keys)>0 else None
+
+    sdcounter.incr('transfer_queue.load')
+
+def _head(data_node,excluded_ids,conn):
+    """Returns the first key of the data node heap (loads the next window if needed)."""
+    heap=_heaps[data_node]
+
+    if len(heap)==0 and not _complete[data_node]:
+        _load_window(data_node,excluded_ids,conn)
+        heap=_heaps[data_node]
+
+    if len(heap)==0:
+        return None
+    else:
+        return heap[0]
+
+def _pop(data_node,excluded_ids,conn):
+    if _head(data_node,excluded_ids,conn) is None:
+        return None
+
+    return heapq.heappop(_heaps[data_node])[2]
+
+def _get_waiting_files(file_ids,conn):
+    """Returns dict (file_id => File) of files which are still waiting."""
+    files={}
+
+    c=conn.cursor()
+    for i in range(0,len(file_ids),chunk_size):
+        chunk=file_ids[i:i+chunk_size]
+        q=waiting_files_query%','.join(['?']*len(chunk))
+        c.execute(q,[sdconst.TRANSFER_STATUS_WAITING]+chunk)
+        for rs in c.fetchall():
+            f=sdsqlutils.get_object_from_resultset(rs,File)
+            files[f.file_id]=f
+    c.close()
+
+    return files
+
+def _set_datasets(files,conn):
+    """Set 'dataset' attribute (one query per dataset)."""
+    datasets={}
+
+    for f in files:
+        if f.dataset_id not in datasets:
+            datasets[f.dataset_id]=sddatasetdao.get_dataset(dataset_id=f.dataset_id,conn=conn)
+
+        f.dataset=datasets[f.dataset_id]
+
+# init.
+
+window_size=1000 # number of waiting transfers loaded per data node
+chunk_size=500   # must stay below sqlite host parameters limit (999)
+
+_heaps={}    # data_node => heap of (-priority,checksum,file_id)
+_complete={} # data_node => True if all waiting transfers of the data node are in the heap
+_floors={}   # data_node => last key of the loaded window (None if window is empty)
+_datanodes_loaded=False
+_data_version=None
+
+# queries (also checked by 'sdqueryplan' module)
+datanodes_query="select data_node from file where status=? group by data_node"
+window_query="select file_id,priority,checksum from file where status=? and data_node=? order by priority desc, checksum, file_id limit ?"
+waiting_files_query="select * from file where status=? and file_id in (%s)"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c','--count',type=int,default=10)
+    args = parser.parse_args()
+
+    datanodes=get_datanodes()
+    for f in pop_transfers(args.count,dict((dn,args.count) for dn in datanodes)):
+        print "%s %s %s"%(f.priority,f.data_node,f.file_functional_id)
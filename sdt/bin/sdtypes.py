@@ -366,6 +366,34 @@ class CommonIO(object):
     def disconnect(self):
         self.store.disconnect()
 
+    # declarative filters (pushed down to SQL when the store supports it, see 'sdmts' module)
+
+    def keep_equal(self,key,value):
+        self.set_store(self.store.filter_equal(key,value,True))
+
+    def remove_equal(self,key,value):
+        self.set_store(self.store.filter_equal(key,value,False))
+
+    def keep_in(self,keys,values):
+        self.set_store(self.store.filter_in(keys,values,True))
+
+    def remove_in(self,keys,values):
+        self.set_store(self.store.filter_in(keys,values,False))
+
+    def distinct(self,keys):
+        self.set_store(self.store.distinct(keys))
+
+    def project(self,keys):
+        """Returns a new Metadata object containing only 'keys' attributes (no copy of the original data)."""
+        store=self.store.project(keys)
+        return Metadata(store=store,size=store.get_total_size())
+
+    def set_store(self,store):
+        if store is not self.store:
+            self.store.delete()
+            self.store=store
+        self.size=self.store.get_total_size()
+
 def compute_total_size(files):
     if len(files)>0:
         total_size=0
@@ -81,12 +81,18 @@ def get_status(args, **kwargs):
         - handle exit status conversion and raise exception if child didn't complete normally
         - subprocess stdxxx bind to parent sdtxxx
         - subprocess stdxxx are displayed in realtime on terminal
+        - 'on_start' kwarg (if set) is called with the Popen object once the child is started
     """
 
+    on_start=kwargs.pop('on_start',None)
+
     kwargs['universal_newlines']=False
 
     p = subprocess.Popen(args, **kwargs)
 
+    if on_start is not None:
+        on_start(p)
+
     p.wait()
 
     return p.returncode
@@ -103,14 +109,20 @@ def get_status_output(args, **kwargs):
         - also note that there is a 'getstatusoutput' func in subprocess
           maybe better to use it directly
           (more info https://docs.python.org/3.3/library/subprocess.html#legacy-shell-invocation-functions)
+        - 'on_start' kwarg (if set) is called with the Popen object once the child is started
     """
 
+    on_start=kwargs.pop('on_start',None)
+
     kwargs['stdout']=subprocess.PIPE
     kwargs['stderr']=subprocess.PIPE
     kwargs['universal_newlines']=False
 
     p = subprocess.Popen(args, **kwargs)
 
+    if on_start is not None:
+        on_start(p)
+
     stdout, stderr = p.communicate()
 
     return p.returncode, stdout, stderr
@@ -162,18 +174,22 @@ def compute_checksum(file_fullpath,checksum_type=sdconst.CHECKSUM_TYPE_MD5,block
 
     with open(file_fullpath, mode='rb') as f:
 
-        d=None
-        if checksum_type==sdconst.CHECKSUM_TYPE_MD5:
-            d = hashlib.md5()
-        elif checksum_type==sdconst.CHECKSUM_TYPE_SHA256:
-            d = hashlib.sha256()
-        else:
-            assert False
+        d=get_checksum_object(checksum_type)
 
         for buf in iter(partial(f.read, blocksize), b''):
             d.update(buf)
     return d.hexdigest()
 
+def get_checksum_object(checksum_type):
+    """Returns hash object for the given checksum type (used to compute checksum incrementally)."""
+
+    if checksum_type==sdconst.CHECKSUM_TYPE_MD5:
+        return hashlib.md5()
+    elif checksum_type==sdconst.CHECKSUM_TYPE_SHA256:
+        return hashlib.sha256()
+    else:
+        raise SDException("SYDUTILS-423","incorrect checksum_type (%s)"%checksum_type)
+
 def cast(value,dest_type_):
     """Cast value to the given destination type.
     
@@ -18,6 +18,7 @@ import sdconst
 import sdlog
 from sdtypes import Variable
 import sdvariablequery
+import sdcompletion
 
 def build_variable_functional_id(dataset_functional_id,v):
     """Note that this is NOT an ESGF official identifier.
@@ -41,27 +42,15 @@ def build_variable_functional_id(dataset_functional_id,v):
 
 def exists_one_complete_variable(d):
     """Return true if the dataset contains at least one variable with all transfer done, else False."""
-
-    vars_files_count=sdvariablequery.get_variables_files_count(d)
-    vars_files_count_by_status=sdvariablequery.get_variables_files_count_by_status(d.dataset_id)
-
-    for k in vars_files_count_by_status.keys(): # k => varname
-
-        done_count=vars_files_count_by_status[k][sdconst.TRANSFER_STATUS_DONE]
-
-        if vars_files_count[k]==done_count: # is the number of done files same as the number of all files, for this variable ? (if true, means that all variable files are done)
-            return True
-
-    return False
+    return sdcompletion.exists_one_complete_variable(d.dataset_id)
 
 def is_variable_complete(dataset_id,variable):
-    di=sdvariablequery.get_variables_files_count_by_status(dataset_id,variable)
-
-    if variable in di:
+    counters=sdcompletion.get_variable_counters(dataset_id,variable)
+    total=counters['total']
 
-        total=sum(count for count in di[variable].values())
+    if total>0:
 
-        if total==di[variable][sdconst.TRANSFER_STATUS_DONE]:
+        if total==counters[sdconst.TRANSFER_STATUS_DONE]:
             # all done (total nbr of files same as nbr of done files)
             return True
         else:
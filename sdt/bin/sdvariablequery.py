@@ -66,9 +66,9 @@ def get_variables_files_count_by_status(dataset_id,variable=None):
     c = sddb.conn.cursor()
 
     if variable is None:
-        c.execute("select variable,status,count(*) from file where dataset_id=? group by variable,status",(dataset_id,))
+        c.execute(variables_files_count_by_status_query,(dataset_id,))
     else:
-        c.execute("select variable,status,count(*) from file where dataset_id=? and variable=? group by variable,status",(dataset_id,variable))
+        c.execute(variable_files_count_by_status_query,(dataset_id,variable))
 
     """
     The query returns something like:
@@ -110,7 +110,7 @@ def get_variables_files_count(d):
 
 
     c = sddb.conn.cursor()
-    c.execute("select variable,count(*) from file where dataset_id=? group by variable",(d.dataset_id,))
+    c.execute(variables_files_count_query,(d.dataset_id,))
 
 
     """
@@ -132,6 +132,13 @@ def get_variables_files_count(d):
 
     return variables
 
+# init.
+
+# queries (also checked by 'sdqueryplan' module)
+variables_files_count_by_status_query="select variable,status,count(*) from file where dataset_id=? group by variable,status"
+variable_files_count_by_status_query="select variable,status,count(*) from file where dataset_id=? and variable=? group by variable,status"
+variables_files_count_query="select variable,count(*) from file where dataset_id=? group by variable"
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     args = parser.parse_args()
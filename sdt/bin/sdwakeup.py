@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the scheduler wake-up mecanism.
+
+Notes
+    - This module is used when the scheduler runs in 'event' mode (see
+      'scheduler_mode' parameter). In this mode, the scheduler main loop
+      doesn't wake up every second anymore, but sleeps until something
+      happens (transfer completion, new enqueued files..) or until the
+      timeout expires.
+    - notify() can be called from any thread.
+"""
+
+import threading
+
+def notify(reason):
+    """Wake up the scheduler main loop."""
+    with _cond:
+        _reasons.add(reason)
+        _cond.notify_all()
+
+def wait(timeout):
+    """Block until notify() is called or until timeout expires.
+
+    Returns
+        Set of reasons received since the previous call (empty set means timeout)
+    """
+    with _cond:
+        if len(_reasons)==0:
+            _cond.wait(timeout)
+
+        reasons=set(_reasons)
+        _reasons.clear()
+
+    return reasons
+
+def is_pending():
+    with _cond:
+        return len(_reasons)>0
+
+# init.
+
+WAKEUP_EOT='eot'           # a transfer thread has pushed an item in the 'eot_queue'
+WAKEUP_ENQUEUE='enqueue'   # new files have been added in the 'file' table by this process
+WAKEUP_EXTERNAL='external' # the database has been modified by another process (e.g. 'synda install')
+
+_cond=threading.Condition()
+_reasons=set()
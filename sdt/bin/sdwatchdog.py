@@ -9,16 +9,35 @@
 # @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
  
-"""This module detect frozen wget."""
+"""This module detects stalled and slow transfers.
+
+Notes
+    - Each running transfer is registered with register(), which returns a
+      TransferWatch object (registry is keyed by file_id).
+    - Progress is reported by the download engine: in-process clients (see
+      'sdget_native' module) count bytes written, and for child processes
+      (i.e. 'sdget.sh'), the local file size is used.
+    - A transfer is killed if no data has been received for
+      'watchdog_stall_timeout' seconds, or if its throughput over the last
+      'watchdog_window' seconds is lower than 'watchdog_min_throughput'.
+    - For child processes, the process group of the process spawned for the
+      transfer is killed (so wget is killed with 'sdget.sh'). For in-process
+      transfers, abort callbacks registered by the client are called (e.g. to
+      unblock a socket read).
+    - Kill reason is kept in the TransferWatch object (caller stores it in
+      'file.error_msg'), and killed transfers are counted.
+"""
 
 import os
-import psutil # http://code.google.com/p/psutil/wiki/Documentation
-import threading
 import time
+import signal
 import argparse
-import re
+import threading
+import collections
 import sdapp
+import sdconfig
 import sdlog
+import sdcounter
 
 class FrozenDownloadCheckerThread(threading.Thread):
     def __init__(self):
@@ -27,99 +46,171 @@ class FrozenDownloadCheckerThread(threading.Thread):
     def run(self):
         watch()
 
-def watch():
-    previous_processes={}
+class TransferWatch():
+    def __init__(self,file_id,local_path):
+        self.file_id=file_id
+        self.local_path=local_path
+        self.process=None         # process spawned for the transfer (if any)
+        self.abort_callbacks=[]   # funcs called when the transfer is killed (in-process clients)
+        self.bytes_written=None   # set by in-process clients (else, local file size is used)
+        self.kill_reason=None
+        self.start_time=time.time()
+        self.last_progress_time=self.start_time
+        self.last_bytes=0
+        self.samples=collections.deque() # (time,bytes) list, covering the last 'window' seconds
+        self.lock=threading.Lock()
+
+    def set_process(self,process):
+        """Set the process to kill (it must be started in its own process group)."""
+        self.process=process
+
+        if self.kill_reason is not None:
+            self.terminate_process() # killed before the process started
+
+    def add_abort_callback(self,callback):
+        with self.lock:
+            self.abort_callbacks.append(callback)
+
+        if self.kill_reason is not None:
+            callback() # killed before the callback was added
+
+    def remove_abort_callback(self,callback):
+        with self.lock:
+            self.abort_callbacks.remove(callback)
+
+    def add_bytes(self,count):
+        with self.lock:
+            self.bytes_written=(self.bytes_written or 0)+count
+
+    def get_bytes_written(self):
+        if self.bytes_written is not None:
+            return self.bytes_written
+        elif os.path.isfile(self.local_path):
+            return os.path.getsize(self.local_path)
+        else:
+            return 0
+
+    def is_killed(self):
+        return self.kill_reason is not None
+
+    def kill(self,reason):
+        self.kill_reason=reason
+
+        if self.process is not None:
+            self.terminate_process()
+
+        with self.lock:
+            callbacks=list(self.abort_callbacks)
+        for callback in callbacks:
+            callback()
+
+    def terminate_process(self):
+        try:
+            os.killpg(self.process.pid,signal.SIGTERM)
+        except OSError,e:
+            pass # process already ended
+
+def register(file_id,local_path):
+    """Start watching a transfer.
+
+    Returns
+        TransferWatch object
+    """
+    w=TransferWatch(file_id,local_path)
+
+    with _lock:
+        _watches[file_id]=w
+
+    return w
+
+def unregister(w):
+    with _lock:
+        if _watches.get(w.file_id) is w:
+            del _watches[w.file_id]
+
+def get_watches():
+    with _lock:
+        return _watches.values()
 
+def watch():
     while True:
-        new_processes={}
 
-        # 10 mn sleep (exit event aware)
-        for i in range(10):
+        # exit event aware sleep
+        for i in range(check_interval):
             if quit==1:
                 break
-            for i in range(6):
-                if quit==1:
-                    break
-                time.sleep(10)
+            time.sleep(1)
 
         # exit event
         if quit==1:
             break
 
-        scan_processes(previous_processes,new_processes)
+        check_transfers(time.time())
 
-        previous_processes=new_processes
+def check_transfers(now):
+    for w in get_watches():
+        if w.is_killed():
+            continue
 
-def scan_processes(previous_processes,new_processes,debug=False):
-    for pid in psutil.pids(): # retrieve wget pids
-        try:
-            p=psutil.Process(pid)
-            if len(p.cmdline())>0:
-                cmd=p.cmdline()[0]
-
-                if cmd=="wget":
-
-                    # second check to be sure not to take other wget process not related to our application
-                    parent=psutil.Process(p.ppid())
-                    if len(parent.cmdline())>1: # check array size not to raise exception in next line if wget is not related to our application
-                        m=re.search("sdget.sh", parent.cmdline()[1])
-                        if(m!=None):
-
-                            # retrieve wget args
-                            local_path=p.cmdline()[2] # this is a huge hack for the checksum/FIFO case !!!! (this class need to know the local file associated with the process, but because of the FIFO, this dest file do not show in "ps fax" output, so we put the dest file in unused " -D domain-list" option (this option is used only in recursive mode, which we do not use))
-                            #local_path=p.cmdline()[4] # to be used without checksum
-                            #url=p.cmdline()[-1] # retrieve url (not used for now)
-
-                            if debug:
-                                if os.path.isfile(local_path):
-                                    print '%i %s'%(os.path.getsize(local_path),local_path)
-                                else:
-                                    print 'File not found: %s'%(local_path,)
-                            else:
-                                if os.path.isfile(local_path):
-                                    check_if_frozen(p,pid,local_path,previous_processes,new_processes)
-                                else:
-                                    sdlog.info("SDWATCHD-274","file not found (%s%s)"%(local_path,pid)) # this can occur if wget already started, but didn't create the output file yet
-
-        except Exception, e:
-            if debug:
-                raise
-            else:
-                # we silently trap exception during normal operation, because
-                # some are raised during normal operation when a process
-                # returned by psutil.pids() finished just before execution of
-                # psutil.Process()
-                pass
-
-def check_if_frozen(p,pid,local_path,previous_processes,new_processes):
-    key="%s%s"%(pid,local_path)
-    fsize=os.path.getsize(local_path)
-
-    if key in previous_processes:
-        previous_size=previous_processes[key]
-
-        # is size the same ? (means wget stalled)
-        if fsize==previous_size:
-            # not good
-
-            sdlog.error("SDWATCHD-275","wget is stalled (%s,%s)"%(local_path,pid))
-            p.terminate()
-        else:
-            # wget works perfectly, no pb
+        reason=get_kill_reason(w,now)
+
+        if reason is not None:
+            (kind,msg)=reason
+
+            sdlog.error("SDWATCHD-275","Transfer killed: %s (file_id=%s,local_path=%s)"%(msg,w.file_id,w.local_path))
+            sdcounter.incr('watchdog.killed.%s'%kind)
+
+            w.kill(msg)
+
+def get_kill_reason(w,now):
+    """Update transfer progress.
+
+    Returns
+        (kind,message) tuple if the transfer must be killed, else None
+    """
+    count=w.get_bytes_written()
 
-            #sdlog.debug("SDWATCHD-276","wget is not stalled (%s,%s)"%(local_path,pid))
+    if count!=w.last_bytes:
+        w.last_bytes=count
+        w.last_progress_time=now
 
-            pass
-    else:
-        # new wget in town
-        new_processes[key]=fsize
+    # keep samples covering the last 'window' seconds
+    w.samples.append((now,count))
+    while len(w.samples)>1 and w.samples[1][0]<=now-window:
+        w.samples.popleft()
+
+    if stall_timeout>0 and now-w.last_progress_time>=stall_timeout:
+        return ('stalled',"no data received for %d seconds"%(now-w.last_progress_time))
+
+    if min_throughput>0 and now-w.start_time>=window:
+        (t0,count0)=w.samples[0]
+        if now>t0:
+            throughput=(count-count0)/(now-t0)
+            if throughput<min_throughput:
+                return ('slow',"throughput too low (%.1f KB/s over the last %d seconds, minimum is %.1f KB/s)"%(throughput/1000,now-t0,min_throughput/1000.0))
+
+    return None
 
 # module init.
 
+check_interval=10 # seconds
+stall_timeout=sdconfig.config.getint('download','watchdog_stall_timeout')   # seconds (0 disables stall detection)
+min_throughput=sdconfig.config.getint('download','watchdog_min_throughput') # bytes per second (0 disables throughput check)
+window=sdconfig.config.getint('download','watchdog_window')                 # seconds
+
 quit=0
 
+_watches={} # file_id => TransferWatch
+_lock=threading.Lock()
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(description='Watch a local file and print what the watchdog would do (dry run)')
+    parser.add_argument('local_path')
     args = parser.parse_args()
 
-    scan_processes(None,None,True)
+    w=TransferWatch(None,args.local_path)
+    while True:
+        time.sleep(check_interval)
+
+        reason=get_kill_reason(w,time.time())
+        print '%i %s'%(w.get_bytes_written(),'' if reason is None else 'would be killed (%s)'%reason[1])
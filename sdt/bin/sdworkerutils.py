@@ -9,29 +9,112 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module contains worker related objects."""
+"""This module contains worker related objects.
+
+Notes
+    - WorkerPool is a fixed-size pool of named threads fed by a bounded
+      submission queue. Each thread owns a slot (WorkerSlot), which holds the
+      state of the item being processed.
+    - Each item gets a CancellationToken, which the service uses to stop the
+      in-flight work (e.g. kill the transfer process, shut down the socket).
+    - Processed items (including cancelled ones) are pushed in the output
+      queue, where they are handled by the main thread (database I/O).
+    - The pool counts items from submission until they are pushed in the
+      output queue (see get_pending_count()).
+"""
 
 import sys
+import time
+import Queue
 import threading
 import sdapp
 import sdtrace
 import sdlog
 import sdconfig
 import sdexception
+import sdwakeup
+
+class CancellationToken():
+    """This class is used to stop an in-flight item from another thread."""
+
+    def __init__(self):
+        self.reason=None
+        self.callbacks=[]
+        self.lock=threading.Lock()
+
+    def cancel(self,reason):
+        with self.lock:
+            if self.reason is not None:
+                return
+            self.reason=reason
+            callbacks=list(self.callbacks)
+
+        for callback in callbacks:
+            callback(reason)
+
+    def is_cancelled(self):
+        return self.reason is not None
+
+    def add_callback(self,callback):
+        """Register a func called with the reason when the item is cancelled (called at once if already cancelled)."""
+        with self.lock:
+            self.callbacks.append(callback)
+            reason=self.reason
+
+        if reason is not None:
+            callback(reason)
+
+    def remove_callback(self,callback):
+        with self.lock:
+            self.callbacks.remove(callback)
+
+class WorkerSlot():
+    def __init__(self,index):
+        self.index=index
+        self.item=None        # item being processed (None if the slot is idle)
+        self.token=None       # CancellationToken of the item being processed
+        self.start_time=None
+        self.processed_count=0
+
+    def is_busy(self):
+        return self.item is not None
 
 class WorkerThread(threading.Thread):
-    """This class is the thread that handle the file transfer."""
+    """This class is the thread that handle the items of one slot of the pool (e.g. file transfers)."""
 
-    def __init__(self,instance,queue,service):
-        threading.Thread.__init__(self)
-        self._queue=queue       # the queue where to push the item once work is done to deferre database I/O
-        self._instance=instance # the item being processed
-        self._service=service   # the service used to process the item
+    def __init__(self,pool,slot):
+        threading.Thread.__init__(self,name='%s-%d'%(pool.name,slot.index))
+        self.setDaemon(True) # if main thread quits, we kill running threads (note though that forked child processes are NOT killed and continue running after that !)
+        self._pool=pool
+        self._slot=slot
 
     def run(self):
+        while True:
+            item=self._pool.next_item()
+            if item is None:
+                break # pool is stopped
+
+            self.process(item)
+
+    def process(self,item):
+        service=self._pool.service
+        slot=self._slot
+
+        slot.token=CancellationToken()
+        slot.start_time=time.time()
+        slot.item=item
+
+        if self._pool.cancel_reason is not None:
+            slot.token.cancel(self._pool.cancel_reason)
+
         try:
-            self._service.run(self._instance) # calls Download.run()
-            self._queue.put(self._instance) # add item in queue to handle database I/O in the main process
+            if slot.token.is_cancelled():
+                service.cancel(item,slot.token.reason) # item was still queued when the pool was cancelled
+            else:
+                service.run(item,slot.token) # calls Download.run()
+
+            item.eot_queued_time=time.time() # used to measure how long the item waits in the queue
+            self._pool.output_queue.put(item) # add item in queue to handle database I/O in the main process
         except sdexception.CertificateRenewalException, e:
             # error occured during certificate renewal
 
@@ -40,11 +123,139 @@ class WorkerThread(threading.Thread):
 
             # no need to log stacktrace here as exception is already logged downstream
 
-            self._service.exception_occurs=True # we always stop daemon in this case, as download can't succeed without a working certificate. TODO: but sometimes, it's just a temporary failure (e.g. DNS failure during openid resolution), so maybe wait for 5 or 6 transfers to fail in a row before stopping the daemon.
+            service.exception_occurs=True # we always stop daemon in this case, as download can't succeed without a working certificate. TODO: but sometimes, it's just a temporary failure (e.g. DNS failure during openid resolution), so maybe wait for 5 or 6 transfers to fail in a row before stopping the daemon.
 
         except Exception, e:
             sdlog.error("SDWUTILS-002","Thread didn't complete successfully")
             sdtrace.log_exception(stderr=True)
 
             if sdconfig.stop_download_if_error_occurs:
-                self._service.exception_occurs=True
+                service.exception_occurs=True
+
+            # the item is given back anyway, so it doesn't stay 'running' in the database
+            service.fail(item,e)
+            item.eot_queued_time=time.time()
+            self._pool.output_queue.put(item)
+        finally:
+            slot.item=None
+            slot.token=None
+            slot.processed_count+=1
+
+            self._pool.item_done()
+
+            sdwakeup.notify(sdwakeup.WAKEUP_EOT) # wake up the scheduler (no matter if the thread succeeded or not)
+
+class WorkerPool():
+    """This class runs items with a fixed number of threads.
+
+    Note
+        'service' must implement run(item,token), cancel(item,reason)
+        (called for items cancelled before they started) and
+        fail(item,exception) (called when run() raises an exception).
+    """
+
+    def __init__(self,name,size,service,output_queue,max_queue_size=None):
+        self.name=name
+        self.service=service
+        self.output_queue=output_queue # the queue where to push the item once work is done to deferre database I/O
+        self.slots=[WorkerSlot(i) for i in range(size)]
+        self.cancel_reason=None
+        self._input_queue=Queue.Queue(max_queue_size if max_queue_size is not None else size)
+        self._threads=[WorkerThread(self,slot) for slot in self.slots]
+        self._accepting=True
+        self._started=False
+        self._pending=0 # submitted items not pushed in the output queue yet
+        self._lock=threading.Lock()
+        self._idle=threading.Condition(self._lock)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started=True
+
+        for th in self._threads:
+            th.start()
+
+    def submit(self,item,timeout=None):
+        """Queue an item (blocks while the submission queue is full).
+
+        Raises
+            Queue.Full if timeout expires
+        """
+        with self._lock:
+            if not self._accepting:
+                raise sdexception.SDException("SDWUTILS-010","Pool is stopped (%s)"%self.name)
+            self._pending+=1
+
+        try:
+            self._input_queue.put(item,True,timeout)
+        except Queue.Full:
+            self.item_done()
+            raise
+
+    def next_item(self):
+        item=self._input_queue.get()
+        self._input_queue.task_done()
+        return item
+
+    def item_done(self):
+        with self._lock:
+            self._pending-=1
+            if self._pending==0:
+                self._idle.notify_all()
+
+    def get_pending_count(self):
+        """Returns the number of items submitted and not pushed in the output queue yet (queued or in-flight)."""
+        with self._lock:
+            return self._pending
+
+    def get_busy_slots(self):
+        return [slot for slot in self.slots if slot.is_busy()]
+
+    def drain(self,timeout=None):
+        """Stop accepting items, and wait until queued and in-flight items are processed.
+
+        Returns
+            True if the pool is idle
+        """
+        with self._lock:
+            self._accepting=False
+
+            end=None if timeout is None else time.time()+timeout
+            while self._pending>0:
+                remaining=None if end is None else end-time.time()
+                if remaining is not None and remaining<=0:
+                    break
+                self._idle.wait(remaining)
+
+            return self._pending==0
+
+    def cancel(self,reason):
+        """Cancel queued and in-flight items.
+
+        Notes
+            - Items submitted after this call are cancelled too (they are
+              given back through the output queue without being run).
+            - This func doesn't take the pool lock, so it can be called from
+              a signal handler.
+        """
+        self.cancel_reason=reason
+
+        for slot in self.slots:
+            token=slot.token
+            if token is not None:
+                token.cancel(reason)
+
+    def stop(self):
+        """Stop the threads once the submission queue is empty (must be called after drain() or cancel())."""
+        self._accepting=False
+
+        if self._started:
+            for th in self._threads:
+                self._input_queue.put(None)
+
+    def join(self):
+        for th in self._threads:
+            if th.isAlive():
+                th.join()
@@ -102,6 +102,12 @@ def run():
             sdtools.print_stderr(sdi18n.m0028)
             sys.exit(1)
 
+    # -- read-only subcommands -- #
+
+    if args.subcommand in sdconst.READ_ONLY_SUBCOMMANDS:
+        import syndautils
+        syndautils.set_read_only(args.subcommand) # so long listings never hold the database write lock
+
     # -- subcommand routing -- #
 
     if args.subcommand=='help':
@@ -27,6 +27,20 @@ def check_daemon():
             print 'The daemon must be stopped before installing/removing dataset'
             sys.exit(3)
 
+def set_read_only(subcommand):
+    """Switch the database connection to read-only (used by read-only subcommands).
+
+    Note
+        search-API parameters are loaded first, as they are stored in the
+        database when the 'param' table is empty (e.g. fresh install).
+    """
+    import sddb
+
+    if subcommand in sdconst.READ_ONLY_SUBCOMMANDS_USING_PARAMETERS:
+        import sdparam
+
+    sddb.set_read_only()
+
 def get_stream(subcommand=None,parameter=None,selection_file=None,no_default=True,raise_exception_if_empty=False):
     """
     TODO: merge me with sdstreamutils.get_stream
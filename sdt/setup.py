@@ -11,7 +11,7 @@ setup(
             'data': ['data_package/data.tar.gz'],
         },
         url='https://github.com/Prodiguer/synda',
-        version='3.10',
+        version='3.12',
         description='ESGF Data transfer Program',
         long_description='This program download files from the Earth System Grid Federation (ESGF) '
                        'archive using command line.',
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains test helpers.
+
+Notes
+    - This module must be imported BEFORE any Synda module: it adds 'sdt/bin'
+      to the python path and redirects the database to a scratch folder
+      (the user database is never used). The database connection is opened
+      when 'sddb' module is imported, and DAO modules bind it at import time,
+      so all tests of one run share the same scratch database.
+    - Tests must call reset_database() in setUp().
+"""
+
+import os
+import re
+import sys
+import time
+import atexit
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import SocketServer
+import BaseHTTPServer
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','bin'))
+
+import sdconfig
+import sdconst
+
+class DataNodeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serve 'server.files' with range requests support.
+
+    Notes
+        - '/redirect/<n>/<path>' is redirected n times before '<path>' is served.
+        - '/forbidden/<path>' returns 403.
+    """
+
+    protocol_version='HTTP/1.1' # keep-alive
+
+    def do_GET(self):
+        server=self.server
+        server.requests.append((self.path,self.headers.get('Range')))
+
+        m=re.match(r'^/redirect/(\d+)(/.*)$',self.path)
+        if m is not None:
+            n=int(m.group(1))
+            location=m.group(2) if n<=1 else '/redirect/%i%s'%(n-1,m.group(2))
+            self.send_empty_response(302,{'Location':location})
+            return
+
+        if self.path.startswith('/forbidden/'):
+            self.send_empty_response(403)
+            return
+
+        if self.path not in server.files:
+            self.send_empty_response(404)
+            return
+
+        data=server.files[self.path]
+        start,end=0,len(data)-1
+        status=200
+
+        m=re.match(r'^bytes=(\d+)-(\d*)$',self.headers.get('Range',''))
+        if m is not None and server.accept_ranges and self.headers.get('If-Range',server.etag)==server.etag:
+            start=int(m.group(1))
+            if m.group(2)!='':
+                end=min(int(m.group(2)),end)
+            if start>end:
+                self.send_empty_response(416,{'Content-Range':'bytes */%i'%len(data)})
+                return
+            status=206
+
+        body=data[start:end+1]
+
+        self.send_response(status)
+        self.send_header('Content-Length',str(len(body)))
+        self.send_header('ETag',server.etag)
+        if server.accept_ranges:
+            self.send_header('Accept-Ranges','bytes')
+        if status==206:
+            self.send_header('Content-Range','bytes %i-%i/%i'%(start,end,len(data)))
+        self.end_headers()
+
+        if server.truncate_count>0 and len(body)>server.truncate_size:
+            # connection closed before the end of the body
+            server.truncate_count-=1
+            self.wfile.write(body[:server.truncate_size])
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection=1
+        else:
+            self.wfile.write(body)
+
+    def send_empty_response(self,status,headers=None):
+        self.send_response(status)
+        for k,v in (headers or {}).iteritems():
+            self.send_header(k,v)
+        self.send_header('Content-Length','0')
+        self.end_headers()
+
+    def log_message(self,*args):
+        pass
+
+class DataNodeServer(SocketServer.ThreadingMixIn,BaseHTTPServer.HTTPServer):
+    """Local HTTP data node (started in a background thread)."""
+
+    daemon_threads=True
+
+    def __init__(self,files):
+        BaseHTTPServer.HTTPServer.__init__(self,('127.0.0.1',0),DataNodeRequestHandler)
+        self.files=files        # path => data
+        self.etag='"v1"'
+        self.accept_ranges=True
+        self.truncate_count=0   # number of responses to truncate
+        self.truncate_size=0    # bytes sent before the connection is closed
+        self.requests=[]        # (path,range header) list
+
+        self.thread=threading.Thread(target=self.serve_forever,kwargs={'poll_interval':0.05})
+        self.thread.daemon=True
+        self.thread.start()
+
+    def get_url(self,path):
+        return 'http://127.0.0.1:%i%s'%(self.server_port,path)
+
+    def handle_error(self,request,client_address):
+        pass # e.g. connection closed by the client
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def use_scratch_folder():
+    folder=tempfile.mkdtemp(prefix='sdt_tests_')
+    atexit.register(shutil.rmtree,folder,True)
+
+    sdconfig.default_db_folder=folder # 'caches.db' location
+    sdconfig.db_folder=folder
+    sdconfig.db_file="%s/sdt.db"%folder
+    sdconfig.daemon_pid_file="%s/daemon.pid"%folder
+    sdconfig.ihm_pid_file="%s/ihm.pid"%folder
+
+    return folder
+
+def add_parameters():
+    """Insert a minimal parameter list (so Synda modules don't retrieve parameters from ESGF at import time)."""
+    import sddb
+
+    c=sddb.conn.cursor()
+    c.execute("select count(1) from param")
+    if c.fetchone()[0]==0:
+        for name,value in (('project','CMIP6'),('model','IPSL-CM6A-LR'),('variable','tas'),('data_node','esgf-node0.example.org')):
+            c.execute("insert into param (name,value) values (?,?)",(name,value))
+        sddb.conn.commit()
+    c.close()
+
+def reset_database():
+    """Remove all files, datasets and events."""
+    import sddb
+
+    for table in ('file','dataset','event','file_replica','failed_url','dataset_counter','variable_counter'):
+        sddb.conn.execute("delete from %s"%table)
+    sddb.conn.commit()
+
+def get_other_connection():
+    """Returns a new connection to the scratch database (used to simulate another process)."""
+    return sqlite3.connect(sdconfig.db_file)
+
+def add_dataset(path,status=sdconst.DATASET_STATUS_EMPTY,latest=0,conn=None):
+    """Returns dataset_id."""
+    import sddb
+
+    conn=sddb.conn if conn is None else conn
+    now=time.strftime("%Y-%m-%d %H:%M:%S")
+    c=conn.cursor()
+    c.execute("insert into dataset (dataset_functional_id,status,crea_date,path,path_without_version,version,local_path,latest,model,project,timestamp) values (?,?,?,?,?,?,?,?,?,?,?)",
+              (path.replace('/','.'),status,now,path,os.path.dirname(path),os.path.basename(path),path,latest,'IPSL-CM6A-LR','CMIP6',now))
+    dataset_id=c.lastrowid
+    c.close()
+    conn.commit()
+
+    return dataset_id
+
+def add_file(dataset_id,filename,data_node='esgf-node0.example.org',status=sdconst.TRANSFER_STATUS_WAITING,priority=sdconst.DEFAULT_PRIORITY,checksum=None,variable='tas',conn=None):
+    """Returns file_id."""
+    import sddb
+
+    conn=sddb.conn if conn is None else conn
+    now=time.strftime("%Y-%m-%d %H:%M:%S")
+    local_path='%i/%s'%(dataset_id,filename)
+    c=conn.cursor()
+    c.execute("insert into file (url,file_functional_id,filename,local_path,data_node,checksum,size,crea_date,status,priority,model,project,variable,dataset_id,insertion_group_id,timestamp) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+              ('http://%s/thredds/fileServer/%s'%(data_node,local_path),local_path.replace('/','.'),filename,local_path,data_node,checksum,1000,now,status,priority,'IPSL-CM6A-LR','CMIP6',variable,dataset_id,1,now))
+    file_id=c.lastrowid
+    c.close()
+    conn.commit()
+
+    return file_id
+
+def get_transfer(file_id):
+    """Returns File object."""
+    import sddb
+    import sdsqlutils
+    from sdtypes import File
+
+    c=sddb.conn.cursor()
+    c.execute("select * from file where file_id=?",(file_id,))
+    tr=sdsqlutils.get_object_from_resultset(c.fetchone(),File)
+    c.close()
+
+    return tr
+
+def get_file_status(file_id):
+    import sddb
+
+    c=sddb.conn.cursor()
+    c.execute("select status from file where file_id=?",(file_id,))
+    rs=c.fetchone()
+    c.close()
+
+    return rs[0] if rs is not None else None
+
+# init.
+
+scratch_folder=use_scratch_folder()
+
+import sdapp
+add_parameters()
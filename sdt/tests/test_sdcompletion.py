@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests dataset and variable completion counters (maintained by triggers)."""
+
+import unittest
+import sdtestutils
+import sddb
+import sdconst
+import sdcompletion
+
+class CompletionCountersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+
+        self.dataset_id=sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+        self.other_dataset_id=sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r2i1p1f1/Amon/tas/gr/v20180803')
+
+        self.file_ids=[sdtestutils.add_file(self.dataset_id,'tas_%i.nc'%i) for i in range(3)]
+        self.file_ids+=[sdtestutils.add_file(self.dataset_id,'pr_%i.nc'%i,variable='pr') for i in range(2)]
+
+    def set_status(self,file_id,status):
+        sddb.conn.execute("update file set status=? where file_id=?",(status,file_id))
+        sddb.conn.commit()
+
+    def test_counters(self):
+        self.set_status(self.file_ids[0],sdconst.TRANSFER_STATUS_DONE)
+        self.set_status(self.file_ids[1],sdconst.TRANSFER_STATUS_ERROR)
+
+        counters=sdcompletion.get_dataset_counters(self.dataset_id)
+        self.assertEqual((counters['total'],counters['done'],counters['error'],counters['waiting']),(5,1,1,3))
+
+        counters=sdcompletion.get_variable_counters(self.dataset_id,'tas')
+        self.assertEqual((counters['total'],counters['done']),(3,1))
+
+        self.assertEqual(sdcompletion.get_dataset_counters(self.other_dataset_id)['total'],0)
+        self.assertEqual(sdcompletion.check(),[])
+
+    def test_complete_variable(self):
+        self.assertFalse(sdcompletion.exists_one_complete_variable(self.dataset_id))
+
+        for file_id in self.file_ids[3:]:
+            self.set_status(file_id,sdconst.TRANSFER_STATUS_DONE)
+
+        self.assertTrue(sdcompletion.exists_one_complete_variable(self.dataset_id))
+
+    def test_modifications(self):
+        # status, variable and dataset changes, and deletions
+        sddb.conn.execute("update file set variable='pr' where file_id=?",(self.file_ids[0],))
+        sddb.conn.execute("update file set dataset_id=?, status=? where file_id=?",(self.other_dataset_id,sdconst.TRANSFER_STATUS_DONE,self.file_ids[1]))
+        sddb.conn.execute("update file set variable=null where file_id=?",(self.file_ids[2],))
+        sddb.conn.execute("delete from file where file_id=?",(self.file_ids[3],))
+        sddb.conn.commit()
+
+        self.assertEqual(sdcompletion.check(),[])
+        self.assertEqual(sdcompletion.get_dataset_counters(self.dataset_id)['total'],3)
+        self.assertEqual(sdcompletion.get_variable_counters(self.dataset_id,'pr')['total'],2)
+        self.assertEqual(sdcompletion.get_variable_counters(self.dataset_id,None)['total'],1)
+        self.assertEqual(sdcompletion.get_dataset_counters(self.other_dataset_id)['done'],1)
+
+    def test_rebuild(self):
+        sddb.conn.execute("update dataset_counter set done=done+1")
+        sddb.conn.commit()
+
+        drifts=sdcompletion.check()
+        self.assertEqual([(table,key) for (table,key,stored,expected) in drifts],[('dataset_counter',(self.dataset_id,))])
+
+        sdcompletion.rebuild()
+        self.assertEqual(sdcompletion.check(),[])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests the adaptive per-data-node concurrency controller (AIMD)."""
+
+import unittest
+import sdtestutils
+import sdconst
+import sdcounter
+import sdconcurrency
+from sdtypes import File
+
+class ConcurrencyTestCase(unittest.TestCase):
+
+    data_node='esgf-node0.example.org'
+
+    def setUp(self):
+        self.settings=(sdconcurrency.max_window,sdconcurrency.initial_window)
+        sdconcurrency.max_window=20
+        sdconcurrency.initial_window=2
+        self.reset_data_node()
+        sdcounter.reset()
+
+        self.now=1000.0
+
+    def tearDown(self):
+        (sdconcurrency.max_window,sdconcurrency.initial_window)=self.settings
+        self.reset_data_node()
+
+    def reset_data_node(self):
+        sdconcurrency._states.pop(self.data_node,None)
+        for d in (sdconcurrency._windows,sdconcurrency._throughputs):
+            if self.data_node in d:
+                del d[self.data_node]
+
+    def end_transfer(self,status=sdconst.TRANSFER_STATUS_DONE,size=0,sdget_status=0,duration=1):
+        tr=File(data_node=self.data_node,status=status,size=size,sdget_status=sdget_status,duration=duration)
+        sdconcurrency.transfer_done(tr,self.now)
+
+    def run_round(self,capacity):
+        """Simulate one round on a data node which transfers 1 MB/s per connection, up to 'capacity' connections."""
+        window=sdconcurrency.get_window(self.data_node)
+        throughput=min(window,capacity)*1000000
+
+        self.now+=1
+        for i in range(window):
+            self.end_transfer(size=throughput/window)
+
+    def test_window_follows_capacity(self):
+        for i in range(20):
+            self.run_round(capacity=6)
+
+        # window grows while throughput improves, then stays close to the data node capacity (periodic probes are reverted)
+        for i in range(40):
+            self.run_round(capacity=6)
+            self.assertTrue(6<=sdconcurrency.get_window(self.data_node)<=7)
+
+        # capacity grows
+        for i in range(40):
+            self.run_round(capacity=10)
+        self.assertTrue(10<=sdconcurrency.get_window(self.data_node)<=11)
+
+    def test_decrease(self):
+        for i in range(10):
+            self.run_round(capacity=20)
+        window=sdconcurrency.get_window(self.data_node)
+
+        # several congestion errors in the same round: window is divided by two once
+        self.end_transfer(status=sdconst.TRANSFER_STATUS_ERROR,sdget_status=25)
+        self.end_transfer(status=sdconst.TRANSFER_STATUS_ERROR,sdget_status=23)
+
+        self.assertEqual(sdconcurrency.get_window(self.data_node),window/2)
+        self.assertEqual(sdcounter.get('concurrency.congestion_error'),2)
+        self.assertEqual(sdcounter.get('concurrency.decrease'),1)
+
+    def test_bounds(self):
+        for i in range(10):
+            self.end_transfer(status=sdconst.TRANSFER_STATUS_ERROR,sdget_status=25)
+            self.run_round(capacity=20)
+        self.assertEqual(sdconcurrency.get_window(self.data_node),sdconcurrency.min_window)
+
+        for i in range(100):
+            self.run_round(capacity=100)
+        self.assertEqual(sdconcurrency.get_window(self.data_node),sdconcurrency.max_window)
+
+    def test_other_errors(self):
+        # errors which are not caused by data node load (e.g. 403) don't decrease the window
+        self.end_transfer(status=sdconst.TRANSFER_STATUS_ERROR,sdget_status=22)
+
+        self.assertEqual(sdconcurrency.get_window(self.data_node),2)
+        self.assertFalse(sdconcurrency.is_congestion_error(File(status=sdconst.TRANSFER_STATUS_DONE,sdget_status=25)))
+        self.assertFalse(sdconcurrency.is_congestion_error(File(status=sdconst.TRANSFER_STATUS_ERROR,sdget_status=None)))
+
+    def test_learned_window(self):
+        for i in range(10):
+            self.run_round(capacity=6)
+        window=sdconcurrency.get_window(self.data_node)
+
+        # restart
+        sdconcurrency._states.clear()
+
+        self.assertEqual(sdconcurrency.get_window(self.data_node),window)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests set-based dataset flags recomputation."""
+
+import unittest
+import sdtestutils
+import sddb
+import sdconst
+import sddatasetquery
+import sddatasetflag
+import sdcompletion
+
+PATH='CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr'
+
+class DatasetFlagsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+
+    def add_version(self,version,variables,done=True,latest=0):
+        """Add a dataset version with one file per variable."""
+        dataset_id=sdtestutils.add_dataset('%s/%s'%(PATH,version),latest=latest)
+        status=sdconst.TRANSFER_STATUS_DONE if done else sdconst.TRANSFER_STATUS_WAITING
+        for variable in variables:
+            sdtestutils.add_file(dataset_id,'%s.nc'%variable,status=status,variable=variable)
+        return dataset_id
+
+    def get_flags(self):
+        c=sddb.conn.cursor()
+        c.execute("select dataset_id,status,latest from dataset")
+        flags=dict((rs[0],(rs[1],rs[2])) for rs in c.fetchall())
+        c.close()
+        return flags
+
+    def test_computed_status(self):
+        complete_id=sdtestutils.add_dataset('%s/v1'%PATH)
+        sdtestutils.add_file(complete_id,'tas.nc',status=sdconst.TRANSFER_STATUS_DONE)
+
+        in_progress_id=sdtestutils.add_dataset('%s/v2'%PATH)
+        sdtestutils.add_file(in_progress_id,'tas.nc',status=sdconst.TRANSFER_STATUS_DONE)
+        sdtestutils.add_file(in_progress_id,'pr.nc',variable='pr')
+
+        # one file done, but no complete variable
+        empty_id=sdtestutils.add_dataset('%s/v3'%PATH)
+        sdtestutils.add_file(empty_id,'tas_0.nc',status=sdconst.TRANSFER_STATUS_DONE)
+        sdtestutils.add_file(empty_id,'tas_1.nc')
+
+        no_file_id=sdtestutils.add_dataset('%s/v4'%PATH)
+
+        datasets=dict((d.dataset_id,d) for d in sddatasetquery.get_datasets_with_computed_status())
+
+        self.assertEqual(datasets[complete_id].computed_status,sdconst.DATASET_STATUS_COMPLETE)
+        self.assertEqual(datasets[in_progress_id].computed_status,sdconst.DATASET_STATUS_IN_PROGRESS)
+        self.assertEqual(datasets[empty_id].computed_status,sdconst.DATASET_STATUS_EMPTY)
+        self.assertEqual(datasets[no_file_id].computed_status,sdconst.DATASET_STATUS_EMPTY)
+        self.assertEqual((datasets[in_progress_id].variable_count,datasets[no_file_id].variable_count),(2,0))
+
+        # same rules as the per-dataset computation
+        for d in datasets.values():
+            self.assertEqual(d.computed_status,sddatasetflag.compute_dataset_status(d))
+
+    def test_most_recent_complete_version_is_latest(self):
+        # inserted out of order, so the result must not depend on dataset_id
+        v2_id=self.add_version('v2',['tas'])
+        v1_id=self.add_version('v1',['tas'])
+        v3_id=self.add_version('v3',['tas'],done=False)
+
+        modified=sddatasetflag.recompute_datasets_flags(reset=True)
+
+        flags=self.get_flags()
+        self.assertEqual(flags[v1_id],(sdconst.DATASET_STATUS_COMPLETE,0))
+        self.assertEqual(flags[v2_id],(sdconst.DATASET_STATUS_COMPLETE,1))
+        self.assertEqual(flags[v3_id],(sdconst.DATASET_STATUS_EMPTY,0))
+
+        d=dict((d.dataset_id,d) for d in modified)[v2_id]
+        self.assertEqual((d.old_status,d.old_latest,d.latest),(sdconst.DATASET_STATUS_EMPTY,False,True))
+        self.assertTrue(d.latest_date is not None)
+
+        # nothing left to do
+        self.assertEqual(sddatasetflag.recompute_datasets_flags(),[])
+
+    def test_latest_is_not_downgraded(self):
+        v1_id=self.add_version('v1',['tas'])
+        v2_id=self.add_version('v2',['tas'],latest=1)
+
+        sddatasetflag.recompute_datasets_flags()
+
+        # v2 is not complete, but keeps the flag as no newer version is complete
+        flags=self.get_flags()
+        self.assertEqual(flags[v1_id][1],0)
+        self.assertEqual(flags[v2_id][1],1)
+
+    def test_quality_check(self):
+        v1_id=self.add_version('v1',['tas','pr','psl','ts'])
+        v2_id=self.add_version('v2',['tas'])
+
+        sddatasetflag.recompute_datasets_flags(reset=True)
+
+        # variable number drops, so v2 is not promoted
+        flags=self.get_flags()
+        self.assertEqual(flags[v1_id][1],1)
+        self.assertEqual(flags[v2_id][1],0)
+
+    def test_reset_rebuilds_counters(self):
+        dataset_id=self.add_version('v1',['tas'])
+
+        # counters drift (e.g. database restored from a backup)
+        sddb.conn.execute("update dataset_counter set done=0")
+        sddb.conn.execute("update variable_counter set done=0")
+        sddb.conn.commit()
+
+        # dry run doesn't fix the counters
+        modified=sddatasetflag.recompute_datasets_flags(reset=True,dry_run=True)
+        self.assertEqual([d.status for d in modified],[sdconst.DATASET_STATUS_COMPLETE])
+        self.assertEqual(len(sdcompletion.check()),2)
+
+        sddatasetflag.recompute_datasets_flags(reset=True)
+
+        self.assertEqual(self.get_flags()[dataset_id],(sdconst.DATASET_STATUS_COMPLETE,1))
+        self.assertEqual(sdcompletion.check(),[])
+
+    def test_dry_run(self):
+        self.add_version('v1',['tas'])
+        self.add_version('v2',['tas'])
+
+        flags=self.get_flags()
+        modified=sddatasetflag.recompute_datasets_flags(reset=True,dry_run=True)
+
+        self.assertEqual(len(modified),2)
+        self.assertEqual(self.get_flags(),flags)
+
+    def test_same_result_as_per_dataset_computation(self):
+        self.add_version('v1',['tas','pr'])
+        self.add_version('v3',['tas'],done=False)
+        self.add_version('v2',['tas','pr'])
+        self.add_version('v4',['tas'])
+        other_id=sdtestutils.add_dataset('%s/v1'%PATH.replace('r1i1p1f1','r2i1p1f1'))
+        sdtestutils.add_file(other_id,'tas.nc',status=sdconst.TRANSFER_STATUS_DONE)
+        sdtestutils.add_file(other_id,'pr.nc',variable='pr')
+
+        sddatasetflag.recompute_datasets_flags(reset=True,dry_run=False)
+        set_based=self.get_flags()
+
+        sddb.conn.execute("update dataset set status=?, latest=0",(sdconst.DATASET_STATUS_EMPTY,))
+        sddb.conn.commit()
+        for i in range(len(set_based)): # run until no modifications remain
+            sddatasetflag.update_datasets__status_and_latest()
+
+        self.assertEqual(self.get_flags(),set_based)
+
+if __name__ == '__main__':
+    unittest.main()
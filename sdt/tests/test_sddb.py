@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests database connection settings (WAL journal mode, pragmas and read-only connections)."""
+
+import os
+import sqlite3
+import unittest
+import sdtestutils
+import sdconfig
+import sddb
+
+class DatabaseConnectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+
+        self.connections=[]
+
+    def tearDown(self):
+        for conn in self.connections:
+            conn.close()
+
+    def open_connection(self,read_only=False):
+        conn=sddb.open_connection(1,read_only=read_only)
+        self.connections.append(conn)
+        return conn
+
+    def get_pragma(self,conn,name):
+        c=conn.cursor()
+        c.execute("pragma %s"%name)
+        value=c.fetchone()[0]
+        c.close()
+        return value
+
+    def count_datasets(self,conn):
+        c=conn.cursor()
+        c.execute("select count(1) from dataset")
+        count=c.fetchone()[0]
+        c.close()
+        return count
+
+    def test_pragmas(self):
+        self.assertEqual(sddb.get_journal_mode(sddb.conn),sdconfig.db_journal_mode)
+
+        conn=self.open_connection()
+        self.assertEqual(self.get_pragma(conn,'cache_size'),sdconfig.db_cache_size)
+        self.assertEqual(self.get_pragma(conn,'mmap_size'),sdconfig.db_mmap_size)
+
+    def test_read_only_connection(self):
+        conn=self.open_connection(read_only=True)
+
+        self.assertRaises(sqlite3.OperationalError,conn.execute,"delete from dataset")
+
+        # the module connection is not affected
+        sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+        self.assertEqual(self.count_datasets(conn),1)
+
+    def test_set_read_only(self):
+        saved_conn=sddb.conn
+        sddb.conn=self.open_connection()
+        try:
+            sddb.set_read_only()
+            self.assertRaises(sqlite3.OperationalError,sddb.conn.execute,"delete from dataset")
+        finally:
+            sddb.conn=saved_conn
+
+    def test_reader_does_not_block_writer(self):
+        if sdconfig.db_journal_mode!='wal':
+            self.skipTest('WAL journal mode not enabled')
+
+        # reader with an active read transaction
+        reader=self.open_connection(read_only=True)
+        reader.execute("begin")
+        self.assertEqual(self.count_datasets(reader),0)
+
+        sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803') # would time out in 'delete' journal mode
+
+        # the reader still sees its snapshot until the end of its transaction
+        self.assertEqual(self.count_datasets(reader),0)
+        reader.rollback()
+        self.assertEqual(self.count_datasets(reader),1)
+
+    def test_data_version(self):
+        version=sddb.get_data_version()
+
+        # changes done with the module connection don't change the value
+        sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+        self.assertEqual(sddb.get_data_version(),version)
+
+        sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r2i1p1f1/Amon/tas/gr/v20180803',conn=self.open_connection())
+        self.assertNotEqual(sddb.get_data_version(),version)
+
+    def test_checkpoint(self):
+        if sdconfig.db_journal_mode!='wal':
+            self.skipTest('WAL journal mode not enabled')
+
+        sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+
+        self.assertEqual(sddb.checkpoint(),0)
+        self.assertEqual(os.path.getsize('%s-wal'%sdconfig.db_file),0)
+
+if __name__ == '__main__':
+    unittest.main()
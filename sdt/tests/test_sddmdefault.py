@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests batched end-of-transfer processing."""
+
+import time
+import unittest
+import sdtestutils
+import sdconst
+import sddmdefault
+
+class TransfersEndTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+        dataset_id=sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+        self.file_ids=[sdtestutils.add_file(dataset_id,'tas_%i.nc'%i,status=sdconst.TRANSFER_STATUS_RUNNING) for i in range(3)]
+        self.end_of_transfer=sddmdefault.end_of_transfer
+
+    def tearDown(self):
+        sddmdefault.end_of_transfer=self.end_of_transfer
+
+        # empty the queue
+        while sddmdefault.eot_queue.unfinished_tasks>0:
+            sddmdefault.eot_queue.get_nowait()
+            sddmdefault.eot_queue.task_done()
+
+    def queue_transfers(self,status=sdconst.TRANSFER_STATUS_ERROR):
+        for file_id in self.file_ids:
+            tr=sdtestutils.get_transfer(file_id)
+            tr.status=status
+            tr.sdget_status=1
+            tr.eot_queued_time=time.time()
+            sddmdefault.eot_queue.put(tr)
+
+    def test_batch_is_committed(self):
+        self.queue_transfers()
+
+        transfers=sddmdefault.transfers_end()
+
+        self.assertEqual(len(transfers),3)
+        self.assertEqual(sddmdefault.eot_queue.unfinished_tasks,0)
+        for file_id in self.file_ids:
+            self.assertEqual(sdtestutils.get_file_status(file_id),sdconst.TRANSFER_STATUS_ERROR)
+
+    def test_rollback_requeues_all_items(self):
+
+        def failing_end_of_transfer(tr,commit=True):
+            self.end_of_transfer(tr,commit=commit)
+            if tr.file_id==self.file_ids[1]:
+                raise Exception('locked database')
+
+        self.queue_transfers()
+        sddmdefault.end_of_transfer=failing_end_of_transfer
+
+        self.assertRaises(Exception,sddmdefault.transfers_end)
+
+        # nothing committed, all items back in the queue
+        self.assertEqual(sddmdefault.eot_queue.qsize(),3)
+        self.assertEqual(sddmdefault.eot_queue.unfinished_tasks,3)
+        for file_id in self.file_ids:
+            self.assertEqual(sdtestutils.get_file_status(file_id),sdconst.TRANSFER_STATUS_RUNNING)
+
+        # next call processes the requeued items
+        sddmdefault.end_of_transfer=self.end_of_transfer
+        transfers=sddmdefault.transfers_end()
+
+        self.assertEqual(sorted(tr.file_id for tr in transfers),self.file_ids)
+        self.assertEqual(sddmdefault.eot_queue.unfinished_tasks,0)
+        for file_id in self.file_ids:
+            self.assertEqual(sdtestutils.get_file_status(file_id),sdconst.TRANSFER_STATUS_ERROR)
+
+    def test_failed_transfer(self):
+        tr=sdtestutils.get_transfer(self.file_ids[0])
+        sddmdefault.Download.fail(tr,Exception('unexpected error'))
+        tr.eot_queued_time=time.time()
+        sddmdefault.eot_queue.put(tr)
+
+        sddmdefault.transfers_end()
+
+        tr=sdtestutils.get_transfer(self.file_ids[0])
+        self.assertEqual(tr.status,sdconst.TRANSFER_STATUS_ERROR)
+        self.assertEqual(tr.error_msg,'Error occurs during download (unexpected error)')
+
+if __name__ == '__main__':
+    unittest.main()
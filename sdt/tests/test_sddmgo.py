@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests Globus task batching, task polling and access token caching.
+
+Note
+    The Transfer API client is replaced by a stub (no Globus account is used).
+"""
+
+import sys
+import time
+import types
+import unittest
+import sdtestutils
+import sdconst
+
+class APIError(Exception):
+    def __init__(self,status_code,message):
+        Exception.__init__(self,message)
+        self.status_code=status_code
+
+class GoAuth():
+    """Deliver a new token at each call ('lifetime' seconds before expiry)."""
+
+    def __init__(self):
+        self.count=0
+        self.lifetime=3600
+
+    def get_access_token(self,username=None,password=None):
+        self.count+=1
+        return (username,None,'un=%s|tokenid=%i|expiry=%i'%(username,self.count,int(time.time())+self.lifetime))
+
+class TransferAPIClient():
+    """Answer 'task_list' requests from 'statuses' (tokens in 'revoked' are rejected)."""
+
+    instances=[]
+    statuses={}
+    revoked=set()
+
+    def __init__(self,username=None,goauth=None):
+        self.token=goauth
+        self.requests=[]
+        TransferAPIClient.instances.append(self)
+
+    def task_list(self,filter=None,fields=None,limit=None):
+        if self.token in TransferAPIClient.revoked:
+            raise APIError(401,'token has been revoked')
+
+        task_ids=filter.split(':')[1].split(',')
+        self.requests.append(task_ids)
+
+        return (200,'OK',{'DATA':[{'task_id':task_id,'status':TransferAPIClient.statuses[task_id]} for task_id in task_ids if task_id in TransferAPIClient.statuses]})
+
+    def endpoint(self,name):
+        raise APIError(404,'endpoint not found')
+
+def new_api_client():
+    api_client=types.ModuleType('api_client')
+    api_client.APIError=APIError
+    api_client.goauth=GoAuth()
+    api_client.TransferAPIClient=TransferAPIClient
+    return api_client
+
+# the Globus SDK is only needed at import time when not installed
+try:
+    import globusonline.transfer.api_client
+except ImportError:
+    for name in ('globusonline','globusonline.transfer','globusonline.transfer.api_client','globusonline.transfer.api_client.x509_proxy'):
+        sys.modules[name]=types.ModuleType(name)
+    sys.modules['globusonline'].transfer=sys.modules['globusonline.transfer']
+    sys.modules['globusonline.transfer'].api_client=sys.modules['globusonline.transfer.api_client']
+    sys.modules['globusonline.transfer.api_client'].x509_proxy=sys.modules['globusonline.transfer.api_client.x509_proxy']
+
+import sddmgo
+
+class Transfer():
+    def __init__(self,size):
+        self.size=size
+
+class GlobusTestCase(unittest.TestCase):
+    """Replace the Transfer API client and reset the module state."""
+
+    def setUp(self):
+        self.api_client=sddmgo.api_client
+        self.access_token=sddmgo.access_token
+        self.task_list_limit=sddmgo.task_list_limit
+
+        sddmgo.api_client=new_api_client()
+        sddmgo.access_token=sddmgo.AccessToken()
+        sddmgo._api=None
+        sddmgo._api_token=None
+        sddmgo.globus_tasks.clear()
+
+        TransferAPIClient.instances=[]
+        TransferAPIClient.statuses={}
+        TransferAPIClient.revoked=set()
+
+    def tearDown(self):
+        sddmgo.api_client=self.api_client
+        sddmgo.access_token=self.access_token
+        sddmgo.task_list_limit=self.task_list_limit
+        sddmgo._api=None
+        sddmgo._api_token=None
+        sddmgo.globus_tasks.clear()
+
+    def get_requests(self):
+        return [task_ids for api in TransferAPIClient.instances for task_ids in api.requests]
+
+class SplitItemsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.max_files_per_task=sddmgo.max_files_per_task
+        self.max_task_size=sddmgo.max_task_size
+
+    def tearDown(self):
+        sddmgo.max_files_per_task=self.max_files_per_task
+        sddmgo.max_task_size=self.max_task_size
+
+    def split(self,sizes):
+        return [[item['tr'].size for item in batch] for batch in sddmgo.split_items([{'tr':Transfer(size)} for size in sizes])]
+
+    def test_file_limit(self):
+        sddmgo.max_files_per_task=3
+        sddmgo.max_task_size=0
+
+        self.assertEqual(self.split([1000]*7),[[1000]*3,[1000]*3,[1000]])
+        self.assertEqual(self.split([1000]*3),[[1000]*3])
+        self.assertEqual(self.split([]),[])
+
+    def test_size_limit(self):
+        sddmgo.max_files_per_task=100
+        sddmgo.max_task_size=2500
+
+        self.assertEqual(self.split([1000,1000,1000,500,2000]),[[1000,1000],[1000,500],[2000]])
+
+        # a file bigger than the limit is submitted in its own task
+        self.assertEqual(self.split([1000,5000,1000]),[[1000],[5000],[1000]])
+
+        # missing size
+        self.assertEqual(self.split([None,None,2500]),[[None,None,2500]])
+
+    def test_both_limits(self):
+        sddmgo.max_files_per_task=2
+        sddmgo.max_task_size=2500
+
+        self.assertEqual(self.split([100,100,100,2000,1000]),[[100,100],[100,2000],[1000]])
+
+class PollTasksTestCase(GlobusTestCase):
+
+    def add_task(self,task_id,next_poll=0):
+        sddmgo.globus_tasks[task_id]={'src_endpoint':'src#endpoint','items':[],'status':None,'poll_interval':sddmgo.poll_min_interval,'next_poll':next_poll}
+
+    def poll(self,task_id):
+        """Poll 'task_id' now and returns its new poll interval."""
+        sddmgo.globus_tasks[task_id]['next_poll']=0
+        sddmgo.poll_tasks()
+        return sddmgo.globus_tasks[task_id]['poll_interval']
+
+    def test_interval_backoff_and_reset(self):
+        self.add_task('t1')
+
+        TransferAPIClient.statuses['t1']='ACTIVE'
+        self.assertEqual(self.poll('t1'),sddmgo.poll_min_interval) # status changed
+
+        intervals=[self.poll('t1') for i in range(6)]
+        self.assertEqual(intervals,[min(sddmgo.poll_min_interval*2**i,sddmgo.poll_max_interval) for i in range(1,7)])
+        self.assertEqual(intervals[-1],sddmgo.poll_max_interval)
+
+        TransferAPIClient.statuses['t1']='SUCCEEDED'
+        self.assertEqual(self.poll('t1'),sddmgo.poll_min_interval)
+        self.assertEqual(sddmgo.globus_tasks['t1']['status'],'SUCCEEDED')
+
+        task=sddmgo.globus_tasks['t1']
+        self.assertTrue(time.time()<task['next_poll']<=time.time()+task['poll_interval'])
+
+    def test_only_due_tasks_are_polled(self):
+        self.add_task('t1')
+        self.add_task('t2',next_poll=time.time()+60)
+        TransferAPIClient.statuses.update({'t1':'ACTIVE','t2':'ACTIVE'})
+
+        self.assertEqual(sddmgo.poll_tasks(),{'t1':'ACTIVE'})
+        self.assertEqual(sddmgo.poll_tasks(),{}) # 't1' is not due anymore
+        self.assertEqual(self.get_requests(),[['t1']])
+
+    def test_bulk_requests(self):
+        sddmgo.task_list_limit=2
+        for i in range(5):
+            self.add_task('t%i'%i)
+            TransferAPIClient.statuses['t%i'%i]='ACTIVE'
+
+        self.assertEqual(len(sddmgo.poll_tasks()),5)
+        self.assertEqual(sorted(len(task_ids) for task_ids in self.get_requests()),[1,2,2])
+
+    def test_task_not_found(self):
+        self.add_task('t1')
+
+        self.assertEqual(sddmgo.poll_tasks(),{})
+
+        # interval is kept, task is polled again later
+        task=sddmgo.globus_tasks['t1']
+        self.assertEqual((task['status'],task['poll_interval']),(None,sddmgo.poll_min_interval))
+        self.assertTrue(task['next_poll']>time.time())
+
+class AccessTokenTestCase(GlobusTestCase):
+
+    def test_token_is_cached(self):
+        goauth=sddmgo.api_client.goauth
+
+        token=sddmgo.access_token.get()
+        self.assertEqual(sddmgo.access_token.get(),token)
+        self.assertEqual(goauth.count,1)
+
+        # same client as long as the token doesn't change
+        self.assertTrue(sddmgo.get_api() is sddmgo.get_api())
+        self.assertEqual(len(TransferAPIClient.instances),1)
+
+    def test_token_expiry(self):
+        goauth=sddmgo.api_client.goauth
+
+        token=sddmgo.access_token.get()
+        self.assertAlmostEqual(sddmgo.access_token.expiry,time.time()+goauth.lifetime,delta=5)
+
+        # token is renewed when expiry is within the renewal margin
+        sddmgo.access_token.expiry=time.time()+sddmgo.token_renewal_margin-1
+        self.assertNotEqual(sddmgo.access_token.get(),token)
+        self.assertEqual(goauth.count,2)
+
+        # token without expiry field
+        self.assertAlmostEqual(sddmgo.get_token_expiry('un=foo|tokenid=1'),time.time()+sddmgo.token_default_lifetime,delta=5)
+
+    def test_renewal_on_401(self):
+        goauth=sddmgo.api_client.goauth
+        TransferAPIClient.statuses['t1']='ACTIVE'
+
+        token=sddmgo.access_token.get()
+        TransferAPIClient.revoked.add(token)
+
+        (code,reason,data)=sddmgo.api_call('task_list',filter='task_id:t1',fields='task_id,status',limit=1)
+
+        self.assertEqual(data['DATA'],[{'task_id':'t1','status':'ACTIVE'}])
+        self.assertEqual(goauth.count,2)
+        self.assertNotEqual(sddmgo.access_token.get(),token)
+        self.assertEqual([api.token for api in TransferAPIClient.instances],[token,sddmgo.access_token.get()])
+
+    def test_other_errors_are_raised(self):
+        goauth=sddmgo.api_client.goauth
+
+        self.assertRaises(APIError,sddmgo.api_call,'endpoint','src#endpoint')
+        self.assertEqual(goauth.count,1)
+
+class CommitVerifiedTransfersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+        dataset_id=sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+        self.file_ids=[sdtestutils.add_file(dataset_id,'tas_%i.nc'%i,status=sdconst.TRANSFER_STATUS_RUNNING) for i in range(3)]
+        self.end_of_transfer=sddmgo.end_of_transfer
+
+    def tearDown(self):
+        sddmgo.end_of_transfer=self.end_of_transfer
+
+        # empty the queue
+        while sddmgo.verify_queue.unfinished_tasks>0:
+            sddmgo.verify_queue.get_nowait()
+            sddmgo.verify_queue.task_done()
+
+    def queue_transfers(self):
+        for file_id in self.file_ids:
+            tr=sdtestutils.get_transfer(file_id)
+            tr.status=sdconst.TRANSFER_STATUS_ERROR
+            tr.error_msg="Error occurs during download."
+            tr.eot_queued_time=time.time()
+            sddmgo.verify_queue.put(tr)
+
+    def test_rollback_requeues_all_items(self):
+
+        def failing_end_of_transfer(tr,commit=True):
+            self.end_of_transfer(tr,commit=commit)
+            if tr.file_id==self.file_ids[1]:
+                raise Exception('locked database')
+
+        self.queue_transfers()
+        sddmgo.end_of_transfer=failing_end_of_transfer
+
+        self.assertRaises(Exception,sddmgo.commit_verified_transfers)
+
+        # nothing committed, all items back in the queue
+        self.assertEqual(sddmgo.verify_queue.qsize(),3)
+        self.assertEqual(sddmgo.verify_queue.unfinished_tasks,3)
+        for file_id in self.file_ids:
+            self.assertEqual(sdtestutils.get_file_status(file_id),sdconst.TRANSFER_STATUS_RUNNING)
+
+        # next call saves the requeued items
+        sddmgo.end_of_transfer=self.end_of_transfer
+        transfers=sddmgo.commit_verified_transfers()
+
+        self.assertEqual(sorted(tr.file_id for tr in transfers),self.file_ids)
+        self.assertEqual(sddmgo.verify_queue.unfinished_tasks,0)
+        for file_id in self.file_ids:
+            self.assertEqual(sdtestutils.get_file_status(file_id),sdconst.TRANSFER_STATUS_ERROR)
+
+    def test_empty_queue(self):
+        self.assertEqual(sddmgo.commit_verified_transfers(),[])
+
+if __name__ == '__main__':
+    unittest.main()
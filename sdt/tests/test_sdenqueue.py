@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests bulk insertion of enqueued files and datasets."""
+
+import os
+import unittest
+import sdtestutils
+import sddb
+import sdconst
+import sdconfig
+import sdfiledao
+import sdenqueue
+from sdtypes import File,Metadata
+from sdexception import SDException
+
+def new_file_dict(dataset_idx,i,data_node='esgf-node0.example.org',priority=sdconst.DEFAULT_PRIORITY,dataset_local_path=None):
+    """Returns a file as it comes out of the file pipeline."""
+    dataset_path='CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r%ii1p1f1/Amon/tas/gr/v20180803'%dataset_idx
+    filename='tas_%i.nc'%i
+    dataset_functional_id=dataset_path.replace('/','.')
+
+    f={}
+    f['url']='http://%s/thredds/fileServer/%s/%s'%(data_node,dataset_path,filename)
+    f['file_functional_id']='%s.%s'%(dataset_functional_id,filename)
+    f['filename']=filename
+    f['local_path']='%s/%s'%(dataset_path,filename)
+    f['data_node']=data_node
+    f['checksum']='%032x'%i
+    f['checksum_type']=sdconst.CHECKSUM_TYPE_MD5
+    f['tracking_id']='hdl:21.14100/%032x'%i
+    f['size']=1000
+    f['priority']=priority
+    f['variable']='tas'
+    f['project']='CMIP6'
+    f['model']='IPSL-CM6A-LR'
+    f['timestamp']='2018-08-03T00:00:00Z'
+    f['status']=sdconst.TRANSFER_STATUS_NEW
+    f['insertion_group_id']=1
+    f['dataset_functional_id']=dataset_functional_id
+    f['dataset_local_path']=dataset_path if dataset_local_path is None else dataset_local_path
+    f['dataset_path']=dataset_path
+    f['dataset_path_without_version']=os.path.dirname(dataset_path)
+    f['dataset_version']='v20180803'
+    f['dataset_template']=None
+    return f
+
+class EnqueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+        sdenqueue._inserted_priorities.clear()
+
+    def tearDown(self):
+        sddb.conn.rollback()
+
+    def get_rows(self,query):
+        c=sddb.conn.cursor()
+        c.execute(query)
+        rows=[tuple(rs) for rs in c.fetchall()]
+        c.close()
+        return rows
+
+    def get_content(self):
+        files=self.get_rows("select f.file_functional_id,f.status,f.priority,f.data_node,d.dataset_functional_id from file f join dataset d on d.dataset_id=f.dataset_id order by 1")
+        datasets=self.get_rows("select dataset_functional_id,path,path_without_version,local_path,version,status,latest from dataset order by 1")
+        return (files,datasets)
+
+    def test_same_result_as_one_by_one_insertion(self):
+        chunk=[new_file_dict(i/3,i,data_node='esgf-node%i.example.org'%(i%2)) for i in range(7)]
+
+        for f in chunk:
+            sdenqueue.add_file(File(**f))
+        expected=self.get_content()
+
+        sddb.conn.rollback()
+
+        sdenqueue.add_files(chunk)
+        self.assertEqual(self.get_content(),expected)
+
+        (files,datasets)=expected
+        self.assertEqual((len(files),len(datasets)),(7,3))
+        self.assertEqual(set(f[1] for f in files),set([sdconst.TRANSFER_STATUS_WAITING]))
+
+    def test_existing_dataset(self):
+        dataset_path='CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r0i1p1f1/Amon/tas/gr/v20180803'
+        dataset_id=sdtestutils.add_dataset(dataset_path,status=sdconst.DATASET_STATUS_COMPLETE,latest=1)
+
+        sdenqueue.add_files([new_file_dict(0,i) for i in range(2)])
+
+        self.assertEqual(self.get_rows("select dataset_id,status,latest from dataset"),[(dataset_id,sdconst.DATASET_STATUS_IN_PROGRESS,1)])
+        self.assertEqual(self.get_rows("select count(1) from file where dataset_id=%i"%dataset_id),[(2,)])
+
+    def test_local_path_format(self):
+        sdenqueue.add_files([new_file_dict(0,0)])
+
+        self.assertRaises(SDException,sdenqueue.add_files,[new_file_dict(0,1,dataset_local_path='other/format')])
+
+    def test_inserted_priorities(self):
+        sdenqueue.add_files([new_file_dict(0,0,priority=1000),new_file_dict(0,1,priority=3000),new_file_dict(1,2,data_node='esgf-node1.example.org',priority=2000)])
+        sdenqueue.add_files([new_file_dict(2,3,priority=2000)])
+
+        self.assertEqual(sdenqueue._inserted_priorities,{'esgf-node0.example.org':3000,'esgf-node1.example.org':2000})
+
+    def test_priority_cache_is_updated_after_commit(self):
+        f=new_file_dict(0,0,priority=4000)
+        f['attached_parameters']={'selection_filename':sdconst.SELECTION_FROM_CMDLINE,'selection_file':sdconst.SELECTION_FROM_CMDLINE}
+
+        fix_timestamp=sdenqueue.fix_timestamp
+        progress=sdconfig.progress
+        priorities=dict(sdfiledao.highest_waiting_priority.vals)
+
+        def failing_fix_timestamp():
+            raise Exception('locked database')
+
+        sdconfig.progress=False
+        sdenqueue.fix_timestamp=failing_fix_timestamp
+        sdfiledao.highest_waiting_priority.vals.clear() # database has been reset
+        try:
+            self.assertRaises(Exception,sdenqueue.run,Metadata(files=[dict(f)]))
+            sddb.conn.rollback()
+
+            # files were not inserted, so the cache is not modified
+            self.assertEqual(dict(sdfiledao.highest_waiting_priority.vals),{})
+
+            sdenqueue.fix_timestamp=lambda: None # dataset timestamps are retrieved from the search-API
+            self.assertEqual(sdenqueue.run(Metadata(files=[dict(f)])),1)
+
+            self.assertEqual(sdfiledao.highest_waiting_priority('esgf-node0.example.org'),4000)
+        finally:
+            sdenqueue.fix_timestamp=fix_timestamp
+            sdconfig.progress=progress
+            sdfiledao.highest_waiting_priority.vals.clear()
+            sdfiledao.highest_waiting_priority.vals.update(priorities)
+
+if __name__ == '__main__':
+    unittest.main()
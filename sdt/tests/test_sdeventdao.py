@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests batched event emission and delivery to the post-processing module."""
+
+import socket
+import threading
+import unittest
+import pyjsonrpc
+import sdtestutils
+import sddb
+import sdconst
+import sdtime
+import sdeventdao
+import sdppproxy
+import sdtask
+from sdtypes import Event
+
+def new_event(variable='tas',name=sdconst.EVENT_VARIABLE_COMPLETE):
+    return Event(name=name,project='CMIP6',model='IPSL-CM6A-LR',dataset_pattern='CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/*/gr/v20180803',
+                 variable=variable,filename_pattern='%s_*.nc'%variable,crea_date=sdtime.now(),priority=sdconst.DEFAULT_PRIORITY)
+
+def count_events(status=None):
+    c=sddb.conn.cursor()
+    if status is None:
+        c.execute("select count(1) from event")
+    else:
+        c.execute("select count(1) from event where status=?",(status,))
+    count=c.fetchone()[0]
+    c.close()
+    return count
+
+class EventEmissionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+        sdeventdao.discard_events()
+
+    def test_events_are_queued_until_flush(self):
+        sdeventdao.add_event(new_event('tas'),commit=False)
+        sdeventdao.add_event(new_event('pr'),commit=False)
+        self.assertEqual(count_events(),0)
+
+        self.assertEqual(sdeventdao.flush_events(),2)
+        sddb.conn.commit()
+        self.assertEqual(count_events(sdconst.EVENT_STATUS_NEW),2)
+
+        # queue is empty after flush
+        self.assertEqual(sdeventdao.flush_events(),0)
+
+    def test_discard(self):
+        sdeventdao.add_event(new_event(),commit=False)
+        sdeventdao.discard_events()
+
+        sdeventdao.add_event(new_event('pr')) # commit=True flushes the queue
+        self.assertEqual(count_events(),1)
+
+    def test_coalescing(self):
+        # identical events in the same batch
+        self.assertEqual(sdeventdao.add_events([new_event('tas'),new_event('tas'),new_event('pr')]),2)
+
+        # identical events already waiting to be sent
+        self.assertEqual(sdeventdao.add_events([new_event('tas')]),0)
+        self.assertEqual(sdeventdao.add_events([new_event('tas',name=sdconst.EVENT_DATASET_COMPLETE)]),1)
+
+        # identical events already sent are inserted again
+        sddb.conn.execute("update event set status=?",(sdconst.EVENT_STATUS_OLD,))
+        sddb.conn.commit()
+        self.assertEqual(sdeventdao.add_events([new_event('tas')]),1)
+
+        self.assertEqual(count_events(),4)
+
+class PostProcessingRequestHandler(pyjsonrpc.HttpRequestHandler):
+    protocol_version='HTTP/1.1' # keep-alive
+
+    def setup(self):
+        pyjsonrpc.HttpRequestHandler.setup(self)
+        self.server.connections+=1
+
+        self.methods={'event':self.event}
+
+    def do_POST(self):
+        self.server.content_encodings.append(self.headers.get('Content-Encoding'))
+
+        pyjsonrpc.HttpRequestHandler.do_POST(self)
+
+    def event(self,events):
+        self.server.batches.append(events)
+        return {"error_code":0,"received":len(events),"duplicates":0}
+
+    def log_message(self,format,*args):
+        pass
+
+class PostProcessingServer(pyjsonrpc.ThreadingHttpServer):
+    """Local post-processing JSON-RPC server, which keeps received batches in memory."""
+    daemon_threads=True
+
+    def __init__(self):
+        pyjsonrpc.ThreadingHttpServer.__init__(self,('127.0.0.1',0),PostProcessingRequestHandler)
+        self.connections=0
+        self.content_encodings=[]
+        self.batches=[]
+
+        self.thread=threading.Thread(target=self.serve_forever,kwargs={'poll_interval':0.05})
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def handle_error(self,request,client_address):
+        pass
+
+    def get_url(self):
+        return 'http://127.0.0.1:%i/jsonrpc'%self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class EventDeliveryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+
+        self.server=PostProcessingServer()
+
+        self.saved=(sdppproxy.url,sdppproxy.service,sdtask.event_batch_min_size,sdtask.event_batch_size)
+        sdppproxy.url=self.server.get_url()
+        sdppproxy.service=None
+        sdtask.event_batch_min_size=2
+        sdtask.event_batch_size=2
+
+    def tearDown(self):
+        if sdppproxy.service is not None:
+            sdppproxy.service.close()
+        (sdppproxy.url,sdppproxy.service,sdtask.event_batch_min_size,sdtask.event_batch_size)=self.saved
+
+        self.server.stop()
+
+    def test_batches_are_sent_on_one_connection(self):
+        sdeventdao.add_events([new_event('v%i'%i) for i in range(7)])
+
+        sdtask.process_async_event()
+
+        # batch size doubles after each full batch (2, 4, then the remaining event)
+        self.assertEqual([len(batch) for batch in self.server.batches],[2,4,1])
+        self.assertEqual(sdtask.event_batch_size,8)
+
+        self.assertEqual(self.server.connections,1)
+        self.assertEqual(set(self.server.content_encodings),set(['gzip']))
+
+        self.assertEqual(count_events(sdconst.EVENT_STATUS_NEW),0)
+        self.assertEqual(count_events(sdconst.EVENT_STATUS_OLD),7)
+
+        delivery_ids=[e['delivery_id'] for batch in self.server.batches for e in batch]
+        self.assertEqual(len(set(delivery_ids)),7)
+
+    def test_delivery_failure(self):
+        sdeventdao.add_events([new_event('v%i'%i) for i in range(7)])
+        sdtask.event_batch_size=4
+
+        # nothing listens on this port
+        s=socket.socket()
+        s.bind(('127.0.0.1',0))
+        sdppproxy.url='http://127.0.0.1:%i/jsonrpc'%s.getsockname()[1]
+        s.close()
+
+        sdtask.process_async_event()
+
+        # events will be sent again, with smaller batches
+        self.assertEqual(count_events(sdconst.EVENT_STATUS_NEW),7)
+        self.assertEqual(sdtask.event_batch_size,2)
+
+if __name__ == '__main__':
+    unittest.main()
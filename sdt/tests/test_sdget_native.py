@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests the in-process HTTP download client."""
+
+import os
+import hashlib
+import tempfile
+import unittest
+import sdtestutils
+import sdconst
+import sdcounter
+import sdutils
+import sdget
+import sdget_native
+
+class DataNodeTestCase(unittest.TestCase):
+    """Base class (local data node, serving one file)."""
+
+    def setUp(self):
+        self.data=os.urandom(1000000)
+        self.server=sdtestutils.DataNodeServer({'/thredds/fileServer/tas.nc':self.data})
+        self.folder=tempfile.mkdtemp(dir=sdtestutils.scratch_folder)
+        self.local_path=os.path.join(self.folder,'CMIP6','tas.nc')
+
+    def tearDown(self):
+        sdget_native.reset()
+        self.server.stop()
+
+    def download(self,path='/thredds/fileServer/tas.nc',checksum_type=None):
+        return sdget_native.download_file(self.server.get_url(path),self.local_path,timeout=10,checksum_type=checksum_type)
+
+    def get_local_data(self):
+        with open(self.local_path,'rb') as fh:
+            return fh.read()
+
+class DownloadTestCase(DataNodeTestCase):
+
+    def test_download(self):
+        self.assertEqual(self.download(),(0,"",None))
+        self.assertEqual(self.get_local_data(),self.data)
+        self.assertEqual(os.listdir(os.path.dirname(self.local_path)),['tas.nc'])
+
+    def test_checksum(self):
+        for checksum_type,hash_func in ((sdconst.CHECKSUM_TYPE_MD5,hashlib.md5),(sdconst.CHECKSUM_TYPE_SHA256,hashlib.sha256)):
+            (status,error_msg,checksum)=self.download(checksum_type=checksum_type)
+
+            self.assertEqual(checksum,hash_func(self.data).hexdigest())
+            self.assertEqual(checksum,sdutils.compute_checksum(self.local_path,checksum_type))
+
+            os.remove(self.local_path)
+
+        # checksum is not returned if the transfer failed
+        self.assertEqual(self.download('/thredds/fileServer/missing.nc',checksum_type=sdconst.CHECKSUM_TYPE_MD5)[2],None)
+
+    def test_sdget(self):
+        (status,killed,script_stderr,local_checksum)=sdget.download(self.server.get_url('/thredds/fileServer/tas.nc'),self.local_path,http_client=sdconst.HTTP_CLIENT_NATIVE,timeout=10,checksum_type=sdconst.CHECKSUM_TYPE_MD5)
+
+        self.assertEqual((status,killed),(0,False))
+        self.assertEqual(local_checksum,hashlib.md5(self.data).hexdigest())
+
+    def test_redirect(self):
+        self.assertEqual(self.download('/redirect/2/thredds/fileServer/tas.nc')[0],0)
+        self.assertEqual(self.get_local_data(),self.data)
+
+    def test_errors(self):
+        for path,status in (('/redirect/3/thredds/fileServer/tas.nc',12),('/forbidden/tas.nc',22),('/redirect/1/forbidden/tas.nc',20),('/thredds/fileServer/missing.nc',23),('/redirect/1/thredds/fileServer/missing.nc',24)):
+            self.assertEqual(self.download(path)[0],status)
+            self.assertFalse(os.path.exists(self.local_path))
+            self.assertEqual(os.listdir(os.path.dirname(self.local_path)),[])
+
+    def test_connection_error(self):
+        url=self.server.get_url('/thredds/fileServer/tas.nc')
+        self.server.stop()
+
+        self.assertEqual(sdget_native.download_file(url,self.local_path,timeout=10)[0],23)
+
+    def test_local_path(self):
+        self.assertEqual(sdget_native.download_file(self.server.get_url('/thredds/fileServer/tas.nc'),'CMIP6/tas.nc')[0],3)
+
+        self.download()
+        self.assertEqual(self.download()[0],2)
+
+class ResumeTestCase(DataNodeTestCase):
+
+    def setUp(self):
+        DataNodeTestCase.setUp(self)
+        sdcounter.reset()
+
+        # first response is truncated
+        self.server.truncate_count=1
+        self.server.truncate_size=300000
+
+    def get_partial_size(self):
+        return os.path.getsize('%s.part'%self.local_path)
+
+    def test_resume(self):
+        self.assertEqual(self.download(checksum_type=sdconst.CHECKSUM_TYPE_MD5)[0],1)
+        self.assertFalse(os.path.exists(self.local_path))
+        self.assertEqual(self.get_partial_size(),300000)
+
+        (status,error_msg,checksum)=self.download(checksum_type=sdconst.CHECKSUM_TYPE_MD5)
+
+        self.assertEqual(status,0)
+        self.assertEqual(self.get_local_data(),self.data)
+        self.assertEqual(checksum,hashlib.md5(self.data).hexdigest()) # bytes written by the first attempt are included
+        self.assertEqual(self.server.requests[-1][1],'bytes=300000-')
+        self.assertEqual(sdcounter.get('download.resumed_bytes'),300000)
+        self.assertEqual(os.listdir(os.path.dirname(self.local_path)),['tas.nc'])
+
+    def test_remote_file_changed(self):
+        self.download()
+
+        self.server.etag='"v2"'
+        self.server.files['/thredds/fileServer/tas.nc']=self.data=os.urandom(500000)
+
+        # whole file is returned (If-Range doesn't match)
+        self.assertEqual(self.download()[0],0)
+        self.assertEqual(self.get_local_data(),self.data)
+        self.assertEqual(sdcounter.get('download.resume_fallback'),1)
+
+    def test_partial_file_too_big(self):
+        self.download()
+
+        self.server.files['/thredds/fileServer/tas.nc']=self.data=os.urandom(100000)
+
+        # range not satisfiable: transfer starts from scratch
+        self.assertEqual(self.download()[0],0)
+        self.assertEqual(self.get_local_data(),self.data)
+
+    def test_range_not_supported(self):
+        self.server.accept_ranges=False
+
+        self.download()
+        self.assertEqual(os.listdir(os.path.dirname(self.local_path)),[]) # partial file is removed
+
+        self.assertEqual(self.download()[0],0)
+        self.assertEqual(self.get_local_data(),self.data)
+
+    def test_other_url(self):
+        self.download()
+
+        # partial file downloaded from another url is not resumed
+        self.server.files['/thredds/fileServer/replica/tas.nc']=self.data
+        self.assertEqual(self.download('/thredds/fileServer/replica/tas.nc')[0],0)
+        self.assertEqual(self.server.requests[-1][1],None)
+        self.assertEqual(self.get_local_data(),self.data)
+
+class RangeTestCase(unittest.TestCase):
+
+    def test_get_range_start(self):
+        self.assertEqual(sdget_native.get_range_start('bytes 100-199/200'),100)
+        self.assertEqual(sdget_native.get_range_start('bytes 0-0/*'),0)
+
+        for content_range in ('','bytes */200','items 100-199/200'):
+            self.assertRaises(sdget_native.ResumeException,sdget_native.get_range_start,content_range)
+
+if __name__ == '__main__':
+    unittest.main()
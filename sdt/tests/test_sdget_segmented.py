@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests downloads with parallel HTTP range segments."""
+
+import os
+import tempfile
+import unittest
+import sdtestutils
+import sdcounter
+import sdget_native
+import sdget_segmented
+
+class SplitTestCase(unittest.TestCase):
+
+    def test_split(self):
+        for size,segment_count in ((100,4),(101,4),(3,4),(1,1),(1000001,7)):
+            segments=sdget_segmented.split(size,segment_count)
+
+            # segments are contiguous and cover the whole file
+            self.assertEqual(segments[0].start,0)
+            self.assertEqual(segments[-1].end,size-1)
+            for previous,seg in zip(segments,segments[1:]):
+                self.assertEqual(seg.start,previous.end+1)
+
+            self.assertTrue(len(segments)<=segment_count)
+            self.assertEqual(sum(seg.get_size() for seg in segments),size)
+
+class SegmentedDownloadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.min_segment_size=sdget_segmented.min_segment_size
+        sdget_segmented.min_segment_size=100000
+        sdcounter.reset()
+
+        self.data=os.urandom(1000000)
+        self.server=sdtestutils.DataNodeServer({'/thredds/fileServer/tas.nc':self.data})
+        self.folder=tempfile.mkdtemp(dir=sdtestutils.scratch_folder)
+        self.local_path=os.path.join(self.folder,'CMIP6','tas.nc')
+
+    def tearDown(self):
+        sdget_segmented.min_segment_size=self.min_segment_size
+        sdget_native.reset()
+        self.server.stop()
+
+    def download(self,segment_count=4):
+        return sdget_segmented.download_file(self.server.get_url('/thredds/fileServer/tas.nc'),self.local_path,segment_count,timeout=10)
+
+    def get_local_data(self):
+        with open(self.local_path,'rb') as fh:
+            return fh.read()
+
+    def get_ranges(self):
+        return sorted(r for (path,r) in self.server.requests if r!='bytes=0-0')
+
+    def test_download(self):
+        self.assertEqual(self.download(),(0,"",None))
+        self.assertEqual(self.get_local_data(),self.data)
+        self.assertEqual(self.get_ranges(),['bytes=0-249999','bytes=250000-499999','bytes=500000-749999','bytes=750000-999999'])
+        self.assertEqual(sdcounter.get('download.segmented'),1)
+
+    def test_small_file(self):
+        self.server.files['/thredds/fileServer/tas.nc']=self.data=os.urandom(150000)
+
+        # file is too small to be split: downloaded in one stream
+        self.assertEqual(self.download()[0],0)
+        self.assertEqual(self.get_local_data(),self.data)
+        self.assertEqual(self.get_ranges(),[None])
+
+    def test_range_not_supported(self):
+        self.server.accept_ranges=False
+
+        self.assertEqual(self.download()[0],0)
+        self.assertEqual(self.get_local_data(),self.data)
+        self.assertEqual(sdcounter.get('download.segmented'),0)
+
+    def test_segment_retry(self):
+        self.server.truncate_count=1
+        self.server.truncate_size=1000
+
+        self.assertEqual(self.download()[0],0)
+        self.assertEqual(self.get_local_data(),self.data)
+        self.assertEqual(sdcounter.get('download.segment_retries'),1)
+
+        # failed segment is retried from where it stopped
+        self.assertEqual(len(self.get_ranges()),5)
+
+    def test_segment_failed(self):
+        self.server.truncate_count=sdget_segmented.max_segment_attempt*2 # all attempts of both segments fail
+        self.server.truncate_size=1000
+
+        self.assertEqual(self.download(segment_count=2)[0],1)
+        self.assertEqual(os.listdir(os.path.dirname(self.local_path)),[]) # partial file is removed
+
+if __name__ == '__main__':
+    unittest.main()
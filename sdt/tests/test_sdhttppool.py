@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests the HTTP connection pool used for search-API calls."""
+
+import gzip
+import StringIO
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+import requests
+import sdtestutils
+import sdcounter
+import sdhttppool
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version='HTTP/1.1' # keep-alive
+
+    def do_GET(self):
+        if self.path.startswith('/missing'):
+            body='not found'
+            self.send_response(404)
+        else:
+            body=self.server.body
+            self.send_response(200)
+
+        if 'gzip' in self.headers.get('Accept-Encoding','') and self.server.gzip:
+            buf=StringIO.StringIO()
+            fh=gzip.GzipFile(fileobj=buf,mode='wb')
+            fh.write(body)
+            fh.close()
+            body=buf.getvalue()
+            self.send_header('Content-Encoding','gzip')
+
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,*args):
+        pass
+
+class HTTPServer(SocketServer.ThreadingMixIn,BaseHTTPServer.HTTPServer):
+
+    daemon_threads=True
+
+    def handle_error(self,request,client_address):
+        pass # e.g. connection discarded by the client
+
+class HTTPPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server=HTTPServer(('127.0.0.1',0),RequestHandler)
+        self.server.body='x'*100000
+        self.server.gzip=False
+        self.thread=threading.Thread(target=self.server.serve_forever,kwargs={'poll_interval':0.05})
+        self.thread.daemon=True
+        self.thread.start()
+        self.url='http://127.0.0.1:%i/esg-search/search'%self.server.server_port
+
+        self.max_drain_size=sdhttppool.max_drain_size
+        sdhttppool.reset()
+        sdcounter.reset()
+
+    def tearDown(self):
+        sdhttppool.max_drain_size=self.max_drain_size
+        sdhttppool.reset()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reuse(self):
+        for i in range(3):
+            response=sdhttppool.get(self.url,10)
+            self.assertEqual(response.read(),self.server.body)
+            response.close()
+
+        # partially read response: the unread part is drained, so the connection is kept
+        response=sdhttppool.get(self.url,10)
+        self.assertEqual(response.read(10),'x'*10)
+        response.close()
+        response=sdhttppool.get(self.url,10)
+        response.close()
+
+        self.assertEqual(sdhttppool.get_stats(),{'requests':5,'connections_opened':1,'connections_reused':4})
+
+    def test_connection_discarded(self):
+        sdhttppool.max_drain_size=1000
+
+        response=sdhttppool.get(self.url,10)
+        response.read(10)
+        response.close() # too much unread data: connection is closed
+
+        response=sdhttppool.get(self.url,10)
+        response.close()
+
+        self.assertEqual(sdcounter.get('http_pool.connection_opened'),2)
+
+    def test_gzip(self):
+        self.server.gzip=True
+
+        response=sdhttppool.get(self.url,10)
+        data=''
+        while True:
+            block=response.read(1000)
+            if len(block)==0:
+                break
+            data+=block
+        response.close()
+
+        self.assertEqual(data,self.server.body)
+
+    def test_http_error(self):
+        self.assertRaises(requests.exceptions.HTTPError,sdhttppool.get,self.url.replace('esg-search','missing'),10)
+
+        # connection is still usable
+        response=sdhttppool.get(self.url,10)
+        self.assertEqual(response.read(),self.server.body)
+        response.close()
+
+if __name__ == '__main__':
+    unittest.main()
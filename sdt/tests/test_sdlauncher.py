@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests the rate-limited transfer launcher."""
+
+import time
+import threading
+import unittest
+import sdtestutils
+import sdlauncher
+from sdtypes import File
+from sdexception import SDException
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def test_burst(self):
+        bucket=sdlauncher.TokenBucket(2,3,0)
+
+        self.assertEqual([bucket.take(0) for i in range(4)],[True,True,True,False])
+        self.assertEqual(bucket.get_wait_time(0),0.5)
+
+        self.assertFalse(bucket.take(0.4))
+        self.assertTrue(bucket.take(0.5))
+
+        # tokens don't accumulate beyond 'burst'
+        self.assertEqual([bucket.take(100) for i in range(4)],[True,True,True,False])
+
+    def test_rate(self):
+        bucket=sdlauncher.TokenBucket(0.5,1,0)
+
+        launches=[t for t in range(10) if bucket.take(t)]
+
+        self.assertEqual(launches,[0,2,4,6,8])
+
+    def test_no_pacing(self):
+        bucket=sdlauncher.TokenBucket(0,1,0)
+
+        self.assertTrue(all(bucket.take(0) for i in range(100)))
+        self.assertEqual(bucket.get_wait_time(0),0)
+
+class BucketParametersTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(sdlauncher.parse_bucket_parameters(''),{})
+        self.assertEqual(sdlauncher.parse_bucket_parameters('esgf-data1.llnl.gov:5:10, vesg.ipsl.upmc.fr:0.5'),
+                         {'esgf-data1.llnl.gov':(5.0,10),'vesg.ipsl.upmc.fr':(0.5,sdlauncher.launch_burst)})
+
+        for value in ('esgf-data1.llnl.gov','esgf-data1.llnl.gov:fast','esgf-data1.llnl.gov:5:10:1'):
+            self.assertRaises(SDException,sdlauncher.parse_bucket_parameters,value)
+
+class LauncherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.settings=(sdlauncher.launch_rate,sdlauncher.launch_burst,sdlauncher.bucket_parameters,sdlauncher.check_interval)
+        sdlauncher.launch_rate=0
+        sdlauncher.launch_burst=1
+        sdlauncher.bucket_parameters={'esgf-node1.example.org':(10,2)}
+        sdlauncher.check_interval=0.05
+
+        self.started=[]
+        self.cancelled=[]
+        self.launcher=sdlauncher.LauncherThread(self.start_transfer,self.cancelled.append)
+        self.launcher.start()
+
+    def tearDown(self):
+        sdlauncher.quit=1
+        self.launcher.join()
+        sdlauncher.quit=0
+        (sdlauncher.launch_rate,sdlauncher.launch_burst,sdlauncher.bucket_parameters,sdlauncher.check_interval)=self.settings
+
+    def start_transfer(self,tr):
+        self.started.append((tr,time.time()))
+
+    def wait_started(self,count,timeout=5):
+        deadline=time.time()+timeout
+        while len(self.started)<count and time.time()<deadline:
+            time.sleep(0.01)
+
+    def test_pacing(self):
+        start=time.time()
+        self.launcher.submit([File(file_id=i,data_node='esgf-node1.example.org') for i in range(4)])
+        self.launcher.submit([File(file_id=i,data_node='esgf-node2.example.org') for i in range(10,14)])
+
+        self.wait_started(8)
+
+        # data node without pacing doesn't wait for the paced one
+        started=dict((tr.file_id,t-start) for (tr,t) in self.started)
+        self.assertTrue(all(started[i]<0.05 for i in range(10,14)))
+
+        # burst of 2, then 10 launches per second
+        self.assertTrue(started[1]<0.05)
+        self.assertTrue(0.05<=started[2]<0.5)
+        self.assertTrue(started[3]-started[2]>=0.05)
+        self.assertEqual([tr.file_id for (tr,t) in self.started if tr.data_node=='esgf-node1.example.org'],[0,1,2,3])
+
+    def test_shutdown(self):
+        sdlauncher.bucket_parameters={'esgf-node3.example.org':(0.1,1)}
+
+        self.launcher.submit([File(file_id=i,data_node='esgf-node3.example.org') for i in range(3)])
+        self.wait_started(1)
+
+        sdlauncher.quit=1
+        self.launcher.join()
+
+        # transfers not started are given back
+        self.assertEqual(len(self.started),1)
+        self.assertEqual(sorted(tr.file_id for tr in self.cancelled),[1,2])
+        self.assertEqual(self.launcher.get_pending_count(),0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests that disk-based storages behave like the memory storage."""
+
+import unittest
+import sdtestutils
+import sdconst
+import sdmts
+from sdexception import SDException
+
+def get_files():
+    files=[]
+    for i in range(10):
+        f={'file_functional_id':'CMIP6.tas_%i.nc'%i,
+           'data_node':'esgf-node%i.example.org'%(i%3),
+           'size':str(1000*i) if i%2 else 1000*i,
+           'status':None,
+           'dataset_functional_id':'CMIP6.ds%i'%(i%2),
+           'variable':[u'tas'],
+           'url':'http://esgf-node%i.example.org/tas_%i.nc'%(i%3,i)}
+        if i==9:
+            del f['status'] # missing attribute and None attribute are not the same thing
+        files.append(f)
+    return files
+
+class StorageTestCase(unittest.TestCase):
+
+    storage_classes=[sdmts.DatabaseStorage,sdmts.ColumnarDatabaseStorage]
+
+    def setUp(self):
+        self.stores=[]
+
+    def tearDown(self):
+        for store in self.stores:
+            store.delete()
+
+    def register(self,store):
+        """Register store for deletion (filters may return a new store)."""
+        if store not in self.stores:
+            self.stores.append(store)
+        return store
+
+    def new_store(self,storage_class,files):
+        store=self.register(storage_class())
+        store.append_files(files)
+        return store
+
+    def get_files(self,store):
+        files=[]
+        for chunk in store.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+            files.extend(chunk)
+        return files
+
+    def test_round_trip(self):
+        for storage_class in self.storage_classes:
+            store=self.new_store(storage_class,get_files())
+
+            self.assertEqual(store.count(),10)
+            self.assertEqual(store.get_files(),get_files())
+            self.assertEqual(self.get_files(store),get_files())
+            self.assertEqual(store.get_one_file(),get_files()[0])
+            self.assertEqual(store.get_total_size(),45000)
+
+    def test_merge(self):
+        for storage_class in self.storage_classes:
+            store=self.new_store(storage_class,get_files()[:4])
+            other_store=self.new_store(storage_class,get_files()[4:])
+
+            store.merge(other_store)
+
+            self.assertEqual(store.get_files(),get_files())
+
+    def test_filter_equal(self):
+        for key,value in (('data_node','esgf-node1.example.org'),('status',None),('size','3000'),('url','http://esgf-node0.example.org/tas_3.nc')):
+            files=get_files()[:9]
+            for keep in (True,False):
+                expected_files=sdmts.filter_equal_files(files,key,value,keep)
+                for storage_class in self.storage_classes:
+                    store=self.new_store(storage_class,files)
+                    store=self.register(store.filter_equal(key,value,keep))
+
+                    self.assertEqual(self.get_files(store),expected_files)
+
+    def test_filter_equal_missing_attribute(self):
+        for storage_class in self.storage_classes:
+            store=self.new_store(storage_class,get_files())
+
+            self.assertRaises(SDException,store.filter_equal,'status',None,True)
+
+    def test_filter_in(self):
+        for keys,values in ((['file_functional_id','data_node'],[('CMIP6.tas_1.nc','esgf-node1.example.org'),('CMIP6.tas_2.nc','esgf-node0.example.org')]),
+                            (['status'],[(None,)]),
+                            (['url'],[('http://esgf-node0.example.org/tas_3.nc',)])):
+            files=get_files()[:9]
+            for keep in (True,False):
+                expected_files=sdmts.filter_in_files(files,keys,set(values),keep)
+                for storage_class in self.storage_classes:
+                    store=self.new_store(storage_class,files)
+                    store=self.register(store.filter_in(keys,values,keep))
+
+                    self.assertEqual(self.get_files(store),expected_files)
+
+        # missing attribute
+        for storage_class in self.storage_classes:
+            store=self.new_store(storage_class,get_files())
+
+            self.assertRaises(SDException,store.filter_in,['status'],[(None,)],True)
+
+    def test_distinct(self):
+        for keys in (['data_node'],['data_node','dataset_functional_id'],['url']):
+            expected_files=sdmts.distinct_files(get_files(),keys,set())
+            for storage_class in self.storage_classes:
+                store=self.new_store(storage_class,get_files())
+                store=self.register(store.distinct(keys))
+
+                self.assertEqual(self.get_files(store),expected_files)
+
+    def test_project(self):
+        for keys in (['data_node','size'],['url']):
+            expected_files=sdmts.project_files(get_files(),keys)
+            for storage_class in self.storage_classes:
+                store=self.new_store(storage_class,get_files())
+                projection=self.register(store.project(keys))
+
+                self.assertEqual(self.get_files(projection),expected_files)
+                self.assertEqual(store.count(),10) # current store is not modified
+
+if __name__ == '__main__':
+    unittest.main()
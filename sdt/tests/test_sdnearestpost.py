@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests nearest replica selection."""
+
+import unittest
+import sdtestutils
+import sdmts
+import sdtypes
+import sdnearestpost
+
+def get_files():
+    """Returns 3 files with several replicas (and one duplicate)."""
+    files=[]
+    for i in range(3):
+        for data_node in ('esgf-node2.example.org','esgf-node%i.example.org'%i,'esgf-node1.example.org'):
+            files.append({'type':'File','file_functional_id':'CMIP6.tas_%i.nc'%i,'data_node':data_node,'size':1000,'url':'http://%s/tas_%i.nc'%(data_node,i)})
+    return files
+
+class NearestPostTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.compare_dn=sdnearestpost.compare_dn
+        sdnearestpost.compare_dn=lambda datanode_1,datanode_2: datanode_1<datanode_2 # lowest name is the nearest
+
+    def tearDown(self):
+        sdnearestpost.compare_dn=self.compare_dn
+
+    def test_nearest_replica(self):
+        expected_files=[{'type':'File','file_functional_id':'CMIP6.tas_%i.nc'%i,'data_node':data_node,'size':1000,'url':'http://%s/tas_%i.nc'%(data_node,i)}
+                        for (i,data_node) in ((0,'esgf-node0.example.org'),(1,'esgf-node1.example.org'),(2,'esgf-node1.example.org'))]
+
+        for storage_class in (sdmts.MemoryStorage,sdmts.DatabaseStorage,sdmts.ColumnarDatabaseStorage):
+            store=storage_class()
+            store.append_files(get_files())
+            metadata=sdtypes.Metadata(store=store,size=store.get_total_size())
+
+            metadata=sdnearestpost.run(metadata)
+
+            self.assertEqual(metadata.get_files(),expected_files)
+            self.assertEqual(metadata.size,3000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests url failover with replica urls stored at enqueue time."""
+
+import os
+import unittest
+import sdtestutils
+import sdconfig
+import sdconst
+import sdcounter
+import sdreplicadao
+import sdshrinkutils
+import sdnexturl
+from sdtypes import File,Metadata
+
+class NextUrlTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+        sdcounter.reset()
+
+        dataset_id=sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+        self.tr=sdtestutils.get_transfer(sdtestutils.add_file(dataset_id,'tas_0.nc'))
+
+        self.get_urls=sdnexturl.get_urls
+        self.search_api_calls=[]
+        sdnexturl.get_urls=self.fake_get_urls
+        self.remote_urlps=[]
+
+    def tearDown(self):
+        sdnexturl.get_urls=self.get_urls
+
+    def fake_get_urls(self,file_functional_id):
+        self.search_api_calls.append(file_functional_id)
+        return self.remote_urlps
+
+    def add_replicas(self,urlps):
+        self.tr.replicas=urlps
+        sdreplicadao.add_replicas([self.tr])
+
+    def test_stored_replicas(self):
+        self.add_replicas([[self.tr.url,'url_http'],
+                           ['gsiftp://esgf-node1.example.org:2811/tas_0.nc','url_gridftp'],
+                           ['http://esgf-node2.example.org/thredds/fileServer/tas_0.nc','url_http']])
+
+        self.assertTrue(sdnexturl.run(self.tr))
+        self.assertEqual(self.tr.url,'gsiftp://esgf-node1.example.org:2811/tas_0.nc') # gridftp is preferred
+
+        self.assertTrue(sdnexturl.run(self.tr))
+        self.assertEqual(self.tr.url,'http://esgf-node2.example.org/thredds/fileServer/tas_0.nc')
+
+        # all urls failed
+        self.assertFalse(sdnexturl.run(self.tr))
+
+        self.assertEqual(self.search_api_calls,[])
+        self.assertEqual(sdcounter.get('nexturl.cache'),3)
+
+    def test_no_stored_replicas(self):
+        self.remote_urlps=[['http://esgf-node2.example.org/thredds/fileServer/tas_0.nc','url_http'],
+                           ['http://esgf-node2.example.org/thredds/dodsC/tas_0.nc','url_opendap']]
+
+        self.assertTrue(sdnexturl.run(self.tr))
+        self.assertEqual(self.tr.url,'http://esgf-node2.example.org/thredds/fileServer/tas_0.nc')
+        self.assertEqual(self.search_api_calls,[self.tr.file_functional_id])
+
+        # search-API result is stored (opendap urls are not kept)
+        self.assertEqual(sdreplicadao.get_replicas(self.tr.file_functional_id),[['http://esgf-node2.example.org/thredds/fileServer/tas_0.nc','url_http']])
+
+    def test_refresh_stale_replicas(self):
+        self.add_replicas([['http://esgf-node1.example.org/thredds/fileServer/tas_0.nc','url_http']])
+
+        max_age=sdnexturl.replica_max_age
+        sdnexturl.replica_max_age=-1 # all replicas are stale
+        try:
+            self.remote_urlps=[['http://esgf-node3.example.org/thredds/fileServer/tas_0.nc','url_http']]
+            sdnexturl.refresh_stale_replicas()
+            self.assertEqual(sdreplicadao.get_replicas(self.tr.file_functional_id),self.remote_urlps)
+
+            # stored replicas are kept if the search-API doesn't know the file anymore
+            self.remote_urlps=[]
+            sdnexturl.refresh_stale_replicas()
+            self.assertEqual(len(sdreplicadao.get_replicas(self.tr.file_functional_id)),1)
+        finally:
+            sdnexturl.replica_max_age=max_age
+
+class CollectReplicasTestCase(unittest.TestCase):
+
+    def test_collect_and_attach(self):
+        files=[{'type':sdconst.SA_TYPE_FILE,'file_functional_id':'tas_0.nc','data_node':'esgf-node%i.example.org'%i,'replicas':[['http://esgf-node%i.example.org/tas_0.nc'%i,'url_http']]} for i in range(3)]
+        metadata=Metadata(files=files)
+
+        expected_urlps=[['http://esgf-node%i.example.org/tas_0.nc'%i,'url_http'] for i in range(3)]
+
+        for lowmem in (True,False):
+            saved_lowmem=sdconfig.lowmem
+            sdconfig.lowmem=lowmem
+            try:
+                replicas=sdshrinkutils.collect_replicas(metadata)
+            finally:
+                sdconfig.lowmem=saved_lowmem
+
+            try:
+                self.assertEqual(replicas.get_replicas(['tas_0.nc','tas_1.nc']),{'tas_0.nc':expected_urlps})
+
+                # duplicates removed (as done by 'sdshrink' module)
+                remaining_metadata=Metadata(files=files[:1])
+                remaining_metadata=sdshrinkutils.attach_replicas(remaining_metadata,replicas)
+
+                self.assertEqual(remaining_metadata.get_files()[0]['replicas'],expected_urlps)
+            finally:
+                replicas.delete()
+
+            self.assertFalse(os.path.exists(replicas.dbfile))
+
+        # files without replicas
+        self.assertIs(sdshrinkutils.collect_replicas(Metadata(files=[{'type':sdconst.SA_TYPE_FILE,'file_functional_id':'tas_0.nc'}])),None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests that incremental search-API response parsers return the same files as DOM parsers."""
+
+import json
+import StringIO
+import unittest
+import sdtestutils
+import sdjson
+import sdxml
+from sdtypes import Metadata
+from sdexception import SDException
+
+def get_docs(count):
+    docs=[]
+    for i in range(count):
+        docs.append({'id':'cmip6.tas_%i.nc|esgf-node0.example.org'%i,
+                     'dataset_id':'cmip6.ds.v1|esgf-node0.example.org',
+                     'type':'File',
+                     'title':u'tas_%i_\xe9t\xe9.nc'%i, # non-ascii
+                     'size':1000+i,
+                     'variable':['tas'],
+                     'url':['http://esgf-node0.example.org/thredds/fileServer/tas_%i.nc|application/netcdf|HTTPServer'%i]})
+    return docs
+
+def get_json_response(docs):
+    return json.dumps({'responseHeader':{'status':0,'QTime':1},
+                       'response':{'numFound':len(docs)*2,'start':0,'docs':docs},
+                       'facet_counts':{'facet_queries':{},'facet_fields':{}}})
+
+def get_xml_value(k,v):
+    if isinstance(v,list):
+        return '<arr name="%s">%s</arr>'%(k,''.join('<str>%s</str>'%i for i in v))
+    elif isinstance(v,int):
+        return '<long name="%s">%i</long>'%(k,v)
+    else:
+        return '<str name="%s">%s</str>'%(k,v)
+
+def get_xml_response(docs):
+    buf=u'<?xml version="1.0" encoding="UTF-8"?>\n<response>\n'
+    buf+=u'<lst name="responseHeader"><int name="status">0</int><int name="QTime">1</int></lst>\n'
+    buf+=u'<result name="response" numFound="%i" start="0">\n'%(len(docs)*2)
+    for doc in docs:
+        buf+=u'<doc>%s</doc>\n'%''.join(get_xml_value(k,v) for k,v in doc.iteritems())
+    buf+=u'</result>\n'
+    buf+=u'<lst name="facet_counts"><lst name="facet_queries"/><lst name="facet_fields"/></lst>\n'
+    buf+=u'</response>\n'
+    return buf.encode('utf-8')
+
+class ParserTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.read_size=sdjson.read_size
+        self.json_chunksize=sdjson.chunksize
+        self.xml_chunksize=sdxml.chunksize
+
+        # small values so docs span several reads and several chunks
+        sdjson.read_size=100
+        sdjson.chunksize=3
+        sdxml.chunksize=3
+
+    def tearDown(self):
+        sdjson.read_size=self.read_size
+        sdjson.chunksize=self.json_chunksize
+        sdxml.chunksize=self.xml_chunksize
+
+    def check_stream_parser(self,parser,buffer,count):
+        expected=parser.parse_metadata(buffer)
+
+        metadata=Metadata()
+        result=parser.parse_metadata_stream(StringIO.StringIO(buffer),metadata)
+
+        self.assertEqual(result,{'num_found':count*2,'num_result':count})
+        self.assertEqual(metadata.get_files(),expected['files'])
+
+    def test_json(self):
+        for count in (0,1,10):
+            self.check_stream_parser(sdjson,get_json_response(get_docs(count)),count)
+
+    def test_xml(self):
+        for count in (0,1,10):
+            self.check_stream_parser(sdxml,get_xml_response(get_docs(count)),count)
+
+    def test_json_truncated(self):
+        buffer=get_json_response(get_docs(10))
+
+        self.assertRaises(ValueError,sdjson.parse_metadata_stream,StringIO.StringIO(buffer[:500]),Metadata())
+        self.assertRaises(SDException,sdjson.parse_metadata_stream,StringIO.StringIO('{"response":{}}'),Metadata())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests parallel pagination of search-API calls."""
+
+import urlparse
+import threading
+import unittest
+import sdtestutils
+import sdconst
+import sdtypes
+import sdindex
+import sdcounter
+import sdproxy
+
+class FakeIndexProxy(sdproxy.SearchAPIProxy):
+    """Search-API proxy which returns files from memory instead of calling the indexes."""
+
+    def __init__(self,results,failures):
+        self.results=results   # host => file ids (each index returns files in its own order)
+        self.failures=failures # (host,offset) => number of calls which fail
+        self.calls=[]          # (host,offset) list
+        self.lock=threading.Lock()
+
+    def call_web_service(self,request):
+        host=urlparse.urlparse(request._url).netloc
+
+        with self.lock:
+            self.calls.append((host,request.offset))
+            if self.failures.get((host,request.offset),0)>0:
+                self.failures[(host,request.offset)]-=1
+                raise Exception('Search-API call failed')
+
+        ids=self.results[host]
+        files=[{'id':id_,'size':1} for id_ in ids[request.offset:request.offset+request.limit]]
+
+        return sdtypes.Response(files=files,num_found=len(ids),call_duration=0,lowmem=False)
+
+class ParallelPaginationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.chunksize=sdconst.SEARCH_API_CHUNKSIZE
+        self.parallel_pagination=sdproxy.parallel_pagination
+        self.retry_delay=sdproxy.retry_delay
+        self.index_host_list=sdindex.index_host_list
+
+        sdconst.SEARCH_API_CHUNKSIZE=10
+        sdproxy.parallel_pagination=4
+        sdproxy.retry_delay=0
+        sdindex.index_host_list=['index1.example.org','index2.example.org']
+        sdcounter.reset()
+
+        self.results={'index1.example.org':['f%i'%i for i in range(35)],
+                      'index2.example.org':['f%i'%i for i in reversed(range(35))]}
+        self.url='http://index1.example.org/esg-search/search?type=File'
+
+    def tearDown(self):
+        sdconst.SEARCH_API_CHUNKSIZE=self.chunksize
+        sdproxy.parallel_pagination=self.parallel_pagination
+        sdproxy.retry_delay=self.retry_delay
+        sdindex.index_host_list=self.index_host_list
+
+    def run_query(self,proxy):
+        request=sdtypes.Request(url=self.url,pagination=True)
+        response=proxy.call_web_service__PAGINATION(request)
+        return [f['id'] for f in response.get_files()]
+
+    def test_pages_order(self):
+        proxy=FakeIndexProxy(self.results,{})
+
+        self.assertEqual(self.run_query(proxy),self.results['index1.example.org'])
+        self.assertEqual(sorted(proxy.calls),[('index1.example.org',offset) for offset in (0,10,20,30)])
+
+    def test_page_retry(self):
+        proxy=FakeIndexProxy(self.results,{('index1.example.org',20):2})
+
+        self.assertEqual(self.run_query(proxy),self.results['index1.example.org'])
+        self.assertEqual(set(host for (host,offset) in proxy.calls),set(['index1.example.org']))
+        self.assertEqual(sdcounter.get('search_api.page_retry'),2)
+
+    def test_failover(self):
+        proxy=FakeIndexProxy(self.results,{('index1.example.org',20):sdproxy.page_max_retry+1})
+
+        # whole query is restarted on the other index (pages are never mixed)
+        self.assertEqual(self.run_query(proxy),self.results['index2.example.org'])
+        self.assertEqual(sorted(offset for (host,offset) in proxy.calls if host=='index2.example.org'),[0,10,20,30])
+        self.assertEqual(sdcounter.get('search_api.query_failover'),1)
+
+    def test_all_indexes_failed(self):
+        proxy=FakeIndexProxy(self.results,{('index1.example.org',0):sdproxy.page_max_retry+1,('index2.example.org',10):sdproxy.page_max_retry+1})
+
+        self.assertRaises(Exception,self.run_query,proxy)
+
+if __name__ == '__main__':
+    unittest.main()
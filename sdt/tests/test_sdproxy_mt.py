@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests multi-host search-API queries processing."""
+
+import os
+import sys
+import time
+import glob
+import StringIO
+import threading
+import unittest
+import sdtestutils
+import sdconfig
+import sdconst
+import sdtypes
+import sdproxy_mt
+
+class FakeService():
+    """Search-API service which returns one file per query."""
+
+    def __init__(self,host,calls,failing_hosts):
+        self.host=host
+        self.calls=calls                 # (host,url) list (shared by all services)
+        self.failing_hosts=failing_hosts # url => hosts on which the query fails
+        self.lock=threading.Lock()
+
+    def run(self,url=None,attached_parameters=None):
+        with self.lock:
+            self.calls.append((self.host,url))
+
+        if self.host in self.failing_hosts.get(url.replace(self.host,sdconst.IDXHOSTMARK),[]):
+            raise Exception('Search-API call failed')
+
+        return sdtypes.Metadata(files=[{'id':url.replace(self.host,sdconst.IDXHOSTMARK),'size':1}],lowmem=True) # one transient database per query
+
+class ProxyMTTestCase(unittest.TestCase):
+
+    hosts=['index1.example.org','index2.example.org']
+
+    def setUp(self):
+        self.services=sdproxy_mt.searchAPIServices
+        self.retry_backoff=sdproxy_mt.retry_backoff
+        self.max_thread_per_host=sdproxy_mt.max_thread_per_host
+
+        sdproxy_mt.retry_backoff=0
+        sdproxy_mt.max_thread_per_host=2
+
+        self.calls=[]
+        self.failing_hosts={}
+        sdproxy_mt.searchAPIServices=dict((host,{'iSearchAPIProxy':FakeService(host,self.calls,self.failing_hosts)}) for host in self.hosts)
+
+        self.urls=['http://%s/esg-search/search?variable=v%i'%(sdconst.IDXHOSTMARK,i) for i in range(10)]
+
+    def tearDown(self):
+        sdproxy_mt.searchAPIServices=self.services
+        sdproxy_mt.retry_backoff=self.retry_backoff
+        sdproxy_mt.max_thread_per_host=self.max_thread_per_host
+
+    def run_queries(self):
+        metadata=sdproxy_mt.run([{'url':url} for url in self.urls])
+        return sorted(f['id'] for f in metadata.get_files())
+
+    def test_run(self):
+        self.assertEqual(self.run_queries(),sorted(self.urls))
+        self.assertEqual(len(self.calls),len(self.urls))
+
+    def test_retry_on_other_host(self):
+        self.failing_hosts[self.urls[0]]=['index1.example.org']
+        self.failing_hosts[self.urls[1]]=['index2.example.org']
+
+        self.assertEqual(self.run_queries(),sorted(self.urls))
+
+        # a failed query is retried on the other host
+        for url,host in ((self.urls[0],'index2.example.org'),(self.urls[1],'index1.example.org')):
+            self.assertEqual(self.calls.count((host,url.replace(sdconst.IDXHOSTMARK,host))),1)
+
+    def test_transient_storage_is_deleted(self):
+        pattern=os.path.join(sdconfig.db_folder,'sdt_transient_storage_*.db')
+        transient_files=set(glob.glob(pattern))
+
+        stderr=sys.stderr
+        sys.stderr=StringIO.StringIO() # errors raised in destructors are only printed
+        try:
+            self.assertEqual(self.run_queries(),sorted(self.urls))
+            errors=sys.stderr.getvalue()
+        finally:
+            sys.stderr=stderr
+
+        self.assertEqual(errors,'')
+        self.assertEqual(set(glob.glob(pattern)),transient_files)
+
+    def test_max_retry(self):
+        self.failing_hosts[self.urls[0]]=self.hosts
+
+        self.assertEqual(self.run_queries(),sorted(self.urls[1:]))
+        self.assertEqual(len([c for c in self.calls if c[1].endswith('variable=v0')]),sdproxy_mt.max_retry)
+
+class WorkQueueTestCase(unittest.TestCase):
+
+    def test_eligibility(self):
+        work_queue=sdproxy_mt.WorkQueue(['index1','index2'])
+
+        task=sdproxy_mt.SearchTask({'url':'url1'})
+        task.failed_hosts.add('index1')
+        work_queue.put(task)
+        other_task=sdproxy_mt.SearchTask({'url':'url2'})
+        work_queue.put(other_task)
+
+        self.assertIs(work_queue.get('index1'),other_task)
+        self.assertIs(work_queue.get('index2'),task)
+        self.assertEqual(work_queue.get_running_counts(),{'index1':1,'index2':1})
+
+        # query failed on all hosts: any host can retry it
+        task.failed_hosts.add('index2')
+        work_queue.put(task)
+        self.assertIs(work_queue.get('index1'),task)
+
+    def test_backoff(self):
+        work_queue=sdproxy_mt.WorkQueue(['index1'])
+
+        task=sdproxy_mt.SearchTask({'url':'url1'})
+        task.not_before=time.time()+0.2
+        work_queue.put(task)
+
+        start=time.time()
+        self.assertIs(work_queue.get('index1'),task)
+        self.assertTrue(time.time()-start>=0.15)
+
+    def test_close(self):
+        work_queue=sdproxy_mt.WorkQueue(['index1'])
+
+        threading.Timer(0.1,work_queue.close).start()
+
+        self.assertIs(work_queue.get('index1'),None)
+
+if __name__ == '__main__':
+    unittest.main()
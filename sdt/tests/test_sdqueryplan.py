@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests that hot queries use an index."""
+
+import sqlite3
+import unittest
+import sdtestutils
+import sddbobj
+import sdqueryplan
+
+class QueryPlanTestCase(unittest.TestCase):
+
+    def test_hot_queries_use_an_index(self):
+        failures=sdqueryplan.check()
+        self.assertEqual([name for (name,query,plan) in failures],[])
+
+    def test_missing_indexes_are_detected(self):
+        conn=sqlite3.connect(':memory:')
+        try:
+            sddbobj.create_tables(conn) # no index
+
+            failures=sdqueryplan.check(conn)
+            self.assertTrue(len(failures)>0)
+        finally:
+            conn.close()
+
+    def test_is_plan_ok(self):
+        self.assertTrue(sdqueryplan.is_plan_ok(['SEARCH file USING INDEX idx_file_7 (status=?)']))
+        self.assertTrue(sdqueryplan.is_plan_ok(['SCAN CONSTANT ROW','SEARCH event USING INDEX idx_event_2 (status=?)']))
+        self.assertFalse(sdqueryplan.is_plan_ok(['SCAN file']))
+        self.assertFalse(sdqueryplan.is_plan_ok(['SEARCH file USING INDEX idx_file_7 (status=?)','USE TEMP B-TREE FOR ORDER BY']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests the write-behind dictionary and the max priority cache."""
+
+import os
+import sqlite3
+import unittest
+import sdtestutils
+import sdconfig
+import sdsqlitedict
+import sdfiledao
+
+class WriteBehindDictTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path=os.path.join(sdtestutils.scratch_folder,'writebehind.db')
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        self.d=sdsqlitedict.WriteBehindDict(self.path,'maxpri',value_type=int)
+
+    def get_stored_values(self):
+        conn=sqlite3.connect(self.path)
+        values=dict(conn.execute("select key,value from maxpri").fetchall())
+        conn.close()
+        return values
+
+    def set_stored_value(self,key,value):
+        conn=sqlite3.connect(self.path)
+        conn.execute("insert or replace into maxpri (key,value) values (?,?)",(key,value))
+        conn.commit()
+        conn.close()
+
+    def test_write_behind(self):
+        self.d['dn1']='1000'
+        self.d['dn2']=2000
+        self.d['dn3']=None
+
+        self.assertEqual(self.d['dn1'],1000)
+        self.assertEqual(self.d['dn3'],None)
+        self.assertEqual(self.get_stored_values(),{})
+
+        self.d.flush()
+        self.assertEqual(self.get_stored_values(),{'dn1':'1000','dn2':'2000','dn3':None})
+
+        del self.d['dn2']
+        self.d.flush()
+        self.assertEqual(self.get_stored_values(),{'dn1':'1000','dn3':None})
+
+    def test_refresh(self):
+        self.assertFalse(self.d.refresh())
+
+        self.set_stored_value('dn1','3000')
+        self.assertNotIn('dn1',self.d)
+
+        self.assertTrue(self.d.refresh())
+        self.assertEqual(self.d['dn1'],3000)
+        self.assertFalse(self.d.refresh())
+
+    def test_reload_keeps_pending_modifications(self):
+        self.d['dn1']=1000
+        self.set_stored_value('dn2','2000')
+
+        self.assertTrue(self.d.refresh())
+        self.assertEqual(dict(self.d.items()),{'dn1':1000,'dn2':2000})
+
+class MaxPriorityCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+        self.dataset_id=sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+        sdfiledao.highest_waiting_priority(True,True)
+        sdfiledao.refresh_highest_waiting_priority()
+
+    def test_cache_modified_by_another_process(self):
+        self.assertEqual(sdfiledao.highest_waiting_priority('esgf-node0.example.org'),None)
+
+        # e.g. 'synda install' flushing its cache at exit
+        conn=sqlite3.connect(os.path.join(sdconfig.default_db_folder,'caches.db'))
+        conn.execute("insert or replace into maxpri (key,value) values (?,?)",('esgf-node0.example.org','4242'))
+        conn.commit()
+        conn.close()
+
+        sdfiledao.refresh_highest_waiting_priority()
+        self.assertEqual(sdfiledao.highest_waiting_priority('esgf-node0.example.org'),4242)
+
+    def test_database_modified_by_another_process(self):
+        sdfiledao.highest_waiting_priority.vals['esgf-node0.example.org']=1000
+        sdfiledao.highest_waiting_priority.vals.flush()
+
+        # cache entry modified by another process but main database committed last
+        conn=sqlite3.connect(os.path.join(sdconfig.default_db_folder,'caches.db'))
+        conn.execute("insert or replace into maxpri (key,value) values (?,?)",('esgf-node0.example.org','5000'))
+        conn.commit()
+        conn.close()
+        conn=sdtestutils.get_other_connection()
+        sdtestutils.add_file(self.dataset_id,'tas_0.nc',priority=5000,conn=conn)
+        conn.close()
+
+        sdfiledao.refresh_highest_waiting_priority()
+        self.assertEqual(sdfiledao.highest_waiting_priority('esgf-node0.example.org'),5000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests the in-memory waiting transfers queue."""
+
+import unittest
+import sdtestutils
+import sddb
+import sdconst
+import sdtransferqueue
+import sdmodify
+
+class TransferQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sdtestutils.reset_database()
+        sdtransferqueue.invalidate()
+        self.window_size=sdtransferqueue.window_size
+        self.dataset_id=sdtestutils.add_dataset('CMIP6/CMIP/IPSL/IPSL-CM6A-LR/historical/r1i1p1f1/Amon/tas/gr/v20180803')
+
+    def tearDown(self):
+        sdtransferqueue.window_size=self.window_size
+        sdtransferqueue.invalidate()
+
+    def add_file(self,name,data_node='esgf-node0.example.org',priority=sdconst.DEFAULT_PRIORITY,checksum=None):
+        return sdtestutils.add_file(self.dataset_id,name,data_node=data_node,priority=priority,checksum=checksum)
+
+    def get_expected_order(self,data_node):
+        c=sddb.conn.cursor()
+        c.execute("select file_id from file where status=? and data_node=? order by priority desc, checksum, file_id",(sdconst.TRANSFER_STATUS_WAITING,data_node))
+        file_ids=[rs[0] for rs in c.fetchall()]
+        c.close()
+        return file_ids
+
+    def test_order(self):
+        for i,(priority,checksum) in enumerate([(1000,'c'),(2000,'b'),(1000,'a'),(3000,None),(2000,'a')]):
+            self.add_file('tas_%i.nc'%i,priority=priority,checksum=checksum)
+
+        transfers=sdtransferqueue.pop_transfers(10,{'esgf-node0.example.org':10})
+
+        self.assertEqual([tr.file_id for tr in transfers],self.get_expected_order('esgf-node0.example.org'))
+        for tr in transfers:
+            self.assertEqual(tr.dataset.dataset_id,self.dataset_id)
+
+    def test_small_window(self):
+        sdtransferqueue.window_size=2
+        for i in range(7):
+            self.add_file('tas_%i.nc'%i,priority=1000+(i%3))
+        expected_file_ids=self.get_expected_order('esgf-node0.example.org')
+
+        file_ids=[]
+        for i in range(4):
+            transfers=sdtransferqueue.pop_transfers(2,{'esgf-node0.example.org':2})
+            file_ids.extend(tr.file_id for tr in transfers)
+
+            # caller is in charge of the status change
+            for tr in transfers:
+                sddb.conn.execute("update file set status=? where file_id=?",(sdconst.TRANSFER_STATUS_RUNNING,tr.file_id))
+            sddb.conn.commit()
+
+        self.assertEqual(file_ids,expected_file_ids)
+
+    def test_priority_change(self):
+        file_ids=[self.add_file('tas_%i.nc'%i,priority=1000) for i in range(3)]
+
+        transfers=sdtransferqueue.pop_transfers(1,{'esgf-node0.example.org':1})
+        self.assertEqual([tr.file_id for tr in transfers],file_ids[:1])
+        sddb.conn.execute("update file set status=? where file_id=?",(sdconst.TRANSFER_STATUS_RUNNING,file_ids[0]))
+        sddb.conn.commit()
+
+        # queued entries are dropped, so the new priority is used
+        self.assertEqual(sdmodify.change_priority(5000,'%i.tas_2.nc'%self.dataset_id),1)
+        transfers=sdtransferqueue.pop_transfers(1,{'esgf-node0.example.org':1})
+        self.assertEqual([tr.file_id for tr in transfers],file_ids[2:])
+
+        # only waiting files are modified
+        self.assertEqual(sdmodify.change_priority(2000),2)
+
+    def test_free_slots(self):
+        for i in range(5):
+            self.add_file('a_%i.nc'%i,data_node='esgf-node1.example.org')
+            self.add_file('b_%i.nc'%i,data_node='esgf-node2.example.org')
+
+        free_slots={'esgf-node1.example.org':1,'esgf-node2.example.org':3}
+        transfers=sdtransferqueue.pop_transfers(10,free_slots)
+
+        data_nodes=[tr.data_node for tr in transfers]
+        self.assertEqual(data_nodes.count('esgf-node1.example.org'),1)
+        self.assertEqual(data_nodes.count('esgf-node2.example.org'),3)
+        self.assertEqual(free_slots,{'esgf-node1.example.org':0,'esgf-node2.example.org':0})
+
+    def test_stale_entry(self):
+        file_ids=[self.add_file('tas_%i.nc'%i) for i in range(3)]
+        self.assertEqual(sdtransferqueue.get_datanodes(),['esgf-node0.example.org']) # load the queue
+
+        # status modified without notifying the queue
+        sddb.conn.execute("update file set status=? where file_id=?",(sdconst.TRANSFER_STATUS_DONE,file_ids[0]))
+        sddb.conn.commit()
+
+        free_slots={'esgf-node0.example.org':2}
+        transfers=sdtransferqueue.pop_transfers(2,free_slots)
+
+        self.assertEqual([tr.file_id for tr in transfers],file_ids[1:])
+        self.assertEqual(free_slots['esgf-node0.example.org'],0)
+
+    def test_push(self):
+        self.add_file('tas_0.nc')
+        self.assertEqual(len(sdtransferqueue.get_datanodes()),1) # load the queue
+
+        file_id=self.add_file('tas_1.nc',priority=9000)
+        sdtransferqueue.push(file_id,'esgf-node0.example.org',9000,None)
+        other_file_id=self.add_file('tas_2.nc',data_node='esgf-node1.example.org')
+        sdtransferqueue.push(other_file_id,'esgf-node1.example.org',sdconst.DEFAULT_PRIORITY,None)
+
+        transfers=sdtransferqueue.pop_transfers(1,{'esgf-node0.example.org':1})
+        self.assertEqual(transfers[0].file_id,file_id)
+
+        transfers=sdtransferqueue.pop_transfers(1,{'esgf-node1.example.org':1})
+        self.assertEqual(transfers[0].file_id,other_file_id)
+
+    def test_refresh(self):
+        sdtransferqueue.refresh()
+        self.assertEqual(sdtransferqueue.get_datanodes(),[])
+
+        # file added by another process (the queue is not notified)
+        conn=sdtestutils.get_other_connection()
+        sdtestutils.add_file(self.dataset_id,'tas_0.nc',conn=conn)
+        conn.close()
+
+        sdtransferqueue.refresh()
+        self.assertEqual(sdtransferqueue.get_datanodes(),['esgf-node0.example.org'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests transfer progress tracking (watchdog)."""
+
+import os
+import tempfile
+import unittest
+import sdtestutils
+import sdconst
+import sdcounter
+import sdget
+import sdget_native
+import sdwatchdog
+
+class WatchdogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.settings=(sdwatchdog.stall_timeout,sdwatchdog.min_throughput,sdwatchdog.window)
+        sdwatchdog.stall_timeout=60
+        sdwatchdog.min_throughput=1000
+        sdwatchdog.window=30
+        sdcounter.reset()
+
+        self.watch=sdwatchdog.register(1,'/tmp/CMIP6/tas.nc')
+        self.start=self.watch.start_time
+
+    def tearDown(self):
+        (sdwatchdog.stall_timeout,sdwatchdog.min_throughput,sdwatchdog.window)=self.settings
+        sdwatchdog.unregister(self.watch)
+
+    def test_progress(self):
+        for i in range(1,10):
+            self.watch.add_bytes(100000)
+            sdwatchdog.check_transfers(self.start+i*10)
+
+        self.assertFalse(self.watch.is_killed())
+
+    def test_stalled(self):
+        sdwatchdog.min_throughput=0
+        self.watch.add_bytes(100000)
+
+        sdwatchdog.check_transfers(self.start+10)
+        sdwatchdog.check_transfers(self.start+69)
+        self.assertFalse(self.watch.is_killed())
+
+        sdwatchdog.check_transfers(self.start+70)
+        self.assertTrue(self.watch.is_killed())
+        self.assertEqual(sdcounter.get('watchdog.killed.stalled'),1)
+
+    def test_slow(self):
+        for i in range(1,4):
+            self.watch.add_bytes(5000) # 500 bytes per second
+            sdwatchdog.check_transfers(self.start+i*10)
+
+        self.assertTrue(self.watch.is_killed())
+        self.assertEqual(sdcounter.get('watchdog.killed.slow'),1)
+
+    def test_abort_callbacks(self):
+        calls=[]
+        callback=lambda: calls.append(1)
+
+        self.watch.add_abort_callback(callback)
+        self.watch.kill('test')
+        self.assertEqual(calls,[1])
+
+        # killed before the callback was added
+        self.watch.add_abort_callback(callback)
+        self.assertEqual(calls,[1,1])
+
+        # killed transfers are not checked anymore
+        sdwatchdog.check_transfers(self.start+1000)
+        self.assertEqual(sdcounter.get('watchdog.killed.stalled'),0)
+
+    def test_abort_download(self):
+        server=sdtestutils.DataNodeServer({'/thredds/fileServer/tas.nc':os.urandom(100000)})
+        local_path=os.path.join(tempfile.mkdtemp(dir=sdtestutils.scratch_folder),'tas.nc')
+
+        self.watch.kill('test')
+
+        try:
+            (status,killed,script_stderr,local_checksum)=sdget.download(server.get_url('/thredds/fileServer/tas.nc'),local_path,http_client=sdconst.HTTP_CLIENT_NATIVE,timeout=10,watch=self.watch)
+        finally:
+            sdget_native.reset()
+            server.stop()
+
+        self.assertEqual((status,killed),(7,True))
+        self.assertFalse(os.path.exists(local_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests the fixed-size worker pool."""
+
+import sys
+import time
+import Queue
+import StringIO
+import threading
+import unittest
+import sdtestutils
+import sdworkerutils
+from sdexception import SDException
+
+class Item():
+    def __init__(self,id_,duration=0,fail=False):
+        self.id=id_
+        self.duration=duration
+        self.fail=fail
+        self.result=None
+
+class Service():
+    """Service which sleeps 'duration' seconds (or until cancelled)."""
+
+    def __init__(self):
+        self.running=0
+        self.max_running=0
+        self.lock=threading.Lock()
+        self.exception_occurs=False
+
+    def run(self,item,token):
+        with self.lock:
+            self.running+=1
+            self.max_running=max(self.max_running,self.running)
+
+        try:
+            if item.fail:
+                raise Exception('item failed')
+
+            cancelled=threading.Event()
+            callback=lambda reason: cancelled.set()
+            token.add_callback(callback)
+            cancelled.wait(item.duration)
+            token.remove_callback(callback)
+
+            item.result='cancelled' if token.is_cancelled() else 'done'
+        finally:
+            with self.lock:
+                self.running-=1
+
+    def cancel(self,item,reason):
+        item.result='not started'
+
+    def fail(self,item,exception):
+        item.result='failed (%s)'%str(exception)
+
+class WorkerPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.service=Service()
+        self.output_queue=Queue.Queue()
+        self.pool=sdworkerutils.WorkerPool('test',3,self.service,self.output_queue,max_queue_size=100)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.cancel('test ended')
+        self.pool.stop()
+        self.pool.join()
+
+    def get_results(self):
+        results={}
+        while not self.output_queue.empty():
+            item=self.output_queue.get()
+            results[item.id]=item.result
+        return results
+
+    def test_pool_size(self):
+        for i in range(10):
+            self.pool.submit(Item(i,duration=0.02))
+
+        self.assertTrue(self.pool.drain(5))
+
+        self.assertEqual(self.get_results(),dict((i,'done') for i in range(10)))
+        self.assertEqual(self.service.max_running,3)
+        self.assertEqual(sum(slot.processed_count for slot in self.pool.slots),10)
+
+    def test_failed_item(self):
+        stderr=sys.stderr
+        sys.stderr=StringIO.StringIO() # stacktrace is printed on stderr
+        try:
+            self.pool.submit(Item(0,fail=True))
+            self.pool.submit(Item(1))
+
+            self.assertTrue(self.pool.drain(5))
+        finally:
+            sys.stderr=stderr
+
+        # thread keeps running, failed item is given back
+        self.assertEqual(self.get_results(),{0:'failed (item failed)',1:'done'})
+        self.assertEqual(self.pool.get_pending_count(),0)
+
+    def test_drain(self):
+        self.pool.submit(Item(0,duration=0.5))
+
+        self.assertFalse(self.pool.drain(0.05))
+        self.assertRaises(SDException,self.pool.submit,Item(1)) # pool doesn't accept items anymore
+
+        self.assertTrue(self.pool.drain(5))
+
+    def test_cancel(self):
+        for i in range(6):
+            self.pool.submit(Item(i,duration=10))
+
+        # wait for in-flight items
+        deadline=time.time()+5
+        while len(self.pool.get_busy_slots())<3 and time.time()<deadline:
+            time.sleep(0.01)
+
+        start=time.time()
+        self.pool.cancel('shutdown')
+        self.assertTrue(self.pool.drain(5))
+        self.assertTrue(time.time()-start<5)
+
+        results=self.get_results()
+        self.assertEqual(sorted(results.values()),['cancelled']*3+['not started']*3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module tests read-only subcommands startup."""
+
+import sys
+import sqlite3
+import StringIO
+import unittest
+import sdtestutils
+import sddb
+import sdcache
+import syndautils
+
+class ReadOnlyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sdparam=sys.modules.pop('sdparam',None) # so parameters are loaded again
+        self.sdcache_run=sdcache.run
+        self.stderr=sys.stderr
+        sys.stderr=StringIO.StringIO() # 'Retrieving parameters' message
+
+        # parameters are stored without retrieving them from ESGF
+        def run(host=None,reload=False,project=None):
+            sddb.conn.execute("delete from param")
+            sdtestutils.add_parameters()
+        sdcache.run=run
+
+    def tearDown(self):
+        sddb.conn.execute("pragma query_only=0")
+
+        sdcache.run=self.sdcache_run
+        sys.stderr=self.stderr
+        if self.sdparam is not None:
+            sys.modules['sdparam']=self.sdparam
+        else:
+            sys.modules.pop('sdparam',None)
+
+        sdtestutils.add_parameters()
+
+    def test_parameters_are_loaded_before_switching_to_read_only(self):
+        for subcommand in ('list','metric'):
+            sys.modules.pop('sdparam',None)
+            # fresh install (no parameters)
+            sddb.conn.execute("pragma query_only=0")
+            sddb.conn.execute("delete from param")
+            sddb.conn.commit()
+
+            syndautils.set_read_only(subcommand)
+
+            import sdparam
+            self.assertEqual(sdparam.params['project'],['CMIP6'])
+            self.assertRaises(sqlite3.OperationalError,sddb.conn.execute,"delete from param")
+
+if __name__ == '__main__':
+    unittest.main()